@@ -10,6 +10,7 @@ from src.services.use_whisper import start_whisper_service, check_whisper_servic
 from src.core.task import process_video_background
 from src.utils.done_timeout_delete import start_timeout_cleaner
 from src.services.enabled import startup_resumer
+from src.services.tran_modules.deferred import start_deferred_translation
 
 app = Flask(__name__)
 app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1, x_proto=1, x_host=1, x_prefix=1)
@@ -50,7 +51,7 @@ def process_task_queue():
             all_tasks = task_coordinator.get_all_tasks()
             queued_tasks = []
             
-            # 找到所有需要处理的任务（队列中 + 中断恢复的任务）
+            # 找到所有需要处理的任务（队列中 + 中断恢复的任务），等待批量翻译的任务由批处理结束后放回翻译阶段
             for tid, task in all_tasks['single_tasks'].items():
                 if task['status'] in ["队列中", "提取原文字幕", "翻译原文字幕"]:
                     queued_tasks.append((tid, task['created_at']))
@@ -149,6 +150,9 @@ if __name__ == "__main__":
         # 初始化高优先级任务恢复功能
         print("[INFO] 高优先级启动任务恢复检查...")
         init_startup_recovery()
+
+        # 继续轮询重启前提交的批量翻译
+        start_deferred_translation()
         
         # 启动任务处理队列
         threading.Thread(target=process_task_queue, daemon=True).start()
@@ -6,6 +6,7 @@ from .handlers import (
     config_ollama_api_handler,
     config_ollama_model_handler,
     get_tranpy_config_handler,
+    get_tranpy_metrics_handler,
     config_translator_type_handler,
     config_openai_base_url_handler,
     config_openai_api_key_handler,
@@ -133,6 +134,11 @@ def create_api_routes(app, app_state, cache_dirs):
     def config_openai_model(model_name):
         return config_openai_model_handler(model_name)
 
+    @app.route("/api/tranpy/metrics", methods=['GET'])
+    @require_internal_access
+    def get_tranpy_metrics():
+        return get_tranpy_metrics_handler()
+
     # 公开API - 使用新的安全检查系统
 
     @app.route("/api/whisper/health", methods=['GET'])
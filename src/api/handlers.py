@@ -89,9 +89,37 @@ def get_tranpy_config_handler():
         return jsonify({"error": str(e)}), 500
 
 
+def get_tranpy_metrics_handler():
+    """获取翻译相关运行指标"""
+    try:
+        from utils.http_client import get_http_client
+        from src.services.tran_modules.memory import get_translation_memory
+        from src.services.tran_modules.metrics import get_translation_metrics
+        from src.services.tran_modules.pool import get_pool_stats
+        from src.services.tran_modules.hedging import get_hedge_stats
+        from src.services.tran_modules.scheduler import get_scheduler_stats
+        from src.services.tran_modules.autotune import get_autotune_stats
+        from src.services.tran_modules.ratelimit import get_rate_limit_stats
+        from src.services.tran_modules.deferred import get_deferred_stats
+        memory = get_translation_memory()
+        return jsonify({
+            "http": get_http_client().get_metrics(),
+            "translation": get_translation_metrics().get_metrics(),
+            "translation_backends": get_pool_stats(),
+            "translation_hedging": get_hedge_stats(),
+            "translation_scheduler": get_scheduler_stats(),
+            "translation_autotune": get_autotune_stats(),
+            "translation_rate_limits": get_rate_limit_stats(),
+            "translation_deferred": get_deferred_stats(),
+            "translation_memory": memory.get_stats() if memory else None
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
 def config_translator_type_handler(translator_type):
     """配置翻译器类型"""
-    if translator_type not in ['ollama', 'openai']:
+    if translator_type not in ['ollama', 'openai', 'local']:
         return jsonify({"error": "不支持的翻译器类型"}), 400
     
     return update_config_field('translator_type', translator_type)
@@ -215,8 +243,9 @@ def process_batch_handler(invite_code, app_state, cache_dirs):
     """批量处理文件"""
     files = request.files.getlist('files')
     mode = request.form.get('mode', 'srt')
+    profile = request.form.get('profile') or None
 
-    result = create_batch_tasks(invite_code, files, mode, app_state, cache_dirs)
+    result = create_batch_tasks(invite_code, files, mode, app_state, cache_dirs, profile)
 
     if "error" in result:
         return jsonify({"error": result["error"]}), result.get("code", 500)
@@ -307,7 +336,8 @@ def process_srt_only_handler(invite_code, app_state, cache_dirs):
         return jsonify({'error': '未选择文件'}), 400
 
     file = request.files['file']
-    result = create_single_task(invite_code, file, "srt", app_state, cache_dirs)
+    profile = request.form.get('profile') or None
+    result = create_single_task(invite_code, file, "srt", app_state, cache_dirs, profile)
 
     if "error" in result:
         return jsonify({"error": result["error"]}), result.get("code", 500)
@@ -321,7 +351,8 @@ def process_video_with_subtitles_handler(invite_code, app_state, cache_dirs):
         return jsonify({'error': '未选择文件'}), 400
 
     file = request.files['file']
-    result = create_single_task(invite_code, file, "video", app_state, cache_dirs)
+    profile = request.form.get('profile') or None
+    result = create_single_task(invite_code, file, "video", app_state, cache_dirs, profile)
 
     if "error" in result:
         return jsonify({"error": result["error"]}), result.get("code", 500)
@@ -42,10 +42,11 @@ class TaskCoordinator:
     
     def create_single_task(self, task_id: str, video_path: str, video_name: str, 
                           video_duration: float, mode: str = "srt", 
-                          invite_code: str = "", batch_id: Optional[str] = None) -> bool:
+                          invite_code: str = "", batch_id: Optional[str] = None,
+                          profile: Optional[str] = None) -> bool:
         """创建单个任务"""
         return self.task_manager.create_single_task(
-            task_id, video_path, video_name, video_duration, mode, invite_code, batch_id
+            task_id, video_path, video_name, video_duration, mode, invite_code, batch_id, profile
         )
     
     def update_task_status(self, task_id: str, status: str, progress: str = "", 
@@ -70,6 +71,10 @@ class TaskCoordinator:
         """更新任务进度百分比"""
         return self.task_manager.update_task_progress(task_id, progress_percentage)
     
+    def update_task_translation_stats(self, task_id: str, stats: Dict[str, Any]) -> bool:
+        """合并写入任务的翻译统计"""
+        return self.task_manager.update_task_translation_stats(task_id, stats)
+    
     def get_task(self, task_id: str) -> Optional[Dict[str, Any]]:
         """获取单个任务信息"""
         return self.task_manager.get_task(task_id)
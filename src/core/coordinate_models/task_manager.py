@@ -21,7 +21,8 @@ class TaskManager:
     
     def create_single_task_direct(self, task_id: str, video_path: str, video_name: str, 
                                  video_duration: float, mode: str = "srt", 
-                                 invite_code: str = "", batch_id: Optional[str] = None) -> bool:
+                                 invite_code: str = "", batch_id: Optional[str] = None,
+                                 profile: Optional[str] = None) -> bool:
         """直接创建单个任务（不通过队列）"""
         data = self.db._load_data_direct()
         
@@ -37,6 +38,7 @@ class TaskManager:
             "mode": mode,
             "invite_code": invite_code,
             "batch_id": batch_id,
+            "profile": profile,
             "status": "队列中",
             "progress": "初始化...",
             "created_at": current_time,
@@ -53,7 +55,8 @@ class TaskManager:
     
     def create_single_task(self, task_id: str, video_path: str, video_name: str, 
                           video_duration: float, mode: str = "srt", 
-                          invite_code: str = "", batch_id: Optional[str] = None) -> bool:
+                          invite_code: str = "", batch_id: Optional[str] = None,
+                          profile: Optional[str] = None) -> bool:
         """
         创建单个任务
         
@@ -65,13 +68,14 @@ class TaskManager:
             mode: 输出模式
             invite_code: 邀请码
             batch_id: 批量任务ID（如果属于批量任务）
+            profile: 处理档位名称（为空时使用默认档位）
         
         Returns:
             创建是否成功
         """
         return self.db._queue_operation(
             self.create_single_task_direct, task_id, video_path, video_name,
-            video_duration, mode, invite_code, batch_id
+            video_duration, mode, invite_code, batch_id, profile
         )
     
     def update_task_status_direct(self, task_id: str, status: str, progress: str = "", 
@@ -107,7 +111,7 @@ class TaskManager:
         
         Args:
             task_id: 任务ID
-            status: 新状态（队列中、提取原文字幕、翻译原文字幕、已完成、过期文件已经被清理、被下载过进入清理倒计时）
+            status: 新状态（队列中、提取原文字幕、翻译原文字幕、等待批量翻译、已完成、过期文件已经被清理、被下载过进入清理倒计时）
             progress: 进度描述
             current_step: 当前步骤
             error: 错误信息
@@ -121,6 +125,33 @@ class TaskManager:
             current_step, error, resume_data
         )
     
+    def update_task_translation_stats_direct(self, task_id: str, stats: Dict[str, Any]) -> bool:
+        """直接合并写入任务的翻译统计（不通过队列）"""
+        data = self.db._load_data_direct()
+
+        if task_id not in data["single_tasks"]:
+            return False
+
+        task = data["single_tasks"][task_id]
+        task.setdefault("translation_stats", {}).update(stats)
+        task["updated_at"] = datetime.now().timestamp()
+
+        self.db._save_data_direct(data)
+        return True
+
+    def update_task_translation_stats(self, task_id: str, stats: Dict[str, Any]) -> bool:
+        """
+        合并写入任务的翻译统计
+
+        Args:
+            task_id: 任务ID
+            stats: 统计字段，如 lines、requests、memory_hits、memory_hit_rate、memory_time_saved
+
+        Returns:
+            更新是否成功
+        """
+        return self.db._queue_operation(self.update_task_translation_stats_direct, task_id, stats)
+
     def update_task_progress_direct(self, task_id: str, progress_percentage: float) -> bool:
         """直接更新任务进度百分比（不通过队列）"""
         data = self.db._load_data_direct()
@@ -7,6 +7,7 @@ from src.utils.filer import schedule_del, handle_down, clear_all, save_temp, mov
 from src.core.batch import check_done, create_batch, get_status as get_batch_status
 from src.utils.taskq import add_task, get_status as get_queue_status, create_task_data
 from src.services.use_whisper import check_whisper_service, call_whisper_service, format_srt
+from src.services.profiles import is_valid_profile
 from src.core.coordinate import task_coordinator
 from src.api.prog_bar.progress_tracker import progress_tracker
 import subprocess
@@ -25,22 +26,20 @@ def validate_video_file(file):
     return verify_uploaded_file(file)
 
 
-def call_whisper_service_with_progress(task_id, video_path):
+def call_whisper_service_with_progress(task_id, video_path, profile=None):
     """带进度监控的Whisper服务调用"""
     try:
         logger.info(f"开始带进度监控的Whisper调用: {task_id[:8]}...")
         
-        # 定义进度回调函数，捕获Whisper的真实tqdm输出
-        def whisper_progress_callback(progress_line):
-            logger.debug(f"Whisper进度输出: {progress_line}")
-            # 解析真实的tqdm输出
-            progress_tracker._parse_whisper_progress(task_id, progress_line)
+        # 进度回调: 每解码完一个窗口回调一次已解码位置和总时长（秒）
+        def whisper_progress_callback(position, duration):
+            progress_tracker.update_whisper_progress(task_id, position, duration)
         
         # 执行实际的Whisper调用，传入进度回调和task_id
-        result = call_whisper_service(video_path, whisper_progress_callback, task_id)
+        result = call_whisper_service(video_path, whisper_progress_callback, task_id, profile)
         
         # 设置Whisper进度为100%（确保完成）
-        progress_tracker._parse_whisper_progress(task_id, "100%|██████████| 100/100 [02:36<00:00, 462.73frames/s]")
+        progress_tracker.update_whisper_progress(task_id, 1.0, 1.0)
         
         return result
         
@@ -49,31 +48,71 @@ def call_whisper_service_with_progress(task_id, video_path):
         return {'success': False, 'error': str(e)}
 
 
-def process_srt_with_progress(task_id, srt_file_path):
+def call_streaming_translation_with_progress(task_id, video_path, raw_srt, translated_srt, profile=None):
+    """带进度监控的流式转录翻译（转录与翻译并行，原文/译文字幕逐条写入）"""
+    try:
+        from src.services.stream_translate import transcribe_and_translate, DEFAULT_QUEUE_SIZE
+        from src.services.tran import load_config
+
+        logger.info(f"开始流式转录翻译: {task_id[:8]}...")
+
+        def whisper_progress_callback(position, duration):
+            progress_tracker.update_whisper_progress(task_id, position, duration)
+
+        translation_started = []
+
+        def translation_progress_callback(current, total):
+            # 转录结束后进入翻译阶段，按已翻译条数推进翻译进度
+            if not translation_started:
+                translation_started.append(True)
+                progress_tracker.start_translation_tracking(task_id)
+            progress_tracker.update_translation_progress_from_count(task_id, current, total)
+
+        queue_size = load_config().get('streaming_queue_size', DEFAULT_QUEUE_SIZE)
+        result = transcribe_and_translate(task_id, video_path, raw_srt, translated_srt, profile,
+                                          whisper_progress_callback, queue_size, translation_progress_callback)
+
+        if not translation_started:
+            progress_tracker.update_whisper_progress(task_id, 1.0, 1.0)
+        return result
+
+    except Exception as e:
+        logger.error(f"流式转录翻译失败: {e}")
+        return {'success': False, 'error': str(e)}
+
+
+def process_srt_with_progress(task_id, srt_file_path, profile=None, journal_path=None):
     """带进度监控的SRT翻译处理"""
     try:
         logger.info(f"开始带进度监控的SRT翻译: {task_id[:8]}...")
         
-        # 翻译使用tqdm，但是输出到控制台，需要重定向捕获
-        # 改为修改翻译函数以支持回调进度更新
-        result = process_srt_with_callback(srt_file_path, lambda current, total: 
-            progress_tracker._parse_translation_progress(task_id, f"翻译进度: {int(current/total*100)}%|█▏        | {current}/{total} [00:03<13:34, 3.84s/it]")
+        result = process_srt_with_callback(srt_file_path, lambda current, total:
+            progress_tracker.update_translation_progress_from_count(task_id, current, total),
+            task_id, profile, journal_path
         )
         
         return result
         
     except Exception as e:
+        from src.services.tran import TranslationFailedError
+        if isinstance(e, TranslationFailedError):
+            raise
         logger.error(f"翻译进度监控处理失败: {e}")
         return False
 
 
-def process_srt_with_callback(srt_file_path, progress_callback):
+def process_srt_with_callback(srt_file_path, progress_callback, task_id=None, profile=None, journal_path=None):
     """带进度回调的SRT翻译处理"""
     try:
         from src.services.tran import translate_srt_with_callback
-        translate_srt_with_callback(srt_file_path, progress_callback)
+        translate_srt_with_callback(srt_file_path, progress_callback, task_id=task_id, profile=profile,
+                                    journal_path=journal_path)
         return True
     except Exception as e:
+        from src.services.tran import TranslationFailedError
+        if isinstance(e, TranslationFailedError):
+            # 失败原因写入任务记录
+            raise
         logger.error(f"SRT翻译失败: {e}")
         return False
 
@@ -83,15 +122,23 @@ def process_video_background(task_id, video_path, mode, app_state):
     try:
         # 导入显存管理器
         from src.utils.vram_manager import get_vram_manager
-        from src.services.whisper_direct import get_whisper_manager
+        from src.services.asr_engines import get_asr_engine, resolve_engine_name
         from src.services.tran import load_config
 
         # 初始化显存管理器
         vram_manager = get_vram_manager()
 
-        # 设置Whisper管理器引用
-        whisper_manager = get_whisper_manager()
-        vram_manager.set_whisper_manager(whisper_manager)
+        # 设置本任务档位对应的ASR引擎引用
+        task_record = task_coordinator.get_task(task_id)
+        profile = task_record.get('profile') if task_record else None
+        asr_engine = get_asr_engine(resolve_engine_name(profile))
+        vram_manager.set_asr_engine(asr_engine)
+
+        # 延后批量翻译（translation_mode 为 deferred）: 字幕交给OpenAI兼容的批处理接口，任务停在等待状态
+        from src.services.profiles import get_profile_config
+        from src.services.tran_modules.deferred import get_deferred_queue
+        deferred_queue = get_deferred_queue()
+        defer_translation = deferred_queue.should_defer(task_id, get_profile_config(profile))
 
         # 设置Ollama配置
         try:
@@ -144,6 +191,8 @@ def process_video_background(task_id, video_path, mode, app_state):
         
         # 完全基于数据库状态决定是否需要提取原文字幕
         need_extract = False
+        streamed = False  # 本次是否已在转录过程中流式完成翻译
+        prewarm_thread = None  # 翻译模型预热线程
         
         if current_status in ['队列中', 'processing']:
             # 新任务或从头开始的任务
@@ -168,18 +217,40 @@ def process_video_background(task_id, video_path, mode, app_state):
             print(f"[INFO] 📊 准备转录阶段 - 优化显存分配")
             vram_manager.prepare_for_transcription()
 
-            # 先更新状态，再执行提取
-            task_coordinator.update_task_status(task_id, "提取原文字幕", "提取原文字幕中...", "extracting")
+            # 翻译模型不与Whisper争用显存时，转录期间就在后台加载，第一条字幕不必等待模型加载
+            if not vram_manager.vram_rotation_enabled:
+                prewarm_thread = vram_manager.prewarm_ollama_model(profile)
+
+            # 翻译器与ASR不争用本机显存时（未启用显存轮询或ASR在远程节点），
+            # Whisper片段定稿即送去翻译，转录与翻译并行（延后批量翻译时不流式翻译）
+            use_streaming = ((not vram_manager.vram_rotation_enabled or not asr_engine.local)
+                             and load_config().get('streaming_translation', True) and not defer_translation)
+
+            if use_streaming:
+                task_coordinator.update_task_status(task_id, "提取原文字幕", "提取并翻译字幕中...", "extracting")
+
+                whisper_result = call_streaming_translation_with_progress(
+                    task_id, video_path, raw_srt, translated_srt, profile
+                )
+                if not whisper_result.get('success'):
+                    raise Exception(f"流式转录翻译失败: {whisper_result.get('error', '未知错误')}")
+
+                streamed = True
+                print(f"[INFO] 任务 {task_id} 原文字幕已保存到: {raw_srt}，翻译字幕已保存到: {translated_srt}")
+                task_coordinator.update_task_status(task_id, "翻译原文字幕", "翻译字幕中...", "translating")
+            else:
+                # 先更新状态，再执行提取
+                task_coordinator.update_task_status(task_id, "提取原文字幕", "提取原文字幕中...", "extracting")
 
-            # 调用Whisper服务时，启动控制台输出监控，传入task_id
-            whisper_result = call_whisper_service_with_progress(task_id, video_path)
-            if not whisper_result.get('success'):
-                raise Exception(f"转录失败: {whisper_result.get('error', '未知错误')}")
+                # 调用Whisper服务时，启动控制台输出监控，传入task_id
+                whisper_result = call_whisper_service_with_progress(task_id, video_path, profile)
+                if not whisper_result.get('success'):
+                    raise Exception(f"转录失败: {whisper_result.get('error', '未知错误')}")
 
-            # 保存原文字幕文件到temp/{task_id}/目录
-            with open(raw_srt, 'w', encoding='utf-8') as f:
-                f.write(format_srt(whisper_result['segments']))
-            print(f"[INFO] 任务 {task_id} 原文字幕已保存到: {raw_srt}")
+                # 保存原文字幕文件到temp/{task_id}/目录
+                with open(raw_srt, 'w', encoding='utf-8') as f:
+                    f.write(format_srt(whisper_result['segments']))
+                print(f"[INFO] 任务 {task_id} 原文字幕已保存到: {raw_srt}")
 
             # Whisper转录完成，将模型移至CPU释放显存
             print(f"[INFO] 📊 转录完成 - 将Whisper移至CPU释放显存")
@@ -201,28 +272,62 @@ def process_video_background(task_id, video_path, mode, app_state):
             print(f"[INFO] 🈶 步骤2: 任务 {task_id[:8]}... 状态为'提取原文字幕'，开始翻译工作")
             need_translate = True
         elif current_status == '翻译原文字幕':
-            # 在翻译阶段中断的任务，删除不完整文件重新开始
-            print(f"[INFO] 🔄 步骤2: 任务 {task_id[:8]}... 状态为'翻译原文字幕'，继续翻译工作")
+            # 在翻译阶段中断的任务，从检查点日志继续，已翻译的行不再请求
+            print(f"[INFO] 🔄 步骤2: 任务 {task_id[:8]}... 状态为'翻译原文字幕'，从检查点继续翻译工作")
             need_translate = True
         elif current_status == '已完成':
             # 已完成翻译阶段的任务
             print(f"[INFO] ⏩ 步骤2: 任务 {task_id[:8]}... 状态为'已完成'，跳过翻译步骤（翻译工作已完成）")
             need_translate = False
         
-        if need_translate:
+        if need_translate and streamed:
+            print(f"[INFO] ⏩ 步骤2: 任务 {task_id[:8]}... 翻译已在转录过程中流式完成")
+            progress_tracker.start_translation_tracking(task_id)
+            translated_count = whisper_result.get('translated_count', 0)
+            progress_tracker.update_translation_progress_from_count(task_id, translated_count, translated_count)
+
+            # 与同步翻译相同，翻译阶段结束时卸载一次Ollama模型，并确保Whisper在CPU
+            print(f"[INFO] 📊 翻译完成 - 卸载Ollama模型")
+            vram_manager.unload_ollama_model()
+            vram_manager.move_whisper_to_cpu()
+
+            from src.utils.bilingual_subtitle import bilingual_subtitle_generator
+            subtitle_files = bilingual_subtitle_generator.generate_all_subtitle_types(
+                task_id, raw_srt, translated_srt, cache_dirs['temp']
+            )
+
+            if not subtitle_files:
+                print(f"[WARNING] 任务 {task_id} 生成三轨道字幕文件失败")
+            else:
+                print(f"[INFO] 任务 {task_id} 已生成三轨道字幕到: cache/temp/{task_id}/")
+        elif need_translate:
             # 检查raw文件是否存在
             if not os.path.exists(raw_srt) or os.path.getsize(raw_srt) == 0:
                 raise Exception(f"原文字幕文件不存在或为空: {raw_srt}")
             
-            # 删除可能存在的不完整翻译文件
-            if os.path.exists(translated_srt):
-                print(f"[INFO] 删除不完整的翻译字幕文件: {translated_srt}")
-                os.remove(translated_srt)
+            # 译文只在翻译全部完成后一次写入，中断时已完成的部分保存在检查点日志中
+            from src.services.tran_modules.journal import journal_path
+            translation_journal = journal_path(task_temp_dir, task_id)
+            if os.path.exists(translation_journal):
+                print(f"[INFO] 发现翻译检查点，将跳过已翻译的行: {translation_journal}")
+
+            if defer_translation:
+                # 字幕交给批处理，任务停在等待状态，主处理循环继续处理下一个任务；
+                # 批处理结束后译文写入检查点，任务回到"翻译原文字幕"状态，从这里继续（检查点中已有的行不再请求）
+                deferred_queue.enqueue(task_id, raw_srt, translation_journal, profile)
+                task_coordinator.update_task_status(task_id, "等待批量翻译", "等待批量翻译结果...", "waiting")
+                progress_tracker.stop_tracking(task_id)
+                print(f"[INFO] ⏸️  任务 {task_id[:8]}... 已加入批量翻译，等待批处理结果")
+                return
 
             # 准备翻译阶段: Whisper应该已经在CPU，这里为Ollama预留显存
             print(f"[INFO] 📊 准备翻译阶段 - 为Ollama模型预留显存")
             vram_manager.prepare_for_translation()
 
+            # Whisper已移出显存，预热Ollama模型，与状态更新、读取字幕等准备工作重叠
+            if prewarm_thread is None:
+                prewarm_thread = vram_manager.prewarm_ollama_model(profile)
+
             # 先更新状态，再执行翻译
             task_coordinator.update_task_status(task_id, "翻译原文字幕", "翻译字幕中...", "translating")
 
@@ -234,12 +339,13 @@ def process_video_background(task_id, video_path, mode, app_state):
             shutil.copy2(raw_srt, translated_srt)
 
             # 调用翻译服务时，启动控制台输出监控
-            if not process_srt_with_progress(task_id, translated_srt):
+            if not process_srt_with_progress(task_id, translated_srt, profile, translation_journal):
                 raise Exception("字幕翻译失败")
 
             print(f"[INFO] 任务 {task_id} 翻译字幕已保存到: {translated_srt}")
+            deferred_queue.finish(task_id)
 
-            # 翻译完成，卸载Ollama模型并将Whisper重新移至CPU(确保)
+            # 翻译阶段结束，卸载一次Ollama模型（翻译期间由 ollama_keep_alive 保持加载），并将Whisper重新移至CPU(确保)
             print(f"[INFO] 📊 翻译完成 - 卸载Ollama模型")
             vram_manager.unload_ollama_model()
             vram_manager.move_whisper_to_cpu()  # 确保Whisper在CPU
@@ -353,17 +459,27 @@ def process_video_background(task_id, video_path, mode, app_state):
         
         # 仅更新数据库失败状态（不再依赖内存）
         task_coordinator.update_task_status(task_id, "failed", f"处理失败: {str(e)}", "failed", error=str(e))
+
+        # 删除批量翻译记录（已合并或已改为同步翻译的记录只在翻译成功时删除）
+        try:
+            from src.services.tran_modules.deferred import get_deferred_queue
+            get_deferred_queue().finish(task_id)
+        except Exception as deferred_error:
+            logger.warning(f"删除批量翻译记录失败: {deferred_error}")
         
         if video_path and os.path.exists(video_path):
             clean_temp(video_path)
 
 
-def create_single_task(invite_code, file, mode, app_state, cache_dirs):
+def create_single_task(invite_code, file, mode, app_state, cache_dirs, profile=None):
     """创建单个任务"""
     validation = validate(invite_code)
     if not validation["valid"]:
         return {"error": "邀请码无效或时长不足", "code": 403}
 
+    if not is_valid_profile(profile):
+        return {"error": f"处理档位不存在: {profile}", "code": 400}
+
     is_valid, message = validate_video_file(file)
     if not is_valid:
         return {"error": message, "code": 400}
@@ -381,7 +497,8 @@ def create_single_task(invite_code, file, mode, app_state, cache_dirs):
 
         task_id = str(uuid.uuid4())
         video_path = move_final(temp_path, cache_dirs, task_id, file.filename)
-        task_data = create_task_data(mode, video_path, invite_code, duration, original_name=file.filename)
+        task_data = create_task_data(mode, video_path, invite_code, duration,
+                                     original_name=file.filename, profile=profile)
         final_task_id = add_task(task_data, app_state)
 
         # 计算队列位置
@@ -400,12 +517,15 @@ def create_single_task(invite_code, file, mode, app_state, cache_dirs):
         return {"error": f"处理文件时出错: {str(e)}", "code": 500}
 
 
-def create_batch_tasks(invite_code, files, mode, app_state, cache_dirs):
+def create_batch_tasks(invite_code, files, mode, app_state, cache_dirs, profile=None):
     """创建批量任务"""
     validation = validate(invite_code)
     if not validation["valid"]:
         return {"error": "邀请码无效或时长不足", "code": 403}
 
+    if not is_valid_profile(profile):
+        return {"error": f"处理档位不存在: {profile}", "code": 400}
+
     if not files:
         return {"error": "未选择文件", "code": 400}
 
@@ -443,7 +563,7 @@ def create_batch_tasks(invite_code, files, mode, app_state, cache_dirs):
             task_id = str(uuid.uuid4())
             video_path = move_final(temp_path, cache_dirs, task_id, file.filename)
             task_data = create_task_data(mode, video_path, invite_code, 0,
-                                         batch_id=batch_id, original_name=file.filename)
+                                         batch_id=batch_id, original_name=file.filename, profile=profile)
             task_ids.append(add_task(task_data, app_state))
 
         create_batch(batch_id, task_ids, mode, invite_code, app_state)
@@ -499,11 +619,11 @@ class TaskManager:
         self.app_state = app_state
         self.cache_dirs = cache_dirs
 
-    def create_task(self, invite_code, file, mode):
-        return create_single_task(invite_code, file, mode, self.app_state, self.cache_dirs)
+    def create_task(self, invite_code, file, mode, profile=None):
+        return create_single_task(invite_code, file, mode, self.app_state, self.cache_dirs, profile)
 
-    def create_batch(self, invite_code, files, mode):
-        return create_batch_tasks(invite_code, files, mode, self.app_state, self.cache_dirs)
+    def create_batch(self, invite_code, files, mode, profile=None):
+        return create_batch_tasks(invite_code, files, mode, self.app_state, self.cache_dirs, profile)
 
     def get_task_status(self, task_id):
         # 完全基于数据库查询，移除内存依赖
@@ -525,7 +645,8 @@ class TaskManager:
                 "invite_code": db_task.get("invite_code", ""),
                 "duration": db_task.get("video_duration", 0) / 60,  # 转换回分钟
                 "filename": self._get_result_filename(task_id, db_task) if db_task["status"] in ["已完成", "被下载过进入清理倒计时"] else "",
-                "error": db_task.get("error")
+                "error": db_task.get("error"),
+                "translation_stats": db_task.get("translation_stats")
             }
         # 任务不存在
         return None
@@ -543,6 +664,8 @@ class TaskManager:
                 return "翻译字幕中"
             else:
                 return "处理中"
+        elif status == "等待批量翻译":
+            return "等待批量翻译结果"
         elif status == "队列中":
             # 计算在队列中的位置
             all_tasks = task_coordinator.get_all_tasks()
@@ -570,6 +693,7 @@ class TaskManager:
             "队列中": "排队中",
             "提取原文字幕": "提取字幕",
             "翻译原文字幕": "翻译字幕", 
+            "等待批量翻译": "等待批量翻译",
             "已完成": "已完成",
             "过期文件已经被清理": "已过期",
             "被下载过进入清理倒计时": "清理倒计时",
@@ -618,6 +742,7 @@ class TaskManager:
             )
             completed_count = status_count.get("已完成", 0)
             failed_count = status_count.get("failed", 0)
+            deferred_count = status_count.get("等待批量翻译", 0)
             
             # 确定当前处理的任务
             current_task = None
@@ -634,6 +759,7 @@ class TaskManager:
                 "processing_count": processing_count,
                 "completed_count": completed_count,
                 "failed_count": failed_count,
+                "deferred_count": deferred_count,
                 "task_statistics": status_count
             }
         except Exception as e:
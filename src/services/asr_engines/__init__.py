@@ -0,0 +1,77 @@
+"""
+ASR引擎模块包
+定义统一的ASR引擎接口，并提供 openai-whisper、faster-whisper 与远程工作节点三种实现
+引擎按部署配置 asr_engine 选择，档位(profile)可覆盖
+"""
+
+import threading
+
+from .base import ASREngine, AUDIO_FILTERS, DEFAULT_TRANSCRIBE_OPTIONS, build_result, normalize_segment
+from .openai_whisper_engine import OpenAIWhisperEngine
+from .faster_whisper_engine import FasterWhisperEngine
+from .remote_engine import RemoteASREngine
+
+DEFAULT_ENGINE = "openai_whisper"
+
+ENGINE_CLASSES = {
+    OpenAIWhisperEngine.name: OpenAIWhisperEngine,
+    FasterWhisperEngine.name: FasterWhisperEngine,
+    RemoteASREngine.name: RemoteASREngine
+}
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def _load_config():
+    # 延迟导入避免循环依赖
+    from ..tran import load_config
+    try:
+        return load_config()
+    except Exception:
+        return {}
+
+
+def resolve_engine_name(profile_name=None) -> str:
+    """根据档位和部署配置确定ASR引擎名称"""
+    from ..profiles import get_profile_config
+    try:
+        config = get_profile_config(profile_name)
+    except Exception:
+        config = {}
+    return config.get('asr_engine') or DEFAULT_ENGINE
+
+
+def get_asr_engine(name: str = None) -> ASREngine:
+    """获取ASR引擎单例，name为空时使用部署配置"""
+    name = name or resolve_engine_name()
+    if name not in ENGINE_CLASSES:
+        raise ValueError(f"不支持的ASR引擎: {name}")
+
+    with _engines_lock:
+        if name not in _engines:
+            _engines[name] = ENGINE_CLASSES[name](_load_config())
+        return _engines[name]
+
+
+def get_loaded_engines():
+    """获取已创建的全部引擎实例"""
+    with _engines_lock:
+        return dict(_engines)
+
+
+__all__ = [
+    'ASREngine',
+    'OpenAIWhisperEngine',
+    'FasterWhisperEngine',
+    'RemoteASREngine',
+    'AUDIO_FILTERS',
+    'DEFAULT_TRANSCRIBE_OPTIONS',
+    'DEFAULT_ENGINE',
+    'ENGINE_CLASSES',
+    'build_result',
+    'normalize_segment',
+    'resolve_engine_name',
+    'get_asr_engine',
+    'get_loaded_engines'
+]
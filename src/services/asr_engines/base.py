@@ -0,0 +1,132 @@
+"""
+ASR引擎接口
+所有语音识别后端实现同一组方法，由 call_whisper_service 按配置分发
+"""
+
+import os
+import sys
+from typing import Optional, Dict, Any, Callable
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+from utils.logger import get_cached_logger
+
+logger = get_cached_logger("ASR引擎")
+
+# Whisper转录选项 - 关闭上下文记忆，提升质量（各引擎自行映射到后端参数）
+DEFAULT_TRANSCRIBE_OPTIONS = {
+    "language": None,  # 自动检测语言
+    "task": "transcribe",  # 转录任务
+    "beam_size": 5,  # 增大束搜索以提升准确度（1->5）
+    "best_of": 5,  # 增大候选数量以获得更好结果（1->5）
+    "temperature": 0.0,  # 温度设置为0，确保结果稳定
+    "compression_ratio_threshold": 2.4,
+    "logprob_threshold": -1.0,
+    "no_speech_threshold": 0.6,
+    "condition_on_previous_text": False,  # 关闭上下文记忆！每句话独立处理
+    "initial_prompt": None  # 不使用初始提示
+}
+
+# 音频提取时的轻度预处理滤镜（本地引擎与远程引擎共用）
+AUDIO_FILTERS = "volume=1.2,highpass=f=80,lowpass=f=8000,dynaudnorm=g=3:f=250:r=0.9:p=0.5"
+
+
+class ASREngine:
+    """
+    ASR引擎基类
+
+    transcribe() 接受音频文件路径或16kHz单声道float32数组，返回统一格式:
+    {success, text, language, segments, processing_time, segment_count}
+
+    progress_cb(position, duration) 在每个解码窗口完成后调用，
+    position 为已解码到的音频位置（秒），duration 为音频总时长（秒）
+
+    segment_cb(segment) 在每个片段定稿后立即调用（格式同结果中的 segments 元素），
+    用于把片段流式交给下游翻译
+    """
+
+    name = "base"
+    # 是否在本机CPU/GPU上推理（远程引擎为False，不与本地翻译模型争用显存）
+    local = True
+
+    def load(self) -> bool:
+        """加载模型（已加载时直接返回）"""
+        raise NotImplementedError
+
+    def warmup(self) -> bool:
+        """预热模型，默认只做加载"""
+        return self.load()
+
+    def transcribe(self, audio, options: Optional[Dict[str, Any]] = None,
+                   progress_cb: Optional[Callable] = None,
+                   segment_cb: Optional[Callable] = None) -> Dict[str, Any]:
+        """转录音频"""
+        raise NotImplementedError
+
+    def unload(self):
+        """卸载模型，释放内存/显存"""
+        raise NotImplementedError
+
+    def move(self, device: str) -> bool:
+        """将模型移动到指定设备（"cpu" 或 "cuda"）"""
+        raise NotImplementedError
+
+    def is_loaded(self) -> bool:
+        """模型是否已加载"""
+        raise NotImplementedError
+
+    def get_status(self) -> Dict[str, Any]:
+        """获取引擎状态"""
+        return {'engine': self.name, 'model_loaded': self.is_loaded()}
+
+    def transcribe_video(self, video_path: str, task_id: str = None,
+                         progress_cb: Optional[Callable] = None,
+                         options: Optional[Dict[str, Any]] = None,
+                         segment_cb: Optional[Callable] = None) -> Dict[str, Any]:
+        """转录视频文件（提取音频后转录），音频提取对所有引擎共用"""
+        from ..whisper_direct import get_whisper_manager
+
+        manager = get_whisper_manager()
+        audio_path = None
+        try:
+            audio_path = manager.extract_audio_from_video(video_path, task_id)
+            result = self.transcribe(audio_path, options, progress_cb, segment_cb)
+            result['video_path'] = video_path
+            result['audio_path'] = audio_path
+            result['engine'] = self.name
+            return result
+        finally:
+            # 只在没有task_id时清理临时音频文件（有task_id时保留在任务目录）
+            if not task_id and audio_path and os.path.exists(audio_path):
+                try:
+                    os.remove(audio_path)
+                    logger.debug(f"已清理临时音频文件: {audio_path}")
+                except Exception as e:
+                    logger.warning(f"清理临时音频文件失败: {e}")
+
+
+def normalize_segment(segment: Dict[str, Any], default_id: int = 0) -> Dict[str, Any]:
+    """将后端片段转换为统一格式"""
+    return {
+        'id': segment.get('id', default_id),
+        'start': segment.get('start', 0.0),
+        'end': segment.get('end', 0.0),
+        'text': segment.get('text', '').strip(),
+        'avg_logprob': segment.get('avg_logprob', 0.0),
+        'compression_ratio': segment.get('compression_ratio', 0.0),
+        'no_speech_prob': segment.get('no_speech_prob', 0.0)
+    }
+
+
+def build_result(segments, text: str, language: str, processing_time: float) -> Dict[str, Any]:
+    """构造统一格式的转录结果，确保每个片段都是独立的"""
+    processed_segments = [normalize_segment(segment, i) for i, segment in enumerate(segments)]
+
+    return {
+        'success': True,
+        'text': text.strip(),
+        'language': language,
+        'segments': processed_segments,
+        'processing_time': processing_time,
+        'context_disabled': True,  # 标记已关闭上下文记忆
+        'segment_count': len(processed_segments)
+    }
@@ -0,0 +1,250 @@
+"""
+ASR引擎对比基准测试
+在固定的本地语料上比较各引擎的实时率(RTF)与词错误率(WER)
+
+语料目录结构（每个音频配一个同名 .txt 参考文本）:
+    bench/asr_corpus/
+        clip01.wav
+        clip01.txt
+        clip02.flac
+        clip02.txt
+
+默认语料 bench/asr_corpus 只提交 manifest.json: 固定版本的源码包地址、各音频的SHA-256与参考文本。
+音频缺失时从源码包中取出并逐一校验后写入目录（--fetch 只下载不测试）。
+
+用法:
+    python -m src.services.asr_engines.benchmark --corpus bench/asr_corpus \\
+        --engines openai_whisper,faster_whisper
+"""
+
+import hashlib
+import json
+import os
+import re
+import subprocess
+import tarfile
+import tempfile
+import time
+from typing import Dict, Any, List
+
+AUDIO_EXTENSIONS = ('.wav', '.flac', '.mp3', '.m4a', '.ogg')
+SAMPLE_RATE = 16000
+MANIFEST_NAME = "manifest.json"
+
+_CJK_PATTERN = re.compile(r'[぀-ヿ㐀-䶿一-鿿가-힯]')
+_PUNCT_PATTERN = re.compile(r'[^\w\s]', flags=re.UNICODE)
+
+
+def load_audio_16k(path: str):
+    """用ffmpeg将音频解码为16kHz单声道float32数组（所有引擎共用同一份输入）"""
+    import numpy as np
+
+    cmd = [
+        "ffmpeg", "-nostdin", "-loglevel", "error", "-i", path,
+        "-f", "s16le", "-ac", "1", "-ar", str(SAMPLE_RATE), "-"
+    ]
+    out = subprocess.run(cmd, capture_output=True, check=True).stdout
+    return np.frombuffer(out, np.int16).flatten().astype(np.float32) / 32768.0
+
+
+def tokenize_for_wer(text: str) -> List[str]:
+    """归一化并分词: 含中日韩文字时按字切分（即CER），否则按空白切分"""
+    text = _PUNCT_PATTERN.sub(' ', text.lower())
+    if _CJK_PATTERN.search(text):
+        return [ch for ch in text if not ch.isspace()]
+    return text.split()
+
+
+def word_error_rate(reference: str, hypothesis: str) -> Dict[str, int]:
+    """计算编辑距离，返回 {errors, words}"""
+    ref = tokenize_for_wer(reference)
+    hyp = tokenize_for_wer(hypothesis)
+
+    previous = list(range(len(hyp) + 1))
+    for i, ref_token in enumerate(ref, 1):
+        current = [i] + [0] * len(hyp)
+        for j, hyp_token in enumerate(hyp, 1):
+            current[j] = min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (ref_token != hyp_token)
+            )
+        previous = current
+
+    return {'errors': previous[-1], 'words': len(ref)}
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def fetch_corpus(corpus_dir: str) -> int:
+    """
+    按语料目录中的 manifest.json 下载固定版本的源码包，取出音频并校验SHA-256，写入音频与参考文本
+
+    Returns:
+        新写入的音频数（已存在且校验通过的不重复下载）
+    """
+    import requests
+
+    with open(os.path.join(corpus_dir, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    missing = []
+    for item in manifest['files']:
+        audio_path = os.path.join(corpus_dir, item['name'])
+        if os.path.exists(audio_path):
+            with open(audio_path, 'rb') as f:
+                if _sha256(f.read()) == item['sha256']:
+                    continue
+            print(f"[WARNING] 音频校验失败，重新下载: {item['name']}")
+        missing.append(item)
+
+    if missing:
+        archive = manifest['archive']
+        print(f"[INFO] 下载语料源码包: {archive['url']}")
+        with tempfile.TemporaryFile() as temp:
+            digest = hashlib.sha256()
+            with requests.get(archive['url'], stream=True, timeout=60) as response:
+                response.raise_for_status()
+                for chunk in response.iter_content(chunk_size=1 << 20):
+                    digest.update(chunk)
+                    temp.write(chunk)
+            if digest.hexdigest() != archive['sha256']:
+                raise ValueError(f"源码包SHA-256不匹配: {digest.hexdigest()}（应为 {archive['sha256']}）")
+            temp.seek(0)
+            with tarfile.open(fileobj=temp, mode='r:gz') as tar:
+                for item in missing:
+                    data = tar.extractfile(item['member']).read()
+                    if _sha256(data) != item['sha256']:
+                        raise ValueError(f"音频SHA-256不匹配: {item['name']}")
+                    with open(os.path.join(corpus_dir, item['name']), 'wb') as f:
+                        f.write(data)
+
+    # 参考文本以清单为准
+    for item in manifest['files']:
+        stem = os.path.splitext(item['name'])[0]
+        with open(os.path.join(corpus_dir, f"{stem}.txt"), 'w', encoding='utf-8') as f:
+            f.write(item['reference'] + "\n")
+    return len(missing)
+
+
+def load_corpus(corpus_dir: str) -> List[Dict[str, Any]]:
+    """读取语料目录，返回 [{name, audio, reference, duration}]"""
+    if not os.path.isdir(corpus_dir):
+        raise FileNotFoundError(f"语料目录不存在: {corpus_dir}")
+
+    items = []
+    for filename in sorted(os.listdir(corpus_dir)):
+        stem, ext = os.path.splitext(filename)
+        if ext.lower() not in AUDIO_EXTENSIONS:
+            continue
+        ref_path = os.path.join(corpus_dir, f"{stem}.txt")
+        if not os.path.exists(ref_path):
+            print(f"[WARNING] 缺少参考文本，跳过: {filename}")
+            continue
+        with open(ref_path, 'r', encoding='utf-8') as f:
+            reference = f.read().strip()
+        audio = load_audio_16k(os.path.join(corpus_dir, filename))
+        items.append({
+            'name': stem,
+            'audio': audio,
+            'reference': reference,
+            'duration': len(audio) / SAMPLE_RATE
+        })
+
+    if not items:
+        raise ValueError(f"语料目录中没有可用的音频/参考文本对: {corpus_dir}")
+    return items
+
+
+def benchmark_engine(engine, corpus: List[Dict[str, Any]], options=None) -> Dict[str, Any]:
+    """在整个语料上运行一个引擎，模型加载与预热不计入耗时"""
+    engine.warmup()
+
+    total_audio = 0.0
+    total_elapsed = 0.0
+    total_errors = 0
+    total_words = 0
+    per_file = []
+
+    for item in corpus:
+        start_time = time.time()
+        result = engine.transcribe(item['audio'], options)
+        elapsed = time.time() - start_time
+
+        wer = word_error_rate(item['reference'], result.get('text', ''))
+        total_audio += item['duration']
+        total_elapsed += elapsed
+        total_errors += wer['errors']
+        total_words += wer['words']
+        per_file.append({
+            'name': item['name'],
+            'duration': round(item['duration'], 2),
+            'elapsed': round(elapsed, 3),
+            'rtf': round(elapsed / item['duration'], 4) if item['duration'] else 0,
+            'wer': round(wer['errors'] / wer['words'], 4) if wer['words'] else 0
+        })
+
+    return {
+        'engine': engine.name,
+        'files': len(corpus),
+        'audio_seconds': round(total_audio, 2),
+        'elapsed': round(total_elapsed, 3),
+        'rtf': round(total_elapsed / total_audio, 4) if total_audio else 0,
+        'wer': round(total_errors / total_words, 4) if total_words else 0,
+        'per_file': per_file
+    }
+
+
+def main():
+    """命令行入口"""
+    import argparse
+
+    from src.services.asr_engines import get_asr_engine, ENGINE_CLASSES
+
+    parser = argparse.ArgumentParser(description="ASR引擎RTF/WER对比基准测试")
+    parser.add_argument("--corpus", default="bench/asr_corpus", help="语料目录")
+    parser.add_argument("--engines", default=",".join(ENGINE_CLASSES.keys()), help="逗号分隔的引擎名称")
+    parser.add_argument("--language", default=None, help="固定识别语言（默认自动检测）")
+    parser.add_argument("--json", dest="json_path", default=None, help="将完整结果写入JSON文件")
+    parser.add_argument("--fetch", action="store_true", help="只按 manifest.json 下载并校验语料，不运行测试")
+    args = parser.parse_args()
+
+    if os.path.exists(os.path.join(args.corpus, MANIFEST_NAME)):
+        fetched = fetch_corpus(args.corpus)
+        if fetched:
+            print(f"[INFO] 已下载并校验 {fetched} 个音频: {args.corpus}")
+    elif args.fetch:
+        raise FileNotFoundError(f"语料目录中没有 {MANIFEST_NAME}: {args.corpus}")
+    if args.fetch:
+        return
+
+    corpus = load_corpus(args.corpus)
+    print(f"[INFO] 语料: {len(corpus)} 个文件，共 {sum(i['duration'] for i in corpus):.1f} 秒")
+
+    options = {"language": args.language} if args.language else None
+    results = []
+    for name in [n.strip() for n in args.engines.split(",") if n.strip()]:
+        engine = get_asr_engine(name)
+        try:
+            print(f"[INFO] 测试引擎: {name}")
+            results.append(benchmark_engine(engine, corpus, options))
+        except Exception as e:
+            print(f"[ERROR] 引擎 {name} 测试失败: {e}")
+        finally:
+            engine.unload()
+
+    print(f"\n{'引擎':<18}{'文件数':>6}{'音频(s)':>10}{'耗时(s)':>10}{'RTF':>9}{'WER':>9}")
+    for r in results:
+        print(f"{r['engine']:<18}{r['files']:>6}{r['audio_seconds']:>10.1f}{r['elapsed']:>10.2f}"
+              f"{r['rtf']:>9.3f}{r['wer']:>9.3f}")
+
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"[INFO] 结果已写入: {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+faster-whisper (CTranslate2) 引擎
+CPU上int8推理吞吐明显高于openai-whisper，为可选依赖:
+    pip install faster-whisper
+"""
+
+import gc
+import os
+import sys
+import threading
+import time
+from typing import Optional, Dict, Any, Callable
+
+from .base import ASREngine, DEFAULT_TRANSCRIBE_OPTIONS, build_result, normalize_segment
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+from utils.logger import get_cached_logger
+
+logger = get_cached_logger("faster-whisper引擎")
+
+# openai-whisper选项名 -> faster-whisper选项名
+OPTION_NAME_MAP = {
+    "logprob_threshold": "log_prob_threshold"
+}
+SUPPORTED_OPTIONS = {
+    "language", "task", "beam_size", "best_of", "temperature",
+    "compression_ratio_threshold", "log_prob_threshold", "no_speech_threshold",
+    "condition_on_previous_text", "initial_prompt", "vad_filter"
+}
+
+
+def _cuda_available() -> bool:
+    try:
+        import ctranslate2
+        return ctranslate2.get_cuda_device_count() > 0
+    except Exception:
+        return False
+
+
+class FasterWhisperEngine(ASREngine):
+    """基于 faster-whisper / CTranslate2 的ASR引擎"""
+
+    name = "faster_whisper"
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        config = config or {}
+        self.model = None
+        self.lock = threading.Lock()
+        self.model_name = config.get('faster_whisper_model', 'large-v3-turbo')
+        self.device = "cuda" if _cuda_available() else "cpu"
+        self.compute_type_override = config.get('faster_whisper_compute_type', 'auto')
+        self.download_root = os.path.abspath(os.path.join("whisper", "faster-whisper"))
+        self.cpu_threads = 0
+        if self.device == "cpu":
+            from utils.cpu_tuner import CPUThreadPlanner, load_cpu_settings
+            plan = CPUThreadPlanner().load_plan(load_cpu_settings().get('whisper_cpu_threads'))
+            self.cpu_threads = plan['intra_op']
+
+    def _compute_type(self, device: str) -> str:
+        if self.compute_type_override and self.compute_type_override != 'auto':
+            return self.compute_type_override
+        return "float16" if device == "cuda" else "int8"
+
+    def _load_on(self, device: str):
+        try:
+            from faster_whisper import WhisperModel
+        except ImportError:
+            raise RuntimeError("faster-whisper 未安装，请执行: pip install faster-whisper")
+
+        compute_type = self._compute_type(device)
+        logger.info(f"加载faster-whisper {self.model_name} 到 {device} ({compute_type})")
+        start_time = time.time()
+        self.model = WhisperModel(
+            self.model_name,
+            device=device,
+            compute_type=compute_type,
+            cpu_threads=self.cpu_threads,
+            download_root=self.download_root
+        )
+        self.device = device
+        logger.info(f"faster-whisper模型加载完成，用时: {time.time() - start_time:.2f}秒")
+
+    def load(self) -> bool:
+        with self.lock:
+            if self.model is None:
+                self._load_on(self.device)
+        return True
+
+    def transcribe(self, audio, options: Optional[Dict[str, Any]] = None,
+                   progress_cb: Optional[Callable] = None,
+                   segment_cb: Optional[Callable] = None) -> Dict[str, Any]:
+        self.load()
+
+        merged = dict(DEFAULT_TRANSCRIBE_OPTIONS)
+        if options:
+            merged.update(options)
+        fw_options = {}
+        for key, value in merged.items():
+            key = OPTION_NAME_MAP.get(key, key)
+            if key in SUPPORTED_OPTIONS:
+                fw_options[key] = value
+
+        try:
+            logger.info(f"开始转录音频: {audio if isinstance(audio, str) else '内存音频'}")
+            start_time = time.time()
+
+            segments_iter, info = self.model.transcribe(audio, **fw_options)
+            duration = info.duration or 0.0
+
+            # faster-whisper按窗口惰性解码，迭代过程即推理过程
+            segments = []
+            for segment in segments_iter:
+                segments.append({
+                    'id': segment.id,
+                    'start': segment.start,
+                    'end': segment.end,
+                    'text': segment.text,
+                    'avg_logprob': segment.avg_logprob,
+                    'compression_ratio': segment.compression_ratio,
+                    'no_speech_prob': segment.no_speech_prob
+                })
+                if segment_cb:
+                    segment_cb(normalize_segment(segments[-1], len(segments) - 1))
+                if progress_cb:
+                    progress_cb(min(segment.end, duration), duration)
+
+            transcribe_time = time.time() - start_time
+            text = ''.join(s['text'] for s in segments)
+            logger.info(f"转录完成，用时: {transcribe_time:.2f}秒，音频时长: {duration:.1f}秒")
+            return build_result(segments, text, info.language, transcribe_time)
+
+        except Exception as e:
+            logger.error(f"音频转录失败: {e}")
+            raise Exception(f"转录失败: {e}")
+
+    def unload(self):
+        with self.lock:
+            if self.model is not None:
+                logger.info("开始卸载faster-whisper模型")
+                del self.model
+                self.model = None
+                gc.collect()
+                logger.info("模型已卸载")
+
+    def move(self, device: str) -> bool:
+        """CTranslate2模型不能原地迁移设备，通过在目标设备上重新加载实现"""
+        with self.lock:
+            if self.model is None:
+                self.device = device
+                return True
+            if device == self.device:
+                return True
+            try:
+                start_time = time.time()
+                del self.model
+                self.model = None
+                gc.collect()
+                self._load_on(device)
+                logger.info(f"faster-whisper模型已迁移到{device}，用时: {time.time() - start_time:.2f}秒")
+                return True
+            except Exception as e:
+                logger.error(f"faster-whisper模型迁移到{device}失败: {e}")
+                return False
+
+    def is_loaded(self) -> bool:
+        return self.model is not None
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            'engine': self.name,
+            'model_loaded': self.model is not None,
+            'model_name': self.model_name,
+            'device': self.device,
+            'compute_type': self._compute_type(self.device),
+            'cpu_threads': self.cpu_threads
+        }
@@ -0,0 +1,56 @@
+"""
+openai-whisper 引擎
+包装 WhisperDirectManager，保持原有的加载、预热、显存轮询行为
+"""
+
+from typing import Optional, Dict, Any, Callable
+
+from .base import ASREngine
+
+
+class OpenAIWhisperEngine(ASREngine):
+    """基于 openai-whisper 的ASR引擎"""
+
+    name = "openai_whisper"
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        # 模型与设备设置沿用 WhisperDirectManager 的部署配置
+        self._manager = None
+
+    @property
+    def manager(self):
+        if self._manager is None:
+            # 动态导入避免循环依赖
+            from ..whisper_direct import get_whisper_manager
+            self._manager = get_whisper_manager()
+        return self._manager
+
+    def load(self) -> bool:
+        self.manager.get_model()
+        return True
+
+    def warmup(self) -> bool:
+        if self.manager.is_warmed_up and self.manager.model is not None:
+            return True
+        return self.manager.preload_and_warmup()
+
+    def transcribe(self, audio, options: Optional[Dict[str, Any]] = None,
+                   progress_cb: Optional[Callable] = None,
+                   segment_cb: Optional[Callable] = None) -> Dict[str, Any]:
+        return self.manager.transcribe_audio(audio, progress_cb, options, segment_cb)
+
+    def unload(self):
+        self.manager.unload_model()
+
+    def move(self, device: str) -> bool:
+        if device == "cpu":
+            return self.manager.move_to_cpu()
+        return self.manager.move_to_gpu()
+
+    def is_loaded(self) -> bool:
+        return self.manager.model is not None
+
+    def get_status(self) -> Dict[str, Any]:
+        status = self.manager.get_status()
+        status['engine'] = self.name
+        return status
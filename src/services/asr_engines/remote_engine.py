@@ -0,0 +1,351 @@
+"""
+远程ASR引擎
+把音频以HTTP请求体流式发送到 asr_endpoints 中配置的ASR工作节点（whisper_service.py），
+主节点只负责调度，不加载模型，也不需要与工作节点共享文件系统。
+
+工作节点按NDJSON逐行返回 progress / segment / result 事件，
+进度回调和片段回调与本地引擎一致。
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Optional, Dict, Any, Callable, List
+
+import requests
+
+from .base import ASREngine, AUDIO_FILTERS
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+from utils.logger import get_cached_logger
+from utils.http_client import get_http_client
+
+logger = get_cached_logger("远程ASR引擎")
+
+CONNECT_TIMEOUT = 5
+# 单个窗口解码的最长等待时间（工作节点每个窗口都会回传进度，超过即认为卡死）
+READ_TIMEOUT = 600
+HEALTH_TIMEOUT = 5
+# 所有节点都满载时等待空闲槽位的最长时间
+ACQUIRE_TIMEOUT = 600
+# 节点返回503（槽位被其他主节点占用）后的重试间隔
+BUSY_RETRY_DELAY = 2
+
+
+class RemoteWorkerBusy(Exception):
+    """工作节点没有空闲槽位"""
+
+
+class RemoteWorkerError(Exception):
+    """工作节点故障（5xx、转录出错或结果流不完整），尚未输出片段时改派其他节点"""
+
+
+class ASREndpointPool:
+    """
+    ASR工作节点池
+
+    后台线程定期调用各节点 /health 获取健康状态和槽位容量，
+    分配时选择 本地在途请求数/槽位数 最低的健康节点，全部满载时等待释放。
+    """
+
+    def __init__(self, urls: List[str], token: str = "", health_interval: float = 15):
+        self.endpoints = [{
+            'url': url.rstrip('/'),
+            'healthy': False,
+            'slots': 1,
+            'available': 0,
+            'in_flight': 0,
+            'engine': None,
+            'device': None,
+            'last_check': 0.0,
+            'last_error': None,
+            'completed': 0,
+            'failed': 0
+        } for url in urls]
+        self.token = token
+        self.health_interval = health_interval
+        self.condition = threading.Condition()
+        self.start_lock = threading.Lock()
+        self.health_thread = None
+        self.running = False
+
+    def headers(self) -> Dict[str, str]:
+        return {'Authorization': f"Bearer {self.token}"} if self.token else {}
+
+    def check_endpoint(self, endpoint: Dict[str, Any]):
+        """检查单个节点健康状态与容量"""
+        try:
+            response = get_http_client().get(f"{endpoint['url']}/health", headers=self.headers(),
+                                             timeout=HEALTH_TIMEOUT, retries=0)
+            data = response.json()
+            healthy = response.status_code == 200 and data.get('status') == 'healthy'
+            with self.condition:
+                was_healthy = endpoint['healthy']
+                endpoint['healthy'] = healthy
+                endpoint['slots'] = max(1, int(data.get('slots', 1)))
+                endpoint['available'] = int(data.get('available', 0))
+                endpoint['engine'] = data.get('engine')
+                endpoint['device'] = data.get('device')
+                endpoint['last_error'] = None if healthy else data.get('error', f"HTTP {response.status_code}")
+                endpoint['last_check'] = time.time()
+                self.condition.notify_all()
+            if healthy and not was_healthy:
+                logger.info(f"ASR节点可用: {endpoint['url']} ({endpoint['engine']}/{endpoint['device']}, "
+                            f"{endpoint['slots']} 槽位)")
+        except Exception as e:
+            self.mark_unhealthy(endpoint, str(e))
+
+    def mark_unhealthy(self, endpoint: Dict[str, Any], error: str):
+        with self.condition:
+            if endpoint['healthy']:
+                logger.warning(f"ASR节点不可用: {endpoint['url']} - {error}")
+            endpoint['healthy'] = False
+            endpoint['last_error'] = error
+            endpoint['last_check'] = time.time()
+
+    def check_all(self):
+        for endpoint in self.endpoints:
+            self.check_endpoint(endpoint)
+
+    def _health_loop(self):
+        while self.running:
+            time.sleep(self.health_interval)
+            self.check_all()
+
+    def start(self):
+        """首次检查并启动后台健康检查线程"""
+        with self.start_lock:
+            if self.running:
+                return
+            self.check_all()
+            self.running = True
+            self.health_thread = threading.Thread(target=self._health_loop, daemon=True)
+            self.health_thread.start()
+
+    def has_healthy(self) -> bool:
+        with self.condition:
+            return any(e['healthy'] for e in self.endpoints)
+
+    def acquire(self, exclude=()) -> Dict[str, Any]:
+        """分配一个节点，在途请求数+1"""
+        self.start()
+        deadline = time.time() + ACQUIRE_TIMEOUT
+        with self.condition:
+            while True:
+                candidates = [e for e in self.endpoints if e['healthy'] and e['url'] not in exclude]
+                if not candidates:
+                    raise Exception("没有可用的ASR工作节点")
+
+                free = [e for e in candidates if e['in_flight'] < e['slots']]
+                if free:
+                    endpoint = min(free, key=lambda e: e['in_flight'] / e['slots'])
+                    endpoint['in_flight'] += 1
+                    return endpoint
+
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise Exception("等待ASR工作节点空闲槽位超时")
+                self.condition.wait(min(remaining, self.health_interval))
+
+    def release(self, endpoint: Dict[str, Any], success: bool):
+        with self.condition:
+            endpoint['in_flight'] -= 1
+            endpoint['completed' if success else 'failed'] += 1
+            self.condition.notify_all()
+
+    def get_stats(self) -> List[Dict[str, Any]]:
+        with self.condition:
+            return [dict(e) for e in self.endpoints]
+
+
+class RemoteASREngine(ASREngine):
+    """把转录分发到远程ASR工作节点的引擎"""
+
+    name = "remote"
+    local = False
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        config = config or {}
+        urls = config.get('asr_endpoints', [])
+        if isinstance(urls, str):
+            urls = [u.strip() for u in urls.split(',') if u.strip()]
+        self.pool = ASREndpointPool(
+            urls,
+            token=config.get('asr_worker_token', ''),
+            health_interval=config.get('asr_health_interval', 15)
+        )
+
+    def load(self) -> bool:
+        self.pool.start()
+        return self.pool.has_healthy()
+
+    def _open_body(self, audio):
+        """返回 (请求体, Content-Type)；文件按块流式上传，数组编码为16kHz s16le PCM"""
+        if isinstance(audio, str):
+            if not os.path.exists(audio):
+                raise FileNotFoundError(f"音频文件不存在: {audio}")
+            return open(audio, 'rb'), 'application/octet-stream'
+
+        import numpy as np
+        pcm = (np.clip(audio, -1.0, 1.0) * 32767).astype('<i2').tobytes()
+        return pcm, 'audio/pcm'
+
+    def _transcribe_on(self, endpoint, audio, options, progress_cb, segment_cb, emitted):
+        body, content_type = self._open_body(audio)
+        headers = self.pool.headers()
+        headers['Content-Type'] = content_type
+        if options:
+            headers['X-ASR-Options'] = json.dumps(options)
+
+        try:
+            # 文件请求体不可重放，失败后由本引擎改派其他节点
+            response = get_http_client().post(f"{endpoint['url']}/transcribe", data=body, headers=headers,
+                                              stream=True, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT),
+                                              retries=0)
+        finally:
+            if hasattr(body, 'close'):
+                body.close()
+
+        with response:
+            if response.status_code == 503:
+                raise RemoteWorkerBusy(f"ASR节点繁忙: {endpoint['url']}")
+            if response.status_code >= 500:
+                raise RemoteWorkerError(f"ASR节点返回错误 {response.status_code}: {response.text[:200]}")
+            if response.status_code != 200:
+                raise Exception(f"ASR节点返回错误 {response.status_code}: {response.text[:200]}")
+
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    raise RemoteWorkerError(f"ASR节点返回的事件无法解析: {line[:200]!r}")
+                event_type = event.get('type')
+                if event_type == 'progress':
+                    if progress_cb:
+                        progress_cb(event['position'], event['duration'])
+                elif event_type == 'segment':
+                    emitted.append(event['segment'])
+                    if segment_cb:
+                        segment_cb(event['segment'])
+                elif event_type == 'result':
+                    result = event['result']
+                    result['worker'] = endpoint['url']
+                    return result
+                elif event_type == 'error':
+                    raise RemoteWorkerError(f"ASR节点转录失败: {event.get('error')}")
+
+        raise RemoteWorkerError(f"ASR节点结果流在返回结果前结束: {endpoint['url']}")
+
+    def transcribe(self, audio, options: Optional[Dict[str, Any]] = None,
+                   progress_cb: Optional[Callable] = None,
+                   segment_cb: Optional[Callable] = None) -> Dict[str, Any]:
+        failed = set()
+        last_error = None
+        deadline = time.time() + ACQUIRE_TIMEOUT
+        while True:
+            try:
+                endpoint = self.pool.acquire(exclude=failed)
+            except Exception:
+                if last_error is not None:
+                    raise Exception(f"所有可用ASR节点转录失败，最后一次错误: {last_error}")
+                raise
+            emitted = []
+            success = False
+            busy = False
+            try:
+                logger.info(f"转录分发到ASR节点: {endpoint['url']}")
+                start_time = time.time()
+                result = self._transcribe_on(endpoint, audio, options, progress_cb, segment_cb, emitted)
+                success = True
+                logger.info(f"ASR节点 {endpoint['url']} 转录完成，往返用时: {time.time() - start_time:.2f}秒")
+                return result
+            except RemoteWorkerBusy as e:
+                # 槽位被其他主节点占用，稍后重新分配
+                if time.time() > deadline:
+                    raise Exception("等待ASR工作节点空闲槽位超时")
+                logger.info(f"{e}，{BUSY_RETRY_DELAY}秒后重新分配")
+                busy = True
+            except (requests.RequestException, RemoteWorkerError) as e:
+                self.pool.mark_unhealthy(endpoint, str(e))
+                failed.add(endpoint['url'])
+                last_error = e
+                if emitted:
+                    # 片段已交给下游，换节点重转会重复输出
+                    raise Exception(f"ASR节点 {endpoint['url']} 在转录中途失败: {e}")
+                logger.warning(f"ASR节点 {endpoint['url']} 转录失败，尝试其他节点: {e}")
+            finally:
+                self.pool.release(endpoint, success)
+
+            if busy:
+                time.sleep(BUSY_RETRY_DELAY)
+
+    def _extract_audio(self, video_path: str, task_id: str = None) -> str:
+        """在主节点提取FLAC音频（比WAV小约一半，减少上传量），不依赖whisper/torch"""
+        if not os.path.exists(video_path):
+            raise FileNotFoundError(f"视频文件不存在: {video_path}")
+
+        if task_id:
+            task_temp_dir = os.path.join("cache", "temp", task_id)
+            os.makedirs(task_temp_dir, exist_ok=True)
+            audio_path = os.path.join(task_temp_dir, f"{task_id}_audio.flac")
+        else:
+            with tempfile.NamedTemporaryFile(suffix=".flac", delete=False) as temp_audio:
+                audio_path = temp_audio.name
+
+        cmd = [
+            "ffmpeg", "-i", video_path,
+            "-vn", "-ar", "16000", "-ac", "1",
+            "-af", AUDIO_FILTERS,
+            "-f", "flac",
+            audio_path, "-y"
+        ]
+        logger.info(f"开始提取并预处理音频: {video_path}")
+        result = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8',
+                                errors='replace', timeout=900)
+        if result.returncode != 0 or not os.path.exists(audio_path) or os.path.getsize(audio_path) == 0:
+            if os.path.exists(audio_path):
+                os.remove(audio_path)
+            raise Exception(f"音频提取失败: {result.stderr[-500:]}")
+        return audio_path
+
+    def transcribe_video(self, video_path: str, task_id: str = None,
+                         progress_cb: Optional[Callable] = None,
+                         options: Optional[Dict[str, Any]] = None,
+                         segment_cb: Optional[Callable] = None) -> Dict[str, Any]:
+        audio_path = None
+        try:
+            audio_path = self._extract_audio(video_path, task_id)
+            result = self.transcribe(audio_path, options, progress_cb, segment_cb)
+            result['video_path'] = video_path
+            result['audio_path'] = audio_path
+            result['engine'] = self.name
+            return result
+        finally:
+            if not task_id and audio_path and os.path.exists(audio_path):
+                try:
+                    os.remove(audio_path)
+                except Exception as e:
+                    logger.warning(f"清理临时音频文件失败: {e}")
+
+    def unload(self):
+        # 工作节点的模型由节点自身管理，可能同时服务其他主节点
+        pass
+
+    def move(self, device: str) -> bool:
+        return True
+
+    def is_loaded(self) -> bool:
+        return self.pool.has_healthy()
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            'engine': self.name,
+            'model_loaded': self.pool.has_healthy(),
+            'endpoints': self.pool.get_stats()
+        }
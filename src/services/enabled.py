@@ -84,8 +84,8 @@ class StartupTaskResumer:
                 return False
             
             # 定义工作文件路径（仅用于清理，不用于状态检测）
-            raw_srt = f"cache/temp/{task_id}_raw.srt"
-            translated_srt = f"cache/outputs/{task_id}_translated.srt"
+            raw_srt = f"cache/temp/{task_id}/{task_id}_raw.srt"
+            translation_journal = f"cache/temp/{task_id}/{task_id}_translation.journal"
             
             # 严格根据数据库状态清理不完整的文件，不修改任务状态
             if status == "提取原文字幕":
@@ -99,15 +99,25 @@ class StartupTaskResumer:
                 log_info(f"  ✅ 任务将从提取原文字幕阶段继续（保持数据库状态: {status}）")
                 
             elif status == "翻译原文字幕":
-                # 在翻译阶段中断，删除可能不完整的翻译文件
-                if os.path.exists(translated_srt):
-                    log_info(f"  清理中断阶段的翻译字幕文件: {translated_srt}")
-                    try:
-                        os.remove(translated_srt)
-                    except:
-                        pass
+                # 在翻译阶段中断，保留检查点日志，已翻译的行不再请求
+                # （译文字幕只在翻译完成后一次写入，处理时会重新从原文复制，无需清理）
+                if os.path.exists(translation_journal):
+                    log_info(f"  保留翻译检查点，将从中断处继续翻译: {translation_journal}")
                 log_info(f"  ✅ 任务将从翻译原文字幕阶段继续（保持数据库状态: {status}）")
                 
+            elif status == "等待批量翻译":
+                # 批处理由延后批量翻译的后台线程继续轮询；批处理记录丢失时改为同步翻译
+                from src.services.tran_modules.deferred import get_deferred_queue
+                deferred_queue = get_deferred_queue()
+                if deferred_queue.tracking(task_id):
+                    log_info(f"  ✅ 任务继续等待批量翻译结果（保持数据库状态: {status}）")
+                else:
+                    # 记为已改为同步翻译，否则重新处理时会按配置再次交给批处理
+                    deferred_queue.fall_back(task_id)
+                    task_coordinator.update_task_status(task_id, "翻译原文字幕", "批量翻译记录丢失，改为同步翻译...",
+                                                        "translating")
+                    log_info("  ✅ 批量翻译记录丢失，任务将从翻译原文字幕阶段同步翻译")
+                return True
             elif status in ["队列中", "processing"]:
                 log_info(f"  ✅ 任务将从头开始处理（保持数据库状态: {status}）")
             elif status == "已完成":
@@ -0,0 +1,60 @@
+"""
+处理档位(profile)模块
+档位是对主配置 config/tran-py.json 的一组覆盖项，
+任务创建时可指定档位，未指定时使用 default_profile
+"""
+
+import os
+import sys
+from typing import Dict, Any, Optional
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+from utils.logger import get_cached_logger
+
+logger = get_cached_logger("处理档位")
+
+
+def _load_config() -> Dict[str, Any]:
+    # 延迟导入避免循环依赖
+    from .tran import load_config
+    return load_config()
+
+
+def list_profiles() -> Dict[str, Dict[str, Any]]:
+    """获取配置中定义的全部档位"""
+    try:
+        return _load_config().get('profiles', {}) or {}
+    except Exception as e:
+        logger.warning(f"读取档位配置失败: {e}")
+        return {}
+
+
+def is_valid_profile(profile_name: Optional[str]) -> bool:
+    """检查档位名称是否存在（空名称表示默认档位，始终有效）"""
+    if not profile_name:
+        return True
+    return profile_name in list_profiles()
+
+
+def get_profile_config(profile_name: Optional[str] = None) -> Dict[str, Any]:
+    """
+    获取指定档位生效后的完整配置
+
+    Args:
+        profile_name: 档位名称，为空时使用 default_profile
+
+    Returns:
+        主配置与档位覆盖项合并后的配置字典
+    """
+    config = _load_config()
+    profiles = config.get('profiles', {}) or {}
+    name = profile_name or config.get('default_profile') or ''
+
+    merged = {k: v for k, v in config.items() if k != 'profiles'}
+    if name:
+        if name in profiles:
+            merged.update(profiles[name])
+        else:
+            logger.warning(f"档位不存在，使用主配置: {name}")
+    merged['profile'] = name
+    return merged
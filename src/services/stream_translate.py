@@ -0,0 +1,200 @@
+"""
+流式转录翻译
+翻译器在远程时（OpenAI或远程Ollama，不需要显存轮询），Whisper每定稿一个片段就放入有界队列，
+由翻译线程并行取出翻译，原文与译文SRT都逐条追加写入，翻译不再等待整段转录结束。
+"""
+
+import os
+import queue
+import sys
+import threading
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+from utils.logger import get_cached_logger
+
+from .use_whisper import call_whisper_service, format_srt_entry
+
+logger = get_cached_logger("流式翻译")
+
+DEFAULT_QUEUE_SIZE = 64
+
+# 队列结束标记
+_END = object()
+
+
+class StreamingTranslator:
+    """
+    片段消费者: 从队列取出Whisper片段，翻译后追加写入原文/译文SRT
+
+    队列有界: 翻译明显慢于转录时，Whisper在 put() 处等待，内存占用不会随视频长度增长。
+    转录结束后片段总数确定，每写完一批调用一次 progress_callback(已翻译条数, 总条数)。
+    """
+
+    def __init__(self, raw_srt, translated_srt, queue_size=DEFAULT_QUEUE_SIZE, profile=None,
+                 progress_callback=None):
+        self.profile = profile
+        self.progress_callback = progress_callback
+        self.received = 0
+        self.transcribed = False
+        self.engine = None
+        self.raw_srt = raw_srt
+        self.translated_srt = translated_srt
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.translated_count = 0
+        self.unit_count = 0
+        self.error = None
+        self.thread = None
+
+    def start(self):
+        """启动翻译线程"""
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def put(self, segment):
+        """Whisper片段回调: 放入队列（队列满时阻塞），翻译已失败时中止转录"""
+        if self.error is not None:
+            raise Exception(f"流式翻译失败: {self.error}")
+        self.received += 1
+        self.queue.put(segment)
+
+    def _report_progress(self):
+        if self.transcribed and self.progress_callback is not None:
+            self.progress_callback(self.translated_count, self.received)
+
+    def finish(self, raise_error=True):
+        """转录结束，等待队列中剩余片段翻译完成；raise_error 为False时不抛出翻译错误（转录本身已失败）"""
+        self.transcribed = True
+        self._report_progress()
+        self.queue.put(_END)
+        self.thread.join()
+        if raise_error and self.error is not None:
+            raise self.error
+
+    def _run(self):
+        from .tran import create_translator
+        from .profiles import get_profile_config
+        from .tran_modules.engine import TranslationEngine
+        from .tran_modules.sentences import ends_sentence, regroup, ungroup
+        from src.utils.srt_checker import clean_srt_content
+
+        raw_file = None
+        translated_file = None
+        finished = False
+        try:
+            config = get_profile_config(self.profile)
+            engine = self.engine = TranslationEngine.from_config(create_translator(config), config)
+            # 一次从队列取出的片段数: 填满所有并发请求
+            take = engine.batch_size * engine.concurrency
+            previous = []
+            # 上一批末尾尚未说完的句子: (序号, 时间轴, 片段)，留到下一批与后续片段一起合并翻译
+            pending = []
+            raw_file = open(self.raw_srt, 'w', encoding='utf-8')
+            translated_file = open(self.translated_srt, 'w', encoding='utf-8')
+
+            index = 0
+            while not finished:
+                # 阻塞取一个片段，再把队列里已就绪的片段一并打包（不等待新片段）
+                segments = [self.queue.get()]
+                while len(segments) < take:
+                    try:
+                        segments.append(self.queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if segments[-1] is _END:
+                    segments.pop()
+                    finished = True
+
+                for segment in segments:
+                    index += 1
+                    entry = format_srt_entry(index, segment)
+                    pending.append((index, entry.split('\n')[1], segment))
+                    raw_file.write(entry)
+                raw_file.flush()
+                if not pending:
+                    continue
+
+                texts = [segment['text'].strip() for _, _, segment in pending]
+                groups, units = regroup(texts, [(segment['start'], segment['end']) for _, _, segment in pending],
+                                        config)
+                # 最后一句还没说完时先不翻译，等后续片段到达后整句合并、批量与去重
+                held = 0
+                if not finished and not ends_sentence(texts[groups[-1][-1]]):
+                    held = len(groups[-1])
+                    groups, units = groups[:-1], units[:-1]
+                if not groups:
+                    continue
+                entries, pending = pending[:len(pending) - held], pending[len(pending) - held:]
+                texts = texts[:len(entries)]
+
+                translations = ungroup(groups, texts, engine.translate(units, preceding=previous))
+                previous = units[-engine.context_lines:] if engine.context_lines else []
+                self.unit_count += len(units)
+                for (entry_index, timestamp, _), translated_text in zip(entries, translations):
+                    translated_file.write(f"{entry_index}\n{timestamp}\n{clean_srt_content(translated_text)}\n\n")
+                translated_file.flush()
+
+                self.translated_count = entries[-1][0]
+                self._report_progress()
+
+        except Exception as e:
+            logger.error(f"流式翻译失败: {e}")
+            self.error = e
+            # 继续清空队列直到结束标记，避免生产者永久阻塞
+            while not finished:
+                finished = self.queue.get() is _END
+        finally:
+            if raw_file:
+                raw_file.close()
+            if translated_file:
+                translated_file.close()
+
+
+def transcribe_and_translate(task_id, video_path, raw_srt, translated_srt, profile=None,
+                             progress_callback=None, queue_size=DEFAULT_QUEUE_SIZE,
+                             translation_progress_callback=None):
+    """
+    转录并流式翻译视频
+
+    Args:
+        task_id: 任务ID
+        video_path: 视频路径
+        raw_srt: 原文SRT输出路径（逐条追加写入）
+        translated_srt: 译文SRT输出路径（逐条追加写入）
+        profile: 处理档位
+        progress_callback: Whisper进度回调 (position, duration)
+        queue_size: 片段队列容量
+        translation_progress_callback: 转录结束后剩余翻译的进度回调 (已翻译条数, 总条数)
+
+    Returns:
+        dict: Whisper转录结果，额外包含 translated_count
+    """
+    consumer = StreamingTranslator(raw_srt, translated_srt, queue_size, profile, translation_progress_callback)
+    consumer.start()
+
+    start_time = time.time()
+    try:
+        result = call_whisper_service(video_path, progress_callback, task_id, profile,
+                                      segment_callback=consumer.put)
+    except BaseException:
+        # 转录失败时只等待翻译线程退出，不让翻译错误掩盖转录本身的异常
+        consumer.finish(raise_error=False)
+        raise
+    transcribe_done = time.time()
+    consumer.finish()
+
+    tail_time = time.time() - transcribe_done
+    logger.info(f"流式翻译完成: {task_id[:8]}... 共 {consumer.translated_count} 条，"
+                f"转录耗时 {transcribe_done - start_time:.1f}秒，转录结束后剩余翻译耗时 {tail_time:.1f}秒")
+
+    if consumer.engine is not None:
+        from .tran import check_translation_failures, record_translation_stats
+        from .profiles import get_profile_config
+        stats = consumer.engine.get_stats()
+        stats['segments'] = consumer.translated_count
+        stats['sentence_units'] = consumer.unit_count
+        record_translation_stats(task_id, stats)
+        check_translation_failures(stats, get_profile_config(profile))
+
+    result['translated_count'] = consumer.translated_count
+    return result
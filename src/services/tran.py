@@ -2,13 +2,15 @@ import os
 import sys
 import requests
 import json
-from tqdm import tqdm
 import re
+import time
+import threading
 import logging
 
 # 导入标准化日志器
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 from utils.logger import get_cached_logger
+from utils.http_client import get_http_client
 
 logger = get_cached_logger("翻译服务")
 
@@ -49,82 +51,188 @@ def load_prompt():
         return default_prompt
 
 
-class OllamaTranslator:
-    def __init__(self):
-        config = load_config()
+# Ollama 上下文长度（所有请求保持一致，避免模型重新加载）
+OLLAMA_NUM_CTX = 2048
+# 翻译阶段 Ollama 模型的保留时间
+DEFAULT_OLLAMA_KEEP_ALIVE = "10m"
+# 重试后仍为原文的字幕超过该比例时任务失败
+DEFAULT_MAX_FAILURE_RATIO = 0.5
 
-        self.base_url = config.get('ollama_api')
-        self.model = config.get('ollama_model')
 
-        if not self.base_url or not self.model:
-            logger.error("配置文件缺少必要参数: ollama_api 和 ollama_model")
-            raise ValueError("配置文件缺少必要参数")
+class TranslationFailedError(Exception):
+    """重试后仍为原文的字幕比例超过 translation_max_failure_ratio"""
 
-        # 验证URL格式
-        if not self.base_url.startswith(('http://', 'https://')):
-            logger.error(f"URL格式错误: {self.base_url}")
-            raise ValueError(f"URL格式错误: {self.base_url}")
 
-        # 验证模型名称格式
-        if not re.match(r'^[a-zA-Z0-9_-]+:[a-zA-Z0-9._-]+$', self.model):
-            logger.error(f"模型名称格式错误: {self.model}")
-            raise ValueError(f"模型名称格式错误: {self.model}")
+class BaseTranslator:
+    """
+    翻译器基类
+    译文提取和单条翻译流程共用，子类只需实现 chat() 发送一次对话请求
 
-        self.chat_url = f"{self.base_url}/api/chat"
-        self.generate_url = f"{self.base_url}/api/generate"
-        self.conversation_history = []
-        self.max_history = 10
+    每个请求只携带前文原文作为上下文，不依赖上一条的译文，因此可以并发发送；
+    max_concurrency 为该后端允许同时进行的请求数。
+    """
 
-        logger.info(f"初始化翻译器 - API: {self.base_url}, 模型: {self.model}")
+    max_concurrency = 1
+    # 翻译器类型与模型名，用作翻译记忆的命名空间
+    translator_type = 'base'
+    model = ''
+    # 进程内翻译器（本地模型）: 翻译单元按 unit_size 切分，不附带前文上下文，不对冲
+    in_process = False
+    # 接口限流器（RateLimiter），为None时不限流
+    rate_limiter = None
 
+    def __init__(self):
         # 从配置文件加载提示词
         self.system_prompt = load_prompt()
-
-        self.conversation_history.append({
-            "role": "system",
-            "content": self.system_prompt
-        })
-
-    def add_to_history(self, user_message, assistant_response):
-        """添加对话到历史记录"""
-        self.conversation_history.append({"role": "user", "content": user_message})
-        self.conversation_history.append({"role": "assistant", "content": assistant_response})
-
-        if len(self.conversation_history) > self.max_history * 2 + 1:
-            self.conversation_history = [self.conversation_history[0]] + self.conversation_history[
-                                                                         -(self.max_history * 2):]
-
-    def translate_text(self, text):
-        """调用Ollama API翻译文本"""
+        # 第一个请求（任务的第一条字幕）的首个token耗时单独记录
+        self.first_line_pending = True
+        self.first_line_lock = threading.Lock()
+
+    def chat(self, messages):
+        """发送一次对话请求，返回模型回复原文，请求失败时抛出异常"""
+        raise NotImplementedError
+
+    def load_generation_settings(self, config):
+        """读取流式输出、停滞超时、思考模式和生成token预算设置"""
+        from src.services.tran_modules.streaming import DEFAULT_STALL_TIMEOUT, DEFAULT_MAX_TOKENS
+        self.streaming = bool(config.get('translation_streaming', True))
+        self.stall_timeout = float(config.get('translation_stall_timeout', DEFAULT_STALL_TIMEOUT))
+        self.max_tokens = int(config.get('translation_max_tokens', DEFAULT_MAX_TOKENS))
+        self.thinking = bool(config.get('translation_thinking', False))
+        self.budget_base = int(config.get('translation_token_budget_base', 64))
+        self.budget_per_char = float(config.get('translation_token_budget_per_char', 1.0))
+        self.thinking_tokens = int(config.get('translation_thinking_tokens', 1024))
+        from src.services.tran_modules.tokens import get_token_counter
+        self.token_counter = get_token_counter(config)
+
+    def generation_key(self) -> str:
+        """
+        影响生成内容和耗时的设置（思考模式、生成预算、模型保留时间）
+
+        各档位的这些设置可以不同，跨任务调度、对冲和自动调节按 (后端, 模型, 本标识) 区分，
+        不同档位的请求不共用一个翻译器，耗时样本也不混在一起。
+        """
+        settings = [('thinking', getattr(self, 'thinking', False)),
+                    ('thinking_tokens', getattr(self, 'thinking_tokens', 0)),
+                    ('budget', f"{getattr(self, 'budget_base', 0)}+{getattr(self, 'budget_per_char', 0)}"),
+                    ('max_tokens', getattr(self, 'max_tokens', 0))]
+        if getattr(self, 'keep_alive', None) is not None:
+            settings.append(('keep_alive', self.keep_alive))
+        return ",".join(f"{name}={value}" for name, value in settings)
+
+    def prompt_tokens(self, messages):
+        """本次请求的提示词token数（分词器见 translation_tokenizer）"""
+        counter = getattr(self, 'token_counter', None)
+        if counter is None:
+            from src.services.tran_modules.tokens import get_token_counter
+            counter = self.token_counter = get_token_counter()
+        return counter.count_messages(messages)
+
+    def token_budget(self, messages):
+        """按待翻译原文长度估算本次请求的生成token上限（开启思考时额外预留思考预算）"""
+        from src.services.tran_modules.context import strip_context
+        source = strip_context(messages[-1]['content'])
+        budget = self.budget_base + int(len(source) * self.budget_per_char)
+        if self.thinking:
+            budget += self.thinking_tokens
+        return min(self.max_tokens, budget)
+
+    def post(self, url, payload, headers=None, **kwargs):
+        """
+        发送对话请求，返回响应和限流器扣除的token数（请求完成后传给 settle_tokens）
+
+        配置了限流器时先按请求数和预估token数（提示词 + 生成预算）排队；收到429时整个接口按
+        Retry-After 暂停，本请求重新排队，不作为失败返回。
+        """
+        limiter = self.rate_limiter
+        if limiter is None:
+            return get_http_client().post(url, headers=headers, json=payload, **kwargs), 0
+
+        from utils.http_client import RETRY_STATUS_CODES
+        # 托管接口按提示词token数加请求的生成上限计入TPM
+        messages = payload['messages']
+        cost = self.prompt_tokens(messages) + payload.get('max_tokens', self.token_budget(messages))
+        deadline = time.time() + limiter.max_wait
+        while True:
+            charged = limiter.acquire(cost, deadline)
+            response = get_http_client().post(url, headers=headers, json=payload,
+                                              retry_codes=RETRY_STATUS_CODES - {429}, **kwargs)
+            if response.status_code != 429:
+                limiter.succeeded()
+                return response, charged
+            # 被限流的请求没有消耗服务端配额，退还后重新排队
+            limiter.settle(charged, 0)
+            limiter.throttled(response.headers)
+            response.close()
+
+    def settle_tokens(self, charged, actual):
+        """按实际token数（提示词 + 生成）修正限流器为本次请求扣除的token数"""
+        if self.rate_limiter is not None:
+            self.rate_limiter.settle(charged, actual)
+
+    def stream_chat(self, url, payload, iter_chunks, headers=None):
+        """
+        以流式方式发送对话请求，返回回复原文
+
+        读取超时即token间停滞超时；译文代码块闭合后立即断开连接。
+        iter_chunks 接收响应对象，返回 (正文片段, 思考片段, token数) 的迭代器。
+        """
+        from src.services.tran_modules.metrics import get_translation_metrics
+        from src.services.tran_modules.streaming import read_stream
+
+        start_time = time.time()
+        try:
+            response, charged = self.post(url, payload, headers, stream=True, timeout=self.stall_timeout)
+            if response.status_code >= 400:
+                response.close()
+                response.raise_for_status()
+            result = read_stream(response, iter_chunks(response), start_time)
+        except requests.exceptions.RequestException as e:
+            if isinstance(e, requests.exceptions.ReadTimeout) or 'timed out' in str(e).lower():
+                get_translation_metrics().record_stall(self.translator_type)
+                logger.warning(f"模型输出停滞超过 {self.stall_timeout:.0f} 秒，放弃本次请求")
+            raise
+
+        prompt_tokens = self.prompt_tokens(payload['messages'])
+        self.settle_tokens(charged, prompt_tokens + result.tokens)
+        get_translation_metrics().record_request(self.translator_type, result.elapsed, result.first_token,
+                                                 result.tokens, result.kept_tokens, streamed=True,
+                                                 cut_early=result.cut_early, prompt_tokens=prompt_tokens)
+        if result.first_token is not None and self.first_line_pending:
+            with self.first_line_lock:
+                first_line, self.first_line_pending = self.first_line_pending, False
+            if first_line:
+                get_translation_metrics().record_first_line(self.translator_type, result.first_token)
+                logger.info(f"第一个翻译请求首token耗时: {result.first_token:.2f}秒")
+        return result.content
+
+    def probe(self):
+        """检查后端是否可用（供翻译后端池在熔断后探测），默认认为可用"""
+        return True
+
+    def prewarm(self):
+        """预热模型，使第一条字幕不必等待模型加载（默认无需预热）"""
+        return True
+
+    def build_messages(self, text, context=None):
+        """构造单条翻译请求消息，context为前文原文列表"""
+        from src.services.tran_modules.context import with_context
+        return [
+            {"role": "system", "content": self.system_prompt},
+            {"role": "user", "content": with_context(text, context)}
+        ]
+
+    def translate_text(self, text, context=None):
+        """翻译单条文本，失败时返回原文"""
         if not text.strip():
             return text
 
         try:
-            payload = {
-                "model": self.model,
-                "messages": self.conversation_history + [{"role": "user", "content": text}],
-                "stream": False,
-                "options": {
-                    "temperature": 0.3,
-                    "top_p": 0.8,
-                    "num_ctx": 2048,
-                    "reasoning": True,  # 开启思考模式
-                    "thinking": True  # 开启思考模式
-                }
-            }
-
             logger.info(f"正在翻译: {text[:30]}...")
-            response = requests.post(self.chat_url, json=payload, timeout=450)
-            response.raise_for_status()
-
-            result = response.json()
-            translated = result["message"]["content"]
+            content = self.chat(self.build_messages(text, context))
 
             # 提取代码块中的翻译结果
-            translated = self.extract_translation(translated)
-
-            # 添加到对话历史
-            self.add_to_history(text, result["message"]["content"])
+            translated = self.extract_translation(content)
 
             logger.info(f"翻译结果: {translated}")
             return translated
@@ -133,9 +241,18 @@ class OllamaTranslator:
             logger.error(f"API请求失败: {e}")
             return text
         except Exception as e:
-            logger.error(f"翻译出错: {e}")
+            from src.services.tran_modules.streaming import RequestCancelled
+            if isinstance(e, RequestCancelled):
+                logger.debug("请求已取消（对冲请求落败）")
+            else:
+                logger.error(f"翻译出错: {e}")
             return text
 
+    def translate_batch(self, texts, context=None, outcome=None):
+        """一次请求翻译多条文本，返回与输入等长的译文列表（outcome 见 batching.translate_batch）"""
+        from src.services.tran_modules.batching import translate_batch
+        return translate_batch(self, texts, context=context, outcome=outcome)
+
     def extract_translation(self, response):
         """从响应中提取代码块内的翻译结果"""
         # 移除思考标签
@@ -155,6 +272,134 @@ class OllamaTranslator:
         # 如果没有代码块，返回清理后的响应
         return response.strip()
 
+
+class OllamaTranslator(BaseTranslator):
+    translator_type = 'ollama'
+
+    def __init__(self, config=None):
+        config = config or load_config()
+
+        self.base_url = config.get('ollama_api')
+        self.model = config.get('ollama_model')
+
+        if not self.base_url or not self.model:
+            logger.error("配置文件缺少必要参数: ollama_api 和 ollama_model")
+            raise ValueError("配置文件缺少必要参数")
+
+        # 验证URL格式
+        if not self.base_url.startswith(('http://', 'https://')):
+            logger.error(f"URL格式错误: {self.base_url}")
+            raise ValueError(f"URL格式错误: {self.base_url}")
+
+        # 验证模型名称格式
+        if not re.match(r'^[a-zA-Z0-9_-]+:[a-zA-Z0-9._-]+$', self.model):
+            logger.error(f"模型名称格式错误: {self.model}")
+            raise ValueError(f"模型名称格式错误: {self.model}")
+
+        self.chat_url = f"{self.base_url}/api/chat"
+        self.generate_url = f"{self.base_url}/api/generate"
+        # Ollama默认逐个处理请求，服务端设置了 OLLAMA_NUM_PARALLEL 时可调大
+        self.max_concurrency = max(1, int(config.get('ollama_concurrency', 1)))
+        # 翻译阶段模型在显存中的保留时间，每个请求显式携带，不依赖服务端默认值（5分钟）
+        self.keep_alive = config.get('ollama_keep_alive', DEFAULT_OLLAMA_KEEP_ALIVE)
+        self.load_generation_settings(config)
+
+        logger.info(f"初始化翻译器 - API: {self.base_url}, 模型: {self.model}")
+
+        super().__init__()
+
+    def options(self, num_predict):
+        """
+        生成参数
+
+        num_ctx 等影响模型加载的参数在所有请求（包括预热）中保持一致，
+        否则 Ollama 会重新加载模型、丢弃已缓存的提示词前缀。
+        """
+        return {
+            "temperature": 0.3,
+            "top_p": 0.8,
+            "num_ctx": OLLAMA_NUM_CTX,
+            "num_predict": num_predict
+        }
+
+    def chat(self, messages):
+        """调用Ollama /api/chat，生成上限按原文长度缩放"""
+        from src.services.tran_modules.metrics import get_translation_metrics
+        from src.services.tran_modules.streaming import iter_ollama_chunks, ollama_timings
+
+        payload = {
+            "model": self.model,
+            "messages": messages,
+            "stream": self.streaming,
+            # 思考模式由档位控制: 批量/快速任务关闭，高质量任务开启
+            "think": self.thinking,
+            "keep_alive": self.keep_alive,
+            "options": self.options(self.token_budget(messages))
+        }
+
+        if self.streaming:
+            # 代码块闭合后提前断开时收不到最后一个分块，没有服务端耗时
+            server_stats = {}
+            content = self.stream_chat(self.chat_url, payload,
+                                       lambda response: iter_ollama_chunks(response, server_stats))
+            if server_stats:
+                get_translation_metrics().record_server_timing(
+                    self.translator_type, server_stats['prefill'], server_stats['prompt_tokens'],
+                    server_stats['load'])
+            return content
+
+        start_time = time.time()
+        response = get_http_client().post(self.chat_url, json=payload)
+        response.raise_for_status()
+
+        result = response.json()
+        from src.services.tran_modules.streaming import estimate_kept_tokens
+        content = result["message"]["content"]
+        tokens = result.get("eval_count", 0)
+        metrics = get_translation_metrics()
+        metrics.record_request(
+            self.translator_type, time.time() - start_time, tokens=tokens,
+            kept_tokens=estimate_kept_tokens(tokens, content, result["message"].get("thinking", "")),
+            prompt_tokens=self.prompt_tokens(messages)
+        )
+        timings = ollama_timings(result)
+        metrics.record_server_timing(self.translator_type, timings['prefill'], timings['prompt_tokens'],
+                                     timings['load'])
+        return content
+
+    def prewarm(self):
+        """
+        用一个只含系统提示词、只生成1个token的请求加载模型
+
+        模型加载进显存的同时系统提示词被预填充进KV缓存，后续请求的相同前缀直接复用。
+        """
+        payload = {
+            "model": self.model,
+            "messages": [{"role": "system", "content": self.system_prompt}],
+            "stream": False,
+            "think": False,
+            "keep_alive": self.keep_alive,
+            "options": self.options(1)
+        }
+        start_time = time.time()
+        try:
+            response = get_http_client().post(self.chat_url, json=payload, retries=0)
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            logger.warning(f"Ollama模型预热失败: {e}")
+            return False
+        logger.info(f"Ollama模型 {self.model} 已预热，用时 {time.time() - start_time:.2f}秒，"
+                    f"保留时间 {self.keep_alive}")
+        return True
+
+    def probe(self):
+        """探测Ollama服务是否可用"""
+        try:
+            response = get_http_client().get(f"{self.base_url}/api/tags", timeout=5, retries=0)
+            return response.status_code == 200
+        except requests.exceptions.RequestException:
+            return False
+
     def unload_model(self) -> bool:
         """卸载Ollama模型从显存"""
         try:
@@ -165,7 +410,7 @@ class OllamaTranslator:
                 "keep_alive": 0  # 立即卸载
             }
 
-            response = requests.post(self.generate_url, json=payload, timeout=10)
+            response = get_http_client().post(self.generate_url, json=payload, timeout=10)
 
             if response.status_code == 200:
                 logger.info(f"Ollama模型 {self.model} 已卸载")
@@ -182,9 +427,11 @@ class OllamaTranslator:
             return False
 
 
-class OpenAITranslator:
-    def __init__(self):
-        config = load_config()
+class OpenAITranslator(BaseTranslator):
+    translator_type = 'openai'
+
+    def __init__(self, config=None):
+        config = config or load_config()
 
         self.base_url = config.get('openai_base_url')
         self.api_key = config.get('openai_api_key')
@@ -200,107 +447,114 @@ class OpenAITranslator:
             raise ValueError(f"URL格式错误: {self.base_url}")
 
         self.chat_url = f"{self.base_url.rstrip('/')}/chat/completions"
-        self.conversation_history = []
-        self.max_history = 10
+        self.max_concurrency = max(1, int(config.get('openai_concurrency', 4)))
+        self.load_generation_settings(config)
+        # 托管接口的RPM/TPM限额，同一接口地址和模型的所有任务共用一个限流器
+        from src.services.tran_modules.ratelimit import DEFAULT_MAX_WAIT, get_rate_limiter
+        self.rate_limiter = get_rate_limiter(f"{self.chat_url}|{self.model}", config.get('openai_rpm', 0),
+                                             config.get('openai_tpm', 0),
+                                             config.get('openai_rate_limit_max_wait', DEFAULT_MAX_WAIT))
 
         logger.info(f"初始化OpenAI翻译器 - API: {self.base_url}, 模型: {self.model}")
 
-        # 从配置文件加载提示词
-        self.system_prompt = load_prompt()
-
-        self.conversation_history.append({
-            "role": "system",
-            "content": self.system_prompt
-        })
-
-    def add_to_history(self, user_message, assistant_response):
-        """添加对话到历史记录"""
-        self.conversation_history.append({"role": "user", "content": user_message})
-        self.conversation_history.append({"role": "assistant", "content": assistant_response})
-
-        if len(self.conversation_history) > self.max_history * 2 + 1:
-            self.conversation_history = [self.conversation_history[0]] + self.conversation_history[
-                                                                         -(self.max_history * 2):]
-
-    def translate_text(self, text):
-        """调用OpenAI兼容API翻译文本"""
-        if not text.strip():
-            return text
+        super().__init__()
 
+    def probe(self):
+        """探测OpenAI兼容接口是否可用"""
         try:
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {self.api_key}"
-            }
-
-            payload = {
-                "model": self.model,
-                "messages": self.conversation_history + [{"role": "user", "content": text}],
-                "stream": False,
-                "temperature": 0.3,
-                "top_p": 0.8,
-                "max_tokens": 2048
-            }
-
-            logger.info(f"正在翻译: {text[:30]}...")
-            response = requests.post(self.chat_url, headers=headers, json=payload, timeout=450)
-            response.raise_for_status()
-
-            result = response.json()
-            translated = result["choices"][0]["message"]["content"]
-
-            # 提取代码块中的翻译结果
-            translated = self.extract_translation(translated)
-
-            # 添加到对话历史
-            self.add_to_history(text, result["choices"][0]["message"]["content"])
-
-            logger.info(f"翻译结果: {translated}")
-            return translated
-
-        except requests.exceptions.RequestException as e:
-            logger.error(f"API请求失败: {e}")
-            return text
-        except Exception as e:
-            logger.error(f"翻译出错: {e}")
-            return text
-
-    def extract_translation(self, response):
-        """从响应中提取代码块内的翻译结果"""
-        # 移除思考标签
-        response = re.sub(r'<think>.*?</think>', '', response, flags=re.DOTALL)
-
-        # 查找代码块
-        code_block_pattern = r'```(?:text\s*)?\n?([^`]+?)```'
-        matches = re.findall(code_block_pattern, response, flags=re.DOTALL)
-
-        if matches:
-            translation = matches[0].strip()
-            # 移除可能的text标记行
-            lines = translation.split('\n')
-            filtered_lines = [line for line in lines if line.strip() not in ['text', '']]
-            return '\n'.join(filtered_lines).strip()
-
-        # 如果没有代码块，返回清理后的响应
-        return response.strip()
-
+            response = get_http_client().get(f"{self.base_url.rstrip('/')}/models", timeout=5, retries=0,
+                                             headers={"Authorization": f"Bearer {self.api_key}"})
+            return response.status_code == 200
+        except requests.exceptions.RequestException:
+            return False
 
-def create_translator():
-    """根据配置创建翻译器"""
-    config = load_config()
+    def chat(self, messages):
+        """调用OpenAI兼容 /chat/completions"""
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.api_key}"
+        }
+
+        payload = {
+            "model": self.model,
+            "messages": messages,
+            "stream": self.streaming,
+            "temperature": 0.3,
+            "top_p": 0.8,
+            # 与Ollama的 num_predict 相同按原文长度设置生成上限；托管接口按请求的 max_tokens 计入TPM，
+            # 与限流器扣除的预估token数一致
+            "max_tokens": self.token_budget(messages)
+        }
+
+        if self.streaming:
+            from src.services.tran_modules.streaming import iter_openai_chunks
+            return self.stream_chat(self.chat_url, payload, iter_openai_chunks, headers)
+
+        from src.services.tran_modules.metrics import get_translation_metrics
+        start_time = time.time()
+        response, charged = self.post(self.chat_url, payload, headers)
+        response.raise_for_status()
+
+        result = response.json()
+        from src.services.tran_modules.streaming import estimate_kept_tokens
+        message = result["choices"][0]["message"]
+        usage = result.get("usage") or {}
+        tokens = usage.get("completion_tokens", 0)
+        self.settle_tokens(charged, usage.get("total_tokens"))
+        get_translation_metrics().record_request(
+            self.translator_type, time.time() - start_time, tokens=tokens,
+            kept_tokens=estimate_kept_tokens(tokens, message["content"], message.get("reasoning_content") or ""),
+            prompt_tokens=self.prompt_tokens(messages)
+        )
+        return message["content"]
+
+
+def create_translator(config=None):
+    """
+    根据配置创建翻译器，config为空时读取主配置（按档位翻译时传入档位生效后的配置）
+
+    配置了 translation_backends 时返回组合多个后端的翻译后端池。
+    """
+    config = config or load_config()
     translator_type = config.get('translator_type', 'ollama').lower()
-    
-    if translator_type == 'openai':
+
+    if config.get('translation_backends'):
+        from src.services.tran_modules.pool import get_translator_pool
+        logger.info("使用多后端翻译后端池")
+        return get_translator_pool(config)
+    elif translator_type == 'openai':
         logger.info("使用 OpenAI 兼容接口翻译器")
-        return OpenAITranslator()
+        return OpenAITranslator(config)
     elif translator_type == 'ollama':
         logger.info("使用 Ollama 接口翻译器")
-        return OllamaTranslator()
+        return OllamaTranslator(config)
+    elif translator_type == 'local':
+        from src.services.tran_modules.local_mt import LocalMTTranslator
+        logger.info("使用本地离线翻译模型")
+        return LocalMTTranslator(config)
     else:
         logger.error(f"不支持的翻译器类型: {translator_type}")
         raise ValueError(f"不支持的翻译器类型: {translator_type}")
 
 
+def start_prewarm(profile=None):
+    """
+    在后台线程中预热翻译模型（转录收尾时调用，与转录/显存切换重叠），返回线程
+
+    预热失败只记录日志，第一个翻译请求照常加载模型。
+    """
+    def run():
+        try:
+            from src.services.profiles import get_profile_config
+            create_translator(get_profile_config(profile)).prewarm()
+        except Exception as e:
+            logger.warning(f"预热翻译模型失败: {e}")
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
 def parse_srt_file(srt_path):
     """解析SRT文件"""
     logger.info(f"读取SRT文件: {srt_path}")
@@ -323,13 +577,39 @@ def parse_srt_file(srt_path):
     return subtitles
 
 
+def write_srt_file(output_path, subtitles):
+    """保存 [(序号, 时间轴, 文本), ...] 为SRT文件，先写临时文件再替换，中断时不会留下写了一半的译文"""
+    from src.utils.srt_checker import clean_srt_content
+
+    temp_path = f"{output_path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        for index, timestamp, text in subtitles:
+            # 在保存时执行SRT内容清理
+            cleaned_text = clean_srt_content(text)
+            f.write(f"{index}\n{timestamp}\n{cleaned_text}\n\n")
+    os.replace(temp_path, output_path)
+
+
 def translate_srt(input_path, output_path=None):
     """翻译SRT字幕文件"""
     return translate_srt_with_callback(input_path, None, output_path)
 
 
-def translate_srt_with_callback(input_path, progress_callback=None, output_path=None):
-    """带进度回调的SRT字幕翻译函数"""
+def translate_srt_with_callback(input_path, progress_callback=None, output_path=None, task_id=None,
+                                profile=None, journal_path=None, config=None):
+    """
+    带进度回调的SRT字幕翻译函数
+
+    被切成多条的句子合并为整句翻译（translation_sentence_merge），译文按原文长度比例分回各条字幕。
+    先查翻译记忆，未命中的字幕才发送请求；传入task_id时把本次的翻译统计
+    （行数、请求数、翻译记忆命中率、节省耗时）写入任务记录。
+    profile为处理档位，档位可覆盖翻译相关配置（如 translation_thinking）；传入config时直接使用该配置
+    （基准测试用来指向桩服务或回放服务），不再读取配置文件和档位。
+    传入journal_path时每翻译完一批就写入检查点日志，中断后重新翻译同一份原文只请求剩余的行；
+    译文保存后删除日志。
+    翻译失败的字幕在最后集中重试，仍为原文的比例超过 translation_max_failure_ratio 时
+    抛出 TranslationFailedError，不保存译文。
+    """
     if output_path is None:
         output_path = input_path
 
@@ -337,53 +617,98 @@ def translate_srt_with_callback(input_path, progress_callback=None, output_path=
     logger.info("SRT字幕翻译程序")
     logger.info("=" * 50)
 
-    # 初始化翻译器（根据配置自动选择）
-    translator = create_translator()
+    # 初始化翻译器（根据档位生效后的配置自动选择）
+    if config is None:
+        from src.services.profiles import get_profile_config
+        config = get_profile_config(profile)
+    translator = create_translator(config)
 
     # 解析SRT文件
     subtitles = parse_srt_file(input_path)
 
-    # 翻译每条字幕
-    translated_subtitles = []
+    # 翻译全部字幕（按配置批量打包、并发发送，输出顺序不变）
+    from src.services.tran_modules.engine import TranslationEngine
+    engine = TranslationEngine.from_config(translator, config)
     logger.info("开始翻译字幕...")
-    
+
     total_count = len(subtitles)
+    texts = [text for _, _, text in subtitles]
+
+    # 被Whisper切开的句子合并为整句翻译，译文再按原文长度分回各条字幕
+    from src.services.tran_modules.sentences import parse_timestamp, regroup, ungroup
+    groups, units = regroup(texts, [parse_timestamp(timestamp) for _, timestamp, _ in subtitles], config)
+
+    journal = None
+    if journal_path:
+        from src.services.tran_modules.journal import TranslationJournal
+        journal = TranslationJournal(journal_path, units)
+    try:
+        translated_units = engine.translate(units, progress_callback, journal=journal)
+    finally:
+        if journal is not None:
+            journal.close()
+    translations = ungroup(groups, texts, translated_units)
+    translated_subtitles = [
+        (index, timestamp, translated)
+        for (index, timestamp, _), translated in zip(subtitles, translations)
+    ]
 
-    for i, (index, timestamp, text) in enumerate(tqdm(subtitles, desc="翻译进度")):
-        logger.info(f"[{i + 1}/{total_count}] 处理字幕 #{index}")
-        
-        # 调用进度回调
-        if progress_callback:
-            progress_callback(i + 1, total_count)
-
-        # 跳过空白或过短的文本
-        if len(text.strip()) < 2:
-            logger.info("跳过空白或过短的文本")
-            translated_subtitles.append((index, timestamp, text))
-            continue
-
-        # 翻译文本
-        translated_text = translator.translate_text(text)
-        translated_subtitles.append((index, timestamp, translated_text))
-    
     # 最后一次调用进度回调，表示完成
     if progress_callback:
         progress_callback(total_count, total_count)
 
+    stats = engine.get_stats()
+    stats['segments'] = total_count
+    stats['sentence_units'] = len(units)
+    record_translation_stats(task_id, stats)
+    # 大部分字幕仍为原文时不保存译文，检查点保留已翻译的部分
+    check_translation_failures(stats, config)
+
     # 保存翻译结果
     logger.info(f"保存翻译结果到: {output_path}")
-    from src.utils.srt_checker import clean_srt_content
-    
-    with open(output_path, 'w', encoding='utf-8') as f:
-        for index, timestamp, text in translated_subtitles:
-            # 在保存时执行SRT内容清理
-            cleaned_text = clean_srt_content(text)
-            f.write(f"{index}\n{timestamp}\n{cleaned_text}\n\n")
+    write_srt_file(output_path, translated_subtitles)
+
+    if journal is not None:
+        journal.remove()
 
     logger.info("翻译完成!")
     return True
 
 
+def record_translation_stats(task_id, stats):
+    """记录一个任务的翻译统计（日志，传入task_id时同时写入任务记录）"""
+    if stats.get('segments', 0) > stats.get('sentence_units', 0) > 0:
+        logger.info(f"整句翻译: {stats['segments']} 条字幕合并为 {stats['sentence_units']} 个句子单元")
+    logger.info(f"翻译统计: {stats['lines']} 条字幕，{stats['requests']} 个请求，"
+                f"合并重复 {stats['duplicates']} 条（少发送 {stats['requests_avoided']} 个请求），"
+                f"翻译记忆命中 {stats['memory_hits']} 条 ({stats['memory_hit_rate'] * 100:.1f}%)，"
+                f"节省约 {stats['memory_time_saved']:.1f} 秒")
+    if stats.get('hedged'):
+        logger.info(f"对冲请求 {stats['hedged']} 次，其中 {stats['hedge_wins']} 次由对冲请求先返回")
+    if stats.get('failed'):
+        logger.warning(f"翻译失败 {stats['failed']} 条，重试 {stats['retried']} 条次，恢复 {stats['recovered']} 条，"
+                       f"仍为原文 {stats['untranslated']} 条 ({stats['failure_rate'] * 100:.1f}%)")
+    if not task_id:
+        return
+    try:
+        from src.core.coordinate import task_coordinator
+        task_coordinator.update_task_translation_stats(task_id, stats)
+    except Exception as e:
+        logger.warning(f"写入任务翻译统计失败: {e}")
+
+
+def check_translation_failures(stats, config):
+    """重试后仍为原文的字幕比例超过 translation_max_failure_ratio 时抛出 TranslationFailedError"""
+    max_ratio = float(config.get('translation_max_failure_ratio', DEFAULT_MAX_FAILURE_RATIO))
+    if max_ratio >= 1 or not stats.get('lines'):
+        return
+    if stats.get('failure_rate', 0) > max_ratio:
+        raise TranslationFailedError(
+            f"{stats['untranslated']}/{stats['lines']} 条字幕翻译失败（{stats['failure_rate'] * 100:.1f}%），"
+            f"超过上限 {max_ratio * 100:.0f}%"
+        )
+
+
 def main():
     """命令行入口"""
     if len(sys.argv) < 3:
@@ -0,0 +1,95 @@
+"""
+翻译模块包
+包含批量翻译、上下文构造、token计数、整句合并、并发翻译引擎、翻译记忆、检查点、流式读取、运行指标、多后端池、对冲请求、跨任务调度、批量与并发自动调节、接口限流与本地离线翻译模型等翻译流程的专责模块
+"""
+
+from .batching import translate_batch, parse_batch_response, build_batch_messages, DEFAULT_BATCH_SIZE
+from .context import preceding_context, with_context, DEFAULT_CONTEXT_LINES, DEFAULT_CONTEXT_TOKENS
+from .tokens import TokenCounter, get_token_counter
+from .engine import TranslationEngine
+from .sentences import regroup, ungroup, group_sentences, distribute
+from .memory import TranslationMemory, get_translation_memory, normalize_text
+from .streaming import read_stream, fence_closed, DEFAULT_STALL_TIMEOUT, DEFAULT_MAX_TOKENS
+from .metrics import TranslationMetrics, get_translation_metrics
+from .journal import TranslationJournal, journal_path
+from .pool import TranslatorPool, get_translator_pool, get_pool_stats
+from .hedging import HedgePolicy, get_hedge_policy, get_hedge_stats
+from .scheduler import TranslationScheduler, get_translation_scheduler, get_scheduler_stats
+from .autotune import AutoTuner, get_autotuner, get_autotune_stats
+from .ratelimit import RateLimiter, RateLimitTimeout, get_rate_limiter, get_rate_limit_stats
+from .local_mt import LocalMTTranslator
+
+__all__ = [
+    # Batching
+    'translate_batch',
+    'parse_batch_response',
+    'build_batch_messages',
+    'DEFAULT_BATCH_SIZE',
+
+    # Context
+    'preceding_context',
+    'with_context',
+    'DEFAULT_CONTEXT_LINES',
+    'DEFAULT_CONTEXT_TOKENS',
+
+    # Tokens
+    'TokenCounter',
+    'get_token_counter',
+
+    # Engine
+    'TranslationEngine',
+
+    # Sentences
+    'regroup',
+    'ungroup',
+    'group_sentences',
+    'distribute',
+
+    # Memory
+    'TranslationMemory',
+    'get_translation_memory',
+    'normalize_text',
+
+    # Streaming
+    'read_stream',
+    'fence_closed',
+    'DEFAULT_STALL_TIMEOUT',
+    'DEFAULT_MAX_TOKENS',
+
+    # Metrics
+    'TranslationMetrics',
+    'get_translation_metrics',
+
+    # Journal
+    'TranslationJournal',
+    'journal_path',
+
+    # Pool
+    'TranslatorPool',
+    'get_translator_pool',
+    'get_pool_stats',
+
+    # Hedging
+    'HedgePolicy',
+    'get_hedge_policy',
+    'get_hedge_stats',
+
+    # Scheduler
+    'TranslationScheduler',
+    'get_translation_scheduler',
+    'get_scheduler_stats',
+
+    # Autotune
+    'AutoTuner',
+    'get_autotuner',
+    'get_autotune_stats',
+
+    # Rate limit
+    'RateLimiter',
+    'RateLimitTimeout',
+    'get_rate_limiter',
+    'get_rate_limit_stats',
+
+    # Local MT
+    'LocalMTTranslator'
+]
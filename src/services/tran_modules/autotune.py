@@ -0,0 +1,271 @@
+"""
+批量大小与并发数自动调节
+本地8GB显存的Ollama与远程OpenAI网关的最佳批量大小、并发数不同，且随负载变化。
+启用后按 (后端, 模型, 生成设置) 测量每个窗口（若干个请求）的吞吐、错位率和失败率，用AIMD方式调节。
+吞吐按利特尔法则估算: Σ条数 / Σ(请求耗时 / 发送时的并发数)，不受任务之间空闲的影响；
+任务收尾阶段（没有更多字幕可发送）的请求和设置变化之前发出的请求不计入。
+
+- 拥塞信号（失败请求→并发数，批量回复错位率超过阈值→批量大小）: 对应参数减半（乘性减）
+- 上一次加大某个参数后吞吐下降超过容差: 该参数减半；吞吐没有明显提升: 退回一步。之后该参数冷却若干窗口
+- 否则轮流把批量大小加2、并发数加1（加性增），逐步探测上限
+
+学到的设置写入 db/translation_autotune.json，重启后从上次的设置继续。
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+from utils.logger import get_cached_logger
+
+logger = get_cached_logger("自动调节")
+
+DEFAULT_AUTOTUNE_PATH = "db/translation_autotune.json"
+DEFAULT_AUTOTUNE_WINDOW = 8
+DEFAULT_MAX_BATCH_SIZE = 40
+DEFAULT_MAX_CONCURRENCY = 8
+DEFAULT_MISALIGN_THRESHOLD = 0.05
+# 吞吐变化小于该比例视为没有变化
+THROUGHPUT_TOLERANCE = 0.05
+# 加大某个参数没有收益后，该参数暂停加大的窗口数
+COOLDOWN_WINDOWS = 5
+BATCH_STEP = 2
+CONCURRENCY_STEP = 1
+HISTORY_SIZE = 20
+
+
+class AutoTuner:
+    """
+    一个 (后端, 模型, 生成设置) 的AIMD调节器（线程安全）
+
+    Args:
+        key: 后端标识 "类型|地址|模型|生成设置"
+        batch_size: 初始每个请求的字幕条数
+        concurrency: 初始同时进行的请求数
+        max_batch_size: 批量大小上限
+        max_concurrency: 并发数上限
+        window: 每多少个请求做一次调节
+        misalign_threshold: 批量回复错位率超过该值时减小批量
+        store: 保存学到的设置的 AutoTuneStore，为None时不保存
+    """
+
+    def __init__(self, key: str, batch_size: int, concurrency: int, max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+                 max_concurrency: int = DEFAULT_MAX_CONCURRENCY, window: int = DEFAULT_AUTOTUNE_WINDOW,
+                 misalign_threshold: float = DEFAULT_MISALIGN_THRESHOLD, store=None):
+        self.key = key
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.batch_size = min(self.max_batch_size, max(1, int(batch_size)))
+        self.concurrency = min(self.max_concurrency, max(1, int(concurrency)))
+        self.window = max(2, int(window))
+        self.misalign_threshold = float(misalign_threshold)
+        self.store = store
+        self.lock = threading.Lock()
+
+        self.requests = []
+        # 每次调节后加1，调节之前发出的请求不计入新窗口
+        self.generation = 0
+        self.throughput = None
+        # 上一次调节: (参数名, 'up'/'down', 调节前的值)
+        self.last_change = None
+        self.next_knob = 'batch_size'
+        self.cooldown = {'batch_size': 0, 'concurrency': 0}
+        self.increases = 0
+        self.decreases = 0
+        self.last_misaligned_rate = 0.0
+        self.last_error_rate = 0.0
+        self.history = deque(maxlen=HISTORY_SIZE)
+
+    def settings(self):
+        """当前的 (批量大小, 并发数, 设置代数)"""
+        with self.lock:
+            return self.batch_size, self.concurrency, self.generation
+
+    def record(self, lines: int, elapsed: float, concurrency: int, misaligned: int = 0, failed: bool = False,
+               generation: Optional[int] = None):
+        """
+        记录一个完成的请求
+
+        Args:
+            lines: 字幕条数
+            elapsed: 请求耗时（秒）
+            concurrency: 发送时的并发数设置
+            misaligned: 批量回复中缺失或错位的条数
+            failed: 是否失败（全部返回原文）
+            generation: 发送时的设置代数，与当前不同时不计入
+        """
+        with self.lock:
+            if generation is not None and generation != self.generation:
+                return
+            self.requests.append((lines, misaligned, failed, elapsed / max(1, concurrency)))
+            # 并发较大时一个窗口至少包含两轮请求
+            if len(self.requests) >= max(self.window, 2 * self.concurrency):
+                self._adjust()
+
+    def _set(self, knob: str, value: int, direction: str, reason: str):
+        old = getattr(self, knob)
+        if value == old:
+            return
+        setattr(self, knob, value)
+        self.generation += 1
+        self.last_change = (knob, direction, old)
+        if direction == 'up':
+            self.increases += 1
+        else:
+            self.decreases += 1
+        self.history.append({'time': round(time.time(), 1), knob: value, 'reason': reason,
+                             'throughput': round(self.throughput or 0, 2)})
+        logger.info(f"{self.key} {knob}: {old} → {value}（{reason}，吞吐 {self.throughput or 0:.2f} 条/秒）")
+
+    def _adjust(self):
+        """一个窗口结束，按吞吐、错位率和失败率调节（调用方持有锁）"""
+        lines = sum(r[0] for r in self.requests)
+        busy = max(sum(r[3] for r in self.requests), 1e-6)
+        misaligned_rate = sum(r[1] for r in self.requests) / lines if lines else 0.0
+        error_rate = sum(1 for r in self.requests if r[2]) / len(self.requests)
+        throughput = lines / busy
+        previous, self.throughput = self.throughput, throughput
+        self.last_misaligned_rate = round(misaligned_rate, 4)
+        self.last_error_rate = round(error_rate, 4)
+        self.requests = []
+        for knob in self.cooldown:
+            self.cooldown[knob] = max(0, self.cooldown[knob] - 1)
+        last_change, self.last_change = self.last_change, None
+
+        if error_rate > 0 and self.concurrency > 1:
+            self._set('concurrency', max(1, self.concurrency // 2), 'down', f"失败率 {error_rate:.0%}")
+            self.cooldown['concurrency'] = COOLDOWN_WINDOWS
+        elif misaligned_rate > self.misalign_threshold and self.batch_size > 1:
+            self._set('batch_size', max(1, self.batch_size // 2), 'down', f"错位率 {misaligned_rate:.0%}")
+            self.cooldown['batch_size'] = COOLDOWN_WINDOWS
+        elif last_change and last_change[1] == 'up' and previous and throughput < previous * (1 + THROUGHPUT_TOLERANCE):
+            knob, _, old = last_change
+            if throughput < previous * (1 - THROUGHPUT_TOLERANCE):
+                self._set(knob, max(1, getattr(self, knob) // 2), 'down', "加大后吞吐下降")
+            else:
+                self._set(knob, old, 'down', "加大后吞吐没有提升")
+            self.cooldown[knob] = COOLDOWN_WINDOWS
+        else:
+            self._increase()
+
+        if self.store is not None:
+            self.store.save(self.key, self.batch_size, self.concurrency, throughput)
+
+    def _increase(self):
+        """轮流加大批量大小和并发数，跳过已到上限或冷却中的参数"""
+        knobs = ['batch_size', 'concurrency']
+        if self.next_knob == 'concurrency':
+            knobs.reverse()
+        limits = {'batch_size': (self.max_batch_size, BATCH_STEP), 'concurrency': (self.max_concurrency,
+                                                                                   CONCURRENCY_STEP)}
+        for knob in knobs:
+            limit, step = limits[knob]
+            if self.cooldown[knob] or getattr(self, knob) >= limit:
+                continue
+            self._set(knob, min(limit, getattr(self, knob) + step), 'up', "探测")
+            self.next_knob = 'concurrency' if knob == 'batch_size' else 'batch_size'
+            return
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                'backend': self.key,
+                'batch_size': self.batch_size,
+                'concurrency': self.concurrency,
+                'throughput': round(self.throughput, 2) if self.throughput is not None else None,
+                'misaligned_rate': self.last_misaligned_rate,
+                'error_rate': self.last_error_rate,
+                'increases': self.increases,
+                'decreases': self.decreases,
+                'history': list(self.history)
+            }
+
+
+class AutoTuneStore:
+    """学到的设置: {后端标识: {batch_size, concurrency, throughput, updated_at}}，保存为JSON文件"""
+
+    def __init__(self, path: str = DEFAULT_AUTOTUNE_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.data = {}
+        try:
+            if os.path.exists(path):
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.data = json.load(f)
+        except Exception as e:
+            logger.warning(f"读取自动调节设置失败，从配置的初始值开始: {e}")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            return self.data.get(key)
+
+    def save(self, key: str, batch_size: int, concurrency: int, throughput: float):
+        with self.lock:
+            self.data[key] = {
+                'batch_size': batch_size,
+                'concurrency': concurrency,
+                'throughput': round(throughput, 2),
+                'updated_at': time.strftime('%Y-%m-%d %H:%M:%S')
+            }
+            try:
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                temp_path = f"{self.path}.tmp"
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    json.dump(self.data, f, ensure_ascii=False, indent=2)
+                os.replace(temp_path, self.path)
+            except Exception as e:
+                logger.warning(f"保存自动调节设置失败: {e}")
+
+
+def backend_key(translator) -> str:
+    """后端标识: 翻译器类型、接口地址、模型和生成设置（思考模式、生成预算不同的档位分别调节）"""
+    endpoint = getattr(translator, 'base_url', None) or getattr(translator, 'chat_url', '') or ''
+    return f"{translator.translator_type}|{endpoint}|{translator.model}|{translator.generation_key()}"
+
+
+_tuners = {}
+_stores = {}
+_tuners_lock = threading.Lock()
+
+
+def get_autotuner(translator, config: Dict[str, Any]) -> Optional[AutoTuner]:
+    """按配置获取后端的调节器，未启用时返回None；同一后端的任务共用一个调节器"""
+    if not config.get('translation_autotune', False) or getattr(translator, 'in_process', False):
+        return None
+    from .batching import DEFAULT_BATCH_SIZE
+
+    key = backend_key(translator)
+    path = config.get('translation_autotune_path', DEFAULT_AUTOTUNE_PATH)
+    with _tuners_lock:
+        tuner = _tuners.get(key)
+        if tuner is None:
+            store = _stores.get(path)
+            if store is None:
+                store = _stores[path] = AutoTuneStore(path)
+            saved = store.get(key) or {}
+            tuner = _tuners[key] = AutoTuner(
+                key,
+                saved.get('batch_size', config.get('translation_batch_size', DEFAULT_BATCH_SIZE)),
+                saved.get('concurrency', translator.max_concurrency),
+                max_batch_size=config.get('translation_autotune_max_batch_size', DEFAULT_MAX_BATCH_SIZE),
+                max_concurrency=config.get('translation_autotune_max_concurrency', DEFAULT_MAX_CONCURRENCY),
+                window=config.get('translation_autotune_window', DEFAULT_AUTOTUNE_WINDOW),
+                misalign_threshold=config.get('translation_autotune_misalign_threshold',
+                                              DEFAULT_MISALIGN_THRESHOLD),
+                store=store
+            )
+            source = "上次学到的设置" if saved else "配置"
+            logger.info(f"自动调节 {key}: 批量 {tuner.batch_size}，并发 {tuner.concurrency}（来自{source}）")
+        return tuner
+
+
+def get_autotune_stats() -> List[Dict[str, Any]]:
+    """所有后端当前的批量大小、并发数、吞吐与调节记录"""
+    with _tuners_lock:
+        tuners = list(_tuners.values())
+    return [tuner.get_stats() for tuner in tuners]
@@ -0,0 +1,143 @@
+"""
+批量翻译
+把连续K条字幕以稳定编号打包进一次请求，要求模型返回同样编号的JSON对象，
+解析后按编号对回各行；缺失或错位的行保留原编号重新请求，多次失败后逐条翻译兜底。
+"""
+
+import json
+import os
+import re
+import sys
+from typing import Dict, List, Optional
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+from utils.logger import get_cached_logger
+
+from .context import with_context
+from .streaming import RequestCancelled
+
+logger = get_cached_logger("批量翻译")
+
+DEFAULT_BATCH_SIZE = 10
+# 缺失/错位行重新请求的次数，之后改为逐条翻译
+DEFAULT_BATCH_RETRIES = 1
+
+BATCH_INSTRUCTION = (
+    "本次输入是一个JSON对象，键为字幕编号，值为字幕原文。"
+    "逐条翻译每个值，保持编号不变，不要合并、拆分或遗漏条目。"
+    "只输出一个代码块，内容为键相同的JSON对象，例如：\n"
+    "```json\n{\"1\": \"译文\", \"2\": \"译文\"}\n```"
+)
+
+_THINK_PATTERN = re.compile(r'<think>.*?</think>', flags=re.DOTALL)
+_CODE_BLOCK_PATTERN = re.compile(r'```(?:json|text)?\s*(.*?)```', flags=re.DOTALL)
+_NUMBERED_LINE_PATTERN = re.compile(r'^\s*\[?(\d+)\]?\s*[.:：、)）]\s*(.+?)\s*$')
+
+
+def build_batch_messages(system_prompt: str, items: Dict[int, str],
+                         context: Optional[List[str]] = None) -> List[Dict[str, str]]:
+    """
+    构造批量翻译请求消息，context为本批之前的原文
+
+    系统提示词与逐条翻译完全相同，批量说明放在用户消息开头，
+    逐条与批量请求共用同一个提示词前缀（Ollama 前缀缓存可以命中）。
+    """
+    payload = {str(line_id): text for line_id, text in items.items()}
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": with_context(json.dumps(payload, ensure_ascii=False), context,
+                                                 BATCH_INSTRUCTION)}
+    ]
+
+
+def _parse_json_object(text: str) -> Optional[dict]:
+    try:
+        data = json.loads(text)
+        return data if isinstance(data, dict) else None
+    except ValueError:
+        pass
+    start, end = text.find('{'), text.rfind('}')
+    if 0 <= start < end:
+        try:
+            data = json.loads(text[start:end + 1])
+            return data if isinstance(data, dict) else None
+        except ValueError:
+            return None
+    return None
+
+
+def parse_batch_response(response: str, ids) -> Dict[int, str]:
+    """
+    解析批量翻译回复，返回 {编号: 译文}，只包含可信的行
+
+    优先解析JSON对象，失败时按 "编号. 译文" 的编号行解析。
+    某个编号缺失时，模型很可能把后续译文错位到了前一个编号上，
+    因此第一个缺失编号之后的行一并视为不可信，需要重新请求。
+    """
+    response = _THINK_PATTERN.sub('', response)
+    blocks = _CODE_BLOCK_PATTERN.findall(response)
+    body = blocks[0].strip() if blocks else response.strip()
+
+    parsed = {}
+    data = _parse_json_object(body)
+    if data is not None:
+        for key, value in data.items():
+            try:
+                parsed[int(key)] = str(value).strip()
+            except (TypeError, ValueError):
+                continue
+    else:
+        for line in body.split('\n'):
+            match = _NUMBERED_LINE_PATTERN.match(line)
+            if match:
+                parsed[int(match.group(1))] = match.group(2).strip()
+
+    results = {}
+    for line_id in sorted(ids):
+        text = parsed.get(line_id, '')
+        if not text:
+            break
+        results[line_id] = text
+    return results
+
+
+def translate_batch(translator, texts: List[str], max_retries: int = DEFAULT_BATCH_RETRIES,
+                    context: Optional[List[str]] = None, outcome: Optional[Dict[str, int]] = None) -> List[str]:
+    """
+    一次请求翻译多条文本，返回与输入等长的译文列表
+
+    Args:
+        translator: 实现了 chat() / translate_text() / system_prompt 的翻译器
+        texts: 原文列表
+        max_retries: 缺失/错位行的重新请求次数
+        context: 本批之前的原文（只作语境参考）
+        outcome: 传入时写入 misaligned（第一次回复中缺失或错位的条数）
+    """
+    pending = {i + 1: text for i, text in enumerate(texts)}
+    results = {}
+
+    for attempt in range(max_retries + 1):
+        if not pending:
+            break
+        try:
+            content = translator.chat(build_batch_messages(translator.system_prompt, pending, context))
+            parsed = parse_batch_response(content, pending.keys())
+        except RequestCancelled:
+            raise
+        except Exception as e:
+            logger.warning(f"批量翻译请求失败: {e}")
+            parsed = {}
+
+        results.update(parsed)
+        pending = {line_id: text for line_id, text in pending.items() if line_id not in parsed}
+        if attempt == 0 and outcome is not None:
+            outcome['misaligned'] = len(pending)
+        if pending and attempt < max_retries:
+            logger.info(f"批量翻译有 {len(pending)} 条缺失或错位，重新请求: {sorted(pending)}")
+
+    if pending:
+        logger.warning(f"批量翻译仍有 {len(pending)} 条未对齐，改为逐条翻译")
+        for line_id, text in pending.items():
+            results[line_id] = translator.translate_text(text, context)
+
+    return [results[i + 1] for i in range(len(texts))]
@@ -0,0 +1,1080 @@
+"""
+翻译流程基准测试，不需要真实的LLM服务
+
+batch: 用进程内模拟翻译器比较不同批量大小K的请求数与总耗时。
+       模拟翻译器每次请求耗时 = 固定开销(overhead) + 条数 × 每条生成耗时(per_line)，
+       并可按比例丢弃批量回复中的条目，以覆盖缺失行重新请求的路径。
+concurrency: 启动本地桩服务（stub_server），用真实的 OpenAITranslator 走HTTP，
+       比较不同并发数N下的吞吐。
+thinking: 桩服务模拟思考模型，用真实的 OllamaTranslator 比较思考模式开/关的吞吐，
+       以及生成token与最终保留为译文的token数。
+resume: 在子进程中翻译并在第N个请求时强制结束进程（模拟翻译中途被杀），
+       再从检查点日志恢复翻译，验证已写入检查点的行没有被重新请求。
+sentences: 把示例句子切成1~3条带时间轴的字幕（模拟Whisper把一句话切开），比较逐条翻译与
+       合并为整句翻译的请求数与总耗时。
+context: 统计每个请求的提示词token数: 旧版回放最近10轮对话（含代码块）与按token预算截取的前文上下文对比。
+hedge: 桩服务按比例让部分请求耗时变为数倍（长尾），比较对冲请求开/关时每条字幕完成耗时的p50/p99。
+ollama: 桩服务模拟Ollama的模型加载耗时和提示词前缀缓存，比较不预热/在Whisper收尾时预热的
+       第一条字幕首token耗时，以及旧版对话回放与固定系统提示词前缀时每个请求需要预填充的token数。
+shared: 一个长任务与多个短任务同时翻译（单个后端、并发1），比较各任务各自分批与跨任务调度共享请求的
+       请求数、每请求条数、总耗时和各任务完成耗时。
+autotune: 桩服务模拟本地Ollama（一次只处理一个请求、批量超过16条时丢条目）和远程网关（可并行6个请求），
+       连续翻译多个任务，比较固定批量/并发与自动调节的吞吐，以及调节器最终学到的设置。
+ratelimit: 桩服务按每秒请求数限额返回429，多个任务同时翻译，比较不限流与按限额配置 openai_rpm 时的
+       429次数、翻译失败条数和总耗时。
+retry: 模拟翻译器按比例让请求出错（翻译器返回原文），比较不重试、集中重试、改用备用后端重试时
+       失败/恢复/仍为原文的条数与总耗时。
+deferred: 多个任务的字幕写入一个JSONL批处理文件提交到桩服务的 /v1/batches，比较逐任务同步翻译与
+       延后批量翻译的对话请求数、批处理请求数和耗时，并验证结果合并进译文字幕后同步补齐时只请求批处理中失败的行。
+replay: 桩服务模拟真实服务（对数正态分布的耗时、按比例返回500、<think>标签输出）时，用真实的
+       translate_srt_with_callback 经录制服务翻译一次并录制响应，再停掉上游、从录音文件回放两次（按录制耗时）
+       和一次（不等待），验证回放的请求全部命中、译文与录制时逐字节相同。
+local: 用本地离线翻译模型（需要 transformers、torch 和模型文件）比较不同每批条数、按长度分批开/关的
+       吞吐与填充token比例。
+
+用法:
+    python -m src.services.tran_modules.benchmark batch --lines 200 --batch-sizes 1,5,10,20
+    python -m src.services.tran_modules.benchmark concurrency --lines 200 --concurrency 1,2,4,8,16
+    python -m src.services.tran_modules.benchmark thinking --lines 100 --think-tokens 300
+    python -m src.services.tran_modules.benchmark resume --lines 200 --kill-after 7
+    python -m src.services.tran_modules.benchmark sentences --lines 300 --batch-sizes 1,10
+    python -m src.services.tran_modules.benchmark context --lines 200 --context-tokens 128
+    python -m src.services.tran_modules.benchmark hedge --lines 300 --tail-rate 0.05 --tail-factor 10
+    python -m src.services.tran_modules.benchmark ollama --lines 100 --load-time 2 --prefill-per-token 0.001
+    python -m src.services.tran_modules.benchmark shared --lines 100 --short-tasks 16 --short-lines 3
+    python -m src.services.tran_modules.benchmark autotune --lines 200 --tasks 4
+    python -m src.services.tran_modules.benchmark ratelimit --lines 100 --tasks 4 --rate-limit 5
+    python -m src.services.tran_modules.benchmark retry --lines 300 --error-rate 0.5
+    python -m src.services.tran_modules.benchmark deferred --lines 300 --tasks 3 --batch-error-rate 0.1
+    python -m src.services.tran_modules.benchmark replay --lines 200 --error-rate 0.05 --latency-jitter 0.5
+    python -m src.services.tran_modules.benchmark local --lines 500 --batch-sizes 1,8,32 --threads 4
+"""
+
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from src.services.tran import (BaseTranslator, OpenAITranslator, OllamaTranslator, load_prompt, parse_srt_file,
+                              translate_srt_with_callback)
+from src.services.tran_modules.autotune import AutoTuner, AutoTuneStore, backend_key
+from src.services.tran_modules.context import strip_context
+from src.services.tran_modules.deferred import DeferredBatchQueue
+from src.services.tran_modules.engine import TranslationEngine
+from src.services.tran_modules.hedging import HedgePolicy
+from src.services.tran_modules.journal import TranslationJournal, read_journal
+from src.services.tran_modules.scheduler import TranslationScheduler
+from src.services.tran_modules.sentences import parse_timestamp, regroup, ungroup
+from src.services.tran_modules.tokens import get_token_counter
+from src.services.tran_modules.metrics import get_translation_metrics, _summary
+from src.services.tran_modules.ratelimit import get_rate_limiter
+from src.services.tran_modules.stub_server import StubLLMServer, mock_reply
+
+SAMPLE_SENTENCES = [
+    "Welcome back to the channel, today we are going to talk about something different.",
+    "I never thought it would take this long to get here.",
+    "Can you hand me that wrench over there?",
+    "The results were not what we expected at all.",
+    "Let's take a closer look at how this works.",
+    "If you enjoyed this video, please consider subscribing.",
+    "We need to leave before the storm gets worse.",
+    "That's the most important part, so remember it.",
+    "Honestly, I have no idea what happened next.",
+    "Thanks for watching, and I'll see you next time."
+]
+
+
+class MockTranslator(BaseTranslator):
+    """本地模拟翻译器，译文为 "译文:" + 原文；error_rate > 0 时按该比例让请求出错"""
+
+    def __init__(self, overhead=0.1, per_line=0.02, drop_rate=0.0, seed=0, kill_after=0, error_rate=0.0):
+        super().__init__()
+        self.overhead = overhead
+        self.per_line = per_line
+        self.drop_rate = drop_rate
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.kill_after = kill_after
+        self.requests = 0
+        self.requested = []
+        self.messages = []
+        self.lock = threading.Lock()
+
+    def chat(self, messages):
+        with self.lock:
+            self.requests += 1
+            if self.kill_after and self.requests > self.kill_after:
+                # 模拟进程在翻译途中被强制结束
+                os._exit(137)
+            self.requested.append(messages[-1]['content'])
+            self.messages.append(messages)
+            failed = self.error_rate > 0 and self.random.random() < self.error_rate
+
+        reply, lines = mock_reply(messages[-1]['content'])
+        time.sleep(self.overhead + self.per_line * lines)
+        if failed:
+            raise Exception("模拟后端返回 503")
+        if lines > 1 and self.drop_rate > 0:
+            block = reply[len("```json\n"):-len("\n```")]
+            output = {key: text for key, text in json.loads(block).items()
+                      if self.random.random() >= self.drop_rate}
+            reply = f"```json\n{json.dumps(output, ensure_ascii=False)}\n```"
+        return reply
+
+
+def make_lines(count):
+    """生成测试字幕文本"""
+    return [f"{SAMPLE_SENTENCES[i % len(SAMPLE_SENTENCES)]} ({i})" for i in range(count)]
+
+
+def count_aligned(lines, translations):
+    return sum(1 for src, dst in zip(lines, translations) if dst == f"译文:{src}")
+
+
+def run_batch_benchmark(lines, batch_size, overhead, per_line, drop_rate):
+    """以批量大小batch_size顺序翻译全部文本，返回统计"""
+    translator = MockTranslator(overhead, per_line, drop_rate)
+    engine = TranslationEngine(translator, batch_size=batch_size, concurrency=1)
+    start_time = time.time()
+    translations = engine.translate(lines)
+    elapsed = time.time() - start_time
+
+    return {
+        'batch_size': batch_size,
+        'requests': translator.requests,
+        'elapsed': round(elapsed, 3),
+        'lines_per_second': round(len(lines) / elapsed, 2) if elapsed else 0,
+        'aligned': count_aligned(lines, translations),
+        'lines': len(lines)
+    }
+
+
+def run_concurrency_benchmark(lines, concurrency, batch_size, server):
+    """通过桩服务以并发数concurrency翻译全部文本，返回统计"""
+    translator = OpenAITranslator({
+        'openai_base_url': f"{server.url}/v1",
+        'openai_api_key': 'stub',
+        'openai_model': 'stub'
+    })
+    engine = TranslationEngine(translator, batch_size=batch_size, concurrency=concurrency)
+    requests_before = server.requests
+    start_time = time.time()
+    translations = engine.translate(lines)
+    elapsed = time.time() - start_time
+
+    return {
+        'concurrency': concurrency,
+        'requests': server.requests - requests_before,
+        'elapsed': round(elapsed, 3),
+        'lines_per_second': round(len(lines) / elapsed, 2) if elapsed else 0,
+        'aligned': count_aligned(lines, translations),
+        'lines': len(lines)
+    }
+
+
+def run_thinking_benchmark(lines, thinking, batch_size, concurrency, server):
+    """通过桩服务以思考模式开/关翻译全部文本，返回统计"""
+    translator = OllamaTranslator({
+        'ollama_api': server.url,
+        'ollama_model': 'stub:latest',
+        'ollama_concurrency': concurrency,
+        'translation_thinking': thinking
+    })
+    engine = TranslationEngine(translator, batch_size=batch_size)
+    before = get_translation_metrics().get_metrics()['backends'].get('ollama', {})
+    requests_before = server.requests
+    start_time = time.time()
+    translations = engine.translate(lines)
+    elapsed = time.time() - start_time
+    after = get_translation_metrics().get_metrics()['backends']['ollama']
+
+    generated = after['generated_tokens'] - before.get('generated_tokens', 0)
+    kept = after['kept_tokens'] - before.get('kept_tokens', 0)
+    return {
+        'thinking': 'on' if thinking else 'off',
+        'requests': server.requests - requests_before,
+        'elapsed': round(elapsed, 3),
+        'lines_per_second': round(len(lines) / elapsed, 2) if elapsed else 0,
+        'aligned': count_aligned(lines, translations),
+        'lines': len(lines),
+        'generated_tokens': generated,
+        'kept_tokens': kept
+    }
+
+
+def make_segments(count, seed=0):
+    """生成count条字幕: 示例句子按词切成1~3段，同一句内停顿短、句与句之间停顿长，返回 (文本列表, 时间轴列表)"""
+    rng = random.Random(seed)
+    texts = []
+    timings = []
+    clock = 0.0
+    sentence = 0
+    while len(texts) < count:
+        words = f"{SAMPLE_SENTENCES[sentence % len(SAMPLE_SENTENCES)][:-1]} ({sentence}).".split()
+        sentence += 1
+        parts = min(rng.choice([1, 2, 2, 3]), len(words))
+        cuts = sorted(rng.sample(range(1, len(words)), parts - 1)) if parts > 1 else []
+        for start, end in zip([0] + cuts, cuts + [len(words)]):
+            text = " ".join(words[start:end])
+            duration = 0.3 * (end - start)
+            timings.append((clock, clock + duration))
+            texts.append(text)
+            clock += duration + rng.uniform(0.05, 0.4)
+        clock += rng.uniform(0.5, 2.0)
+    return texts[:count], timings[:count]
+
+
+def run_sentence_benchmark(texts, timings, merge, batch_size, overhead, per_line):
+    """逐条或合并为整句翻译全部字幕，返回统计"""
+    translator = MockTranslator(overhead, per_line)
+    engine = TranslationEngine(translator, batch_size=batch_size, concurrency=1)
+    start_time = time.time()
+    groups, units = regroup(texts, timings, {'translation_sentence_merge': merge})
+    translations = ungroup(groups, texts, engine.translate(units))
+    elapsed = time.time() - start_time
+
+    return {
+        'mode': f"{'整句' if merge else '逐条'}K{batch_size}",
+        'units': len(units),
+        'requests': translator.requests,
+        'elapsed': round(elapsed, 3),
+        'lines_per_second': round(len(texts) / elapsed, 2) if elapsed else 0,
+        # 每条字幕都分到了非空译文
+        'aligned': sum(1 for translated in translations if translated.strip()),
+        'lines': len(texts)
+    }
+
+
+# 旧版翻译器每条请求回放的对话轮数
+LEGACY_HISTORY_TURNS = 10
+
+
+def legacy_prompts(lines):
+    """旧版翻译器的请求: 系统提示词 + 最近10轮 (原文, 带代码块的回复) + 当前原文"""
+    system = {"role": "system", "content": load_prompt()}
+    history = []
+    prompts = []
+    for text in lines:
+        prompts.append([system] + history + [{"role": "user", "content": text}])
+        history += [{"role": "user", "content": text},
+                    {"role": "assistant", "content": f"```\n译文:{text}\n```"}]
+        history = history[-LEGACY_HISTORY_TURNS * 2:]
+    return prompts
+
+
+def prompt_summary(label, prompts, lines, counter):
+    counts = sorted(counter.count_messages(messages) for messages in prompts)
+    return {
+        'mode': label,
+        'requests': len(counts),
+        'mean': round(sum(counts) / len(counts), 1) if counts else 0,
+        'p50': counts[len(counts) // 2] if counts else 0,
+        'max': counts[-1] if counts else 0,
+        'per_line': round(sum(counts) / lines, 1) if lines else 0
+    }
+
+
+def run_context_benchmark(lines, batch_size, context_lines, context_tokens, tokenizer):
+    """统计旧版对话回放与按token预算截取上下文时每个请求的提示词token数"""
+    counter = get_token_counter({'translation_tokenizer': tokenizer})
+    results = [prompt_summary("旧版10轮对话", legacy_prompts(lines), len(lines), counter)]
+    for with_translations in (False, True):
+        translator = MockTranslator(overhead=0, per_line=0)
+        engine = TranslationEngine(translator, batch_size=batch_size, concurrency=1, context_lines=context_lines,
+                                   context_tokens=context_tokens, token_counter=counter,
+                                   context_translations=with_translations)
+        engine.translate(lines)
+        label = "预算上下文+译文" if with_translations else "预算上下文"
+        results.append(prompt_summary(label, translator.messages, len(lines), counter))
+    return results, counter.exact
+
+
+def run_hedge_benchmark(lines, hedging, batch_size, concurrency, fraction, server):
+    """通过桩服务以对冲请求开/关翻译全部文本，返回每条字幕完成耗时的分位数"""
+    translator = OllamaTranslator({
+        'ollama_api': server.url,
+        'ollama_model': 'stub:latest',
+        'ollama_concurrency': concurrency
+    })
+    policy = HedgePolicy(fraction) if hedging else None
+    engine = TranslationEngine(translator, batch_size=batch_size, hedge_policy=policy)
+    metrics = get_translation_metrics()
+    with metrics.lock:
+        metrics.line_latency.clear()
+    requests_before = server.requests
+    start_time = time.time()
+    translations = engine.translate(lines)
+    elapsed = time.time() - start_time
+    with metrics.lock:
+        latency = _summary(metrics.line_latency)
+
+    stats = engine.get_stats()
+    return {
+        'hedging': 'on' if hedging else 'off',
+        'requests': server.requests - requests_before,
+        'elapsed': round(elapsed, 3),
+        'lines_per_second': round(len(lines) / elapsed, 2) if elapsed else 0,
+        'aligned': count_aligned(lines, translations),
+        'lines': len(lines),
+        'p50_ms': latency['p50_ms'],
+        'p99_ms': latency['p99_ms'],
+        'hedged': stats['hedged'],
+        'hedge_wins': stats['hedge_wins']
+    }
+
+
+def run_first_line_benchmark(lines, prewarm, whisper_tail, server):
+    """
+    模型未加载时开始翻译，返回第一条字幕的首token耗时
+
+    prewarm 为True时在Whisper收尾（whisper_tail秒）的同时预热模型，否则等Whisper结束后直接翻译。
+    """
+    with server.lock:
+        server.loaded = False
+        server.last_prompt = ''
+    translator = OllamaTranslator({'ollama_api': server.url, 'ollama_model': 'stub:latest'})
+    engine = TranslationEngine(translator, batch_size=1, concurrency=1)
+    metrics = get_translation_metrics()
+    with metrics.lock:
+        metrics.backends.pop('ollama', None)
+
+    start_time = time.time()
+    thread = threading.Thread(target=translator.prewarm, daemon=True) if prewarm else None
+    if thread:
+        thread.start()
+    time.sleep(whisper_tail)
+    translation_start = time.time()
+    translations = engine.translate(lines)
+    elapsed = time.time() - translation_start
+    if thread:
+        thread.join()
+    backend = metrics.get_metrics()['backends']['ollama']
+
+    return {
+        'prewarm': 'on' if prewarm else 'off',
+        'first_line_ms': backend['first_line_first_token']['p50_ms'],
+        'elapsed': round(elapsed, 3),
+        'total': round(time.time() - start_time, 3),
+        'aligned': count_aligned(lines, translations),
+        'lines': len(lines)
+    }
+
+
+def run_prefill_benchmark(lines, server):
+    """模型已加载时比较旧版对话回放与固定系统提示词前缀的预填充token数和耗时（非流式请求才有服务端耗时）"""
+    translator = OllamaTranslator({'ollama_api': server.url, 'ollama_model': 'stub:latest',
+                                   'translation_streaming': False})
+    metrics = get_translation_metrics()
+    results = []
+    for label in ("旧版10轮对话", "固定前缀"):
+        with server.lock:
+            server.last_prompt = ''
+        with metrics.lock:
+            metrics.backends.pop('ollama', None)
+        start_time = time.time()
+        if label == "固定前缀":
+            TranslationEngine(translator, batch_size=1, concurrency=1).translate(lines)
+        else:
+            for messages in legacy_prompts(lines):
+                translator.chat(messages)
+        elapsed = time.time() - start_time
+        with metrics.lock:
+            backend = metrics.backends['ollama']
+            tokens = list(backend.prefill_tokens)
+            prefill = list(backend.prefill)
+        results.append({
+            'mode': label,
+            'requests': len(tokens),
+            'elapsed': round(elapsed, 3),
+            'prefill_tokens_mean': round(sum(tokens) / len(tokens), 1) if tokens else 0,
+            'prefill_ms_mean': round(sum(prefill) / len(prefill) * 1000, 1) if prefill else 0
+        })
+    return results
+
+
+def run_local_benchmark(lines, batch_size, sort_by_length, model, threads):
+    """用本地离线翻译模型翻译全部文本，返回统计"""
+    from src.services.tran_modules.local_mt import LocalMTTranslator, length_buckets, padding_ratio
+
+    translator = LocalMTTranslator({'local_mt_model': model, 'local_mt_threads': threads,
+                                    'local_mt_batch_size': batch_size})
+    translator.sort_by_length = sort_by_length
+    tokenizer = translator._model().tokenizer
+    engine = TranslationEngine(translator, batch_size=translator.unit_size, context_lines=0)
+    metrics = get_translation_metrics()
+    requests_before = metrics.get_metrics()['backends'].get('local', {}).get('requests', 0)
+    start_time = time.time()
+    translations = engine.translate(lines)
+    elapsed = time.time() - start_time
+
+    # 与引擎相同地按翻译单元切分，统计各单元内分批后的填充比例
+    lengths = [len(tokenizer.tokenize(text)) for text in lines]
+    units = [lengths[start:start + translator.unit_size] for start in range(0, len(lengths), translator.unit_size)]
+    padded = sum(padding_ratio(unit, length_buckets(unit, batch_size, sort_by_length)) * len(unit)
+                 for unit in units) / len(lines)
+    return {
+        'mode': f"{'排序' if sort_by_length else '原序'}B{batch_size}",
+        'requests': metrics.get_metrics()['backends']['local']['requests'] - requests_before,
+        'elapsed': round(elapsed, 3),
+        'lines_per_second': round(len(lines) / elapsed, 2) if elapsed else 0,
+        # 译文与原文不同即视为已翻译
+        'aligned': sum(1 for src, dst in zip(lines, translations) if dst and dst != src),
+        'lines': len(lines),
+        'padding_ratio': round(padded, 4)
+    }
+
+
+def run_shared_benchmark(long_lines, short_tasks, short_lines, shared, batch_size, batch_tokens, server):
+    """一个长任务和 short_tasks 个短任务同时翻译，返回总体统计与各任务完成耗时"""
+    tasks = [[f"{text} [long]" for text in make_lines(long_lines)]]
+    tasks += [[f"{text} [short {k}]" for text in make_lines(short_lines)] for k in range(short_tasks)]
+    config = {'ollama_api': server.url, 'ollama_model': 'stub:latest', 'ollama_concurrency': 1}
+    scheduler = None
+    if shared:
+        scheduler = TranslationScheduler(OllamaTranslator(config), batch_size, batch_tokens, get_token_counter())
+
+    finished = [0.0] * len(tasks)
+    aligned = [0] * len(tasks)
+    requests_before = server.requests
+    start_time = time.time()
+
+    def run(k):
+        # 每个任务各自创建翻译器与引擎，与实际任务相同
+        engine = TranslationEngine(OllamaTranslator(config), batch_size=batch_size, scheduler=scheduler)
+        translations = engine.translate(tasks[k])
+        finished[k] = time.time() - start_time
+        aligned[k] = count_aligned(tasks[k], translations)
+
+    threads = [threading.Thread(target=run, args=(k,)) for k in range(len(tasks))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.time() - start_time
+
+    lines = sum(len(texts) for texts in tasks)
+    requests = server.requests - requests_before
+    short = sorted(finished[1:])
+    return {
+        'mode': '共享' if shared else '各自',
+        'requests': requests,
+        'elapsed': round(elapsed, 3),
+        'lines_per_second': round(lines / elapsed, 2) if elapsed else 0,
+        'aligned': sum(aligned),
+        'lines': lines,
+        'lines_per_request': round(lines / requests, 2) if requests else 0,
+        'long_finished': round(finished[0], 3),
+        'short_p50': round(short[len(short) // 2], 3) if short else 0,
+        'short_max': round(short[-1], 3) if short else 0
+    }
+
+
+# 自动调节基准测试的两种后端: (桩服务参数, 翻译器类型, 初始并发数)
+AUTOTUNE_PROFILES = {
+    'local': ({'latency': 0.3, 'per_line': 0.03, 'slots': 1, 'max_batch': 16}, 'ollama', 1),
+    'gateway': ({'latency': 0.6, 'per_line': 0.02, 'slots': 6, 'max_batch': 30}, 'openai', 4)
+}
+
+
+def run_autotune_benchmark(lines, tasks, profile, autotune, batch_size, store_path):
+    """按 profile 启动桩服务，连续翻译 tasks 个任务，返回统计（自动调节时调节器设置保存到 store_path）"""
+    server_options, translator_type, concurrency = AUTOTUNE_PROFILES[profile]
+    server = StubLLMServer(**server_options).start()
+    try:
+        if translator_type == 'ollama':
+            translator = OllamaTranslator({'ollama_api': server.url, 'ollama_model': 'stub:latest',
+                                           'ollama_concurrency': concurrency})
+        else:
+            translator = OpenAITranslator({'openai_base_url': f"{server.url}/v1", 'openai_api_key': 'stub',
+                                           'openai_model': 'stub', 'openai_concurrency': concurrency})
+        tuner = None
+        if autotune:
+            tuner = AutoTuner(backend_key(translator), batch_size, concurrency, window=6,
+                              store=AutoTuneStore(store_path))
+        requests_before = server.requests
+        start_time = time.time()
+        aligned = 0
+        last_elapsed = 0
+        for k in range(tasks):
+            task_lines = [f"{text} [task {k}]" for text in lines]
+            engine = TranslationEngine(translator, batch_size=batch_size, autotuner=tuner)
+            task_start = time.time()
+            aligned += count_aligned(task_lines, engine.translate(task_lines))
+            last_elapsed = time.time() - task_start
+        elapsed = time.time() - start_time
+    finally:
+        server.stop()
+
+    settings = tuner.settings()[:2] if tuner else (batch_size, concurrency)
+    return {
+        'mode': f"{profile}-{'自动' if autotune else '固定'}",
+        'requests': server.requests - requests_before,
+        'elapsed': round(elapsed, 3),
+        'lines_per_second': round(len(lines) * tasks / elapsed, 2) if elapsed else 0,
+        'aligned': aligned,
+        'lines': len(lines) * tasks,
+        'last_task_lines_per_second': round(len(lines) / last_elapsed, 2) if last_elapsed else 0,
+        'batch_size': settings[0],
+        'concurrency': settings[1]
+    }
+
+
+def run_ratelimit_benchmark(lines, tasks, limited, rate_limit, batch_size, concurrency):
+    """tasks 个任务同时翻译，桩服务每秒最多接受 rate_limit 个请求；limited 时按该限额配置 openai_rpm"""
+    server = StubLLMServer(latency=0.2, per_line=0.01, slots=tasks * concurrency, rate_limit=rate_limit).start()
+    config = {'openai_base_url': f"{server.url}/v1", 'openai_api_key': 'stub', 'openai_model': 'stub',
+              'openai_concurrency': concurrency, 'openai_rpm': rate_limit * 60 if limited else 0}
+    results = [None] * tasks
+
+    def run(k):
+        # 每个任务各自创建翻译器（与实际任务相同），限流器按接口地址共用
+        engine = TranslationEngine(OpenAITranslator(config), batch_size=batch_size, retry_rounds=0)
+        task_lines = [f"{text} [task {k}]" for text in lines]
+        translations = engine.translate(task_lines)
+        results[k] = (count_aligned(task_lines, translations), engine.get_stats()['failed'])
+
+    start_time = time.time()
+    try:
+        threads = [threading.Thread(target=run, args=(k,)) for k in range(tasks)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.time() - start_time
+    finally:
+        server.stop()
+
+    limiter = get_rate_limiter(f"{server.url}/v1/chat/completions|stub", config['openai_rpm'], 0)
+    return {
+        'mode': '限流' if limited else '不限流',
+        'requests': server.requests,
+        'elapsed': round(elapsed, 3),
+        'lines_per_second': round(len(lines) * tasks / elapsed, 2) if elapsed else 0,
+        'aligned': sum(r[0] for r in results),
+        'lines': len(lines) * tasks,
+        'throttled': server.throttled,
+        'failed': sum(r[1] for r in results),
+        'limiter': limiter.get_stats() if limiter else None
+    }
+
+
+RETRY_MODES = {'none': '不重试', 'retry': '集中重试', 'backup': '备用后端重试'}
+
+
+def run_retry_benchmark(lines, mode, error_rate, batch_size, concurrency, backoff):
+    """mode: none 不重试 / retry 集中重试 / backup 改用不出错的备用后端重试"""
+    translator = MockTranslator(overhead=0.05, per_line=0.005, error_rate=error_rate)
+    backup = MockTranslator(overhead=0.05, per_line=0.005, seed=1) if mode == 'backup' else None
+    engine = TranslationEngine(translator, batch_size=batch_size, concurrency=concurrency,
+                               retry_rounds=0 if mode == 'none' else 2, retry_backoff=backoff,
+                               retry_translator=backup)
+    start_time = time.time()
+    translations = engine.translate(lines)
+    elapsed = time.time() - start_time
+    stats = engine.get_stats()
+    return {
+        'mode': mode,
+        'requests': translator.requests + (backup.requests if backup else 0),
+        'elapsed': round(elapsed, 3),
+        'lines_per_second': round(len(lines) / elapsed, 2) if elapsed else 0,
+        'aligned': count_aligned(lines, translations),
+        'lines': len(lines),
+        'failed': stats['failed'],
+        'retried': stats['retried'],
+        'recovered': stats['recovered'],
+        'untranslated': stats['untranslated'],
+        'failure_rate': stats['failure_rate']
+    }
+
+
+def write_task_srt(path, texts):
+    """写出测试字幕，相邻两条间隔2秒（不合并为整句）"""
+    with open(path, 'w', encoding='utf-8') as f:
+        for i, text in enumerate(texts):
+            f.write(f"{i + 1}\n00:{i * 3 // 60:02d}:{i * 3 % 60:02d},000 --> 00:{i * 3 // 60:02d}:{i * 3 % 60:02d},900\n"
+                    f"{text}\n\n")
+
+
+def translate_task_srt(config, raw_srt, journal_file=None):
+    """与 translate_srt_with_callback 相同的流程翻译一个任务（传入检查点时跳过已有的行），返回 (译文, 统计)"""
+    subtitles = parse_srt_file(raw_srt)
+    texts = [text for _, _, text in subtitles]
+    groups, units = regroup(texts, [parse_timestamp(timestamp) for _, timestamp, _ in subtitles], config)
+    engine = TranslationEngine.from_config(OpenAITranslator(config), config)
+    journal = TranslationJournal(journal_file, units) if journal_file else None
+    try:
+        translated_units = engine.translate(units, journal=journal)
+    finally:
+        if journal is not None:
+            journal.close()
+    return ungroup(groups, texts, translated_units), engine.get_stats()
+
+
+def run_deferred_benchmark(lines, tasks, deferred, batch_size, batch_time, batch_error_rate):
+    """tasks 个任务各 lines 条字幕: 逐任务同步翻译，或提交一个批处理后合并结果、同步补齐缺失的行"""
+    server = StubLLMServer(latency=0.2, per_line=0.01, slots=4, batch_time=batch_time,
+                           batch_error_rate=batch_error_rate).start()
+    work_dir = tempfile.mkdtemp(prefix="tranpy-deferred-")
+    config = {'openai_base_url': f"{server.url}/v1", 'openai_api_key': 'stub', 'openai_model': 'stub',
+              'translation_batch_size': batch_size, 'translation_memory_enabled': False,
+              'translation_retry_backoff': 0, 'translation_mode': 'deferred'}
+    task_texts = {f"task{k}": [f"{text} [task {k}]" for text in lines] for k in range(tasks)}
+    entries = {}
+    for task_id, texts in task_texts.items():
+        entries[task_id] = {name: os.path.join(work_dir, f"{task_id}_{name}") for name in
+                            ('raw.srt', 'translation.journal')}
+        write_task_srt(entries[task_id]['raw.srt'], texts)
+
+    ready = {}
+    batch_stats = {}
+    start_time = time.time()
+    try:
+        if deferred:
+            queue = DeferredBatchQueue(os.path.join(work_dir, "translation_deferred.json"), collect_seconds=0.2,
+                                       poll_interval=0.2, config_loader=lambda profile: config,
+                                       on_ready=lambda task_id, stats, message: ready.update({task_id: stats}))
+            for task_id, paths in entries.items():
+                queue.enqueue(task_id, paths['raw.srt'], paths['translation.journal'])
+            while len(ready) < tasks:
+                time.sleep(0.05)
+            waited = time.time() - start_time
+            batch_stats = queue.get_stats()
+            merged = {task_id: read_journal(paths['translation.journal'])['items'] for task_id, paths in entries.items()}
+            merged_aligned = sum(count_aligned(task_texts[t], [merged[t].get(i, text) for i, text in
+                                                               enumerate(task_texts[t])]) for t in merged)
+        chat_before = server.requests
+        aligned = 0
+        failed = 0
+        for task_id, paths in entries.items():
+            translations, stats = translate_task_srt(config, paths['raw.srt'],
+                                                     paths['translation.journal'] if deferred else None)
+            aligned += count_aligned(task_texts[task_id], translations)
+            failed += stats['untranslated']
+        elapsed = time.time() - start_time
+    finally:
+        server.stop()
+
+    result = {
+        'mode': '延后批量' if deferred else '同步',
+        'requests': server.requests,
+        'elapsed': round(elapsed, 3),
+        'lines_per_second': round(len(lines) * tasks / elapsed, 2) if elapsed else 0,
+        'aligned': aligned,
+        'lines': len(lines) * tasks,
+        'batch_requests': server.batch_requests,
+        'sync_after_merge': server.requests - chat_before if deferred else server.requests,
+        'untranslated': failed
+    }
+    if deferred:
+        result.update({'batch_wait': round(waited, 3), 'merged_aligned': merged_aligned,
+                       'batches': batch_stats['submitted'], 'ready': ready})
+    return result
+
+
+def run_replay_benchmark(lines, batch_size, concurrency, latency_jitter, error_rate, think_tokens, seed):
+    """录制一次真实流程（上游为带抖动、失败和思考输出的桩服务）再回放，返回各次的统计"""
+    work_dir = tempfile.mkdtemp(prefix="tranpy-replay-")
+    raw_srt = os.path.join(work_dir, "raw.srt")
+    cassette_path = os.path.join(work_dir, "cassette.jsonl")
+    write_task_srt(raw_srt, lines)
+    upstream = StubLLMServer(latency=0.2, per_line=0.01, slots=concurrency, latency_dist='lognormal',
+                             latency_jitter=latency_jitter, error_rate=error_rate, think_tokens=think_tokens,
+                             per_token=0.001, seed=seed).start()
+
+    def run(mode, server):
+        output_srt = os.path.join(work_dir, f"{mode}.srt")
+        config = {'translator_type': 'openai', 'openai_base_url': f"{server.url}/v1", 'openai_api_key': 'stub',
+                  'openai_model': 'stub', 'openai_concurrency': concurrency, 'translation_batch_size': batch_size,
+                  'translation_memory_enabled': False, 'translation_retry_backoff': 0}
+        start_time = time.time()
+        try:
+            translate_srt_with_callback(raw_srt, output_path=output_srt, config=config)
+        finally:
+            server.stop()
+        elapsed = time.time() - start_time
+        with open(output_srt, 'rb') as f:
+            output = f.read()
+        return {
+            'mode': mode,
+            'requests': server.requests,
+            'elapsed': round(elapsed, 3),
+            'lines_per_second': round(len(lines) / elapsed, 2) if elapsed else 0,
+            'aligned': count_aligned(lines, [text for _, _, text in parse_srt_file(output_srt)]),
+            'lines': len(lines),
+            'hits': server.replay_hits,
+            'misses': server.replay_misses,
+            'output': output
+        }
+
+    try:
+        recorded = run('录制', StubLLMServer(upstream=upstream.url, cassette_path=cassette_path).start())
+    finally:
+        upstream.stop()
+    recorded.update({'upstream_requests': upstream.requests + upstream.errors, 'upstream_errors': upstream.errors})
+    results = [recorded]
+    # 上游已停止，之后只从录音文件回放
+    for mode, timing in (('回放1', True), ('回放2', True), ('快进', False)):
+        results.append(run(mode, StubLLMServer(cassette_path=cassette_path, replay_timing=timing).start()))
+    for r in results:
+        r['identical'] = r.pop('output') == recorded.get('output', b'') if r is not recorded else True
+    recorded.pop('output')
+    with open(cassette_path, 'r', encoding='utf-8') as f:
+        recorded['cassette_entries'] = sum(1 for line in f if line.strip())
+    return results
+
+
+def run_resume_worker(lines, journal_file, batch_size, kill_after):
+    """带检查点日志翻译全部文本，kill_after>0 时在第kill_after+1个请求时强制结束进程"""
+    translator = MockTranslator(overhead=0.01, per_line=0.001, kill_after=kill_after)
+    engine = TranslationEngine(translator, batch_size=batch_size, concurrency=1)
+    journal = TranslationJournal(journal_file, lines)
+    try:
+        translations = engine.translate(lines, journal=journal)
+    finally:
+        journal.close()
+    return translator, engine, translations
+
+
+def run_resume_check(lines, batch_size, kill_after):
+    """子进程翻译到一半被杀，再从检查点恢复，返回统计"""
+    journal_file = os.path.join(tempfile.mkdtemp(prefix="tranpy-resume-"), "bench_translation.journal")
+    child = subprocess.run([sys.executable, "-m", "src.services.tran_modules.benchmark", "resume", "--worker",
+                            "--journal", journal_file, "--lines", str(len(lines)),
+                            "--batch-size", str(batch_size), "--kill-after", str(kill_after)],
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    committed = read_journal(journal_file)['items']
+
+    translator, engine, translations = run_resume_worker(lines, journal_file, batch_size, 0)
+    committed_texts = {lines[i] for i in committed}
+    # 只看请求中需要翻译的部分，前文上下文不算
+    requested = [strip_context(content) for content in translator.requested]
+    rerequested = sum(1 for content in requested for text in committed_texts if text in content)
+    os.remove(journal_file)
+
+    return {
+        'child_exit_code': child.returncode,
+        'committed_before_kill': len(committed),
+        'resumed': engine.get_stats()['resumed'],
+        'requests_after_resume': translator.requests,
+        'rerequested_lines': rerequested,
+        'aligned': count_aligned(lines, translations),
+        'lines': len(lines)
+    }
+
+
+def print_table(results, key, label):
+    baseline = results[0]['elapsed'] if results else 0
+    print(f"\n{label:>4}{'请求数':>8}{'耗时(s)':>10}{'条/秒':>9}{'对齐':>10}{'加速比':>8}")
+    for r in results:
+        speedup = baseline / r['elapsed'] if r['elapsed'] else 0
+        r['speedup'] = round(speedup, 2)
+        print(f"{r[key]:>4}{r['requests']:>8}{r['elapsed']:>10.2f}{r['lines_per_second']:>9.1f}"
+              f"{r['aligned']:>6}/{r['lines']:<4}{speedup:>7.1f}x")
+
+
+def main():
+    """命令行入口"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="翻译流程基准测试（本地模拟翻译器/桩服务）")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    batch_parser = subparsers.add_parser("batch", help="比较不同批量大小K")
+    batch_parser.add_argument("--batch-sizes", default="1,5,10,20", help="逗号分隔的批量大小K")
+    batch_parser.add_argument("--overhead", type=float, default=0.1, help="每次请求固定开销（秒）")
+    batch_parser.add_argument("--per-line", type=float, default=0.02, help="每条生成耗时（秒）")
+    batch_parser.add_argument("--drop-rate", type=float, default=0.02, help="批量回复中丢弃条目的比例")
+
+    concurrency_parser = subparsers.add_parser("concurrency", help="通过本地桩服务比较不同并发数N")
+    concurrency_parser.add_argument("--concurrency", default="1,2,4,8,16", help="逗号分隔的并发数N")
+    concurrency_parser.add_argument("--batch-size", type=int, default=1, help="每个请求的字幕条数")
+    concurrency_parser.add_argument("--latency", type=float, default=0.2, help="桩服务每个请求固定耗时（秒）")
+    concurrency_parser.add_argument("--per-line", type=float, default=0.02, help="桩服务每条生成耗时（秒）")
+    concurrency_parser.add_argument("--slots", type=int, default=8, help="桩服务同时处理的请求数")
+
+    thinking_parser = subparsers.add_parser("thinking", help="通过本地桩服务比较思考模式开/关")
+    thinking_parser.add_argument("--think-tokens", type=int, default=300, help="桩服务每次请求的思考token数")
+    thinking_parser.add_argument("--per-token", type=float, default=0.005, help="每个思考token的耗时（秒）")
+    thinking_parser.add_argument("--batch-size", type=int, default=10, help="每个请求的字幕条数")
+    thinking_parser.add_argument("--concurrency", type=int, default=1, help="并发请求数")
+    thinking_parser.add_argument("--latency", type=float, default=0.1, help="桩服务每个请求固定耗时（秒）")
+    thinking_parser.add_argument("--per-line", type=float, default=0.02, help="桩服务每条生成耗时（秒）")
+
+    resume_parser = subparsers.add_parser("resume", help="验证翻译中途被杀后从检查点恢复不重复请求")
+    resume_parser.add_argument("--batch-size", type=int, default=10, help="每个请求的字幕条数")
+    resume_parser.add_argument("--kill-after", type=int, default=7, help="第几个请求之后强制结束子进程")
+    resume_parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    resume_parser.add_argument("--journal", default=None, help=argparse.SUPPRESS)
+
+    hedge_parser = subparsers.add_parser("hedge", help="通过本地桩服务比较对冲请求开/关的长尾耗时")
+    hedge_parser.add_argument("--tail-rate", type=float, default=0.05, help="桩服务长尾请求的比例")
+    hedge_parser.add_argument("--tail-factor", type=float, default=10.0, help="长尾请求的耗时倍数")
+    hedge_parser.add_argument("--percentile", type=float, default=0.9, help="触发对冲的耗时分位数")
+    hedge_parser.add_argument("--batch-size", type=int, default=1, help="每个请求的字幕条数")
+    hedge_parser.add_argument("--concurrency", type=int, default=4, help="并发请求数")
+    hedge_parser.add_argument("--latency", type=float, default=0.1, help="桩服务每个请求固定耗时（秒）")
+    hedge_parser.add_argument("--per-line", type=float, default=0.02, help="桩服务每条生成耗时（秒）")
+
+    sentences_parser = subparsers.add_parser("sentences", help="比较逐条翻译与合并为整句翻译")
+    sentences_parser.add_argument("--batch-sizes", default="1,10", help="逗号分隔的批量大小K")
+    sentences_parser.add_argument("--overhead", type=float, default=0.1, help="每次请求固定开销（秒）")
+    sentences_parser.add_argument("--per-line", type=float, default=0.02, help="每条生成耗时（秒）")
+
+    context_parser = subparsers.add_parser("context", help="比较旧版对话回放与按token预算截取上下文的提示词token数")
+    context_parser.add_argument("--batch-size", type=int, default=1, help="每个请求的字幕条数")
+    context_parser.add_argument("--context-lines", type=int, default=3, help="上下文最多条数")
+    context_parser.add_argument("--context-tokens", type=int, default=128, help="上下文token预算")
+    context_parser.add_argument("--tokenizer", default="", help="分词器（Hugging Face 模型名或本地路径），为空时按字符估算")
+
+    ollama_parser = subparsers.add_parser("ollama", help="通过本地桩服务比较模型预热与固定提示词前缀的效果")
+    ollama_parser.add_argument("--load-time", type=float, default=2.0, help="桩服务模型加载耗时（秒）")
+    ollama_parser.add_argument("--prefill-per-token", type=float, default=0.001,
+                               help="桩服务未命中前缀缓存的每个提示词token的预填充耗时（秒）")
+    ollama_parser.add_argument("--whisper-tail", type=float, default=1.5,
+                               help="模拟转录收尾的耗时（秒），预热在此期间进行")
+    ollama_parser.add_argument("--latency", type=float, default=0.05, help="桩服务每个请求固定耗时（秒）")
+    ollama_parser.add_argument("--per-line", type=float, default=0.02, help="桩服务每条生成耗时（秒）")
+
+    shared_parser = subparsers.add_parser("shared", help="通过本地桩服务比较各任务各自分批与跨任务调度共享请求")
+    shared_parser.add_argument("--short-tasks", type=int, default=16, help="同时翻译的短任务数")
+    shared_parser.add_argument("--short-lines", type=int, default=3, help="每个短任务的字幕条数")
+    shared_parser.add_argument("--batch-size", type=int, default=10, help="每个请求最多包含的字幕条数")
+    shared_parser.add_argument("--batch-tokens", type=int, default=512, help="每个请求原文的token预算")
+    shared_parser.add_argument("--latency", type=float, default=0.3, help="桩服务每个请求固定耗时（秒）")
+    shared_parser.add_argument("--per-line", type=float, default=0.02, help="桩服务每条生成耗时（秒）")
+
+    autotune_parser = subparsers.add_parser("autotune", help="通过本地桩服务比较固定批量/并发与自动调节")
+    autotune_parser.add_argument("--tasks", type=int, default=4, help="连续翻译的任务数")
+    autotune_parser.add_argument("--batch-size", type=int, default=10, help="初始（固定时）每个请求的字幕条数")
+    autotune_parser.add_argument("--profiles", default="local,gateway", help="逗号分隔的后端类型: local,gateway")
+
+    ratelimit_parser = subparsers.add_parser("ratelimit", help="通过限额桩服务比较不限流与客户端限流")
+    ratelimit_parser.add_argument("--tasks", type=int, default=4, help="同时翻译的任务数")
+    ratelimit_parser.add_argument("--rate-limit", type=int, default=5, help="桩服务每秒最多接受的请求数")
+    ratelimit_parser.add_argument("--batch-size", type=int, default=5, help="每个请求的字幕条数")
+    ratelimit_parser.add_argument("--concurrency", type=int, default=4, help="每个任务的并发请求数")
+
+    retry_parser = subparsers.add_parser("retry", help="比较翻译失败的字幕不重试、集中重试与改用备用后端重试")
+    retry_parser.add_argument("--error-rate", type=float, default=0.5, help="模拟翻译器请求出错的比例")
+    retry_parser.add_argument("--batch-size", type=int, default=10, help="每个请求的字幕条数")
+    retry_parser.add_argument("--concurrency", type=int, default=4, help="并发请求数")
+    retry_parser.add_argument("--backoff", type=float, default=0.5, help="第一轮重试前等待的秒数")
+
+    deferred_parser = subparsers.add_parser("deferred", help="通过桩服务的批处理接口比较同步翻译与延后批量翻译")
+    deferred_parser.add_argument("--tasks", type=int, default=3, help="合并提交的任务数")
+    deferred_parser.add_argument("--batch-size", type=int, default=10, help="每个请求的字幕条数")
+    deferred_parser.add_argument("--batch-time", type=float, default=1.0, help="桩服务批处理完成耗时（秒）")
+    deferred_parser.add_argument("--batch-error-rate", type=float, default=0.1, help="桩服务批处理中请求失败的比例")
+
+    replay_parser = subparsers.add_parser("replay", help="录制一次经桩服务的完整字幕翻译并回放，验证回放可重现")
+    replay_parser.add_argument("--batch-size", type=int, default=10, help="每个请求的字幕条数")
+    replay_parser.add_argument("--concurrency", type=int, default=4, help="并发请求数")
+    replay_parser.add_argument("--latency-jitter", type=float, default=0.5, help="上游耗时的对数正态抖动幅度")
+    replay_parser.add_argument("--error-rate", type=float, default=0.05, help="上游返回500的比例")
+    replay_parser.add_argument("--think-tokens", type=int, default=20, help="上游每次请求输出的思考token数")
+    replay_parser.add_argument("--seed", type=int, default=0, help="上游的随机数种子")
+
+    local_parser = subparsers.add_parser("local", help="比较本地离线翻译模型不同每批条数与按长度分批开/关")
+    local_parser.add_argument("--batch-sizes", default="1,8,32", help="逗号分隔的每批条数")
+    local_parser.add_argument("--model", default="Helsinki-NLP/opus-mt-en-zh", help="Hugging Face 模型名或本地路径")
+    local_parser.add_argument("--threads", type=int, default=0, help="CPU推理线程数，0 为 torch 默认值")
+
+    for sub in (batch_parser, concurrency_parser, thinking_parser, resume_parser, hedge_parser, sentences_parser,
+                context_parser, ollama_parser, shared_parser, autotune_parser, ratelimit_parser, retry_parser,
+                deferred_parser, replay_parser, local_parser):
+        sub.add_argument("--lines", type=int, default=200, help="字幕条数")
+        sub.add_argument("--json", dest="json_path", default=None, help="将完整结果写入JSON文件")
+    args = parser.parse_args()
+
+    lines = make_lines(args.lines)
+    results = []
+    if args.command == "batch":
+        for batch_size in [int(k) for k in args.batch_sizes.split(",") if k.strip()]:
+            print(f"[INFO] 测试批量大小 K={batch_size}")
+            results.append(run_batch_benchmark(lines, batch_size, args.overhead, args.per_line, args.drop_rate))
+        print_table(results, 'batch_size', 'K')
+    elif args.command == "resume":
+        if args.worker:
+            run_resume_worker(lines, args.journal, args.batch_size, args.kill_after)
+            return
+        result = run_resume_check(lines, args.batch_size, args.kill_after)
+        results.append(result)
+        print(f"\n子进程退出码: {result['child_exit_code']}，被杀前已写入检查点 {result['committed_before_kill']} 条")
+        print(f"恢复后: 跳过 {result['resumed']} 条，发送 {result['requests_after_resume']} 个请求，"
+              f"重复请求 {result['rerequested_lines']} 条，对齐 {result['aligned']}/{result['lines']}")
+        print("[OK] 已写入检查点的行没有被重新请求" if result['rerequested_lines'] == 0
+              else "[FAIL] 有已写入检查点的行被重新请求")
+    elif args.command == "thinking":
+        server = StubLLMServer(latency=args.latency, per_line=args.per_line, slots=max(1, args.concurrency),
+                               think_tokens=args.think_tokens, per_token=args.per_token).start()
+        try:
+            for thinking in (False, True):
+                print(f"[INFO] 测试思考模式 {'开' if thinking else '关'}")
+                results.append(run_thinking_benchmark(lines, thinking, args.batch_size, args.concurrency, server))
+        finally:
+            server.stop()
+        print_table(results, 'thinking', '思考')
+        print(f"\n{'思考':>4}{'生成token':>12}{'保留token':>12}{'保留比例':>10}")
+        for r in results:
+            ratio = r['kept_tokens'] / r['generated_tokens'] if r['generated_tokens'] else 0
+            print(f"{r['thinking']:>4}{r['generated_tokens']:>12}{r['kept_tokens']:>12}{ratio:>10.1%}")
+    elif args.command == "sentences":
+        texts, timings = make_segments(args.lines)
+        for batch_size in [int(k) for k in args.batch_sizes.split(",") if k.strip()]:
+            for merge in (False, True):
+                print(f"[INFO] 测试{'整句' if merge else '逐条'}翻译 K={batch_size}")
+                results.append(run_sentence_benchmark(texts, timings, merge, batch_size, args.overhead,
+                                                      args.per_line))
+        print_table(results, 'mode', '方式')
+        print(f"\n{'方式':>6}{'翻译单元':>10}")
+        for r in results:
+            print(f"{r['mode']:>6}{r['units']:>10}")
+    elif args.command == "context":
+        results, exact = run_context_benchmark(lines, args.batch_size, args.context_lines, args.context_tokens,
+                                               args.tokenizer)
+        print(f"\n提示词token数（{'分词器 ' + args.tokenizer if exact else '按字符估算'}）")
+        print(f"{'方式':>12}{'请求数':>8}{'平均':>8}{'p50':>8}{'最大':>8}{'每条字幕':>10}")
+        for r in results:
+            print(f"{r['mode']:>12}{r['requests']:>8}{r['mean']:>8.1f}{r['p50']:>8}{r['max']:>8}{r['per_line']:>10.1f}")
+    elif args.command == "hedge":
+        # 服务端留出余量给对冲请求，避免对冲请求本身排队
+        server = StubLLMServer(latency=args.latency, per_line=args.per_line, slots=args.concurrency * 2,
+                               tail_rate=args.tail_rate, tail_factor=args.tail_factor).start()
+        try:
+            for hedging in (False, True):
+                print(f"[INFO] 测试对冲请求 {'开' if hedging else '关'}")
+                random.seed(0)
+                results.append(run_hedge_benchmark(lines, hedging, args.batch_size, args.concurrency,
+                                                   args.percentile, server))
+        finally:
+            server.stop()
+        print_table(results, 'hedging', '对冲')
+        print(f"\n{'对冲':>4}{'p50(ms)':>10}{'p99(ms)':>10}{'对冲次数':>10}{'对冲胜出':>10}")
+        for r in results:
+            print(f"{r['hedging']:>4}{r['p50_ms']:>10.1f}{r['p99_ms']:>10.1f}{r['hedged']:>10}{r['hedge_wins']:>10}")
+    elif args.command == "shared":
+        # 单个Ollama实例一次只处理一个请求
+        server = StubLLMServer(latency=args.latency, per_line=args.per_line, slots=1).start()
+        try:
+            for shared in (False, True):
+                print(f"[INFO] 测试{'跨任务调度' if shared else '各任务各自分批'}")
+                results.append(run_shared_benchmark(args.lines, args.short_tasks, args.short_lines, shared,
+                                                    args.batch_size, args.batch_tokens, server))
+        finally:
+            server.stop()
+        print_table(results, 'mode', '方式')
+        print(f"\n{'方式':>4}{'每请求条数':>10}{'长任务完成(s)':>14}{'短任务p50(s)':>13}{'短任务最慢(s)':>14}")
+        for r in results:
+            print(f"{r['mode']:>4}{r['lines_per_request']:>10.2f}{r['long_finished']:>14.2f}"
+                  f"{r['short_p50']:>13.2f}{r['short_max']:>14.2f}")
+    elif args.command == "autotune":
+        store_path = os.path.join(tempfile.mkdtemp(prefix="tranpy-autotune-"), "translation_autotune.json")
+        for profile in [p.strip() for p in args.profiles.split(",") if p.strip()]:
+            for autotune in (False, True):
+                print(f"[INFO] 测试 {profile} {'自动调节' if autotune else '固定设置'}")
+                results.append(run_autotune_benchmark(lines, args.tasks, profile, autotune, args.batch_size,
+                                                      store_path))
+        print_table(results, 'mode', '方式')
+        print(f"\n{'方式':>12}{'最后一个任务条/秒':>16}{'批量':>6}{'并发':>6}")
+        for r in results:
+            print(f"{r['mode']:>12}{r['last_task_lines_per_second']:>16.1f}{r['batch_size']:>6}{r['concurrency']:>6}")
+        with open(store_path, 'r', encoding='utf-8') as f:
+            print(f"\n保存的设置（重启后从这里继续）: {f.read()}")
+    elif args.command == "ratelimit":
+        for limited in (False, True):
+            print(f"[INFO] 测试{'客户端限流' if limited else '不限流'}")
+            results.append(run_ratelimit_benchmark(lines, args.tasks, limited, args.rate_limit, args.batch_size,
+                                                   args.concurrency))
+        print_table(results, 'mode', '方式')
+        print(f"\n{'方式':>6}{'429次数':>8}{'失败条数':>8}{'排队请求':>8}{'平均排队(s)':>12}")
+        for r in results:
+            limiter = r['limiter'] or {}
+            print(f"{r['mode']:>6}{r['throttled']:>8}{r['failed']:>8}{limiter.get('waited', 0):>8}"
+                  f"{limiter.get('avg_wait', 0):>12.3f}")
+    elif args.command == "retry":
+        for mode in ('none', 'retry', 'backup'):
+            print(f"[INFO] 测试{RETRY_MODES[mode]}")
+            results.append(run_retry_benchmark(lines, mode, args.error_rate, args.batch_size, args.concurrency,
+                                               args.backoff))
+        print_table(results, 'mode', '方式')
+        print(f"\n{'方式':>8}{'失败':>6}{'重试':>6}{'恢复':>6}{'仍为原文':>8}{'失败率':>8}")
+        for r in results:
+            print(f"{r['mode']:>8}{r['failed']:>6}{r['retried']:>6}{r['recovered']:>6}{r['untranslated']:>8}"
+                  f"{r['failure_rate']:>8.1%}")
+    elif args.command == "deferred":
+        for deferred in (False, True):
+            print(f"[INFO] 测试{'延后批量翻译' if deferred else '逐任务同步翻译'}")
+            results.append(run_deferred_benchmark(lines, args.tasks, deferred, args.batch_size, args.batch_time,
+                                                  args.batch_error_rate))
+        print_table(results, 'mode', '方式')
+        print(f"\n{'方式':>6}{'批处理请求':>10}{'合并后同步请求':>14}{'批处理等待(s)':>14}{'合并时已对齐':>12}{'仍为原文':>8}")
+        for r in results:
+            print(f"{r['mode']:>6}{r['batch_requests']:>10}{r['sync_after_merge']:>14}{r.get('batch_wait', 0):>14.2f}"
+                  f"{r.get('merged_aligned', 0):>12}{r['untranslated']:>8}")
+    elif args.command == "replay":
+        print("[INFO] 录制经桩服务的字幕翻译，并从录音文件回放")
+        results = run_replay_benchmark(lines, args.batch_size, args.concurrency, args.latency_jitter,
+                                       args.error_rate, args.think_tokens, args.seed)
+        print_table(results, 'mode', '方式')
+        recorded = results[0]
+        print(f"\n上游请求 {recorded['upstream_requests']} 个（其中返回500 {recorded['upstream_errors']} 个），"
+              f"录音文件 {recorded['cassette_entries']} 条")
+        print(f"\n{'方式':>6}{'命中':>8}{'未命中':>8}{'与录制相同':>10}")
+        for r in results[1:]:
+            print(f"{r['mode']:>6}{r['hits']:>8}{r['misses']:>8}{'是' if r['identical'] else '否':>10}")
+        print("[OK] 回放全部命中，译文与录制时相同" if all(r['identical'] and not r['misses'] for r in results[1:])
+              else "[FAIL] 回放有未命中的请求或译文不同")
+    elif args.command == "local":
+        # 长短不一的字幕（Whisper切开的句子片段），按长度分批的效果才明显
+        texts, _ = make_segments(args.lines)
+        for batch_size in [int(k) for k in args.batch_sizes.split(",") if k.strip()]:
+            for sort_by_length in ((False, True) if batch_size > 1 else (True,)):
+                print(f"[INFO] 测试每批 {batch_size} 条，{'按长度分批' if sort_by_length else '按原顺序分批'}")
+                results.append(run_local_benchmark(texts, batch_size, sort_by_length, args.model, args.threads))
+        print_table(results, 'mode', '方式')
+        print(f"\n{'方式':>6}{'前向计算次数':>12}{'填充比例':>10}")
+        for r in results:
+            print(f"{r['mode']:>6}{r['requests']:>12}{r['padding_ratio']:>10.1%}")
+    elif args.command == "ollama":
+        server = StubLLMServer(latency=args.latency, per_line=args.per_line, load_time=args.load_time,
+                               prefill_per_token=args.prefill_per_token).start()
+        try:
+            first_line = []
+            for prewarm in (False, True):
+                print(f"[INFO] 测试模型预热 {'开' if prewarm else '关'}")
+                first_line.append(run_first_line_benchmark(lines[:10], prewarm, args.whisper_tail, server))
+            print("[INFO] 测试提示词前缀缓存")
+            prefill = run_prefill_benchmark(lines, server)
+        finally:
+            server.stop()
+        results = {'first_line': first_line, 'prefill': prefill}
+        print(f"\n{'预热':>4}{'首条首token(ms)':>16}{'翻译耗时(s)':>12}{'含转录收尾(s)':>14}{'对齐':>8}")
+        for r in first_line:
+            print(f"{r['prewarm']:>4}{r['first_line_ms']:>16.1f}{r['elapsed']:>12.2f}{r['total']:>14.2f}"
+                  f"{r['aligned']:>4}/{r['lines']}")
+        print(f"\n{'方式':>12}{'请求数':>8}{'耗时(s)':>10}{'平均预填充token':>16}{'平均预填充(ms)':>16}")
+        for r in prefill:
+            print(f"{r['mode']:>12}{r['requests']:>8}{r['elapsed']:>10.2f}{r['prefill_tokens_mean']:>16.1f}"
+                  f"{r['prefill_ms_mean']:>16.1f}")
+    else:
+        server = StubLLMServer(latency=args.latency, per_line=args.per_line, slots=args.slots).start()
+        try:
+            for concurrency in [int(n) for n in args.concurrency.split(",") if n.strip()]:
+                print(f"[INFO] 测试并发数 N={concurrency}")
+                results.append(run_concurrency_benchmark(lines, concurrency, args.batch_size, server))
+        finally:
+            server.stop()
+        print_table(results, 'concurrency', 'N')
+
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"[INFO] 结果已写入: {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
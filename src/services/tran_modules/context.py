@@ -0,0 +1,72 @@
+"""
+翻译上下文
+只用前文的原文作为上下文（不回放模型的历史回复），各请求互不依赖，可以并发发送。
+上下文同时受条数和token预算限制，从最近的一条往前取，超出预算即停止；
+可选附带已完成的前文译文（只有译文本身，不含代码块）。
+"""
+
+from typing import Callable, Dict, List, Optional
+
+DEFAULT_CONTEXT_LINES = 3
+DEFAULT_CONTEXT_TOKENS = 128
+
+CONTEXT_HEADER = "参考上文（仅用于理解语境，不要翻译）："
+CONTENT_HEADER = "需要翻译的内容："
+
+
+def preceding_context(texts: List[str], index: int, context_lines: int, max_tokens: int = 0,
+                      count_tokens: Optional[Callable[[str], int]] = None,
+                      translations: Optional[Dict[int, str]] = None) -> List[str]:
+    """
+    取 texts[index] 之前最多 context_lines 条非空原文
+
+    Args:
+        max_tokens: 上下文的token预算，<=0 时只按条数限制
+        count_tokens: token计数函数，设置了 max_tokens 时必须提供
+        translations: {下标: 译文}，已有译文的前文附在原文之后
+    """
+    if context_lines <= 0:
+        return []
+    context = []
+    used = 0
+    for i in range(index - 1, -1, -1):
+        text = texts[i].strip()
+        if not text:
+            continue
+        translated = (translations or {}).get(i)
+        if translated and translated.strip() and translated.strip() != text:
+            text = f"{text} → {translated.strip()}"
+        if max_tokens > 0:
+            used += count_tokens(text)
+            if used > max_tokens:
+                break
+        context.append(text)
+        if len(context) >= context_lines:
+            break
+    return list(reversed(context))
+
+
+def with_context(content: str, context: Optional[List[str]] = None, instruction: Optional[str] = None) -> str:
+    """
+    构造用户消息: 固定说明 + 上文原文 + 需要翻译的内容
+
+    固定说明放在最前面、随请求变化的上文放在其后，相邻请求的提示词前缀尽量相同，
+    便于 Ollama 复用前缀的KV缓存。
+    """
+    parts = []
+    if instruction:
+        parts.append(instruction)
+    if context:
+        parts.append(f"{CONTEXT_HEADER}\n" + "\n".join(context))
+    if not parts:
+        return content
+    parts.append(f"{CONTENT_HEADER}\n{content}")
+    return "\n\n".join(parts)
+
+
+def strip_context(content: str) -> str:
+    """去掉用户消息中的固定说明和上文部分，只保留需要翻译的内容"""
+    separator = f"\n\n{CONTENT_HEADER}\n"
+    if separator in content:
+        return content.split(separator, 1)[1]
+    return content
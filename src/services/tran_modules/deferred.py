@@ -0,0 +1,582 @@
+"""
+延后批量翻译
+不急的批量上传任务逐条同步请求托管接口最贵也最慢。translation_mode 为 deferred 时，任务转录完成后不立即翻译，
+而是进入 "等待批量翻译" 状态，主处理循环继续处理下一个任务。
+
+后台线程把收集窗口（translation_deferred_collect_seconds）内到达的一个或多个任务的待翻译字幕写成一个
+JSONL批处理文件: 每行一个 /v1/chat/completions 请求（与同步翻译相同的批量提示词，custom_id 为 "任务ID:请求序号"），
+翻译检查点和翻译记忆中已有的行、重复的行不写入。文件上传到 OpenAI 兼容接口的 /v1/files，
+创建 /v1/batches 批处理后定期轮询。
+
+批处理结束后（过期或取消时取已完成的部分）按 custom_id 把译文写入各任务的翻译检查点日志，
+任务回到 "翻译原文字幕" 状态由主处理循环继续: 检查点中已有的行不再请求，批处理中缺失或
+失败的行同步翻译（含集中重试），之后照常生成字幕文件和视频。批处理失败或超过 translation_deferred_timeout
+仍未结束时（超时先取消）任务同样回到同步翻译。
+
+等待中的任务和批处理保存在 db/translation_deferred.json，重启后继续轮询。
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+from utils.logger import get_cached_logger
+from utils.http_client import get_http_client
+
+from src.services.tran import OpenAITranslator, parse_srt_file
+
+from .batching import DEFAULT_BATCH_SIZE, build_batch_messages, parse_batch_response
+from .context import DEFAULT_CONTEXT_LINES, DEFAULT_CONTEXT_TOKENS, preceding_context
+from .engine import MIN_TEXT_LENGTH, untranslated
+from .journal import TranslationJournal
+from .memory import get_translation_memory, normalize_text, translator_namespace
+from .sentences import parse_timestamp, regroup
+from .tokens import get_token_counter
+
+logger = get_cached_logger("延后批量翻译")
+
+DEFAULT_STATE_PATH = "db/translation_deferred.json"
+DEFAULT_COLLECT_SECONDS = 60
+DEFAULT_POLL_INTERVAL = 30
+DEFAULT_COMPLETION_WINDOW = "24h"
+# 超过该秒数仍未结束的批处理取消，任务改为同步翻译
+DEFAULT_DEFERRED_TIMEOUT = 90000
+# OpenAI 批处理每个文件最多5万个请求
+DEFAULT_MAX_REQUESTS = 50000
+BATCH_ENDPOINT = "/v1/chat/completions"
+# 后台线程检查的间隔（秒）
+TICK_SECONDS = 1.0
+# 已结束的批处理的状态
+TERMINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+STATUS_NAMES = {"completed": "已完成", "failed": "失败", "expired": "已过期", "cancelled": "已取消"}
+
+# 任务状态: 等待收集 / 已提交 / 结果已合并 / 改为同步翻译
+PENDING = "pending"
+SUBMITTED = "submitted"
+DONE = "done"
+FALLBACK = "fallback"
+
+
+def deferred_enabled(config: Dict[str, Any]) -> bool:
+    """配置（按档位生效后）是否使用延后批量翻译；未配置完整的OpenAI兼容接口时不启用"""
+    if config.get('translation_mode', 'sync') != 'deferred':
+        return False
+    if not (config.get('openai_base_url') and config.get('openai_api_key') and config.get('openai_model')):
+        logger.warning("延后批量翻译需要 openai_base_url、openai_api_key 和 openai_model，改为同步翻译")
+        return False
+    return True
+
+
+def requeue_task(task_id: str, stats: Dict[str, Any], message: str):
+    """批处理结束: 写入批量翻译统计，任务回到翻译阶段由主处理循环继续"""
+    from src.core.coordinate import task_coordinator
+    try:
+        task_coordinator.update_task_translation_stats(task_id, {'deferred': stats})
+    except Exception as e:
+        logger.warning(f"写入批量翻译统计失败: {e}")
+    task_coordinator.update_task_status(task_id, "翻译原文字幕", message, "translating")
+
+
+class DeferredBatchQueue:
+    """
+    等待批量翻译的任务与已提交的批处理（线程安全，由一个后台线程提交和轮询）
+
+    Args:
+        path: 状态文件路径
+        collect_seconds: 最早的等待任务等待多少秒后提交（期间到达的任务合并到同一个批处理）
+        poll_interval: 轮询批处理状态的间隔（秒）
+        completion_window: 批处理的完成时限
+        timeout: 提交后超过该秒数仍未结束时取消，任务改为同步翻译
+        max_requests: 每个批处理最多包含的请求数
+        config_loader: 按档位返回生效配置的函数，默认 get_profile_config
+        on_ready: 任务结果已合并（或改为同步翻译）时调用 (任务ID, 统计, 进度描述)，默认 requeue_task
+    """
+
+    def __init__(self, path: str = DEFAULT_STATE_PATH, collect_seconds: float = DEFAULT_COLLECT_SECONDS,
+                 poll_interval: float = DEFAULT_POLL_INTERVAL, completion_window: str = DEFAULT_COMPLETION_WINDOW,
+                 timeout: float = DEFAULT_DEFERRED_TIMEOUT, max_requests: int = DEFAULT_MAX_REQUESTS,
+                 config_loader: Optional[Callable] = None, on_ready: Optional[Callable] = None):
+        if config_loader is None:
+            from src.services.profiles import get_profile_config
+            config_loader = get_profile_config
+        self.path = path
+        self.collect_seconds = float(collect_seconds)
+        self.poll_interval = float(poll_interval)
+        self.completion_window = completion_window
+        self.timeout = float(timeout)
+        self.max_requests = max(1, int(max_requests))
+        self.config_loader = config_loader
+        self.on_ready = on_ready or requeue_task
+        self.lock = threading.Lock()
+        self.thread = None
+        self.state = {'tasks': {}, 'batches': {}}
+        self.stats = {'submitted': 0, 'completed': 0, 'failed': 0, 'requests': 0, 'merged_lines': 0,
+                      'fallback_tasks': 0}
+        try:
+            if os.path.exists(path):
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.state.update(json.load(f))
+                if self.state['tasks']:
+                    logger.info(f"从 {path} 恢复 {len(self.state['tasks'])} 个等待批量翻译的任务，"
+                                f"{len(self.state['batches'])} 个批处理")
+        except Exception as e:
+            logger.warning(f"读取批量翻译状态失败，等待中的任务将改为同步翻译: {e}")
+
+    def _save(self):
+        """保存状态（调用方持有锁）"""
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.state, f, ensure_ascii=False, indent=2)
+            os.replace(temp_path, self.path)
+        except Exception as e:
+            logger.warning(f"保存批量翻译状态失败: {e}")
+
+    def start(self):
+        """启动后台提交/轮询线程（重复调用只启动一次）"""
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._loop, daemon=True)
+                self.thread.start()
+        return self
+
+    def _loop(self):
+        while True:
+            try:
+                self.tick()
+            except Exception as e:
+                logger.error(f"批量翻译后台处理出错: {e}")
+            time.sleep(TICK_SECONDS)
+
+    def tick(self):
+        """提交收集窗口已结束的任务，轮询到期的批处理"""
+        self._submit_due()
+        self._poll_due()
+
+    def should_defer(self, task_id: str, config: Dict[str, Any]) -> bool:
+        """本次翻译是否交给批处理: 启用了延后批量翻译，且任务的批处理结果尚未合并、没有改为同步翻译"""
+        with self.lock:
+            entry = self.state['tasks'].get(task_id)
+        if entry is not None:
+            return entry['status'] in (PENDING, SUBMITTED)
+        return deferred_enabled(config)
+
+    def tracking(self, task_id: str) -> bool:
+        """任务是否在等待批处理结果"""
+        with self.lock:
+            entry = self.state['tasks'].get(task_id)
+            return entry is not None and entry['status'] in (PENDING, SUBMITTED)
+
+    def enqueue(self, task_id: str, raw_srt: str, journal: str, profile: Optional[str] = None):
+        """任务进入等待批量翻译，收集窗口结束后与其他等待的任务一起提交"""
+        with self.lock:
+            entry = self.state['tasks'].get(task_id)
+            if entry is None or entry['status'] not in (PENDING, SUBMITTED):
+                self.state['tasks'][task_id] = {
+                    'status': PENDING, 'profile': profile or '', 'raw_srt': raw_srt, 'journal': journal,
+                    'enqueued_at': time.time()
+                }
+                self._save()
+                logger.info(f"任务 {task_id[:8]}... 等待批量翻译，{self.collect_seconds:.0f} 秒内到达的任务合并提交")
+        self.start()
+
+    def finish(self, task_id: str):
+        """任务翻译完成或处理失败，删除记录"""
+        with self.lock:
+            if self.state['tasks'].pop(task_id, None) is not None:
+                self._save()
+
+    def fall_back(self, task_id: str):
+        """任务改为同步翻译（如批处理记录丢失），之后 should_defer 不再把它交给批处理"""
+        with self.lock:
+            entry = self.state['tasks'].setdefault(task_id, {'enqueued_at': time.time()})
+            entry['status'] = FALLBACK
+            self.stats['fallback_tasks'] += 1
+            self._save()
+
+    def _release(self, task_ids: List[str], stats: Dict[str, Any], message: str, status: str):
+        """任务结束等待: 标记为 done/fallback 并通知"""
+        with self.lock:
+            for task_id in task_ids:
+                entry = self.state['tasks'].get(task_id)
+                if entry is not None:
+                    entry['status'] = status
+            if status == FALLBACK:
+                self.stats['fallback_tasks'] += len(task_ids)
+            self._save()
+        for task_id in task_ids:
+            try:
+                self.on_ready(task_id, dict(stats.get(task_id, {}), status=status), message)
+            except Exception as e:
+                logger.error(f"任务 {task_id[:8]}... 结束等待批量翻译失败: {e}")
+
+    def _load_units(self, entry: Dict[str, Any], config: Dict[str, Any]):
+        """读取原文字幕并按同步翻译相同的规则合并为句子单元，返回 (字幕, 下标分组, 单元原文)"""
+        subtitles = parse_srt_file(entry['raw_srt'])
+        texts = [text for _, _, text in subtitles]
+        groups, units = regroup(texts, [parse_timestamp(timestamp) for _, timestamp, _ in subtitles], config)
+        return subtitles, groups, units
+
+    def _build_requests(self, task_id: str, entry: Dict[str, Any], translator, config: Dict[str, Any]):
+        """
+        生成一个任务的批处理请求行
+
+        检查点中已有的单元跳过，翻译记忆命中的写入检查点，规范化后相同的单元只请求一次。
+        Returns:
+            (请求行列表, 每个请求包含的单元下标)
+        """
+        _, _, units = self._load_units(entry, config)
+        journal = TranslationJournal(entry['journal'], units)
+        try:
+            todo = [i for i, text in enumerate(units)
+                    if len(text.strip()) >= MIN_TEXT_LENGTH and i not in journal.completed]
+            memory = get_translation_memory(config)
+            if memory is not None and todo:
+                try:
+                    found = memory.lookup({i: units[i] for i in todo}, translator_namespace(translator))
+                    journal.append({i: translation for i, (translation, _) in found.items()})
+                    todo = [i for i in todo if i not in found]
+                except Exception as e:
+                    logger.warning(f"查询翻译记忆失败，全部写入批处理: {e}")
+        finally:
+            journal.close()
+
+        seen = set()
+        leaders = []
+        for i in todo:
+            key = normalize_text(units[i])
+            if key not in seen:
+                seen.add(key)
+                leaders.append(i)
+
+        batch_size = max(1, int(config.get('translation_batch_size', DEFAULT_BATCH_SIZE)))
+        context_lines = int(config.get('translation_context_lines', DEFAULT_CONTEXT_LINES))
+        context_tokens = int(config.get('translation_context_tokens', DEFAULT_CONTEXT_TOKENS))
+        counter = get_token_counter(config)
+        lines = []
+        requests = []
+        for start in range(0, len(leaders), batch_size):
+            unit = leaders[start:start + batch_size]
+            context = preceding_context(units, unit[0], context_lines, context_tokens, counter.count)
+            if len(unit) == 1:
+                messages = translator.build_messages(units[unit[0]], context)
+            else:
+                messages = build_batch_messages(translator.system_prompt,
+                                                {k: units[i] for k, i in enumerate(unit, 1)}, context)
+            lines.append({
+                "custom_id": f"{task_id}:{len(requests)}",
+                "method": "POST",
+                "url": BATCH_ENDPOINT,
+                "body": {"model": translator.model, "messages": messages, "temperature": 0.3, "top_p": 0.8,
+                         "max_tokens": translator.max_tokens}
+            })
+            requests.append(unit)
+        return lines, requests
+
+    @staticmethod
+    def _headers(translator) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {translator.api_key}"}
+
+    def _submit_due(self):
+        """按档位把收集窗口已结束的等待任务写成批处理文件并提交"""
+        now = time.time()
+        with self.lock:
+            pending = {task_id: dict(entry) for task_id, entry in self.state['tasks'].items()
+                       if entry['status'] == PENDING}
+        by_profile = {}
+        for task_id, entry in pending.items():
+            by_profile.setdefault(entry['profile'], []).append(task_id)
+        for profile, task_ids in by_profile.items():
+            if now - min(pending[t]['enqueued_at'] for t in task_ids) < self.collect_seconds:
+                continue
+            task_ids.sort(key=lambda t: pending[t]['enqueued_at'])
+            try:
+                self._submit(profile, task_ids, pending)
+            except Exception as e:
+                # 已直接合并的任务已经结束等待，只让仍在等待的任务改为同步翻译
+                with self.lock:
+                    waiting = [t for t in task_ids if self.state['tasks'].get(t, {}).get('status') == PENDING]
+                logger.error(f"生成批量翻译请求失败，{len(waiting)} 个任务改为同步翻译: {e}")
+                self._release(waiting, {}, "批量翻译提交失败，改为同步翻译...", FALLBACK)
+
+    def _submit(self, profile: str, task_ids: List[str], pending: Dict[str, Dict[str, Any]]):
+        config = self.config_loader(profile or None)
+        translator = OpenAITranslator(config)
+        base_url = translator.base_url.rstrip('/')
+
+        lines = []
+        task_requests = {}
+        empty = []
+        for task_id in task_ids:
+            task_lines, requests = self._build_requests(task_id, pending[task_id], translator, config)
+            if not task_lines:
+                empty.append(task_id)
+                continue
+            if lines and len(lines) + len(task_lines) > self.max_requests:
+                # 超出单个批处理的上限，留到下一次提交
+                break
+            lines.extend(task_lines)
+            task_requests[task_id] = requests
+        if empty:
+            # 全部来自检查点或翻译记忆，直接合并
+            for task_id in empty:
+                self._merge(task_id, pending[task_id], config, translator, {})
+            self._release(empty, {t: {'requests': 0} for t in empty}, "翻译记忆已覆盖全部字幕，合并译文...", DONE)
+        if not lines:
+            return
+
+        batch_dir = os.path.join(os.path.dirname(self.path) or '.', "translation_batches")
+        os.makedirs(batch_dir, exist_ok=True)
+        file_path = os.path.join(batch_dir, f"{time.strftime('%Y%m%d_%H%M%S')}_{len(task_requests)}tasks.jsonl")
+        with open(file_path, 'w', encoding='utf-8') as f:
+            for line in lines:
+                f.write(json.dumps(line, ensure_ascii=False) + "\n")
+
+        try:
+            input_file_id, batch_id = self._upload(base_url, translator, file_path, len(task_requests))
+        except Exception as e:
+            # 只有写入本批处理的任务改为同步翻译，超出上限留到下一次的任务继续等待
+            logger.error(f"提交批量翻译失败，{len(task_requests)} 个任务改为同步翻译: {e}")
+            self._release(list(task_requests), {}, "批量翻译提交失败，改为同步翻译...", FALLBACK)
+            return
+
+        with self.lock:
+            self.state['batches'][batch_id] = {
+                'profile': profile, 'tasks': list(task_requests), 'input_file_id': input_file_id,
+                'file': file_path, 'requests': len(lines), 'status': 'validating',
+                'submitted_at': time.time(), 'next_poll': time.time() + self.poll_interval, 'cancel_requested': False
+            }
+            for task_id, requests in task_requests.items():
+                entry = self.state['tasks'].get(task_id)
+                if entry is not None:
+                    entry.update({'status': SUBMITTED, 'batch_id': batch_id, 'requests': requests})
+            self.stats['submitted'] += 1
+            self.stats['requests'] += len(lines)
+            self._save()
+        logger.info(f"已提交批量翻译 {batch_id}: {len(task_requests)} 个任务，{len(lines)} 个请求（{file_path}）")
+
+    def _upload(self, base_url: str, translator, file_path: str, tasks: int):
+        """上传请求文件并创建批处理，返回 (输入文件ID, 批处理ID)"""
+        client = get_http_client()
+        with open(file_path, 'rb') as f:
+            response = client.post(f"{base_url}/files", headers=self._headers(translator), retries=0,
+                                   files={'file': (os.path.basename(file_path), f, 'application/jsonl')},
+                                   data={'purpose': 'batch'})
+        response.raise_for_status()
+        input_file_id = response.json()['id']
+        response = client.post(f"{base_url}/batches", headers=self._headers(translator), json={
+            "input_file_id": input_file_id,
+            "endpoint": BATCH_ENDPOINT,
+            "completion_window": self.completion_window,
+            "metadata": {"source": "tranvideo", "tasks": str(tasks)}
+        })
+        response.raise_for_status()
+        return input_file_id, response.json()['id']
+
+    def _poll_due(self):
+        now = time.time()
+        with self.lock:
+            due = [(batch_id, dict(batch)) for batch_id, batch in self.state['batches'].items()
+                   if batch['next_poll'] <= now]
+        for batch_id, batch in due:
+            try:
+                self._poll(batch_id, batch)
+            except Exception as e:
+                logger.warning(f"轮询批量翻译 {batch_id} 失败，稍后重试: {e}")
+                with self.lock:
+                    if batch_id in self.state['batches']:
+                        self.state['batches'][batch_id]['next_poll'] = time.time() + self.poll_interval
+
+    def _poll(self, batch_id: str, batch: Dict[str, Any]):
+        config = self.config_loader(batch['profile'] or None)
+        translator = OpenAITranslator(config)
+        base_url = translator.base_url.rstrip('/')
+        client = get_http_client()
+        response = client.get(f"{base_url}/batches/{batch_id}", headers=self._headers(translator))
+        response.raise_for_status()
+        info = response.json()
+        status = info.get('status', '')
+        counts = info.get('request_counts') or {}
+
+        if status not in TERMINAL_STATUSES:
+            overdue = time.time() - batch['submitted_at'] > self.timeout
+            if overdue and not batch['cancel_requested']:
+                logger.warning(f"批量翻译 {batch_id} 超过 {self.timeout:.0f} 秒未完成，取消并改为同步翻译剩余部分")
+                cancel = client.post(f"{base_url}/batches/{batch_id}/cancel", headers=self._headers(translator))
+                if cancel.status_code >= 400:
+                    self._finish_batch(batch_id, batch, config, translator, {}, f"取消失败（{cancel.status_code}）")
+                    return
+            with self.lock:
+                current = self.state['batches'].get(batch_id)
+                if current is not None:
+                    current.update({'status': status, 'next_poll': time.time() + self.poll_interval,
+                                    'completed': counts.get('completed', 0), 'failed': counts.get('failed', 0),
+                                    'cancel_requested': current['cancel_requested'] or overdue})
+                    self._save()
+            return
+
+        replies = {}
+        if info.get('output_file_id'):
+            content = client.get(f"{base_url}/files/{info['output_file_id']}/content",
+                                 headers=self._headers(translator))
+            content.raise_for_status()
+            replies = self._parse_output(content.text)
+        self._finish_batch(batch_id, batch, config, translator, replies, status)
+
+    @staticmethod
+    def _parse_output(text: str) -> Dict[str, str]:
+        """解析批处理输出文件，返回 {custom_id: 回复原文}，失败的请求不包含在内"""
+        replies = {}
+        for line in text.splitlines():
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                response = record.get('response') or {}
+                if record.get('error') or response.get('status_code', 200) >= 400:
+                    continue
+                replies[record['custom_id']] = response['body']['choices'][0]['message']['content']
+            except (ValueError, KeyError, IndexError, TypeError):
+                continue
+        return replies
+
+    def _finish_batch(self, batch_id: str, batch: Dict[str, Any], config, translator, replies: Dict[str, str],
+                      status: str):
+        """批处理结束: 合并各任务的译文，任务回到翻译阶段（缺失的行同步翻译）"""
+        stats = {}
+        for task_id in batch['tasks']:
+            with self.lock:
+                entry = dict(self.state['tasks'].get(task_id) or {})
+            if not entry:
+                continue
+            try:
+                merged, sent = self._merge(task_id, entry, config, translator, replies)
+            except Exception as e:
+                logger.error(f"合并任务 {task_id[:8]}... 的批量翻译结果失败，改为同步翻译: {e}")
+                merged, sent = 0, 0
+            stats[task_id] = {'batch_id': batch_id, 'batch_status': status, 'requests': len(entry.get('requests', [])),
+                              'lines': sent, 'translated': merged,
+                              'wait': round(time.time() - entry['enqueued_at'], 1)}
+
+        succeeded = status == 'completed'
+        with self.lock:
+            self.state['batches'].pop(batch_id, None)
+            self.stats['completed' if succeeded else 'failed'] += 1
+            self.stats['merged_lines'] += sum(s['translated'] for s in stats.values())
+            self._save()
+        try:
+            os.remove(batch['file'])
+        except OSError:
+            pass
+        total = sum(s['lines'] for s in stats.values())
+        translated = sum(s['translated'] for s in stats.values())
+        logger.info(f"批量翻译 {batch_id} 结束（{status}）: {translated}/{total} 条译文已合并，"
+                    f"{len(stats)} 个任务回到翻译阶段")
+        message = ("批量翻译已完成，合并译文..." if succeeded
+                   else f"批量翻译{STATUS_NAMES.get(status, status)}，同步翻译剩余字幕...")
+        self._release(list(stats), stats, message, DONE if succeeded else FALLBACK)
+
+    def _merge(self, task_id: str, entry: Dict[str, Any], config, translator, replies: Dict[str, str]):
+        """
+        按 custom_id 取出一个任务的译文写入检查点日志，同步翻译时检查点中已有的行不再请求
+
+        仍为原文、缺失或错位的行不写入检查点，由同步翻译补齐。
+        Returns:
+            (写入的单元数（含重复行）, 批处理中请求的单元数)
+        """
+        _, _, units = self._load_units(entry, config)
+        translated = {}
+        requests = entry.get('requests', [])
+        for n, unit in enumerate(requests):
+            content = replies.get(f"{task_id}:{n}")
+            if content is None:
+                continue
+            if len(unit) == 1:
+                results = {unit[0]: translator.extract_translation(content)}
+            else:
+                parsed = parse_batch_response(content, range(1, len(unit) + 1))
+                results = {i: parsed[k] for k, i in enumerate(unit, 1) if k in parsed}
+            for i, text in results.items():
+                if text and not untranslated(units[i], text):
+                    translated[i] = text
+
+        duplicates = {}
+        for i, text in enumerate(units):
+            duplicates.setdefault(normalize_text(text), []).append(i)
+        items = {}
+        for i, text in translated.items():
+            for j in duplicates[normalize_text(units[i])]:
+                items[j] = text
+
+        journal = TranslationJournal(entry['journal'], units)
+        try:
+            journal.append(items)
+        finally:
+            journal.close()
+
+        memory = get_translation_memory(config)
+        if memory is not None and translated:
+            try:
+                memory.store([(units[i], text) for i, text in translated.items()], translator_namespace(translator))
+            except Exception as e:
+                logger.warning(f"写入翻译记忆失败: {e}")
+
+        return len(items), sum(len(unit) for unit in requests)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self.lock:
+            tasks = self.state['tasks'].values()
+            return dict(self.stats, **{
+                'pending_tasks': sum(1 for t in tasks if t['status'] == PENDING),
+                'waiting_tasks': sum(1 for t in tasks if t['status'] == SUBMITTED),
+                'batches': [{'id': batch_id, 'status': batch['status'], 'tasks': len(batch['tasks']),
+                             'requests': batch['requests'], 'completed': batch.get('completed', 0),
+                             'failed': batch.get('failed', 0),
+                             'age': round(time.time() - batch['submitted_at'], 1)}
+                            for batch_id, batch in self.state['batches'].items()]
+            })
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_deferred_queue(config: Optional[Dict[str, Any]] = None) -> DeferredBatchQueue:
+    """获取全局的延后批量翻译队列（按主配置创建）"""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            if config is None:
+                from src.services.tran import load_config
+                config = load_config()
+            _queue = DeferredBatchQueue(
+                config.get('translation_deferred_path', DEFAULT_STATE_PATH),
+                collect_seconds=config.get('translation_deferred_collect_seconds', DEFAULT_COLLECT_SECONDS),
+                poll_interval=config.get('translation_deferred_poll_interval', DEFAULT_POLL_INTERVAL),
+                completion_window=config.get('translation_deferred_completion_window', DEFAULT_COMPLETION_WINDOW),
+                timeout=config.get('translation_deferred_timeout', DEFAULT_DEFERRED_TIMEOUT),
+                max_requests=config.get('translation_deferred_max_requests', DEFAULT_MAX_REQUESTS)
+            )
+        return _queue
+
+
+def start_deferred_translation():
+    """启动时调用: 有等待中的任务或批处理时启动后台线程继续提交和轮询"""
+    queue = get_deferred_queue()
+    with queue.lock:
+        active = bool(queue.state['tasks'] or queue.state['batches'])
+    if active:
+        queue.start()
+    return queue
+
+
+def get_deferred_stats() -> Optional[Dict[str, Any]]:
+    """延后批量翻译的等待任务数、批处理状态与累计统计，未使用时返回None"""
+    with _queue_lock:
+        queue = _queue
+    return queue.get_stats() if queue is not None else None
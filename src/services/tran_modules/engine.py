@@ -0,0 +1,443 @@
+"""
+并发翻译引擎
+把待翻译字幕切成翻译单元（单条或K条一批），每个后端最多同时发送 max_concurrency 个请求。
+每个单元只携带前文原文作为上下文（受条数和token预算限制），互不依赖；结果按原下标写回，输出顺序与并发度无关。
+启用翻译记忆时，先查翻译记忆，只有未命中的字幕才发送请求。
+规范化后相同的字幕（"Thank you."、"[Music]"、重复的副歌）只翻译第一次出现的那条，译文写回所有出现位置。
+传入检查点日志时，日志中已有的译文直接复用，每个翻译单元完成后立即追加写入日志。
+启用对冲请求时，耗时超过近期分位数的翻译单元会再发送一份请求，先返回有效译文的一方胜出。
+启用跨任务调度时，待翻译字幕交给同一后端共享的调度器，与其他任务的字幕一起装满请求。
+启用自动调节时，每个翻译单元的条数和同时进行的请求数取自该后端的调节器，翻译过程中随时生效。
+翻译失败的字幕（翻译器返回原文）不写入检查点，全部翻译结束后集中起来退避重试（可改用另一个后端），
+失败、重试和恢复的条数计入统计。
+"""
+
+import os
+import re
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from typing import List, Callable, Optional
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+from utils.logger import get_cached_logger
+
+from .batching import DEFAULT_BATCH_SIZE
+from .context import DEFAULT_CONTEXT_LINES, DEFAULT_CONTEXT_TOKENS, preceding_context
+from .memory import normalize_text
+from .metrics import get_translation_metrics
+
+logger = get_cached_logger("翻译引擎")
+
+# 过短的文本不翻译
+MIN_TEXT_LENGTH = 2
+
+DEFAULT_RETRY_ROUNDS = 2
+DEFAULT_RETRY_BACKOFF = 2.0
+
+_LETTER_PATTERN = re.compile(r'[^\W\d_]')
+_CJK_PATTERN = re.compile(r'[\u3040-\u30ff\u3400-\u9fff\uac00-\ud7af]')
+
+
+def untranslated(source: str, translated: str) -> bool:
+    """
+    译文是否仍为原文（翻译失败时翻译器返回原文）
+
+    不含字母的文本（数字、符号）和中日韩文字的原文译文与原文相同是正常的，不算失败。
+    """
+    return (translated.strip() == source.strip() and _LETTER_PATTERN.search(source) is not None
+            and _CJK_PATTERN.search(source) is None)
+
+
+def retry_translator(config: dict):
+    """translation_retry_backend 配置的重试后端（配置项覆盖主配置），未配置时返回None"""
+    entry = config.get('translation_retry_backend')
+    if not entry:
+        return None
+    from src.services.tran import create_translator
+    merged = {k: v for k, v in config.items() if k not in ('translation_backends', 'translation_retry_backend')}
+    merged.update(entry)
+    return create_translator(merged)
+
+
+class TranslationEngine:
+    """
+    并发翻译引擎
+
+    Args:
+        translator: 翻译器（BaseTranslator子类）
+        batch_size: 每个请求的字幕条数，<=1 时逐条翻译
+        concurrency: 同时进行的请求数，默认取翻译器的 max_concurrency
+        context_lines: 每个请求附带的前文原文条数
+        context_tokens: 前文上下文的token预算，<=0 时只按条数限制
+        token_counter: 计算上下文token数的 TokenCounter，设置了 context_tokens 时使用
+        context_translations: 上下文中是否附带已完成的前文译文
+        memory: 翻译记忆（TranslationMemory），为None时不使用
+        hedge_policy: 对冲策略（HedgePolicy），为None时不对冲
+        scheduler: 跨任务调度器（TranslationScheduler），为None时由本引擎自行分批发送
+        autotuner: 批量大小与并发数调节器（AutoTuner），为None时使用固定的 batch_size / concurrency
+        retry_rounds: 翻译失败的字幕集中重试的轮数，0 为不重试
+        retry_backoff: 第一轮重试前等待的秒数，之后每轮加倍
+        retry_translator: 重试使用的翻译器，为None时使用 translator
+    """
+
+    def __init__(self, translator, batch_size: int = DEFAULT_BATCH_SIZE, concurrency: Optional[int] = None,
+                 context_lines: int = DEFAULT_CONTEXT_LINES, memory=None, hedge_policy=None,
+                 context_tokens: int = 0, token_counter=None, context_translations: bool = False,
+                 scheduler=None, autotuner=None, retry_rounds: int = DEFAULT_RETRY_ROUNDS,
+                 retry_backoff: float = DEFAULT_RETRY_BACKOFF, retry_translator=None):
+        self.translator = translator
+        self.batch_size = max(1, int(batch_size))
+        self.concurrency = max(1, int(concurrency or translator.max_concurrency))
+        self.context_lines = max(0, int(context_lines))
+        self.context_tokens = int(context_tokens) if token_counter is not None else 0
+        self.token_counter = token_counter
+        self.context_translations = bool(context_translations)
+        self.memory = memory
+        self.namespace = None
+        if memory is not None:
+            from .memory import translator_namespace
+            self.namespace = translator_namespace(translator)
+        self.hedge_policy = hedge_policy
+        self.scheduler = scheduler
+        self.autotuner = autotuner if scheduler is None else None
+        self.retry_rounds = max(0, int(retry_rounds))
+        self.retry_backoff = max(0.0, float(retry_backoff))
+        self.retry_translator = retry_translator
+        self.lock = threading.Lock()
+        # 本引擎累计的翻译统计（一个任务使用一个引擎）
+        self.stats = {'lines': 0, 'resumed': 0, 'memory_hits': 0, 'duplicates': 0, 'requests': 0,
+                      'requests_avoided': 0, 'time_saved': 0.0, 'hedged': 0, 'hedge_wins': 0,
+                      'failed': 0, 'retried': 0, 'recovered': 0}
+
+    @classmethod
+    def from_config(cls, translator, config=None):
+        """按配置创建引擎"""
+        if config is None:
+            from src.services.tran import load_config
+            config = load_config()
+        from .memory import get_translation_memory
+        from .hedging import get_hedge_policy
+        from .scheduler import get_translation_scheduler
+        from .autotune import get_autotuner
+        from .tokens import get_token_counter
+        batch_size = max(1, int(config.get('translation_batch_size', DEFAULT_BATCH_SIZE)))
+        retry = {
+            'retry_rounds': config.get('translation_retry_rounds', DEFAULT_RETRY_ROUNDS),
+            'retry_backoff': config.get('translation_retry_backoff', DEFAULT_RETRY_BACKOFF),
+            'retry_translator': retry_translator(config)
+        }
+        if getattr(translator, 'in_process', False):
+            # 本地模型一个翻译单元在进程内按长度分成多批前向计算，句级模型不使用前文
+            return cls(translator, batch_size=translator.unit_size, context_lines=0,
+                       memory=get_translation_memory(config), **retry)
+        return cls(
+            translator,
+            batch_size=batch_size,
+            context_lines=config.get('translation_context_lines', DEFAULT_CONTEXT_LINES),
+            memory=get_translation_memory(config),
+            hedge_policy=get_hedge_policy(translator, batch_size, config),
+            context_tokens=config.get('translation_context_tokens', DEFAULT_CONTEXT_TOKENS),
+            token_counter=get_token_counter(config),
+            context_translations=config.get('translation_context_translations', False),
+            scheduler=get_translation_scheduler(translator, config),
+            autotuner=get_autotuner(translator, config),
+            **retry
+        )
+
+    def _units(self, todo: List[int]) -> List[List[int]]:
+        """把需要翻译的下标切分为翻译单元"""
+        return [todo[start:start + self.batch_size] for start in range(0, len(todo), self.batch_size)]
+
+    def _request_count(self, lines: int) -> int:
+        return -(-lines // self.batch_size)
+
+    @staticmethod
+    def _deduplicate(texts: List[str], todo: List[int]) -> dict:
+        """按规范化原文分组，返回 {首次出现的下标: [所有出现的下标]}"""
+        first_seen = {}
+        groups = {}
+        for i in todo:
+            key = normalize_text(texts[i])
+            if key not in first_seen:
+                first_seen[key] = i
+                groups[i] = []
+            groups[first_seen[key]].append(i)
+        return groups
+
+    def _call_unit(self, texts: List[str], unit: List[int], context: List[str], outcome: dict = None) -> List[str]:
+        if len(unit) == 1:
+            return [self.translator.translate_text(texts[unit[0]], context)]
+        if outcome is None:
+            return self.translator.translate_batch([texts[i] for i in unit], context)
+        return self.translator.translate_batch([texts[i] for i in unit], context, outcome=outcome)
+
+    def _context(self, texts: List[str], index: int, known: dict) -> List[str]:
+        """texts[index] 的前文上下文，known 为已完成的 {下标: 译文}"""
+        return preceding_context(
+            texts, index, self.context_lines, self.context_tokens,
+            self.token_counter.count if self.token_counter is not None else None,
+            known if self.context_translations else None
+        )
+
+    def _translate_unit(self, texts: List[str], unit: List[int], known: dict,
+                        tuning: Optional[tuple] = None) -> List[str]:
+        """翻译一个单元；tuning 为自动调节时发送时的 (并发数, 设置代数)，为None时（任务收尾）不计入调节"""
+        context = self._context(texts, unit[0], known)
+        start_time = time.time()
+        batch_outcome = {} if self.autotuner is not None else None
+        if self.hedge_policy is None:
+            results = self._call_unit(texts, unit, context, batch_outcome)
+        else:
+            # 翻译失败时翻译器返回原文，至少有一条与原文不同才算有效译文
+            outcome = {}
+            results = self.hedge_policy.run(
+                lambda: self._call_unit(texts, unit, context),
+                lambda translated: any(t != texts[i] for i, t in zip(unit, translated)),
+                outcome
+            )
+            with self.lock:
+                self.stats['hedged'] += outcome['hedged']
+                self.stats['hedge_wins'] += outcome['hedge_won']
+
+        if self.autotuner is not None and tuning is not None:
+            # 翻译失败时翻译器返回原文，整个单元都是原文视为一次失败请求
+            self.autotuner.record(len(unit), time.time() - start_time, tuning[0],
+                                  (batch_outcome or {}).get('misaligned', 0),
+                                  all(t == texts[i] for i, t in zip(unit, results)), tuning[1])
+        self._record_unit(texts, unit, results, (time.time() - start_time) / len(unit), known)
+        return results
+
+    def _record_unit(self, texts: List[str], unit: List[int], results: List[str], per_line: float, known: dict):
+        """记录一个完成的翻译单元: 耗时指标、翻译记忆和已知译文"""
+        get_translation_metrics().record_lines(per_line, len(unit))
+        if self.memory is not None:
+            try:
+                self.memory.store([(texts[i], translated) for i, translated in zip(unit, results)],
+                                  self.namespace, per_line)
+            except Exception as e:
+                logger.warning(f"写入翻译记忆失败: {e}")
+        # 在工作线程中立即登记，下一个请求开始时即可作为上下文
+        known.update(zip(unit, results))
+
+    def _retry_unit(self, translator, texts: List[str], unit: List[int], known: dict) -> List[str]:
+        """用重试翻译器翻译一个单元"""
+        context = self._context(texts, unit[0], known)
+        start_time = time.time()
+        try:
+            if len(unit) == 1:
+                results = [translator.translate_text(texts[unit[0]], context)]
+            else:
+                results = translator.translate_batch([texts[i] for i in unit], context)
+        except Exception as e:
+            logger.error(f"重试翻译请求失败（{len(unit)} 条保留原文）: {e}")
+            results = [texts[i] for i in unit]
+        self._record_unit(texts, unit, results, (time.time() - start_time) / len(unit), known)
+        return results
+
+    def _retry_failed(self, texts: List[str], groups: dict, known: dict, apply_recovered: Callable):
+        """全部翻译结束后把仍为原文的字幕集中起来，退避后按批重新请求，恢复的译文交给 apply_recovered"""
+        failed = [i for i in groups if untranslated(texts[i], known.get(i, texts[i]))]
+        if not failed:
+            return
+        self.stats['failed'] += sum(len(groups[i]) for i in failed)
+        translator = self.retry_translator or self.translator
+        concurrency = self.concurrency if translator is self.translator else translator.max_concurrency
+
+        for attempt in range(self.retry_rounds):
+            if not failed:
+                break
+            delay = self.retry_backoff * 2 ** attempt
+            units = self._units(failed)
+            logger.warning(f"{len(failed)} 条字幕翻译失败，{delay:.1f} 秒后批量重试"
+                           f"（第 {attempt + 1}/{self.retry_rounds} 轮，{len(units)} 个请求）")
+            time.sleep(delay)
+            with self.lock:
+                self.stats['requests'] += len(units)
+                self.stats['retried'] += sum(len(groups[i]) for i in failed)
+
+            recovered = {}
+            with ThreadPoolExecutor(max_workers=min(max(1, concurrency), len(units))) as executor:
+                futures = {executor.submit(self._retry_unit, translator, texts, unit, known): unit for unit in units}
+                for future in as_completed(futures):
+                    for i, translated in zip(futures[future], future.result()):
+                        if not untranslated(texts[i], translated):
+                            recovered[i] = translated
+            if recovered:
+                self.stats['recovered'] += sum(len(groups[i]) for i in recovered)
+                apply_recovered(recovered)
+            failed = [i for i in failed if i not in recovered]
+
+        if failed:
+            logger.warning(f"重试后仍有 {sum(len(groups[i]) for i in failed)} 条字幕保留原文")
+
+    def _scheduled(self, texts: List[str], leaders: List[int], known: dict):
+        """通过跨任务调度器翻译，逐个返回 (单元下标, 译文)；上下文在提交时确定"""
+        items = [(texts[i], self._context(texts, i, known)) for i in leaders]
+        for positions, results, per_line in self.scheduler.run(items):
+            unit = [leaders[p] for p in positions]
+            self._record_unit(texts, unit, results, per_line, known)
+            with self.lock:
+                self.stats['requests'] += 1
+            yield unit, results
+
+    def _translate_tuned(self, texts: List[str], leaders: List[int], known: dict, apply: Callable):
+        """按调节器的当前设置逐个切出翻译单元并发送，设置在翻译过程中变化时立即生效"""
+        batch_size, concurrency, _ = self.autotuner.settings()
+        logger.info(f"翻译 {len(leaders)} 条字幕: 自动调节，当前每批 {batch_size} 条，并发 {concurrency}")
+        queue = deque(leaders)
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.autotuner.max_concurrency) as executor:
+            while queue or running:
+                batch_size, concurrency, generation = self.autotuner.settings()
+                while queue and len(running) < concurrency:
+                    unit = [queue.popleft() for _ in range(min(batch_size, len(queue)))]
+                    # 之后没有字幕可发送时进入收尾，在途请求数低于设置，不计入调节
+                    tuning = (concurrency, generation) if queue else None
+                    running[executor.submit(self._translate_unit, texts, unit, known, tuning)] = unit
+                    with self.lock:
+                        self.stats['requests'] += 1
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    apply(running.pop(future), future.result())
+
+    def _lookup_memory(self, texts: List[str], todo: List[int]) -> dict:
+        """查翻译记忆，返回 {下标: 译文}"""
+        if self.memory is None or not todo:
+            return {}
+        try:
+            found = self.memory.lookup({i: texts[i] for i in todo}, self.namespace)
+        except Exception as e:
+            logger.warning(f"查询翻译记忆失败，全部发送请求: {e}")
+            return {}
+        self.stats['time_saved'] += sum(cost for _, cost in found.values())
+        return {i: translation for i, (translation, _) in found.items()}
+
+    def translate(self, texts: List[str], progress_callback: Optional[Callable] = None,
+                  preceding: Optional[List[str]] = None, journal=None) -> List[str]:
+        """
+        翻译全部文本，返回与输入等长、顺序一致的译文列表
+
+        Args:
+            texts: 原文列表，过短的文本原样保留
+            progress_callback: (已完成条数, 待翻译条数)，每个翻译单元完成后调用
+            preceding: texts之前的原文（流式翻译时为上一批字幕），只作上下文
+            journal: 翻译检查点日志（TranslationJournal），下标相对于texts
+        """
+        preceding = list(preceding or [])
+        full_texts = preceding + list(texts)
+        offset = len(preceding)
+
+        translations = list(texts)
+        todo = [offset + i for i, text in enumerate(texts) if len(text.strip()) >= MIN_TEXT_LENGTH]
+        total = len(todo)
+
+        # 检查点中已有的译文不再请求
+        resumed = {}
+        if journal is not None:
+            resumed = {offset + i: text for i, text in journal.completed.items() if 0 <= i < len(texts)}
+            for i, translated in resumed.items():
+                translations[i - offset] = translated
+            todo = [i for i in todo if i not in resumed]
+
+        remembered = self._lookup_memory(full_texts, todo)
+        for i, translated in remembered.items():
+            translations[i - offset] = translated
+        if journal is not None:
+            journal.append({i - offset: translated for i, translated in remembered.items()})
+        pending = [i for i in todo if i not in remembered]
+
+        # 相同原文只翻译一次
+        groups = self._deduplicate(full_texts, pending)
+        units = self._units(list(groups))
+        duplicates = len(pending) - len(groups)
+        avoided = self._request_count(len(pending)) - len(units)
+
+        self.stats['lines'] += total
+        self.stats['resumed'] += len(resumed)
+        self.stats['memory_hits'] += len(remembered)
+        self.stats['duplicates'] += duplicates
+        if self.scheduler is None and self.autotuner is None:
+            # 使用调度器或自动调节时按实际发送的请求计数
+            self.stats['requests'] += len(units)
+        self.stats['requests_avoided'] += avoided
+        if resumed:
+            logger.info(f"检查点已有 {len(resumed)}/{total} 条译文，跳过")
+        if remembered:
+            logger.info(f"翻译记忆命中 {len(remembered)}/{total} 条")
+        if duplicates:
+            logger.info(f"合并 {duplicates} 条重复字幕（{len(pending)} 条中 {len(groups)} 条不同），"
+                        f"少发送 {avoided} 个请求")
+        if not units:
+            if total and progress_callback:
+                progress_callback(total, total)
+            return translations
+
+        # 已有的译文（检查点、翻译记忆、已完成的请求），供后续请求作为上下文
+        known = dict(resumed)
+        known.update(remembered)
+
+        done = len(resumed) + len(remembered)
+
+        def write(items):
+            """写回译文；仍为原文的（翻译失败）不写入检查点，恢复翻译时重新请求"""
+            completed = {}
+            for i, translated in items:
+                failed = untranslated(full_texts[i], translated)
+                for j in groups[i]:
+                    translations[j - offset] = translated
+                    known[j] = translated
+                    if not failed:
+                        completed[j - offset] = translated
+            if journal is not None and completed:
+                journal.append(completed)
+
+        def apply(unit, results):
+            nonlocal done
+            write(zip(unit, results))
+            done += sum(len(groups[i]) for i in unit)
+            if progress_callback:
+                progress_callback(done, total)
+
+        if self.scheduler is not None:
+            logger.info(f"翻译 {len(groups)} 条字幕: 提交跨任务调度器")
+            for unit, results in self._scheduled(full_texts, list(groups), known):
+                apply(unit, results)
+        elif self.autotuner is not None:
+            self._translate_tuned(full_texts, list(groups), known, apply)
+        else:
+            workers = min(self.concurrency, len(units))
+            logger.info(f"翻译 {len(groups)} 条字幕: {len(units)} 个请求，"
+                        f"每批 {self.batch_size} 条，并发 {workers}")
+
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = {executor.submit(self._translate_unit, full_texts, unit, known): unit for unit in units}
+                for future in as_completed(futures):
+                    apply(futures[future], future.result())
+
+        self._retry_failed(full_texts, groups, known, lambda recovered: write(recovered.items()))
+        return translations
+
+    def get_stats(self) -> dict:
+        """本引擎累计的行数、请求数、重复合并、翻译记忆命中率、节省的耗时和翻译失败/重试/恢复的条数"""
+        lines = self.stats['lines']
+        untranslated_lines = self.stats['failed'] - self.stats['recovered']
+        return {
+            'lines': lines,
+            'resumed': self.stats['resumed'],
+            'requests': self.stats['requests'],
+            'duplicates': self.stats['duplicates'],
+            'requests_avoided': self.stats['requests_avoided'],
+            'memory_hits': self.stats['memory_hits'],
+            'memory_hit_rate': round(self.stats['memory_hits'] / lines, 4) if lines else 0,
+            'memory_time_saved': round(self.stats['time_saved'], 2),
+            'hedged': self.stats['hedged'],
+            'hedge_wins': self.stats['hedge_wins'],
+            'failed': self.stats['failed'],
+            'retried': self.stats['retried'],
+            'recovered': self.stats['recovered'],
+            'untranslated': untranslated_lines,
+            'failure_rate': round(untranslated_lines / lines, 4) if lines else 0
+        }
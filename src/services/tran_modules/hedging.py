@@ -0,0 +1,181 @@
+"""
+对冲请求
+一个翻译单元的耗时超过最近请求耗时的分位数（默认p90）仍未返回时，再发送一份相同的请求
+（使用后端池时会被分配到当前最空闲的后端），先返回有效译文的一方胜出，另一方被取消。
+
+取消依赖流式读取: 被取消的请求在收到下一个分块时断开连接，服务端随之停止生成；
+非流式请求无法中途取消，只是结果被丢弃。
+"""
+
+import os
+import queue
+import sys
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+from utils.logger import get_cached_logger
+from utils.http_client import percentile
+
+from .streaming import set_cancel_event
+
+logger = get_cached_logger("对冲请求")
+
+DEFAULT_HEDGE_PERCENTILE = 0.9
+DEFAULT_HEDGE_MIN_SAMPLES = 20
+# 参与计算分位数的最近请求数
+HEDGE_WINDOW = 200
+
+
+class HedgePolicy:
+    """
+    对冲策略
+
+    Args:
+        fraction: 触发对冲的耗时分位数
+        min_samples: 样本数达到该值后才开始对冲
+    """
+
+    def __init__(self, fraction: float = DEFAULT_HEDGE_PERCENTILE, min_samples: int = DEFAULT_HEDGE_MIN_SAMPLES):
+        self.fraction = float(fraction)
+        self.min_samples = max(1, int(min_samples))
+        self.samples = deque(maxlen=HEDGE_WINDOW)
+        self.lock = threading.Lock()
+        self.hedged = 0
+        self.hedge_wins = 0
+
+    def record(self, elapsed: float):
+        """记录一次未对冲请求（或对冲前主请求）的耗时"""
+        with self.lock:
+            self.samples.append(elapsed)
+
+    def threshold(self) -> Optional[float]:
+        """当前触发对冲的等待时间，样本不足时为None"""
+        with self.lock:
+            if len(self.samples) < self.min_samples:
+                return None
+            return percentile(sorted(self.samples), self.fraction)
+
+    def run(self, call: Callable, is_valid: Callable[[List[str]], bool],
+            outcome: Optional[Dict[str, bool]] = None) -> List[str]:
+        """
+        执行一次可能被对冲的调用
+
+        Args:
+            call: 发送请求并返回译文列表的函数（在独立线程中调用）
+            is_valid: 判断译文是否有效（失败时翻译器返回原文）
+            outcome: 传入时写入 hedged（是否发送了对冲请求）和 hedge_won（是否由对冲请求胜出）
+        """
+        if outcome is None:
+            outcome = {}
+        outcome['hedged'] = outcome['hedge_won'] = False
+        threshold = self.threshold()
+        start_time = time.time()
+        if threshold is None:
+            results = call()
+            self.record(time.time() - start_time)
+            return results
+
+        outcomes = queue.Queue()
+        cancels = []
+
+        def attempt(cancel, label):
+            set_cancel_event(cancel)
+            try:
+                outcomes.put((label, call(), None))
+            except Exception as e:
+                outcomes.put((label, None, e))
+            finally:
+                set_cancel_event(None)
+
+        def launch(label):
+            cancel = threading.Event()
+            cancels.append(cancel)
+            threading.Thread(target=attempt, args=(cancel, label), daemon=True).start()
+
+        launch('primary')
+        pending = 1
+        try:
+            first = outcomes.get(timeout=threshold)
+            pending -= 1
+        except queue.Empty:
+            first = None
+            launch('hedge')
+            pending += 1
+            outcome['hedged'] = True
+            with self.lock:
+                self.hedged += 1
+            logger.debug(f"请求超过 {threshold:.2f} 秒未返回，发送对冲请求")
+
+        fallback = None
+        while True:
+            if first is None:
+                first = outcomes.get()
+                pending -= 1
+            label, results, error = first
+            first = None
+            if label == 'primary':
+                self.record(time.time() - start_time)
+            if error is None and is_valid(results):
+                if label == 'hedge':
+                    outcome['hedge_won'] = True
+                    with self.lock:
+                        self.hedge_wins += 1
+                for cancel in cancels:
+                    cancel.set()
+                return results
+            if error is None and fallback is None:
+                fallback = results
+            if pending == 0:
+                if fallback is not None:
+                    return fallback
+                raise error
+
+    def get_stats(self) -> Dict[str, Any]:
+        threshold = self.threshold()
+        with self.lock:
+            return {
+                'hedged': self.hedged,
+                'hedge_wins': self.hedge_wins,
+                'threshold_ms': round(threshold * 1000, 1) if threshold is not None else None
+            }
+
+
+_policies = {}
+_policies_lock = threading.Lock()
+
+
+def get_hedge_policy(translator, batch_size: int, config: Dict[str, Any]) -> Optional[HedgePolicy]:
+    """
+    按配置获取对冲策略，未启用时返回None
+
+    同一翻译器（后端、模型、提示词、生成设置）和批量大小共用一组耗时样本，新任务不必重新积累样本；
+    思考模式、生成预算不同的档位耗时差别很大，各自统计。
+    """
+    if not config.get('translation_hedging', False):
+        return None
+    from .memory import translator_namespace
+
+    key = (translator_namespace(translator), translator.generation_key(), batch_size)
+    with _policies_lock:
+        policy = _policies.get(key)
+        if policy is None:
+            policy = _policies[key] = HedgePolicy(
+                config.get('translation_hedge_percentile', DEFAULT_HEDGE_PERCENTILE),
+                config.get('translation_hedge_min_samples', DEFAULT_HEDGE_MIN_SAMPLES)
+            )
+        return policy
+
+
+def get_hedge_stats() -> Dict[str, int]:
+    """所有对冲策略累计的对冲次数和对冲胜出次数"""
+    with _policies_lock:
+        policies = list(_policies.values())
+    stats = {'hedged': 0, 'hedge_wins': 0}
+    for policy in policies:
+        policy_stats = policy.get_stats()
+        stats['hedged'] += policy_stats['hedged']
+        stats['hedge_wins'] += policy_stats['hedge_wins']
+    return stats
@@ -0,0 +1,124 @@
+"""
+翻译检查点日志
+翻译过程中每完成一个翻译单元就把译文追加写入任务临时目录下的日志文件（JSON Lines）并刷盘，
+任务中断后重新翻译同一份原文时，已写入日志的行直接复用，只翻译剩余的行。
+
+第一行为文件头，记录原文指纹（全部原文的哈希）和行数，原文变化（如重新转录）时旧日志作废；
+之后每行为一个翻译单元: {"items": {"下标": "译文", ...}}。进程被强制结束时最后一行可能不完整，读取时忽略。
+"""
+
+import hashlib
+import json
+import os
+import sys
+import threading
+from typing import Dict, List
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+from utils.logger import get_cached_logger
+
+logger = get_cached_logger("翻译检查点")
+
+JOURNAL_SUFFIX = "_translation.journal"
+
+
+def journal_path(task_temp_dir: str, task_id: str) -> str:
+    """任务的检查点日志路径"""
+    return os.path.join(task_temp_dir, f"{task_id}{JOURNAL_SUFFIX}")
+
+
+def source_fingerprint(texts: List[str]) -> str:
+    """原文指纹"""
+    digest = hashlib.sha256()
+    for text in texts:
+        digest.update(text.encode('utf-8'))
+        digest.update(b'\x1e')
+    return digest.hexdigest()
+
+
+def read_journal(path: str) -> Dict[str, object]:
+    """读取日志，返回 {'source': 指纹, 'lines': 行数, 'items': {下标: 译文}}；文件不存在或损坏时返回None"""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            header = json.loads(f.readline())
+            items = {}
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # 中断时写了一半的最后一行
+                    break
+                for index, text in record.get('items', {}).items():
+                    items[int(index)] = text
+        return {'source': header.get('source'), 'lines': header.get('lines', 0), 'items': items}
+    except (OSError, ValueError) as e:
+        logger.warning(f"读取翻译检查点失败，忽略: {path}: {e}")
+        return None
+
+
+class TranslationJournal:
+    """
+    翻译检查点日志（线程安全）
+
+    Args:
+        path: 日志文件路径
+        texts: 本次要翻译的全部原文，用于校验旧日志是否属于同一份原文
+    """
+
+    def __init__(self, path: str, texts: List[str]):
+        self.path = path
+        self.fingerprint = source_fingerprint(texts)
+        self.lock = threading.Lock()
+        self.completed = {}
+
+        existing = read_journal(path)
+        if existing and existing['source'] == self.fingerprint:
+            self.completed = existing['items']
+            logger.info(f"从检查点恢复 {len(self.completed)}/{len(texts)} 条译文: {path}")
+        elif existing:
+            logger.info(f"原文已变化，丢弃旧的翻译检查点: {path}")
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # 重写文件: 文件头 + 已恢复的译文（顺带去掉不完整的最后一行）。
+        # 先写临时文件并刷盘再原子替换，重写过程中被结束也不会丢失已恢复的译文
+        temp_path = path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({'source': self.fingerprint, 'lines': len(texts)}) + "\n")
+            if self.completed:
+                f.write(json.dumps({'items': {str(i): t for i, t in self.completed.items()}},
+                                   ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+        self.file = open(path, 'a', encoding='utf-8')
+
+    def _sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def append(self, items: Dict[int, str]):
+        """写入一个翻译单元的译文并刷盘"""
+        if not items:
+            return
+        with self.lock:
+            self.completed.update(items)
+            self.file.write(json.dumps({'items': {str(i): t for i, t in items.items()}},
+                                       ensure_ascii=False) + "\n")
+            self._sync()
+
+    def close(self):
+        with self.lock:
+            if not self.file.closed:
+                self.file.close()
+
+    def remove(self):
+        """翻译结果已保存，删除日志"""
+        self.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
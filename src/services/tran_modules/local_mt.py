@@ -0,0 +1,215 @@
+"""
+本地离线翻译模型
+translator_type 为 local 时，在进程内用 transformers 加载 MarianMT / NLLB 等 seq2seq 翻译模型，
+不经过网络，适合批量任务，也可作为基准测试中流水线其余部分的本地替身。
+
+一次前向计算翻译多条字幕: 翻译单元内的字幕按token长度排序后切成若干批，每批只填充到批内最长的一条，
+长度相近的字幕在同一批中，填充浪费的计算最少。
+
+torch 的CPU推理线程数是进程级设置，与 Whisper 的CPU线程方案（cpu_tuner）共用: 默认沿用方案的 intra-op 线程数，
+local_mt_threads 只在尚未应用方案时生效，与已应用的方案冲突时保持方案不变。
+
+模型按 (模型名, 设备) 只加载一次，各任务共用；推理串行进行（并发由模型内部的计算线程提供）。
+"""
+
+import os
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+from utils.logger import get_cached_logger
+
+from src.services.tran import BaseTranslator
+
+from .metrics import get_translation_metrics
+
+logger = get_cached_logger("本地翻译模型")
+
+DEFAULT_LOCAL_MODEL = "Helsinki-NLP/opus-mt-en-zh"
+DEFAULT_LOCAL_BATCH_SIZE = 32
+DEFAULT_LOCAL_MAX_LENGTH = 256
+# 一个翻译单元包含的批数: 单元越大，按长度分批越充分，但检查点的粒度越粗
+BUCKET_BATCHES = 4
+
+
+class LocalModel:
+    """加载好的分词器与模型，forward 串行执行"""
+
+    def __init__(self, name: str, device: str, threads: int):
+        import torch
+        from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
+
+        self.threads = 0
+        if device == 'cpu':
+            self.threads = cpu_threads(threads)
+            if torch.get_num_threads() != self.threads:
+                torch.set_num_threads(self.threads)
+        start_time = time.time()
+        self.tokenizer = AutoTokenizer.from_pretrained(name)
+        self.model = AutoModelForSeq2SeqLM.from_pretrained(name).to(device).eval()
+        self.device = device
+        self.torch = torch
+        self.lock = threading.Lock()
+        logger.info(f"已加载本地翻译模型: {name} ({device}, {torch.get_num_threads()} 线程)，"
+                    f"耗时 {time.time() - start_time:.1f} 秒")
+
+
+_models = {}
+_models_lock = threading.Lock()
+
+
+def cpu_threads(requested: int) -> int:
+    """
+    CPU推理线程数
+
+    已应用CPU线程方案时使用方案的 intra-op 线程数（local_mt_threads 与之不同时警告，不覆盖方案）；
+    尚未应用时使用 local_mt_threads，为0时按线程方案计算。
+    """
+    from utils.cpu_tuner import CPUThreadPlanner, get_active_plan, load_cpu_settings
+
+    plan = get_active_plan()
+    if plan is not None:
+        if requested > 0 and requested != plan['intra_op']:
+            logger.warning(f"local_mt_threads={requested} 与已应用的CPU线程方案 (intra-op {plan['intra_op']}) 冲突，"
+                           f"torch线程数为进程级设置，保持线程方案不变")
+        return plan['intra_op']
+    if requested > 0:
+        return requested
+    return CPUThreadPlanner().load_plan(load_cpu_settings().get('whisper_cpu_threads'))['intra_op']
+
+
+def get_local_model(name: str, device: str = 'cpu', threads: int = 0) -> LocalModel:
+    """按 (模型名, 设备) 获取本地翻译模型，第一次调用时加载"""
+    key = (name, device)
+    with _models_lock:
+        model = _models.get(key)
+        if model is None:
+            model = _models[key] = LocalModel(name, device, threads)
+        elif threads > 0 and model.threads and threads != model.threads:
+            logger.warning(f"本地翻译模型 {name} 已按 {model.threads} 线程加载，忽略 local_mt_threads={threads}")
+        return model
+
+
+def length_buckets(lengths: List[int], batch_size: int, sort: bool = True) -> List[List[int]]:
+    """按长度排序（sort为False时按原顺序）后每 batch_size 条一批，返回每批的下标列表"""
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i]) if sort else list(range(len(lengths)))
+    return [order[start:start + batch_size] for start in range(0, len(order), batch_size)]
+
+
+def padding_ratio(lengths: List[int], buckets: List[List[int]]) -> float:
+    """各批填充到批内最长一条后，填充token占全部token的比例"""
+    total = sum(max(lengths[i] for i in bucket) * len(bucket) for bucket in buckets)
+    return 1 - sum(lengths) / total if total else 0.0
+
+
+class LocalMTTranslator(BaseTranslator):
+    """
+    进程内 seq2seq 翻译器
+
+    配置项:
+        local_mt_model: Hugging Face 模型名或本地路径（MarianMT、NLLB、M2M100 等）
+        local_mt_device: 推理设备，默认 cpu
+        local_mt_threads: CPU推理线程数，0 为沿用CPU线程方案的 intra-op 线程数
+        local_mt_batch_size: 每次前向计算的字幕条数
+        local_mt_max_length: 原文与译文的最大token数
+        local_mt_num_beams: 束搜索宽度，1 为贪心解码（最快）
+        local_mt_src_lang / local_mt_tgt_lang: 多语言模型（NLLB）的源语言与目标语言代码
+    """
+
+    translator_type = 'local'
+    # 不经过网络，翻译单元按 unit_size 切分，不附带前文上下文，也不对冲
+    in_process = True
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        config = config or {}
+        self.model = config.get('local_mt_model', DEFAULT_LOCAL_MODEL)
+        self.device = config.get('local_mt_device', 'cpu')
+        self.threads = int(config.get('local_mt_threads', 0))
+        self.batch_size = max(1, int(config.get('local_mt_batch_size', DEFAULT_LOCAL_BATCH_SIZE)))
+        self.max_length = int(config.get('local_mt_max_length', DEFAULT_LOCAL_MAX_LENGTH))
+        self.num_beams = max(1, int(config.get('local_mt_num_beams', 1)))
+        self.src_lang = config.get('local_mt_src_lang')
+        self.tgt_lang = config.get('local_mt_tgt_lang')
+        self.unit_size = self.batch_size * BUCKET_BATCHES
+        self.sort_by_length = True
+        logger.info(f"初始化本地翻译器 - 模型: {self.model}, 设备: {self.device}, 每批 {self.batch_size} 条")
+
+        super().__init__()
+
+    def _model(self) -> LocalModel:
+        return get_local_model(self.model, self.device, self.threads)
+
+    def chat(self, messages):
+        raise NotImplementedError("本地翻译模型不支持对话请求")
+
+    def probe(self):
+        try:
+            self._model()
+            return True
+        except Exception as e:
+            logger.warning(f"本地翻译模型不可用: {e}")
+            return False
+
+    def prewarm(self):
+        """加载模型（转录期间在后台调用，第一条字幕不必等待模型加载）"""
+        return self.probe()
+
+    def _generate(self, local: LocalModel, texts: List[str]) -> List[str]:
+        """一次前向计算翻译一批文本，只填充到批内最长的一条"""
+        tokenizer = local.tokenizer
+        kwargs = {'max_new_tokens': self.max_length, 'num_beams': self.num_beams}
+        if self.tgt_lang:
+            kwargs['forced_bos_token_id'] = tokenizer.convert_tokens_to_ids(self.tgt_lang)
+
+        start_time = time.time()
+        with local.lock, local.torch.inference_mode():
+            # 分词器的源语言设置是共享状态，与推理一起串行
+            if self.src_lang:
+                tokenizer.src_lang = self.src_lang
+            inputs = tokenizer(texts, return_tensors='pt', padding='longest', truncation=True,
+                               max_length=self.max_length).to(local.device)
+            outputs = local.model.generate(**inputs, **kwargs)
+        elapsed = time.time() - start_time
+
+        pad_id = tokenizer.pad_token_id
+        generated = int((outputs != pad_id).sum()) if pad_id is not None else outputs.numel()
+        get_translation_metrics().record_request(
+            self.translator_type, elapsed, tokens=generated, kept_tokens=generated,
+            prompt_tokens=int(inputs['attention_mask'].sum())
+        )
+        return [text.strip() for text in tokenizer.batch_decode(outputs, skip_special_tokens=True)]
+
+    def translate_batch(self, texts, context=None, outcome=None):
+        """
+        翻译多条文本，返回与输入等长的译文列表
+
+        按token长度分批，每批一次前向计算；context 被忽略（句级翻译模型不使用前文）。
+        某一批失败时该批返回原文，不影响其他批。
+        """
+        results = list(texts)
+        todo = [i for i, text in enumerate(texts) if text.strip()]
+        if not todo:
+            return results
+        try:
+            local = self._model()
+        except Exception as e:
+            logger.error(f"加载本地翻译模型失败: {e}")
+            return results
+
+        lengths = [len(local.tokenizer.tokenize(texts[i])) for i in todo]
+        for bucket in length_buckets(lengths, self.batch_size, self.sort_by_length):
+            indices = [todo[j] for j in bucket]
+            try:
+                translated = self._generate(local, [texts[i] for i in indices])
+            except Exception as e:
+                logger.error(f"本地模型翻译出错（{len(indices)} 条保留原文）: {e}")
+                continue
+            for i, text in zip(indices, translated):
+                results[i] = text or texts[i]
+        return results
+
+    def translate_text(self, text, context=None):
+        """翻译单条文本，失败时返回原文"""
+        return self.translate_batch([text])[0]
@@ -0,0 +1,241 @@
+"""
+翻译记忆
+把已翻译的字幕按 (规范化原文, 翻译器类型, 模型, 提示词哈希) 存入本地SQLite文件，
+再次遇到相同原文时直接复用译文，不发送网络请求。
+
+每条记录带创建时间（超过TTL视为失效）和最近使用时间（超出容量时按LRU淘汰），
+并记录生成该译文所花的时间，用于统计命中节省的耗时。
+"""
+
+import hashlib
+import os
+import sqlite3
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+from utils.logger import get_cached_logger
+
+logger = get_cached_logger("翻译记忆")
+
+DEFAULT_DB_PATH = "db/translation_memory.sqlite3"
+DEFAULT_TTL_DAYS = 30
+DEFAULT_MAX_ENTRIES = 200000
+
+# SQLite 单条语句的参数个数上限较低，批量查询时分块
+_QUERY_CHUNK = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS memory (
+    key TEXT PRIMARY KEY,
+    translator TEXT NOT NULL,
+    model TEXT NOT NULL,
+    prompt_hash TEXT NOT NULL,
+    source TEXT NOT NULL,
+    translation TEXT NOT NULL,
+    cost REAL NOT NULL DEFAULT 0,
+    hits INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_memory_last_used ON memory (last_used);
+"""
+
+
+def normalize_text(text: str) -> str:
+    """规范化原文: 去掉首尾空白，连续空白（含换行）合并为一个空格"""
+    return " ".join(text.split())
+
+
+def translator_namespace(translator) -> Tuple[str, str, str]:
+    """翻译器对应的记忆命名空间: (翻译器类型, 模型, 提示词哈希)"""
+    prompt = getattr(translator, 'system_prompt', '') or ''
+    prompt_hash = hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:16]
+    return (getattr(translator, 'translator_type', type(translator).__name__),
+            str(getattr(translator, 'model', '') or ''),
+            prompt_hash)
+
+
+def memory_key(text: str, namespace: Tuple[str, str, str]) -> str:
+    raw = "\x1f".join(namespace + (normalize_text(text),))
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class TranslationMemory:
+    """
+    基于SQLite的翻译记忆（线程安全）
+
+    Args:
+        db_path: SQLite文件路径
+        ttl_days: 记录有效天数，<=0 表示不过期
+        max_entries: 最多保留的记录数，超出时淘汰最久未使用的记录
+    """
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH, ttl_days: float = DEFAULT_TTL_DAYS,
+                 max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.db_path = db_path
+        self.ttl = float(ttl_days) * 86400 if ttl_days and float(ttl_days) > 0 else None
+        self.max_entries = max(1, int(max_entries))
+        self.lock = threading.Lock()
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.executescript(_SCHEMA)
+        self.conn.commit()
+
+        # 进程内累计统计
+        self.hits = 0
+        self.misses = 0
+        self.time_saved = 0.0
+        self.evicted = 0
+        self.expired = 0
+
+    def lookup(self, texts: Dict[int, str], namespace: Tuple[str, str, str]) -> Dict[int, Tuple[str, float]]:
+        """
+        查找译文
+
+        Args:
+            texts: {下标: 原文}
+            namespace: translator_namespace() 的返回值
+
+        Returns:
+            {下标: (译文, 当初生成耗时)}，只包含命中且未过期的条目
+        """
+        if not texts:
+            return {}
+        keys = {index: memory_key(text, namespace) for index, text in texts.items()}
+        now = time.time()
+
+        found = {}
+        with self.lock:
+            unique_keys = list(set(keys.values()))
+            for start in range(0, len(unique_keys), _QUERY_CHUNK):
+                chunk = unique_keys[start:start + _QUERY_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self.conn.execute(
+                    f"SELECT key, translation, cost, created_at FROM memory WHERE key IN ({placeholders})",
+                    chunk
+                ).fetchall()
+                for key, translation, cost, created_at in rows:
+                    found[key] = (translation, cost, created_at)
+
+            expired = [key for key, (_, _, created_at) in found.items()
+                       if self.ttl is not None and now - created_at > self.ttl]
+            if expired:
+                self.conn.executemany("DELETE FROM memory WHERE key = ?", [(key,) for key in expired])
+                self.expired += len(expired)
+                for key in expired:
+                    del found[key]
+
+            results = {index: found[key][:2] for index, key in keys.items() if key in found}
+            if found:
+                self.conn.executemany(
+                    "UPDATE memory SET hits = hits + 1, last_used = ? WHERE key = ?",
+                    [(now, key) for key in found]
+                )
+            self.conn.commit()
+
+            self.hits += len(results)
+            self.misses += len(texts) - len(results)
+            self.time_saved += sum(cost for _, cost in results.values())
+        return results
+
+    def store(self, items: List[Tuple[str, str]], namespace: Tuple[str, str, str], cost: float = 0.0):
+        """
+        写入译文
+
+        Args:
+            items: [(原文, 译文)]，译文与原文相同（多为翻译失败时原样返回）的不写入
+            namespace: translator_namespace() 的返回值
+            cost: 生成每条译文的平均耗时（秒）
+        """
+        rows = []
+        now = time.time()
+        for text, translation in items:
+            if not translation.strip() or normalize_text(translation) == normalize_text(text):
+                continue
+            rows.append((memory_key(text, namespace), namespace[0], namespace[1], namespace[2],
+                         normalize_text(text), translation, cost, now, now))
+        if not rows:
+            return
+
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO memory "
+                "(key, translator, model, prompt_hash, source, translation, cost, hits, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, 0, ?, ?)",
+                rows
+            )
+            self._evict()
+            self.conn.commit()
+
+    def _evict(self):
+        """删除过期记录，超出容量时按最近使用时间淘汰（调用方持有锁）"""
+        if self.ttl is not None:
+            cursor = self.conn.execute("DELETE FROM memory WHERE created_at < ?", (time.time() - self.ttl,))
+            self.expired += max(0, cursor.rowcount)
+
+        count = self.conn.execute("SELECT COUNT(*) FROM memory").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self.conn.execute(
+                "DELETE FROM memory WHERE key IN (SELECT key FROM memory ORDER BY last_used ASC LIMIT ?)",
+                (overflow,)
+            )
+            self.evicted += overflow
+            logger.debug(f"翻译记忆超出容量，淘汰最久未使用的 {overflow} 条")
+
+    def clear(self):
+        """清空翻译记忆"""
+        with self.lock:
+            self.conn.execute("DELETE FROM memory")
+            self.conn.commit()
+
+    def get_stats(self) -> Dict[str, object]:
+        """记录数与进程内累计命中统计"""
+        with self.lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM memory").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                'entries': entries,
+                'max_entries': self.max_entries,
+                'ttl_days': round(self.ttl / 86400, 2) if self.ttl is not None else None,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0,
+                'time_saved_seconds': round(self.time_saved, 2),
+                'evicted': self.evicted,
+                'expired': self.expired
+            }
+
+
+_translation_memory = None
+_translation_memory_lock = threading.Lock()
+
+
+def get_translation_memory(config=None) -> Optional[TranslationMemory]:
+    """按配置获取全局翻译记忆实例，未启用时返回None"""
+    global _translation_memory
+    if config is None:
+        from src.services.tran import load_config
+        config = load_config()
+    if not config.get('translation_memory_enabled', True):
+        return None
+
+    with _translation_memory_lock:
+        if _translation_memory is None:
+            try:
+                _translation_memory = TranslationMemory(
+                    config.get('translation_memory_path', DEFAULT_DB_PATH),
+                    config.get('translation_memory_ttl_days', DEFAULT_TTL_DAYS),
+                    config.get('translation_memory_max_entries', DEFAULT_MAX_ENTRIES)
+                )
+                logger.info(f"翻译记忆已加载: {_translation_memory.db_path}")
+            except sqlite3.Error as e:
+                logger.error(f"打开翻译记忆失败，本次不使用翻译记忆: {e}")
+                return None
+        return _translation_memory
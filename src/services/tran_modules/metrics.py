@@ -0,0 +1,152 @@
+"""
+翻译运行指标
+按后端记录请求数、首个token耗时、提示词token数、生成/保留token数、提前截断和停滞超时次数，
+并记录每条字幕从发出请求到拿到译文的耗时（批量请求按条数平摊）。
+Ollama 另外记录服务端报告的提示词预填充耗时与模型加载次数；每个翻译器（一个任务一个）的第一个请求的
+首个token耗时单独记录，用于观察模型预热的效果。
+"""
+
+import os
+import sys
+import threading
+from collections import deque
+from typing import Any, Dict, Optional
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+from utils.http_client import percentile
+
+# 保留的最近样本数（用于计算分位数）
+SAMPLE_WINDOW = 1000
+# 服务端报告的模型加载耗时超过该值（秒）时记为一次模型加载
+MODEL_LOAD_SECONDS = 0.5
+
+
+def _summary(samples) -> Dict[str, float]:
+    values = sorted(samples)
+    return {
+        'count': len(values),
+        'p50_ms': round(percentile(values, 0.5) * 1000, 1),
+        'p90_ms': round(percentile(values, 0.9) * 1000, 1),
+        'p99_ms': round(percentile(values, 0.99) * 1000, 1)
+    }
+
+
+def _token_summary(samples) -> Dict[str, float]:
+    values = sorted(samples)
+    return {
+        'count': len(values),
+        'mean': round(sum(values) / len(values), 1) if values else 0,
+        'p50': percentile(values, 0.5),
+        'p99': percentile(values, 0.99)
+    }
+
+
+class BackendMetrics:
+    """单个翻译后端的请求统计"""
+
+    def __init__(self):
+        self.requests = 0
+        self.streamed = 0
+        self.cut_early = 0
+        self.stalled = 0
+        self.tokens = 0
+        self.kept_tokens = 0
+        self.prompt_tokens = deque(maxlen=SAMPLE_WINDOW)
+        self.elapsed = deque(maxlen=SAMPLE_WINDOW)
+        self.first_token = deque(maxlen=SAMPLE_WINDOW)
+        self.prefill = deque(maxlen=SAMPLE_WINDOW)
+        self.prefill_tokens = deque(maxlen=SAMPLE_WINDOW)
+        self.model_loads = 0
+        self.first_line_first_token = deque(maxlen=SAMPLE_WINDOW)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'requests': self.requests,
+            'streamed': self.streamed,
+            'cut_early': self.cut_early,
+            'stalled': self.stalled,
+            'generated_tokens': self.tokens,
+            'kept_tokens': self.kept_tokens,
+            'kept_ratio': round(self.kept_tokens / self.tokens, 4) if self.tokens else 0,
+            'prompt_tokens': _token_summary(self.prompt_tokens),
+            'elapsed': _summary(self.elapsed),
+            'first_token': _summary(self.first_token),
+            'prefill': _summary(self.prefill),
+            'prefill_tokens': _token_summary(self.prefill_tokens),
+            'model_loads': self.model_loads,
+            'first_line_first_token': _summary(self.first_line_first_token)
+        }
+
+
+class TranslationMetrics:
+    """翻译运行指标（线程安全）"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.backends = {}
+        self.line_latency = deque(maxlen=SAMPLE_WINDOW)
+
+    def _backend(self, name: str) -> BackendMetrics:
+        backend = self.backends.get(name)
+        if backend is None:
+            backend = self.backends[name] = BackendMetrics()
+        return backend
+
+    def record_request(self, backend: str, elapsed: float, first_token: Optional[float] = None,
+                       tokens: int = 0, kept_tokens: int = 0, streamed: bool = False, cut_early: bool = False,
+                       prompt_tokens: Optional[int] = None):
+        """记录一次完成的模型请求，tokens为生成的token数（含思考），kept_tokens为保留为译文的部分"""
+        with self.lock:
+            metrics = self._backend(backend)
+            metrics.requests += 1
+            metrics.tokens += tokens
+            metrics.kept_tokens += kept_tokens
+            metrics.elapsed.append(elapsed)
+            if streamed:
+                metrics.streamed += 1
+            if cut_early:
+                metrics.cut_early += 1
+            if first_token is not None:
+                metrics.first_token.append(first_token)
+            if prompt_tokens is not None:
+                metrics.prompt_tokens.append(prompt_tokens)
+
+    def record_server_timing(self, backend: str, prefill: float, prompt_tokens: int, load: float):
+        """记录服务端报告的预填充耗时与token数，模型加载耗时较长时记为一次模型加载"""
+        with self.lock:
+            metrics = self._backend(backend)
+            metrics.prefill.append(prefill)
+            metrics.prefill_tokens.append(prompt_tokens)
+            if load >= MODEL_LOAD_SECONDS:
+                metrics.model_loads += 1
+
+    def record_first_line(self, backend: str, first_token: float):
+        """记录一个翻译器第一个请求的首个token耗时"""
+        with self.lock:
+            self._backend(backend).first_line_first_token.append(first_token)
+
+    def record_stall(self, backend: str):
+        """记录一次token间停滞超时"""
+        with self.lock:
+            self._backend(backend).stalled += 1
+
+    def record_lines(self, seconds_per_line: float, count: int = 1):
+        """记录count条字幕的完成耗时"""
+        with self.lock:
+            for _ in range(count):
+                self.line_latency.append(seconds_per_line)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                'backends': {name: metrics.to_dict() for name, metrics in self.backends.items()},
+                'line_completion': _summary(self.line_latency)
+            }
+
+
+_translation_metrics = TranslationMetrics()
+
+
+def get_translation_metrics() -> TranslationMetrics:
+    """获取全局翻译运行指标"""
+    return _translation_metrics
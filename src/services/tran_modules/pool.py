@@ -0,0 +1,279 @@
+"""
+翻译后端池
+把 translation_backends 中配置的多个翻译后端（多台Ollama主机、OpenAI兼容网关）组合成一个翻译器:
+每个请求发往 在途请求数/权重 最低且未满载的健康后端；某个后端连续失败达到阈值后熔断剔除，
+冷却期过后由后台线程探测，探测成功再重新加入。请求失败时换一个后端重试。
+
+每个后端的配置项覆盖主配置（提示词、生成预算等沿用主配置）:
+    {"name": "gpu1", "translator_type": "ollama", "ollama_api": "http://10.0.0.2:11434",
+     "ollama_model": "qwen3:8b", "weight": 2, "max_concurrency": 2}
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+from utils.logger import get_cached_logger
+from utils.http_client import percentile
+
+from src.services.tran import BaseTranslator
+
+from .streaming import RequestCancelled
+
+logger = get_cached_logger("翻译后端池")
+
+# 所有后端都满载或不可用时等待的最长时间
+ACQUIRE_TIMEOUT = 300
+# 每个后端保留的最近延迟样本数
+LATENCY_WINDOW = 500
+
+DEFAULT_BREAKER_FAILURES = 3
+DEFAULT_BREAKER_COOLDOWN = 30
+DEFAULT_PROBE_INTERVAL = 10
+
+# 熔断器状态
+CLOSED = "closed"
+OPEN = "open"
+
+
+class Backend:
+    """池中的一个翻译后端"""
+
+    def __init__(self, name: str, translator, weight: float, max_concurrency: int):
+        self.name = name
+        self.translator = translator
+        self.weight = max(0.01, float(weight))
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.state = CLOSED
+        self.in_flight = 0
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.requests = 0
+        self.errors = 0
+        self.last_error = None
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+    @property
+    def healthy(self) -> bool:
+        return self.state == CLOSED
+
+    def to_dict(self) -> Dict[str, Any]:
+        latencies = sorted(self.latencies)
+        return {
+            'name': self.name,
+            'translator_type': self.translator.translator_type,
+            'model': self.translator.model,
+            'weight': self.weight,
+            'max_concurrency': self.max_concurrency,
+            'state': self.state,
+            'in_flight': self.in_flight,
+            'requests': self.requests,
+            'errors': self.errors,
+            'consecutive_failures': self.consecutive_failures,
+            'last_error': self.last_error,
+            'p50_ms': round(percentile(latencies, 0.5) * 1000, 1),
+            'p90_ms': round(percentile(latencies, 0.9) * 1000, 1),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 1)
+        }
+
+
+class TranslatorPool(BaseTranslator):
+    """
+    多后端翻译器
+
+    Args:
+        backends: Backend 列表
+        breaker_failures: 连续失败多少次后熔断
+        breaker_cooldown: 熔断后多少秒开始探测
+        probe_interval: 后台探测间隔（秒）
+    """
+
+    translator_type = 'pool'
+
+    def __init__(self, backends: List[Backend], breaker_failures: int = DEFAULT_BREAKER_FAILURES,
+                 breaker_cooldown: float = DEFAULT_BREAKER_COOLDOWN,
+                 probe_interval: float = DEFAULT_PROBE_INTERVAL):
+        if not backends:
+            raise ValueError("翻译后端池至少需要一个后端")
+        super().__init__()
+        self.backends = backends
+        self.breaker_failures = max(1, int(breaker_failures))
+        self.breaker_cooldown = float(breaker_cooldown)
+        self.probe_interval = float(probe_interval)
+        # 池的并发上限为各后端之和，由引擎据此决定同时发出的请求数
+        self.max_concurrency = sum(b.max_concurrency for b in backends)
+        self.model = ",".join(sorted({b.translator.model for b in backends}))
+        self.condition = threading.Condition()
+        self.probe_thread = None
+
+    def generation_key(self) -> str:
+        return ";".join(backend.translator.generation_key() for backend in self.backends)
+
+    def _start_probe_thread(self):
+        if self.probe_thread is None:
+            self.probe_thread = threading.Thread(target=self._probe_loop, daemon=True)
+            self.probe_thread.start()
+
+    def _probe_loop(self):
+        while True:
+            time.sleep(self.probe_interval)
+            with self.condition:
+                due = [b for b in self.backends
+                       if b.state == OPEN and time.time() - b.opened_at >= self.breaker_cooldown]
+            for backend in due:
+                ok = backend.translator.probe()
+                with self.condition:
+                    if ok:
+                        backend.state = CLOSED
+                        backend.consecutive_failures = 0
+                        logger.info(f"翻译后端探测成功，重新加入: {backend.name}")
+                        self.condition.notify_all()
+                    else:
+                        backend.opened_at = time.time()
+                        logger.debug(f"翻译后端探测失败，继续剔除: {backend.name}")
+
+    def acquire(self, exclude=()) -> Backend:
+        """选择 在途请求数/权重 最低的未满载健康后端，在途请求数+1"""
+        self._start_probe_thread()
+        deadline = time.time() + ACQUIRE_TIMEOUT
+        with self.condition:
+            while True:
+                candidates = [b for b in self.backends if b.healthy and b.name not in exclude]
+                free = [b for b in candidates if b.in_flight < b.max_concurrency]
+                if free:
+                    backend = min(free, key=lambda b: (b.in_flight + 1) / b.weight)
+                    backend.in_flight += 1
+                    return backend
+                if exclude and not candidates:
+                    raise Exception("没有其他可用的翻译后端")
+
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise Exception("等待可用的翻译后端超时")
+                self.condition.wait(min(remaining, self.probe_interval))
+
+    def release(self, backend: Backend, elapsed: float, error: Exception = None):
+        with self.condition:
+            backend.in_flight -= 1
+            backend.requests += 1
+            if isinstance(error, RequestCancelled):
+                # 主动取消（对冲请求落败）不算后端故障
+                pass
+            elif error is None:
+                backend.consecutive_failures = 0
+                backend.latencies.append(elapsed)
+            else:
+                backend.errors += 1
+                backend.consecutive_failures += 1
+                backend.last_error = str(error)
+                if backend.state == CLOSED and backend.consecutive_failures >= self.breaker_failures:
+                    backend.state = OPEN
+                    backend.opened_at = time.time()
+                    logger.warning(f"翻译后端连续失败 {backend.consecutive_failures} 次，熔断剔除: "
+                                   f"{backend.name} - {error}")
+            self.condition.notify_all()
+
+    def chat(self, messages):
+        """在池中选择后端发送请求，失败时换一个后端重试"""
+        tried = []
+        last_error = None
+        while len(tried) < len(self.backends):
+            try:
+                backend = self.acquire(exclude=tried)
+            except Exception:
+                if last_error is not None:
+                    raise last_error
+                raise
+            tried.append(backend.name)
+            start_time = time.time()
+            try:
+                content = backend.translator.chat(messages)
+            except RequestCancelled as e:
+                self.release(backend, time.time() - start_time, e)
+                raise
+            except Exception as e:
+                self.release(backend, time.time() - start_time, e)
+                logger.warning(f"翻译后端请求失败: {backend.name} - {e}")
+                last_error = e
+                continue
+            self.release(backend, time.time() - start_time)
+            return content
+        raise last_error
+
+    def probe(self) -> bool:
+        return any(b.translator.probe() for b in self.backends)
+
+    def prewarm(self) -> bool:
+        """预热所有健康的后端"""
+        results = [b.translator.prewarm() for b in self.backends if b.healthy]
+        return any(results)
+
+    def get_stats(self) -> List[Dict[str, Any]]:
+        with self.condition:
+            return [b.to_dict() for b in self.backends]
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def backend_configs(config: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """每个后端生效的完整配置（后端配置项覆盖主配置）"""
+    base = {k: v for k, v in config.items() if k != 'translation_backends'}
+    merged = []
+    for index, entry in enumerate(config.get('translation_backends') or []):
+        backend_config = dict(base)
+        backend_config.update(entry)
+        backend_config.setdefault('name', f"backend{index + 1}")
+        merged.append(backend_config)
+    return merged
+
+
+def get_translator_pool(config: Dict[str, Any]) -> TranslatorPool:
+    """
+    按配置获取翻译后端池
+
+    相同后端配置共用一个池，各任务的请求在同一组在途计数和熔断状态下调度。
+    """
+    from src.services.tran import create_translator
+
+    configs = backend_configs(config)
+    key = json.dumps(configs, sort_keys=True, ensure_ascii=False, default=str)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            backends = []
+            for backend_config in configs:
+                translator = create_translator(backend_config)
+                if translator.in_process:
+                    raise ValueError(f"本地翻译模型不能加入翻译后端池: {backend_config['name']}")
+                backends.append(Backend(
+                    backend_config['name'],
+                    translator,
+                    backend_config.get('weight', 1),
+                    backend_config.get('max_concurrency', translator.max_concurrency)
+                ))
+            pool = TranslatorPool(
+                backends,
+                breaker_failures=config.get('translation_breaker_failures', DEFAULT_BREAKER_FAILURES),
+                breaker_cooldown=config.get('translation_breaker_cooldown', DEFAULT_BREAKER_COOLDOWN),
+                probe_interval=config.get('translation_probe_interval', DEFAULT_PROBE_INTERVAL)
+            )
+            _pools[key] = pool
+            logger.info(f"翻译后端池: {', '.join(b.name for b in backends)}，总并发 {pool.max_concurrency}")
+        return pool
+
+
+def get_pool_stats() -> List[Dict[str, Any]]:
+    """所有翻译后端池中各后端的状态与延迟统计"""
+    with _pools_lock:
+        pools = list(_pools.values())
+    stats = []
+    for pool in pools:
+        stats.extend(pool.get_stats())
+    return stats
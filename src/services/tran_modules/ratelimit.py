@@ -0,0 +1,220 @@
+"""
+远程翻译接口的客户端限流
+托管的OpenAI兼容接口按每分钟请求数（RPM）和每分钟token数（TPM）限额，超出时返回429。
+配置了 openai_rpm / openai_tpm 后，同一接口地址和模型的所有请求（所有任务、所有并发线程）共用一个
+令牌桶限流器: 发送前按请求数和预估token数（提示词 + 生成预算）排队等待，先到先得，不超过限额。
+
+仍然收到429时（限额比配置的小，或同一账号还有其他调用方），整个接口按 Retry-After 暂停，
+被限流的请求重新排队，而不是作为失败返回原文；排队超过 openai_rate_limit_max_wait 秒才放弃。
+"""
+
+import email.utils
+import os
+import sys
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+from utils.logger import get_cached_logger
+
+logger = get_cached_logger("接口限流")
+
+DEFAULT_MAX_WAIT = 600
+# 令牌桶容量为该秒数内的配额，空闲后最多一次突发这么多请求
+# （单个请求的token数超过容量时等桶满后放行，超出部分从之后的配额中扣除）
+BURST_SECONDS = 1
+# 没有 Retry-After 时的暂停秒数，连续被限流时加倍
+DEFAULT_THROTTLE_PAUSE = 1.0
+MAX_THROTTLE_PAUSE = 60.0
+
+
+class RateLimitTimeout(Exception):
+    """排队等待配额超时"""
+
+
+def retry_after_seconds(headers) -> Optional[float]:
+    """从429响应头读取等待秒数: retry-after-ms、Retry-After（秒数或HTTP日期），没有时返回None"""
+    value = headers.get('retry-after-ms')
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimiter:
+    """
+    一个接口的请求数/token数令牌桶（线程安全，按到达顺序放行）
+
+    Args:
+        key: 接口标识 "地址|模型"
+        rpm: 每分钟请求数上限，0 为不限
+        tpm: 每分钟token数上限，0 为不限
+        max_wait: 一个请求最多排队的秒数
+    """
+
+    def __init__(self, key: str, rpm: float = 0, tpm: float = 0, max_wait: float = DEFAULT_MAX_WAIT):
+        self.key = key
+        self.condition = threading.Condition()
+        self.waiting = deque()
+        self.paused_until = 0.0
+        self.consecutive_throttles = 0
+        self.stats = {'requests': 0, 'waited': 0, 'wait_time': 0.0, 'throttled': 0, 'timeouts': 0}
+        self.configure(rpm, tpm, max_wait)
+        self.request_tokens = self.request_capacity
+        self.token_tokens = self.token_capacity
+        self.updated_at = time.time()
+
+    def configure(self, rpm: float, tpm: float, max_wait: float = DEFAULT_MAX_WAIT):
+        """更新限额（配置修改后新建的翻译器生效）"""
+        with self.condition:
+            self.rpm = max(0.0, float(rpm or 0))
+            self.tpm = max(0.0, float(tpm or 0))
+            self.max_wait = float(max_wait)
+            self.request_capacity = max(1.0, self.rpm * BURST_SECONDS / 60)
+            self.token_capacity = self.tpm * BURST_SECONDS / 60
+            if hasattr(self, 'request_tokens'):
+                self.request_tokens = min(self.request_tokens, self.request_capacity)
+                self.token_tokens = min(self.token_tokens, self.token_capacity)
+            self.condition.notify_all()
+
+    def _refill(self, now: float):
+        elapsed = now - self.updated_at
+        self.updated_at = now
+        if self.rpm:
+            self.request_tokens = min(self.request_capacity, self.request_tokens + elapsed * self.rpm / 60)
+        if self.tpm:
+            self.token_tokens = min(self.token_capacity, self.token_tokens + elapsed * self.tpm / 60)
+
+    def _wait_time(self, tokens: float, now: float) -> float:
+        """还需要等待多少秒才有足够的配额（调用方持有锁）"""
+        wait = self.paused_until - now
+        if self.rpm and self.request_tokens < 1:
+            wait = max(wait, (1 - self.request_tokens) * 60 / self.rpm)
+        # 超过桶容量的请求等桶满即可放行
+        needed = min(tokens, self.token_capacity)
+        if self.tpm and self.token_tokens < needed:
+            wait = max(wait, (needed - self.token_tokens) * 60 / self.tpm)
+        return wait
+
+    def acquire(self, tokens: int = 0, deadline: Optional[float] = None) -> float:
+        """
+        排队直到有一个请求和 tokens 个token的配额，超过 deadline 时抛出 RateLimitTimeout，返回扣除的token数
+
+        单个请求的token数超过桶容量时等桶满后放行并扣除全部token数（桶为负，之后的请求等待补足），
+        不会永远等待，长期的token速率也不超过限额。请求完成后把返回值传给 settle。
+        """
+        if deadline is None:
+            deadline = time.time() + self.max_wait
+        start_time = time.time()
+        ticket = object()
+        with self.condition:
+            tokens = float(tokens) if self.tpm else 0.0
+            self.waiting.append(ticket)
+            try:
+                while True:
+                    now = time.time()
+                    self._refill(now)
+                    wait = self._wait_time(tokens, now) if self.waiting[0] is ticket else None
+                    if wait is not None and wait <= 0:
+                        break
+                    if now >= deadline:
+                        self.stats['timeouts'] += 1
+                        raise RateLimitTimeout(f"等待 {self.key} 的限流配额超过 {now - start_time:.0f} 秒")
+                    # 排在前面的请求放行时会唤醒后面的请求
+                    self.condition.wait(deadline - now if wait is None else min(wait, deadline - now))
+                if self.rpm:
+                    self.request_tokens -= 1
+                self.token_tokens -= tokens
+                waited = time.time() - start_time
+                self.stats['requests'] += 1
+                if waited > 0.001:
+                    self.stats['waited'] += 1
+                    self.stats['wait_time'] += waited
+            finally:
+                self.waiting.remove(ticket)
+                self.condition.notify_all()
+        return tokens
+
+    def settle(self, charged: float, actual: Optional[int]):
+        """请求完成后按实际token数修正 acquire 扣除的token数，actual 为None（服务端未返回用量）时不修正"""
+        if not self.tpm or not charged or actual is None:
+            return
+        with self.condition:
+            self.token_tokens = min(self.token_capacity, self.token_tokens + charged - actual)
+            self.condition.notify_all()
+
+    def throttled(self, headers) -> float:
+        """收到429: 整个接口暂停 Retry-After 秒（没有时按连续次数加倍），返回暂停秒数"""
+        retry_after = retry_after_seconds(headers)
+        with self.condition:
+            self.consecutive_throttles += 1
+            if retry_after is None:
+                retry_after = min(MAX_THROTTLE_PAUSE,
+                                  DEFAULT_THROTTLE_PAUSE * 2 ** (self.consecutive_throttles - 1))
+            self.paused_until = max(self.paused_until, time.time() + retry_after)
+            # 服务端的窗口已满，暂停结束后不再突发
+            self.request_tokens = min(self.request_tokens, 0.0)
+            self.stats['throttled'] += 1
+            self.condition.notify_all()
+        logger.warning(f"{self.key} 返回429，暂停 {retry_after:.2f} 秒后重新排队")
+        return retry_after
+
+    def succeeded(self):
+        """请求未被限流，重置连续限流次数"""
+        with self.condition:
+            self.consecutive_throttles = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self.condition:
+            waited = self.stats['waited']
+            return {
+                'endpoint': self.key,
+                'rpm': self.rpm,
+                'tpm': self.tpm,
+                'requests': self.stats['requests'],
+                'waited': waited,
+                'avg_wait': round(self.stats['wait_time'] / waited, 3) if waited else 0,
+                'throttled': self.stats['throttled'],
+                'timeouts': self.stats['timeouts'],
+                'queued': len(self.waiting),
+                'paused_for': round(max(0.0, self.paused_until - time.time()), 1)
+            }
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(key: str, rpm: float, tpm: float, max_wait: float = DEFAULT_MAX_WAIT) -> Optional[RateLimiter]:
+    """获取接口的限流器，rpm 和 tpm 都为0时返回None；同一接口的所有翻译器共用一个限流器"""
+    if not rpm and not tpm:
+        return None
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = _limiters[key] = RateLimiter(key, rpm, tpm, max_wait)
+            logger.info(f"接口限流 {key}: RPM {rpm or '不限'}，TPM {tpm or '不限'}")
+        elif (limiter.rpm, limiter.tpm, limiter.max_wait) != (float(rpm or 0), float(tpm or 0), float(max_wait)):
+            limiter.configure(rpm, tpm, max_wait)
+        return limiter
+
+
+def get_rate_limit_stats() -> List[Dict[str, Any]]:
+    """所有接口限流器的限额、排队和429统计"""
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return [limiter.get_stats() for limiter in limiters]
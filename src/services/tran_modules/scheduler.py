@@ -0,0 +1,224 @@
+"""
+跨任务翻译调度
+批量上传的短视频各自只有几十条字幕，每个任务单独发送几个不满的请求，任务之间模型还会空闲。
+启用后，同一翻译后端上所有处于翻译阶段的任务把待翻译字幕交给共享的调度器，
+调度器按字幕条数上限和原文token预算把各任务的字幕装满一个请求，译文再按来源分回各任务。
+
+公平性: 每个请求按轮转顺序从各任务依次取字幕，每个任务每轮最多取 ceil(条数上限/排队任务数) 条，
+长任务不会独占请求，新加入的短任务在下一个请求中就能分到位置。
+
+只含一个任务字幕的请求照常附带该任务的前文上下文；混合多个任务的请求不附带上下文
+（不同任务的前文互不相关）。
+"""
+
+import os
+import queue
+import sys
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+from utils.logger import get_cached_logger
+
+from .batching import DEFAULT_BATCH_SIZE
+
+logger = get_cached_logger("跨任务调度")
+
+DEFAULT_BATCH_TOKENS = 512
+
+
+class _Job:
+    """一个任务提交的一组字幕"""
+
+    def __init__(self, job_id: int, items: List[Tuple[str, List[str]]]):
+        self.job_id = job_id
+        self.items = items
+        self.pending = deque(range(len(items)))
+        self.results = queue.Queue()
+
+
+class TranslationScheduler:
+    """
+    共享一个翻译后端的跨任务调度器
+
+    Args:
+        translator: 翻译器，请求通过 translate_text / translate_batch 发送
+        batch_size: 每个请求最多包含的字幕条数
+        batch_tokens: 每个请求原文的token预算（至少包含一条）
+        token_counter: TokenCounter，用于计算原文token数
+    """
+
+    def __init__(self, translator, batch_size: int = DEFAULT_BATCH_SIZE, batch_tokens: int = DEFAULT_BATCH_TOKENS,
+                 token_counter=None):
+        self.translator = translator
+        self.batch_size = max(1, int(batch_size))
+        self.batch_tokens = int(batch_tokens)
+        self.token_counter = token_counter
+        self.workers = max(1, int(translator.max_concurrency))
+        self.condition = threading.Condition()
+        self.jobs = []
+        self.next_job_id = 0
+        self.rotation = 0
+        self.threads = []
+        self.stats = {'requests': 0, 'lines': 0, 'mixed_requests': 0, 'tokens': 0}
+
+    def _count(self, text: str) -> int:
+        if self.token_counter is None:
+            from .tokens import estimate_tokens
+            return estimate_tokens(text)
+        return self.token_counter.count(text)
+
+    def _start_workers(self):
+        while len(self.threads) < self.workers:
+            thread = threading.Thread(target=self._worker, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def _take(self) -> List[Tuple[_Job, int]]:
+        """按轮转顺序从各任务取字幕装满一个请求（调用方持有锁）"""
+        active = [job for job in self.jobs if job.pending]
+        if not active:
+            return []
+        start = self.rotation % len(active)
+        active = active[start:] + active[:start]
+        self.rotation += 1
+        quantum = -(-self.batch_size // len(active))
+
+        pack = []
+        tokens = 0
+        full = False
+        while not full and any(job.pending for job in active):
+            for job in active:
+                taken = 0
+                while job.pending and taken < quantum:
+                    position = job.pending[0]
+                    cost = self._count(job.items[position][0])
+                    if len(pack) >= self.batch_size or (pack and self.batch_tokens > 0
+                                                        and tokens + cost > self.batch_tokens):
+                        full = True
+                        break
+                    job.pending.popleft()
+                    pack.append((job, position))
+                    tokens += cost
+                    taken += 1
+                if full:
+                    break
+        self.jobs = [job for job in self.jobs if job.pending]
+        self.stats['tokens'] += tokens
+        # 同一任务的字幕在请求中保持原来的先后顺序
+        order = {job.job_id: rank for rank, job in enumerate(active)}
+        return sorted(pack, key=lambda entry: (order[entry[0].job_id], entry[1]))
+
+    def _worker(self):
+        while True:
+            with self.condition:
+                pack = self._take()
+                while not pack:
+                    self.condition.wait()
+                    pack = self._take()
+            self._send(pack)
+
+    def _send(self, pack: List[Tuple[_Job, int]]):
+        jobs = {job.job_id: job for job, _ in pack}
+        texts = [job.items[position][0] for job, position in pack]
+        # 混合多个任务时各任务的前文互不相关，不附带上下文
+        context = pack[0][0].items[pack[0][1]][1] if len(jobs) == 1 else None
+        start_time = time.time()
+        try:
+            if len(texts) == 1:
+                results = [self.translator.translate_text(texts[0], context)]
+            else:
+                results = self.translator.translate_batch(texts, context)
+        except Exception as e:
+            logger.error(f"跨任务翻译请求失败（{len(texts)} 条保留原文）: {e}")
+            results = list(texts)
+        per_line = (time.time() - start_time) / len(texts)
+
+        with self.condition:
+            self.stats['requests'] += 1
+            self.stats['lines'] += len(texts)
+            if len(jobs) > 1:
+                self.stats['mixed_requests'] += 1
+        for job_id, job in jobs.items():
+            entries = [(position, result) for (owner, position), result in zip(pack, results)
+                       if owner.job_id == job_id]
+            job.results.put(([p for p, _ in entries], [r for _, r in entries], per_line))
+
+    def run(self, items: List[Tuple[str, List[str]]]) -> Iterator[Tuple[List[int], List[str], float]]:
+        """
+        提交一个任务的字幕并等待翻译完成
+
+        Args:
+            items: [(原文, 前文上下文), ...]
+
+        Yields:
+            (items中的位置列表, 对应译文列表, 平均每条耗时)，每个包含本任务字幕的请求完成后返回一次
+        """
+        if not items:
+            return
+        with self.condition:
+            job = _Job(self.next_job_id, items)
+            self.next_job_id += 1
+            self.jobs.append(job)
+            self._start_workers()
+            self.condition.notify_all()
+
+        remaining = len(items)
+        while remaining:
+            positions, results, per_line = job.results.get()
+            remaining -= len(positions)
+            yield positions, results, per_line
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self.condition:
+            requests = self.stats['requests']
+            return {
+                'translator_type': self.translator.translator_type,
+                'model': self.translator.model,
+                'requests': requests,
+                'lines': self.stats['lines'],
+                'mixed_requests': self.stats['mixed_requests'],
+                'lines_per_request': round(self.stats['lines'] / requests, 2) if requests else 0,
+                'tokens_per_request': round(self.stats['tokens'] / requests, 1) if requests else 0,
+                'queued_tasks': len(self.jobs),
+                'queued_lines': sum(len(job.pending) for job in self.jobs)
+            }
+
+
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+
+def get_translation_scheduler(translator, config: Dict[str, Any]) -> Optional[TranslationScheduler]:
+    """
+    按配置获取跨任务调度器，未启用时返回None
+
+    同一后端（翻译器类型、模型、提示词、接口地址）、生成设置（思考模式、生成预算等，见
+    BaseTranslator.generation_key）和批量设置的任务共用一个调度器。
+    """
+    if not config.get('translation_shared_batching', False) or getattr(translator, 'in_process', False):
+        return None
+    from .memory import translator_namespace
+    from .tokens import get_token_counter
+
+    batch_size = max(1, int(config.get('translation_batch_size', DEFAULT_BATCH_SIZE)))
+    batch_tokens = int(config.get('translation_batch_tokens', DEFAULT_BATCH_TOKENS))
+    key = (translator_namespace(translator), getattr(translator, 'chat_url', ''), translator.generation_key(),
+           batch_size, batch_tokens)
+    with _schedulers_lock:
+        scheduler = _schedulers.get(key)
+        if scheduler is None:
+            scheduler = _schedulers[key] = TranslationScheduler(translator, batch_size, batch_tokens,
+                                                                get_token_counter(config))
+            logger.info(f"跨任务翻译调度: 每个请求最多 {batch_size} 条、原文 {batch_tokens} token，"
+                        f"并发 {scheduler.workers}")
+        return scheduler
+
+
+def get_scheduler_stats() -> List[Dict[str, Any]]:
+    """所有跨任务调度器的请求数、装载率和排队情况"""
+    with _schedulers_lock:
+        schedulers = list(_schedulers.values())
+    return [scheduler.get_stats() for scheduler in schedulers]
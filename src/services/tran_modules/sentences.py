@@ -0,0 +1,186 @@
+"""
+整句翻译
+Whisper 常把一句话切成2~3条字幕，逐条翻译时请求多、每条又缺少完整语境。
+翻译前把相邻字幕按标点和时间间隔合并为句子单元: 前一条没有以句末标点结尾、两条之间的停顿不超过
+max_gap 秒、合并后条数和字数未超上限时合并。整句翻译后再按各条原文长度的比例把译文分回原来的时间轴，
+切分点就近对齐到标点或空格。
+"""
+
+import os
+import re
+import sys
+from typing import List, Optional, Sequence, Tuple
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+from utils.logger import get_cached_logger
+
+logger = get_cached_logger("整句翻译")
+
+DEFAULT_MAX_GAP = 1.0
+DEFAULT_MAX_SEGMENTS = 3
+DEFAULT_MAX_CHARS = 200
+
+# 句末标点（后面可跟引号/括号）；省略号表示话没说完，不算句末
+_SENTENCE_END_PATTERN = re.compile(r'[.?!。？！♪][\"\'”’)）\]」』]*$')
+_ELLIPSIS_PATTERN = re.compile(r'(\.\.\.|…)[\"\'”’)）\]」』]*$')
+_TIMESTAMP_PATTERN = re.compile(r'(\d+):(\d{2}):(\d{2})[,.](\d{3})')
+# 切分译文时优先对齐的位置（在这些字符之后切开）
+_BREAK_CHARS = set(' ，,。.、；;：:！!？?…—')
+
+
+def parse_timestamp(timestamp: str) -> Optional[Tuple[float, float]]:
+    """解析SRT时间轴 "00:00:01,000 --> 00:00:03,500"，返回 (开始秒, 结束秒)，格式不对时返回None"""
+    times = _TIMESTAMP_PATTERN.findall(timestamp)
+    if len(times) != 2:
+        return None
+    return tuple(int(h) * 3600 + int(m) * 60 + int(s) + int(ms) / 1000 for h, m, s, ms in times)
+
+
+def ends_sentence(text: str) -> bool:
+    """文本是否以句末标点结尾"""
+    text = text.strip()
+    return bool(_SENTENCE_END_PATTERN.search(text)) and not _ELLIPSIS_PATTERN.search(text)
+
+
+def _is_cjk(char: str) -> bool:
+    return '\u3000' <= char <= '\u9fff' or '\uac00' <= char <= '\ud7af' or '\uff00' <= char <= '\uffef'
+
+
+def join_segments(texts: Sequence[str]) -> str:
+    """拼接同一句的各条原文，中日韩文字之间不加空格"""
+    merged = ''
+    for text in texts:
+        text = text.strip()
+        if merged and text and not (_is_cjk(merged[-1]) and _is_cjk(text[0])):
+            merged += ' '
+        merged += text
+    return merged
+
+
+def group_sentences(texts: Sequence[str], timings: Sequence[Optional[Tuple[float, float]]],
+                    max_gap: float = DEFAULT_MAX_GAP, max_segments: int = DEFAULT_MAX_SEGMENTS,
+                    max_chars: int = DEFAULT_MAX_CHARS) -> List[List[int]]:
+    """
+    把相邻字幕合并为句子单元，返回每个单元包含的下标列表
+
+    Args:
+        texts: 各条字幕原文
+        timings: 各条字幕的 (开始秒, 结束秒)，未知时为None（不与相邻字幕合并）
+        max_gap: 两条字幕之间的停顿超过该值（秒）时不合并
+        max_segments: 一个单元最多包含的字幕条数
+        max_chars: 一个单元最多包含的字符数
+    """
+    groups = []
+    current = []
+    chars = 0
+    for i, text in enumerate(texts):
+        if current:
+            last = current[-1]
+            joinable = (
+                not ends_sentence(texts[last])
+                and text.strip()
+                and timings[last] is not None and timings[i] is not None
+                and timings[i][0] - timings[last][1] <= max_gap
+                and len(current) < max_segments
+                and chars + len(text.strip()) <= max_chars
+            )
+            if not joinable:
+                groups.append(current)
+                current = []
+                chars = 0
+        current.append(i)
+        chars += len(text.strip())
+    if current:
+        groups.append(current)
+    return groups
+
+
+def _snap(text: str, target: int, previous: int, upper: int, window: int) -> int:
+    """
+    在 target 附近找一个标点或空格之后的切分点，找不到时就在 target 处切开
+
+    切分点在 (previous, upper] 之间，且上一个切分点到这里至少有一个非空白字符。
+    """
+    def usable(position):
+        return bool(text[previous:position].strip())
+
+    best = None
+    for position in range(max(previous + 1, target - window), min(upper, target + window) + 1):
+        if text[position - 1] in _BREAK_CHARS and usable(position) and (
+                best is None or abs(position - target) < abs(best - target)):
+            best = position
+    if best is not None:
+        return best
+    cut = min(max(target, previous + 1), upper)
+    while cut < upper and not usable(cut):
+        cut += 1
+    return cut
+
+
+def distribute(translation: str, sources: Sequence[str]) -> List[str]:
+    """
+    按各条原文长度的比例把整句译文分回各条字幕
+
+    译文与拼接后的原文相同（翻译失败时翻译器返回原文）时，各条保留各自的原文。
+    """
+    if len(sources) == 1:
+        return [translation]
+    text = translation.strip()
+    if text == join_segments(sources):
+        return list(sources)
+    if len(text) < len(sources):
+        # 译文太短无法切分，每条都显示完整译文
+        return [text] * len(sources)
+
+    weights = [max(1, len(source.strip())) for source in sources]
+    total = sum(weights)
+    window = max(2, len(text) // (len(sources) * 4))
+    cuts = []
+    previous = 0
+    accumulated = 0
+    for index, weight in enumerate(weights[:-1]):
+        accumulated += weight
+        target = round(len(text) * accumulated / total)
+        # 后面每段至少留一个字符
+        upper = len(text) - (len(sources) - 1 - index)
+        cut = _snap(text, target, previous, upper, window)
+        cuts.append(cut)
+        previous = cut
+    bounds = [0] + cuts + [len(text)]
+    return [text[start:end].strip() for start, end in zip(bounds, bounds[1:])]
+
+
+def regroup(texts: Sequence[str], timings: Sequence[Optional[Tuple[float, float]]],
+            config=None) -> Tuple[List[List[int]], List[str]]:
+    """
+    按配置把字幕合并为句子单元
+
+    translation_sentence_merge 为false时每条字幕单独成为一个单元。
+
+    Returns:
+        (每个单元包含的下标列表, 每个单元的原文)
+    """
+    config = config or {}
+    if config.get('translation_sentence_merge', True):
+        groups = group_sentences(
+            texts, timings,
+            max_gap=config.get('translation_sentence_max_gap', DEFAULT_MAX_GAP),
+            max_segments=config.get('translation_sentence_max_segments', DEFAULT_MAX_SEGMENTS),
+            max_chars=config.get('translation_sentence_max_chars', DEFAULT_MAX_CHARS)
+        )
+    else:
+        groups = [[i] for i in range(len(texts))]
+
+    units = [join_segments([texts[i] for i in group]) if len(group) > 1 else texts[group[0]] for group in groups]
+    if len(units) < len(texts):
+        logger.info(f"{len(texts)} 条字幕合并为 {len(units)} 个句子单元")
+    return groups, units
+
+
+def ungroup(groups: List[List[int]], texts: Sequence[str], translated_units: Sequence[str]) -> List[str]:
+    """把各句子单元的译文分回各条字幕，返回与texts等长的译文列表"""
+    translations = list(texts)
+    for group, translated in zip(groups, translated_units):
+        for i, piece in zip(group, distribute(translated, [texts[i] for i in group])):
+            translations[i] = piece
+    return translations
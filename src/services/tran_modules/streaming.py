@@ -0,0 +1,165 @@
+"""
+流式读取模型回复
+Ollama /api/chat 逐行返回JSON，OpenAI /chat/completions 返回SSE（data: {...}）。
+读取超时即token间的停滞超时：超过 stall_timeout 秒没有新数据就放弃该请求，
+不再让一次卡住的生成占住整条流水线；译文代码块闭合后立即断开连接，不等模型生成剩余内容。
+
+思考内容（Ollama message.thinking、OpenAI兼容接口的 reasoning_content 或正文中的 <think> 标签）
+只计入生成量，最终被 extract_translation 丢弃；kept_tokens 按字符比例估算真正保留下来的译文token数。
+"""
+
+import json
+import re
+import threading
+import time
+from typing import Iterator, Optional, Tuple
+
+DEFAULT_STALL_TIMEOUT = 60
+DEFAULT_MAX_TOKENS = 2048
+
+_THINK_PATTERN = re.compile(r'<think>.*?</think>', flags=re.DOTALL)
+_CLOSED_FENCE_PATTERN = re.compile(r'```[^\n`]*\n.*?```', flags=re.DOTALL)
+
+
+# 当前线程的取消标记（对冲请求中落败的一方被取消）
+_local = threading.local()
+
+
+class RequestCancelled(Exception):
+    """请求被主动取消"""
+
+
+def set_cancel_event(event: Optional[threading.Event]):
+    """设置当前线程后续流式请求的取消标记"""
+    _local.cancel = event
+
+
+def fence_closed(content: str) -> bool:
+    """回复中（思考内容之外）是否已有一个完整的代码块"""
+    if '<think>' in content and '</think>' not in content:
+        return False
+    return _CLOSED_FENCE_PATTERN.search(_THINK_PATTERN.sub('', content)) is not None
+
+
+def kept_text(content: str) -> str:
+    """回复中最终保留的部分: 去掉思考内容后第一个代码块的内容，没有代码块时为全文"""
+    content = _THINK_PATTERN.sub('', content)
+    match = re.search(r'```[^\n`]*\n?(.*?)```', content, flags=re.DOTALL)
+    return (match.group(1) if match else content).strip()
+
+
+def estimate_kept_tokens(generated: int, content: str, thinking: str = '') -> int:
+    """按字符比例估算生成的token中保留为译文的数量"""
+    total_chars = len(content) + len(thinking)
+    if not generated or not total_chars:
+        return 0
+    return round(generated * len(kept_text(content)) / total_chars)
+
+
+def ollama_timings(data: dict) -> dict:
+    """Ollama最后一个分块（或非流式回复）中的服务端耗时: 提示词预填充token数/秒数、模型加载秒数"""
+    return {
+        'prompt_tokens': data.get('prompt_eval_count', 0),
+        'prefill': data.get('prompt_eval_duration', 0) / 1e9,
+        'load': data.get('load_duration', 0) / 1e9
+    }
+
+
+def iter_ollama_chunks(response, server_stats: Optional[dict] = None) -> Iterator[Tuple[str, str, Optional[int]]]:
+    """
+    逐个返回 (正文片段, 思考片段, 生成token数)，token数只在最后一个分块中给出
+
+    传入server_stats时，收到最后一个分块后写入 ollama_timings 的结果（提前断开时不写入）。
+    """
+    for line in response.iter_lines():
+        if not line:
+            continue
+        data = json.loads(line)
+        if data.get('error'):
+            raise Exception(f"Ollama返回错误: {data['error']}")
+        if data.get('done') and server_stats is not None:
+            server_stats.update(ollama_timings(data))
+        message = data.get('message', {})
+        yield (message.get('content', ''), message.get('thinking', ''),
+               data.get('eval_count') if data.get('done') else None)
+
+
+def iter_openai_chunks(response) -> Iterator[Tuple[str, str, Optional[int]]]:
+    """逐个返回 (正文片段, 思考片段, 生成token数)，服务端提供usage时在最后给出token数"""
+    for line in response.iter_lines():
+        if not line:
+            continue
+        line = line.decode('utf-8') if isinstance(line, bytes) else line
+        if not line.startswith('data:'):
+            continue
+        data = line[len('data:'):].strip()
+        if data == '[DONE]':
+            break
+        chunk = json.loads(data)
+        usage = chunk.get('usage') or {}
+        for choice in chunk.get('choices') or []:
+            delta = choice.get('delta') or {}
+            yield delta.get('content') or '', delta.get('reasoning_content') or '', None
+        if usage.get('completion_tokens') is not None:
+            yield '', '', usage['completion_tokens']
+
+
+class StreamResult:
+    """一次流式请求的结果"""
+
+    def __init__(self, content: str, elapsed: float, first_token: Optional[float], tokens: int, cut_early: bool,
+                 thinking: str = ''):
+        self.content = content
+        self.thinking = thinking
+        self.elapsed = elapsed
+        self.first_token = first_token
+        self.tokens = tokens
+        self.kept_tokens = estimate_kept_tokens(tokens, content, thinking)
+        self.cut_early = cut_early
+
+
+def read_stream(response, chunks: Iterator[Tuple[str, str, Optional[int]]], start_time: float,
+                stop_at_fence: bool = True) -> StreamResult:
+    """
+    读取流式回复直到结束，或在代码块闭合时提前断开
+
+    Args:
+        response: stream=True 的 requests.Response
+        chunks: iter_ollama_chunks / iter_openai_chunks 的返回值
+        start_time: 发出请求的时间
+        stop_at_fence: 代码块闭合后是否立即断开
+    """
+    parts = []
+    thinking_parts = []
+    first_token = None
+    tokens = 0
+    reported_tokens = None
+    cut_early = False
+    cancel = getattr(_local, 'cancel', None)
+    try:
+        for text, thinking, token_count in chunks:
+            if cancel is not None and cancel.is_set():
+                raise RequestCancelled("请求已取消")
+            if token_count is not None:
+                reported_tokens = token_count
+            if not text and not thinking:
+                continue
+            if first_token is None:
+                first_token = time.time() - start_time
+            tokens += 1
+            if thinking:
+                thinking_parts.append(thinking)
+            if not text:
+                continue
+            parts.append(text)
+            # 只在分块含反引号时检查代码块是否闭合，避免每个分块都做全文匹配
+            if stop_at_fence and '`' in text and fence_closed(''.join(parts)):
+                cut_early = True
+                break
+    finally:
+        # 提前结束时关闭连接，服务端随之停止生成
+        response.close()
+
+    return StreamResult(''.join(parts), time.time() - start_time, first_token,
+                        reported_tokens if reported_tokens is not None else tokens, cut_early,
+                        ''.join(thinking_parts))
@@ -0,0 +1,681 @@
+"""
+本地LLM桩服务
+实现 OpenAI 兼容的 /v1/chat/completions 与 Ollama 的 /api/chat，用固定延迟模拟生成耗时，
+译文为 "译文:" + 原文。用于在没有真实模型的机器上测量翻译流程的吞吐。
+
+每个请求耗时 = latency + 条数 × per_line；slots 限制服务端同时处理的请求数，
+超出的请求排队等待，模拟真实推理服务的并行上限。
+latency_dist 为 uniform / normal / lognormal 时，耗时再乘以按 latency_jitter 抖动的随机系数
+（均匀分布 [1-j, 1+j]、均值为1标准差为j的正态分布、对数正态分布），默认 fixed 不抖动。
+error_rate > 0 时按该概率让对话请求返回500（客户端按HTTP重试策略重试）。
+seed 固定随机数种子，抖动、长尾和失败在同样的请求顺序下可重现。
+请求带 "stream": true 时，Ollama 接口逐行返回JSON，OpenAI 接口返回SSE，回复按几个字符一块分段发送，
+代码块之后追加一段无关内容，用于验证客户端在代码块闭合后提前断开。
+think_tokens > 0 时 /api/chat 模拟思考模型: 请求 "think": true 时在 message.thinking 中输出思考内容，
+未指定 think 时（旧版Ollama行为）以 <think> 标签输出在正文前，"think": false 时不思考；
+OpenAI 接口以 <think> 标签输出在正文前（部署了思考模型的兼容网关）。每个思考token额外耗时 per_token 秒。
+load_time > 0 时模拟Ollama模型加载: 模型未加载时第一个请求额外耗时 load_time 秒，
+/api/generate 带 "keep_alive": 0 时卸载模型，不带 prompt 的 /api/generate 只加载模型。
+prefill_per_token > 0 时模拟前缀KV缓存: 提示词与上一个请求相同的前缀不再预填充，
+其余部分每个token（按 STREAM_CHUNK_CHARS 个字符计）耗时 prefill_per_token 秒；
+/api/chat 的回复带 prompt_eval_count / prompt_eval_duration / load_duration。
+tail_rate > 0 时模拟长尾: 按该概率让一个请求的耗时变为 tail_factor 倍（如GPU被其他任务占用、显存换入换出）。
+max_batch > 0 时模拟小模型处理不了长批量: 一次请求超过 max_batch 条时只返回前 max_batch 条。
+rate_limit > 0 时模拟托管接口的限额: 任意1秒内超过 rate_limit 个对话请求时返回429，
+带 Retry-After（秒，向上取整）和 retry-after-ms。
+同时实现 OpenAI 批处理接口: POST /v1/files（multipart，purpose=batch）上传JSONL请求文件，
+POST /v1/batches 创建批处理，GET /v1/batches/{id} 查询，POST /v1/batches/{id}/cancel 取消，
+GET /v1/files/{id}/content 下载输出文件。批处理在 batch_time 秒后完成，每个请求按对话接口相同的规则生成回复
+（不计延迟和限流）；batch_error_rate > 0 时按该比例让请求失败（写入错误文件）。
+
+录制/回放: 指定 upstream 和 cassette_path 时为录制模式，对话、/api/generate 和模型列表请求原样转发给
+真实服务（upstream 为服务根地址，路径不变），响应（状态码、正文、耗时）追加写入录音文件（JSONL）；
+只指定 cassette_path 时为回放模式，按 (方法, 路径, 请求体) 查找录制的响应返回，不需要真实服务。
+同一请求录制了多次时按录制顺序依次回放（如先失败后成功的重试）。replay_timing 为真时按录制的耗时回放，
+流式响应按行均匀分布在该耗时内；为假时立即返回。录音文件中没有的请求返回500，计入 replay_misses。
+录制时不保存 Authorization 请求头；录制模式下流式响应在上游完成后一次性返回给客户端。
+
+用法:
+    python -m src.services.tran_modules.stub_server --port 18080 --latency 0.2 --slots 8
+    python -m src.services.tran_modules.stub_server --latency-dist lognormal --latency-jitter 0.5 --error-rate 0.05
+    python -m src.services.tran_modules.stub_server --upstream http://127.0.0.1:11434 --record cassette.jsonl
+    python -m src.services.tran_modules.stub_server --replay cassette.jsonl
+"""
+
+import email.parser
+import email.policy
+import hashlib
+import json
+import math
+import os
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from .context import strip_context
+
+# 流式回复每个分块的字符数
+STREAM_CHUNK_CHARS = 4
+# 流式回复在代码块之后追加的内容（客户端应在此之前断开）
+STREAM_TRAILER = "\n\n以上是译文。"
+# 录制/回放的路径: 对话、/api/generate 和模型列表
+CASSETTE_PATHS = ('/v1/chat/completions', '/chat/completions', '/api/chat', '/api/generate', '/api/tags',
+                  '/v1/models', '/models')
+LATENCY_DISTS = ('fixed', 'uniform', 'normal', 'lognormal')
+
+
+def _split_tokens(text: str):
+    """按固定字符数把文本切成模拟token"""
+    return [text[i:i + STREAM_CHUNK_CHARS] for i in range(0, len(text), STREAM_CHUNK_CHARS)]
+
+
+def mock_reply(user_message: str, max_batch: int = 0):
+    """按请求内容生成模拟回复，返回 (回复文本, 条数)；max_batch > 0 时批量回复最多包含 max_batch 条"""
+    content = strip_context(user_message)
+    try:
+        items = json.loads(content)
+    except ValueError:
+        items = None
+
+    if isinstance(items, dict):
+        output = {key: f"译文:{text}" for key, text in items.items()}
+        if 0 < max_batch < len(output):
+            output = dict(list(output.items())[:max_batch])
+        return f"```json\n{json.dumps(output, ensure_ascii=False)}\n```", len(items)
+    return f"```\n译文:{content}\n```", 1
+
+
+def cassette_key(method: str, path: str, body: bytes) -> str:
+    """请求的录音键: 方法、路径和请求体（JSON按键排序，与字段顺序无关）"""
+    try:
+        canonical = json.dumps(json.loads(body), ensure_ascii=False, sort_keys=True)
+    except ValueError:
+        canonical = body.decode('utf-8', errors='replace')
+    return hashlib.sha256(f"{method} {path}\n{canonical}".encode('utf-8')).hexdigest()
+
+
+class Cassette:
+    """
+    录制的请求与响应（JSONL，每行一条，线程安全）
+
+    同一请求有多条记录时按录制顺序依次回放，回放完后从头开始。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.positions = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.entries.setdefault(entry['key'], []).append(entry)
+
+    def __len__(self):
+        with self.lock:
+            return sum(len(entries) for entries in self.entries.values())
+
+    def record(self, key: str, method: str, path: str, body: bytes, status: int, content_type: str,
+               content: bytes, elapsed: float):
+        try:
+            request = json.loads(body) if body else None
+        except ValueError:
+            request = body.decode('utf-8', errors='replace')
+        entry = {"key": key, "method": method, "path": path, "request": request, "status": status,
+                 "content_type": content_type, "body": content.decode('utf-8', errors='replace'),
+                 "elapsed": round(elapsed, 4)}
+        with self.lock:
+            self.entries.setdefault(key, []).append(entry)
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def replay(self, key: str):
+        """按录制顺序返回下一条记录，没有时返回None"""
+        with self.lock:
+            entries = self.entries.get(key)
+            if not entries:
+                return None
+            position = self.positions.get(key, 0)
+            self.positions[key] = position + 1
+            return entries[position % len(entries)]
+
+
+class StubLLMServer:
+    """在后台线程运行的桩服务（指定 upstream 时录制，只指定 cassette_path 时回放）"""
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.2, per_line=0.02, slots=8,
+                 think_tokens=0, per_token=0.005, tail_rate=0.0, tail_factor=10.0, load_time=0.0,
+                 prefill_per_token=0.0, max_batch=0, rate_limit=0, batch_time=1.0, batch_error_rate=0.0,
+                 latency_dist='fixed', latency_jitter=0.0, error_rate=0.0, seed=None, upstream=None,
+                 cassette_path=None, replay_timing=True):
+        if latency_dist not in LATENCY_DISTS:
+            raise ValueError(f"未知的延迟分布: {latency_dist}")
+        if upstream and not cassette_path:
+            raise ValueError("录制模式需要指定录音文件")
+        self.latency = latency
+        self.latency_dist = latency_dist
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        # 未指定种子时使用 random 模块（调用方可用 random.seed 固定）
+        self.random = random.Random(seed) if seed is not None else random
+        self.errors = 0
+        self.upstream = upstream.rstrip('/') if upstream else None
+        self.cassette = Cassette(cassette_path) if cassette_path else None
+        self.replay_timing = replay_timing
+        self.replay_hits = 0
+        self.replay_misses = 0
+        self.per_line = per_line
+        self.think_tokens = think_tokens
+        self.per_token = per_token
+        self.tail_rate = tail_rate
+        self.tail_factor = tail_factor
+        self.load_time = load_time
+        self.prefill_per_token = prefill_per_token
+        self.max_batch = max_batch
+        self.rate_limit = rate_limit
+        self.batch_time = batch_time
+        self.batch_error_rate = batch_error_rate
+        self.files = {}
+        self.batches = {}
+        self.batch_requests = 0
+        self.accepted = deque()
+        self.throttled = 0
+        self.loaded = False
+        self.last_prompt = ''
+        self.load_lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(slots)
+        self.requests = 0
+        # 收到的每个翻译请求的最后一条消息，供测试检查请求了哪些行
+        self.prompts = []
+        # 正在处理的翻译请求数及其峰值（客户端的实际并发）
+        self.active = 0
+        self.peak_active = 0
+        self.lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    def _jitter(self, delay: float) -> float:
+        """按延迟分布抖动耗时"""
+        jitter = self.latency_jitter
+        if self.latency_dist == 'fixed' or jitter <= 0:
+            return delay
+        if self.latency_dist == 'uniform':
+            return delay * max(0.0, self.random.uniform(1 - jitter, 1 + jitter))
+        if self.latency_dist == 'normal':
+            return delay * max(0.0, self.random.gauss(1, jitter))
+        return delay * self.random.lognormvariate(0, jitter)
+
+    def _forward(self, method: str, path: str, body: bytes, headers) -> tuple:
+        """录制模式: 把请求转发给上游并录制，返回 (状态码, Content-Type, 响应正文)"""
+        forward = {name: headers[name] for name in ('Content-Type', 'Authorization') if headers.get(name)}
+        start_time = time.time()
+        try:
+            response = requests.request(method, self.upstream + path, data=body or None, headers=forward,
+                                        timeout=600)
+            status, content = response.status_code, response.content
+            content_type = response.headers.get('Content-Type', 'application/json')
+        except requests.RequestException as e:
+            # 上游不可用不录制，下次录制时重新请求
+            return 502, 'application/json', json.dumps({"error": {"message": f"上游请求失败: {e}"}},
+                                                       ensure_ascii=False).encode('utf-8')
+        self.cassette.record(cassette_key(method, path, body), method, path, body, status, content_type,
+                             content, time.time() - start_time)
+        return status, content_type, content
+
+    def _load(self) -> float:
+        """模型未加载时加载，返回加载耗时（加载期间到达的请求等待加载完成）"""
+        with self.load_lock:
+            if self.loaded or self.load_time <= 0:
+                return 0.0
+            time.sleep(self.load_time)
+            self.loaded = True
+            return self.load_time
+
+    def _prefill(self, messages) -> tuple:
+        """与上一个请求提示词的公共前缀视为已缓存，返回 (需要预填充的token数, 预填充耗时)"""
+        prompt = json.dumps(messages, ensure_ascii=False)
+        with self.lock:
+            cached = 0
+            for a, b in zip(prompt, self.last_prompt):
+                if a != b:
+                    break
+                cached += 1
+            self.last_prompt = prompt
+        tokens = -(-(len(prompt) - cached) // STREAM_CHUNK_CHARS)
+        return tokens, tokens * self.prefill_per_token
+
+    def _admit(self) -> float:
+        """按1秒滑动窗口限流，放行时返回0，超出限额时返回需要等待的秒数"""
+        if self.rate_limit <= 0:
+            return 0.0
+        with self.lock:
+            now = time.time()
+            while self.accepted and now - self.accepted[0] >= 1.0:
+                self.accepted.popleft()
+            if len(self.accepted) >= self.rate_limit:
+                self.throttled += 1
+                return 1.0 - (now - self.accepted[0])
+            self.accepted.append(now)
+            return 0.0
+
+    def _create_file(self, content: bytes, filename: str, purpose: str) -> dict:
+        file_id = f"file-{uuid.uuid4().hex[:24]}"
+        info = {"id": file_id, "object": "file", "bytes": len(content), "created_at": int(time.time()),
+                "filename": filename, "purpose": purpose}
+        with self.lock:
+            self.files[file_id] = (info, content)
+        return info
+
+    def _create_batch(self, payload) -> tuple:
+        """创建批处理并在后台线程中处理，返回 (状态码, 批处理对象)"""
+        with self.lock:
+            stored = self.files.get(payload.get('input_file_id'))
+        if stored is None:
+            return 400, {"error": {"message": "input_file_id not found"}}
+        lines = [line for line in stored[1].decode('utf-8').splitlines() if line.strip()]
+        batch_id = f"batch_{uuid.uuid4().hex[:24]}"
+        batch = {"id": batch_id, "object": "batch", "endpoint": payload.get('endpoint'),
+                 "input_file_id": payload.get('input_file_id'),
+                 "completion_window": payload.get('completion_window', '24h'), "status": "validating",
+                 "output_file_id": None, "error_file_id": None, "created_at": int(time.time()),
+                 "in_progress_at": None, "completed_at": None, "cancelled_at": None,
+                 "request_counts": {"total": len(lines), "completed": 0, "failed": 0},
+                 "metadata": payload.get('metadata')}
+        with self.lock:
+            self.batches[batch_id] = batch
+        threading.Thread(target=self._run_batch, args=(batch_id, lines), daemon=True).start()
+        return 200, dict(batch)
+
+    def _run_batch(self, batch_id: str, lines):
+        """逐个处理请求，batch_time 秒内均匀完成；取消时保留已完成的部分"""
+        with self.lock:
+            self.batches[batch_id].update({"status": "in_progress", "in_progress_at": int(time.time())})
+        outputs, errors = [], []
+        for line in lines:
+            time.sleep(self.batch_time / max(1, len(lines)))
+            with self.lock:
+                if self.batches[batch_id]["status"] == "cancelling":
+                    break
+            record = json.loads(line)
+            request_id = f"req_{uuid.uuid4().hex[:16]}"
+            if self.batch_error_rate > 0 and random.random() < self.batch_error_rate:
+                errors.append({"id": request_id, "custom_id": record.get('custom_id'), "response": None,
+                               "error": {"code": "server_error", "message": "模拟请求失败"}})
+            else:
+                messages = record.get('body', {}).get('messages') or [{"content": ""}]
+                reply, _ = mock_reply(messages[-1].get('content', ''), self.max_batch)
+                outputs.append({"id": request_id, "custom_id": record.get('custom_id'), "error": None,
+                                "response": {"status_code": 200, "request_id": request_id, "body": {
+                                    "model": record.get('body', {}).get('model'),
+                                    "choices": [{"index": 0, "message": {"role": "assistant", "content": reply},
+                                                 "finish_reason": "stop"}]}}})
+            with self.lock:
+                self.batch_requests += 1
+                counts = self.batches[batch_id]["request_counts"]
+                counts["completed"], counts["failed"] = len(outputs), len(errors)
+
+        def dump(records):
+            return "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records).encode('utf-8')
+
+        output_file = self._create_file(dump(outputs), f"{batch_id}_output.jsonl", "batch_output") if outputs else None
+        error_file = self._create_file(dump(errors), f"{batch_id}_error.jsonl", "batch_output") if errors else None
+        with self.lock:
+            batch = self.batches[batch_id]
+            cancelled = batch["status"] == "cancelling"
+            batch.update({"status": "cancelled" if cancelled else "completed",
+                          "cancelled_at" if cancelled else "completed_at": int(time.time()),
+                          "output_file_id": output_file["id"] if output_file else None,
+                          "error_file_id": error_file["id"] if error_file else None})
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status, data):
+                body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _send_stream(self, chunks):
+                """逐块发送流式回复（HTTP/1.0，连接关闭即结束）"""
+                content_type = 'application/x-ndjson' if self.path == '/api/chat' else 'text/event-stream'
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.end_headers()
+                try:
+                    for chunk in chunks:
+                        self.wfile.write(chunk.encode('utf-8'))
+                        self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    # 客户端提前断开
+                    pass
+
+            def _send_raw(self, status, content_type, content: bytes, elapsed=0.0):
+                """发送录制的响应；流式响应逐行发送，elapsed 秒内均匀发完"""
+                lines = content.splitlines(keepends=True)
+                streaming = 'ndjson' in content_type or 'event-stream' in content_type
+                if not streaming or len(lines) <= 1:
+                    time.sleep(elapsed)
+                    self.send_response(status)
+                    self.send_header('Content-Type', content_type)
+                    self.send_header('Content-Length', str(len(content)))
+                    self.end_headers()
+                    self.wfile.write(content)
+                    return
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.end_headers()
+                try:
+                    for line in lines:
+                        time.sleep(elapsed / len(lines))
+                        self.wfile.write(line)
+                        self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            def _cassette(self, method, body: bytes):
+                """录制模式转发并录制，回放模式返回录制的响应"""
+                with server.lock:
+                    server.requests += 1
+                if server.upstream:
+                    self._send_raw(*server._forward(method, self.path, body, self.headers))
+                    return
+                entry = server.cassette.replay(cassette_key(method, self.path, body))
+                with server.lock:
+                    if entry is None:
+                        server.replay_misses += 1
+                    else:
+                        server.replay_hits += 1
+                if entry is None:
+                    self._send_json(500, {"error": {"message": "录音文件中没有该请求", "type": "cassette_miss"}})
+                    return
+                with server.slots:
+                    self._send_raw(entry['status'], entry['content_type'], entry['body'].encode('utf-8'),
+                                   entry['elapsed'] if server.replay_timing else 0.0)
+
+            def _stream_chunks(self, model, reply, thinking='', timings=None):
+                pieces = _split_tokens(reply)
+                thinking_pieces = _split_tokens(thinking)
+                if self.path == '/api/chat':
+                    for token in thinking_pieces:
+                        yield json.dumps({"model": model, "message": {"role": "assistant", "content": "",
+                                                                      "thinking": token},
+                                          "done": False}, ensure_ascii=False) + "\n"
+                    for piece in pieces:
+                        yield json.dumps({"model": model, "message": {"role": "assistant", "content": piece},
+                                          "done": False}, ensure_ascii=False) + "\n"
+                    yield json.dumps(dict({"model": model, "message": {"role": "assistant", "content": ""},
+                                           "done": True, "eval_count": len(thinking_pieces) + len(pieces)},
+                                          **(timings or {}))) + "\n"
+                else:
+                    for piece in pieces:
+                        data = {"model": model, "choices": [{"index": 0, "delta": {"content": piece},
+                                                             "finish_reason": None}]}
+                        yield f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+                    yield "data: [DONE]\n\n"
+
+            def _generate(self, payload):
+                """/api/generate: keep_alive 为0时卸载模型，没有 prompt 时只加载模型"""
+                if payload.get('keep_alive') in (0, "0", "0s"):
+                    with server.lock:
+                        server.loaded = False
+                        server.last_prompt = ''
+                    self._send_json(200, {"model": payload.get('model'), "response": "", "done": True,
+                                          "done_reason": "unload"})
+                    return
+                load = server._load()
+                response = f"译文:{payload['prompt']}" if payload.get('prompt') else ""
+                self._send_json(200, {"model": payload.get('model'), "response": response, "done": True,
+                                      "done_reason": "stop" if response else "load",
+                                      "load_duration": int(load * 1e9)})
+
+            def do_GET(self):
+                if server.cassette is not None and self.path in CASSETTE_PATHS:
+                    self._cassette('GET', b'')
+                    return
+                parts = self.path.strip('/').split('/')
+                if parts[:2] == ['v1', 'batches'] and len(parts) == 3:
+                    with server.lock:
+                        batch = server.batches.get(parts[2])
+                        batch = dict(batch, request_counts=dict(batch["request_counts"])) if batch else None
+                    if batch is None:
+                        self._send_json(404, {"error": "not found"})
+                    else:
+                        self._send_json(200, batch)
+                    return
+                if parts[:2] == ['v1', 'files'] and len(parts) == 4 and parts[3] == 'content':
+                    with server.lock:
+                        stored = server.files.get(parts[2])
+                    if stored is None:
+                        self._send_json(404, {"error": "not found"})
+                        return
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'application/jsonl')
+                    self.send_header('Content-Length', str(len(stored[1])))
+                    self.end_headers()
+                    self.wfile.write(stored[1])
+                    return
+                # 供翻译后端池探测
+                if self.path == '/api/tags':
+                    self._send_json(200, {"models": [{"name": "stub:latest"}]})
+                elif self.path in ('/v1/models', '/models'):
+                    self._send_json(200, {"object": "list", "data": [{"id": "stub", "object": "model"}]})
+                else:
+                    self._send_json(404, {"error": "not found"})
+
+            def _upload(self, body: bytes):
+                """/v1/files: 解析 multipart 表单中的 file 与 purpose"""
+                header = f"Content-Type: {self.headers.get('Content-Type', '')}\r\n\r\n".encode('utf-8')
+                message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(header + body)
+                fields = {}
+                for part in message.iter_parts():
+                    name = part.get_param('name', header='content-disposition')
+                    fields[name] = (part.get_filename(), part.get_payload(decode=True) or b'')
+                if 'file' not in fields:
+                    self._send_json(400, {"error": {"message": "missing file"}})
+                    return
+                purpose = fields.get('purpose', (None, b'batch'))[1].decode('utf-8')
+                self._send_json(200, server._create_file(fields['file'][1], fields['file'][0] or 'input.jsonl',
+                                                         purpose))
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                body = self.rfile.read(length)
+                if server.cassette is not None and self.path in CASSETTE_PATHS:
+                    self._cassette('POST', body)
+                    return
+                if self.path == '/v1/files':
+                    self._upload(body)
+                    return
+                try:
+                    payload = json.loads(body or b'{}')
+                except ValueError:
+                    self._send_json(400, {"error": "invalid json"})
+                    return
+
+                if self.path == '/v1/batches':
+                    self._send_json(*server._create_batch(payload))
+                    return
+                parts = self.path.strip('/').split('/')
+                if parts[:2] == ['v1', 'batches'] and len(parts) == 4 and parts[3] == 'cancel':
+                    with server.lock:
+                        batch = server.batches.get(parts[2])
+                        if batch and batch["status"] in ("validating", "in_progress"):
+                            batch["status"] = "cancelling"
+                        batch = dict(batch) if batch else None
+                    if batch is None:
+                        self._send_json(404, {"error": "not found"})
+                    else:
+                        self._send_json(200, batch)
+                    return
+                if self.path == '/api/generate':
+                    self._generate(payload)
+                    return
+                if self.path not in ('/v1/chat/completions', '/chat/completions', '/api/chat'):
+                    self._send_json(404, {"error": "not found"})
+                    return
+
+                retry_after = server._admit()
+                if retry_after > 0:
+                    body = json.dumps({"error": {"message": "Rate limit reached", "type": "requests"}}).encode()
+                    self.send_response(429)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.send_header('Retry-After', str(math.ceil(retry_after)))
+                    self.send_header('retry-after-ms', str(int(retry_after * 1000)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                    return
+                if server.error_rate > 0 and server.random.random() < server.error_rate:
+                    with server.lock:
+                        server.errors += 1
+                    self._send_json(500, {"error": {"message": "模拟服务端错误", "type": "server_error"}})
+                    return
+
+                messages = payload.get('messages') or [{"content": ""}]
+                with server.lock:
+                    server.prompts.append(messages[-1].get('content', ''))
+                reply, lines = mock_reply(messages[-1].get('content', ''), server.max_batch)
+
+                # 模拟思考: 思考内容单独返回，或以<think>标签放在正文前
+                thinking = ''
+                think_time = 0
+                think = payload.get('think')
+                if server.think_tokens > 0 and think is not False:
+                    # 与正文一致: 每个token STREAM_CHUNK_CHARS 个字符
+                    thinking = "嗯" * (server.think_tokens * STREAM_CHUNK_CHARS)
+                    think_time = server.per_token * server.think_tokens
+                    if think is None or self.path != '/api/chat':
+                        reply = f"<think>{thinking}</think>\n{reply}"
+                        thinking = ''
+
+                delay = server._jitter(server.latency + server.per_line * lines + think_time)
+                if server.tail_rate > 0 and server.random.random() < server.tail_rate:
+                    delay *= server.tail_factor
+                timings = {}
+                with server.lock:
+                    server.active += 1
+                    server.peak_active = max(server.peak_active, server.active)
+                with server.slots:
+                    if self.path == '/api/chat':
+                        load = server._load()
+                        prompt_tokens, prefill = server._prefill(payload.get('messages') or [])
+                        delay += prefill
+                        timings = {"load_duration": int(load * 1e9), "prompt_eval_count": prompt_tokens,
+                                   "prompt_eval_duration": int(prefill * 1e9)}
+                    time.sleep(delay)
+                with server.lock:
+                    server.active -= 1
+                    server.requests += 1
+                    if self.path == '/api/chat' and payload.get('keep_alive') in (0, "0", "0s"):
+                        server.loaded = False
+
+                if payload.get('stream'):
+                    self._send_stream(self._stream_chunks(payload.get('model'), reply + STREAM_TRAILER, thinking,
+                                                          timings))
+                elif self.path == '/api/chat':
+                    message = {"role": "assistant", "content": reply}
+                    if thinking:
+                        message["thinking"] = thinking
+                    self._send_json(200, dict({
+                        "model": payload.get('model'),
+                        "message": message,
+                        "done": True,
+                        "eval_count": len(_split_tokens(thinking)) + len(_split_tokens(reply))
+                    }, **timings))
+                else:
+                    self._send_json(200, {
+                        "model": payload.get('model'),
+                        "choices": [{"index": 0, "message": {"role": "assistant", "content": reply},
+                                     "finish_reason": "stop"}]
+                    })
+
+        return Handler
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def main():
+    """命令行入口"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="本地LLM桩服务")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址")
+    parser.add_argument("--port", type=int, default=18080, help="监听端口")
+    parser.add_argument("--latency", type=float, default=0.2, help="每个请求固定耗时（秒）")
+    parser.add_argument("--per-line", type=float, default=0.02, help="每条字幕的生成耗时（秒）")
+    parser.add_argument("--slots", type=int, default=8, help="服务端同时处理的请求数")
+    parser.add_argument("--think-tokens", type=int, default=0, help="模拟思考模型每次请求的思考token数")
+    parser.add_argument("--per-token", type=float, default=0.005, help="每个思考token的耗时（秒）")
+    parser.add_argument("--tail-rate", type=float, default=0.0, help="长尾请求的比例")
+    parser.add_argument("--tail-factor", type=float, default=10.0, help="长尾请求的耗时倍数")
+    parser.add_argument("--load-time", type=float, default=0.0, help="模拟Ollama模型加载耗时（秒）")
+    parser.add_argument("--prefill-per-token", type=float, default=0.0, help="未命中前缀缓存的每个提示词token的预填充耗时（秒）")
+    parser.add_argument("--max-batch", type=int, default=0, help="批量回复最多包含的条数，超出的条目被丢弃")
+    parser.add_argument("--rate-limit", type=int, default=0, help="每秒最多接受的对话请求数，超出返回429")
+    parser.add_argument("--batch-time", type=float, default=1.0, help="批处理从创建到完成的耗时（秒）")
+    parser.add_argument("--batch-error-rate", type=float, default=0.0, help="批处理中请求失败的比例")
+    parser.add_argument("--latency-dist", choices=LATENCY_DISTS, default='fixed', help="请求耗时的分布")
+    parser.add_argument("--latency-jitter", type=float, default=0.0, help="耗时抖动幅度（相对值）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="对话请求返回500的比例")
+    parser.add_argument("--seed", type=int, default=None, help="随机数种子")
+    parser.add_argument("--upstream", default=None, help="录制模式: 真实服务的根地址")
+    parser.add_argument("--record", default=None, help="录制模式: 录音文件（追加写入）")
+    parser.add_argument("--replay", default=None, help="回放模式: 录音文件")
+    parser.add_argument("--no-replay-timing", action="store_true", help="回放时不按录制的耗时等待")
+    args = parser.parse_args()
+    if bool(args.upstream) != bool(args.record):
+        parser.error("--upstream 与 --record 需要同时指定")
+    if args.record and args.replay:
+        parser.error("--record 与 --replay 不能同时指定")
+
+    server = StubLLMServer(args.host, args.port, args.latency, args.per_line, args.slots,
+                           args.think_tokens, args.per_token, args.tail_rate, args.tail_factor,
+                           args.load_time, args.prefill_per_token, args.max_batch, args.rate_limit,
+                           args.batch_time, args.batch_error_rate, args.latency_dist, args.latency_jitter,
+                           args.error_rate, args.seed, args.upstream, args.record or args.replay,
+                           not args.no_replay_timing)
+    if args.record:
+        mode = f"，录制 {args.upstream} 到 {args.record}"
+    elif args.replay:
+        mode = f"，回放 {args.replay}（{len(server.cassette)} 条记录）"
+    else:
+        mode = ""
+    print(f"[INFO] 桩服务已启动: {server.url}  (OpenAI: {server.url}/v1, Ollama: {server.url}){mode}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+提示词token计数
+用 transformers 的分词器统计提示词的token数，用于按token预算截取上下文和记录每个请求的提示词token数。
+分词器在第一次计数时加载（translation_tokenizer，Hugging Face 模型名或本地路径）；
+默认不配置分词器，只按字符估算: 中日韩文字每字约1个token，其他约4个字符1个token
+（模型名需要从 Hugging Face 下载，离线部署会在第一次翻译时卡在下载上）。
+transformers 未安装或分词器无法加载时同样按字符估算。
+"""
+
+import os
+import sys
+import threading
+from typing import Any, Dict, List
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+from utils.logger import get_cached_logger
+
+logger = get_cached_logger("提示词计数")
+
+DEFAULT_TOKENIZER = ""
+# 聊天模板为每条消息附加的角色标记等token数（估算时使用）
+MESSAGE_OVERHEAD = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """没有分词器时按字符估算token数"""
+    cjk = sum(1 for char in text if '\u3000' <= char <= '\u9fff' or '\uac00' <= char <= '\ud7af'
+              or '\uff00' <= char <= '\uffef')
+    return cjk + -(-(len(text) - cjk) // 4)
+
+
+class TokenCounter:
+    """
+    token计数器（线程安全，分词器只加载一次）
+
+    Args:
+        tokenizer_name: Hugging Face 模型名或本地路径，为空时只做估算
+    """
+
+    def __init__(self, tokenizer_name: str = DEFAULT_TOKENIZER):
+        self.tokenizer_name = tokenizer_name
+        self.tokenizer = None
+        self.loaded = False
+        self.lock = threading.Lock()
+
+    def _load(self):
+        with self.lock:
+            if self.loaded:
+                return
+            self.loaded = True
+            if not self.tokenizer_name:
+                return
+            try:
+                from transformers import AutoTokenizer
+                self.tokenizer = AutoTokenizer.from_pretrained(self.tokenizer_name)
+                logger.info(f"已加载分词器: {self.tokenizer_name}")
+            except ImportError:
+                logger.warning("transformers 未安装，提示词token数按字符估算")
+            except Exception as e:
+                logger.warning(f"加载分词器失败，提示词token数按字符估算: {self.tokenizer_name} - {e}")
+
+    @property
+    def exact(self) -> bool:
+        """是否使用真实分词器计数"""
+        self._load()
+        return self.tokenizer is not None
+
+    def count(self, text: str) -> int:
+        """文本的token数"""
+        if not text:
+            return 0
+        self._load()
+        if self.tokenizer is None:
+            return estimate_tokens(text)
+        return len(self.tokenizer.encode(text, add_special_tokens=False))
+
+    def count_messages(self, messages: List[Dict[str, str]]) -> int:
+        """一次对话请求的提示词token数（分词器带聊天模板时按模板计数）"""
+        self._load()
+        if self.tokenizer is not None and getattr(self.tokenizer, 'chat_template', None):
+            try:
+                return len(self.tokenizer.apply_chat_template(messages, tokenize=True, add_generation_prompt=True))
+            except Exception:
+                pass
+        return sum(self.count(message.get('content', '')) + MESSAGE_OVERHEAD for message in messages)
+
+
+_counters = {}
+_counters_lock = threading.Lock()
+
+
+def get_token_counter(config: Dict[str, Any] = None) -> TokenCounter:
+    """按配置获取token计数器，相同分词器共用一个实例"""
+    name = (config or {}).get('translation_tokenizer', DEFAULT_TOKENIZER)
+    with _counters_lock:
+        counter = _counters.get(name)
+        if counter is None:
+            counter = _counters[name] = TokenCounter(name)
+        return counter
@@ -8,8 +8,8 @@ from threading import Timer
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
 from utils.logger import get_cached_logger
 
-# 导入直接调用模块
-from .whisper_direct import get_whisper_manager, transcribe_video_direct, get_whisper_status
+# 导入ASR引擎模块
+from .asr_engines import get_asr_engine, get_loaded_engines, resolve_engine_name
 
 logger = get_cached_logger("Whisper服务管理")
 
@@ -36,22 +36,29 @@ def schedule_log_cleanup():
 
 
 def check_whisper_service():
-    """检查 Whisper 服务是否可用（改为检查直接调用模块）"""
+    """检查 Whisper 服务是否可用（检查部署配置的ASR引擎）"""
     try:
-        # 对于新的直接调用系统，如果管理器初始化成功就认为可用
+        # 引擎创建成功就认为可用
         # 不需要检查模型是否已加载，因为采用延迟加载
-        manager = get_whisper_manager()
-        return True  # 管理器存在即表示服务可用
+        get_asr_engine()
+        return True  # 引擎存在即表示服务可用
     except Exception as e:
         logger.error(f"检查Whisper状态失败: {e}")
         return False
 
 
-def call_whisper_service(video_path, progress_callback=None, task_id=None):
-    """调用 Whisper 进行转录（改为直接调用）"""
+def call_whisper_service(video_path, progress_callback=None, task_id=None, profile=None,
+                         segment_callback=None):
+    """
+    调用 Whisper 进行转录（按档位/部署配置分发到ASR引擎）
+
+    segment_callback(segment) 在每个片段定稿后立即调用，用于流式翻译
+    """
     try:
-        logger.info(f"开始直接转录视频: {video_path}")
-        result = transcribe_video_direct(video_path, task_id, progress_callback)
+        engine = get_asr_engine(resolve_engine_name(profile))
+        logger.info(f"开始转录视频: {video_path}，ASR引擎: {engine.name}")
+        result = engine.transcribe_video(video_path, task_id, progress_callback,
+                                         segment_cb=segment_callback)
         
         if result.get('success'):
             return result
@@ -63,23 +70,26 @@ def call_whisper_service(video_path, progress_callback=None, task_id=None):
         raise Exception(f"Whisper 服务调用失败: {str(e)}")
 
 
-def format_srt(segments):
-    """格式化为SRT字幕"""
+def format_timestamp(seconds):
+    """秒数转为SRT时间戳"""
+    hours = int(seconds // 3600)
+    minutes = int((seconds % 3600) // 60)
+    secs = int(seconds % 60)
+    millisecs = int((seconds % 1) * 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d},{millisecs:03d}"
+
 
-    def format_timestamp(seconds):
-        hours = int(seconds // 3600)
-        minutes = int((seconds % 3600) // 60)
-        secs = int(seconds % 60)
-        millisecs = int((seconds % 1) * 1000)
-        return f"{hours:02d}:{minutes:02d}:{secs:02d},{millisecs:03d}"
+def format_srt_entry(index, segment):
+    """格式化单条SRT字幕"""
+    start = format_timestamp(segment['start'])
+    end = format_timestamp(segment['end'])
+    text = segment['text'].strip()
+    return f"{index}\n{start} --> {end}\n{text}\n\n"
 
-    srt_content = ""
-    for i, segment in enumerate(segments, 1):
-        start = format_timestamp(segment['start'])
-        end = format_timestamp(segment['end'])
-        text = segment['text'].strip()
-        srt_content += f"{i}\n{start} --> {end}\n{text}\n\n"
-    return srt_content
+
+def format_srt(segments):
+    """格式化为SRT字幕"""
+    return "".join(format_srt_entry(i, segment) for i, segment in enumerate(segments, 1))
 
 
 def start_whisper_service():
@@ -90,7 +100,7 @@ def start_whisper_service():
         # 步骤1: 如果是本地Ollama，先卸载Ollama模型释放显存
         try:
             from src.services.tran import load_config
-            import requests
+            from utils.http_client import get_http_client
 
             config = load_config()
             translator_type = config.get('translator_type', 'ollama')
@@ -106,7 +116,7 @@ def start_whisper_service():
                     try:
                         unload_url = f"{ollama_url}/api/generate"
                         payload = {"model": ollama_model, "keep_alive": 0}
-                        response = requests.post(unload_url, json=payload, timeout=10)
+                        response = get_http_client().post(unload_url, json=payload, timeout=10, retries=0)
 
                         if response.status_code == 200:
                             logger.info(f"[INFO] ✅ Ollama模型 {ollama_model} 已卸载，显存已释放")
@@ -119,9 +129,11 @@ def start_whisper_service():
         except Exception as e:
             logger.warning(f"[WARN] 检查Ollama配置失败(将继续启动): {e}")
 
-        # 步骤2: 启用预加载模式，立即加载Whisper模型并预热
-        manager = get_whisper_manager(preload=True)
-        logger.info("[INFO] Whisper 模块已初始化并完成预热")
+        # 步骤2: 立即加载部署配置的ASR引擎并预热
+        engine = get_asr_engine()
+        if not engine.warmup():
+            logger.warning(f"[WARN] ASR引擎 {engine.name} 预热失败，将在首次转录时加载")
+        logger.info(f"[INFO] Whisper 模块已初始化并完成预热 (引擎: {engine.name})")
 
         # 步骤3: 启动日志清理
         schedule_log_cleanup()
@@ -136,8 +148,8 @@ def stop_whisper_service():
     """停止 Whisper 模块（卸载模型）"""
     try:
         logger.info("[INFO] 停止 Whisper 模块...")
-        manager = get_whisper_manager()
-        manager.unload_model()
+        for engine in get_loaded_engines().values():
+            engine.unload()
         logger.info("[INFO] Whisper 模块已停止")
         return True
         
@@ -187,7 +199,7 @@ class WhisperServiceManager:
 
     def get_status(self):
         """获取服务状态"""
-        return get_whisper_status()
+        return get_asr_engine().get_status()
 
     def transcribe(self, video_path, progress_callback=None):
         """转录视频"""
@@ -235,6 +247,8 @@ __all__ = [
     'check_whisper_service',
     'call_whisper_service',
     'format_srt',
+    'format_srt_entry',
+    'format_timestamp',
     'start_whisper_service',
     'stop_whisper_service',
     'restart_whisper_service',
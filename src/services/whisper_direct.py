@@ -13,15 +13,87 @@ import os
 import tempfile
 import subprocess
 import sys
-import io
-from contextlib import redirect_stderr, redirect_stdout
+import importlib
+import types
 from typing import Optional, Dict, Any, List
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
 from utils.audio_preprocessor import preprocess_audio_for_whisper, analyze_audio_quality
+from utils.cpu_tuner import (CPUThreadPlanner, apply_thread_plan, load_cpu_settings, quantize_whisper_for_cpu,
+                             resolve_quantize)
 from utils.logger import get_cached_logger
+from .asr_engines.base import AUDIO_FILTERS, DEFAULT_TRANSCRIBE_OPTIONS, build_result, normalize_segment
 
 logger = get_cached_logger("Whisper语音识别")
 
+# 每个mel帧对应的秒数（HOP_LENGTH / SAMPLE_RATE = 10ms）
+FRAME_SECONDS = whisper.audio.HOP_LENGTH / whisper.audio.SAMPLE_RATE
+
+_window_progress_local = threading.local()
+_window_progress_installed = False
+_segments_hook_warned = False
+
+
+class _WindowProgress:
+    """
+    替代 whisper.transcribe 内部的 tqdm 进度条
+
+    whisper每解码完一个30秒窗口调用一次 update(已前进帧数)，
+    这里直接把 (已解码秒数, 总秒数) 交给当前线程登记的回调，无需捕获stderr。
+
+    update() 由 transcribe() 在把本窗口片段并入 all_segments 之后调用，
+    此时这些片段已经定稿，登记了片段回调时从调用方栈帧取出新增片段逐个回调。
+    all_segments 是 whisper 内部的局部变量，升级后取不到时不再逐窗口回调，
+    由 transcribe_audio 在转录结束后一次性回调剩余片段（退化为非流式）。
+    """
+
+    def __init__(self, total=None, **kwargs):
+        self.total = total or 0
+        self.n = 0
+        self.emitted = 0
+        self.callback = getattr(_window_progress_local, 'callback', None)
+        self.segment_callback = getattr(_window_progress_local, 'segment_callback', None)
+        _window_progress_local.emitted = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def update(self, n=1):
+        self.n += n
+        if self.segment_callback is not None:
+            all_segments = sys._getframe(1).f_locals.get('all_segments')
+            if not isinstance(all_segments, list):
+                _warn_segments_unavailable()
+                self.segment_callback = None
+            else:
+                for segment in all_segments[self.emitted:]:
+                    self.segment_callback(normalize_segment(segment, self.emitted))
+                    self.emitted += 1
+                _window_progress_local.emitted = self.emitted
+        if self.callback is not None:
+            self.callback(self.n * FRAME_SECONDS, self.total * FRAME_SECONDS)
+
+
+def _warn_segments_unavailable():
+    """whisper.transcribe 中没有 all_segments 局部变量（版本变化），只警告一次"""
+    global _segments_hook_warned
+    if not _segments_hook_warned:
+        _segments_hook_warned = True
+        logger.warning("当前whisper版本取不到逐窗口的转录片段，流式翻译退化为转录结束后一次性翻译")
+
+
+def _install_window_progress_hook():
+    """将 whisper.transcribe 模块中的 tqdm 替换为窗口进度钩子（只安装一次）"""
+    global _window_progress_installed
+    if _window_progress_installed:
+        return
+    # whisper包内 transcribe 属性是同名函数，需从模块表取得模块本身
+    transcribe_module = importlib.import_module('whisper.transcribe')
+    transcribe_module.tqdm = types.SimpleNamespace(tqdm=_WindowProgress)
+    _window_progress_installed = True
+
 class WhisperDirectManager:
     """Whisper直接调用管理器"""
     
@@ -32,6 +104,10 @@ class WhisperDirectManager:
         self.lock = threading.Lock()
         self.is_loading = False
         self.is_warmed_up = False
+        self.is_quantized = False
+        self.cpu_quantize = False
+        self.ffmpeg_threads = 4
+        self.cpu_plan = None
         
         # 设置本地模型目录
         self.whisper_cache_dir = os.path.abspath("whisper")
@@ -43,6 +119,13 @@ class WhisperDirectManager:
             torch.backends.cudnn.benchmark = False  # 禁用benchmark避免超时
             os.environ['PYTORCH_CUDA_ALLOC_CONF'] = 'max_split_size_mb:512'  # 增大分割大小以提升性能
             os.environ['CUDA_LAUNCH_BLOCKING'] = '1'  # 启用同步执行
+        else:
+            # 纯CPU节点: 按线程方案分配核心，避免与ffmpeg争抢
+            cpu_settings = load_cpu_settings()
+            self.cpu_plan = CPUThreadPlanner().load_plan(cpu_settings.get('whisper_cpu_threads'))
+            self.cpu_quantize = resolve_quantize(cpu_settings.get('whisper_cpu_quantize', 'auto'), self.cpu_plan)
+            apply_thread_plan(self.cpu_plan)
+            self.ffmpeg_threads = self.cpu_plan['ffmpeg']
         
         # 防止并行冲突
         os.environ['TOKENIZERS_PARALLELISM'] = 'false'
@@ -99,7 +182,7 @@ class WhisperDirectManager:
                 try:
                     # 动态导入避免循环依赖
                     import json
-                    import requests
+                    from utils.http_client import get_http_client
 
                     config_path = 'config/tran-py.json'
                     if os.path.exists(config_path):
@@ -119,7 +202,7 @@ class WhisperDirectManager:
                                 try:
                                     unload_url = f"{ollama_url}/api/generate"
                                     payload = {"model": ollama_model, "keep_alive": 0}
-                                    response = requests.post(unload_url, json=payload, timeout=10)
+                                    response = get_http_client().post(unload_url, json=payload, timeout=10, retries=0)
 
                                     if response.status_code == 200:
                                         logger.info(f"✅ Ollama模型已卸载")
@@ -174,6 +257,15 @@ class WhisperDirectManager:
             for param in self.model.parameters():
                 param.requires_grad = False
             
+            # CPU模式: 线性层int8动态量化
+            self.is_quantized = False
+            if self.device == "cpu" and self.cpu_quantize:
+                try:
+                    self.model = quantize_whisper_for_cpu(self.model)
+                    self.is_quantized = True
+                except Exception as e:
+                    logger.warning(f"int8量化失败，使用fp32模型: {e}")
+            
             load_time = time.time() - start_time
             
             if self.device == "cuda":
@@ -270,8 +362,8 @@ class WhisperDirectManager:
             "-acodec", "pcm_s16le",  # 16位PCM编码
             "-ar", "16000",  # 16kHz采样率
             "-ac", "1",  # 单声道
-            "-af", "volume=1.2,highpass=f=80,lowpass=f=8000,dynaudnorm=g=3:f=250:r=0.9:p=0.5",  # 音频预处理滤镜
-            "-threads", "4",  # 多线程
+            "-af", AUDIO_FILTERS,  # 音频预处理滤镜
+            "-threads", str(self.ffmpeg_threads),  # 线程数由CPU线程方案决定（GPU模式默认4）
             "-f", "wav",  # WAV格式
             audio_path, "-y"  # 覆盖输出文件
         ]
@@ -322,93 +414,53 @@ class WhisperDirectManager:
                     pass
             raise Exception(f"音频提取失败: {e}")
     
-    def transcribe_audio(self, audio_path: str, progress_callback=None) -> Dict[str, Any]:
-        """转录音频文件"""
-        if not os.path.exists(audio_path):
+    def transcribe_audio(self, audio_path, progress_callback=None,
+                         options: Optional[Dict[str, Any]] = None,
+                         segment_callback=None) -> Dict[str, Any]:
+        """转录音频（文件路径或16kHz float32数组）"""
+        if isinstance(audio_path, str) and not os.path.exists(audio_path):
             raise FileNotFoundError(f"音频文件不存在: {audio_path}")
         
         model = self.get_model()
         
-        # Whisper转录选项 - 关闭上下文记忆，提升质量
-        transcribe_options = {
-            "language": None,  # 自动检测语言
-            "task": "transcribe",  # 转录任务
-            "beam_size": 5,  # 增大束搜索以提升准确度（1->5）
-            "best_of": 5,  # 增大候选数量以获得更好结果（1->5）
-            "temperature": 0.0,  # 温度设置为0，确保结果稳定
-            "compression_ratio_threshold": 2.4,
-            "logprob_threshold": -1.0,
-            "no_speech_threshold": 0.6,
-            "condition_on_previous_text": False,  # 关闭上下文记忆！每句话独立处理
-            "initial_prompt": None,  # 不使用初始提示
-            "verbose": False,  # 不显示详细信息
-            "fp16": True if self.device == "cuda" else False  # GPU使用半精度
-        }
+        transcribe_options = dict(DEFAULT_TRANSCRIBE_OPTIONS)
+        if options:
+            transcribe_options.update(options)
+        transcribe_options["verbose"] = False  # 不显示详细信息
+        transcribe_options["fp16"] = self.device == "cuda"  # GPU使用半精度
         
         try:
-            logger.info(f"开始转录音频: {audio_path}")
+            logger.info(f"开始转录音频: {audio_path if isinstance(audio_path, str) else '内存音频'}")
             start_time = time.time()
             
             if self.device == "cuda":
                 torch.cuda.empty_cache()
             
-            # 执行转录，关闭梯度计算，同时捕获控制台输出
-            if progress_callback:
-                # 捕获stderr以获取tqdm输出
-                captured_output = io.StringIO()
-                with torch.no_grad(), redirect_stderr(captured_output):
-                    # 在后台线程中监控输出
-                    def monitor_progress():
-                        last_pos = 0
-                        while True:
-                            time.sleep(0.1)
-                            captured_output.seek(last_pos)
-                            new_content = captured_output.read()
-                            if new_content:
-                                lines = new_content.strip().split('\n')
-                                for line in lines:
-                                    if line.strip() and ('frames/s' in line or '%|' in line):
-                                        progress_callback(line.strip())
-                                last_pos = captured_output.tell()
-                            else:
-                                # 检查是否完成
-                                if not hasattr(monitor_progress, 'running') or not monitor_progress.running:
-                                    break
-                    
-                    monitor_progress.running = True
-                    monitor_thread = threading.Thread(target=monitor_progress, daemon=True)
-                    monitor_thread.start()
-                    
-                    try:
-                        result = model.transcribe(audio_path, **transcribe_options)
-                    finally:
-                        monitor_progress.running = False
-                        if monitor_thread.is_alive():
-                            monitor_thread.join(timeout=1)
-            else:
+            # 执行转录，关闭梯度计算；进度由窗口钩子直接回调
+            _install_window_progress_hook()
+            _window_progress_local.callback = progress_callback
+            _window_progress_local.segment_callback = segment_callback
+            _window_progress_local.emitted = 0
+            try:
                 with torch.no_grad():
                     result = model.transcribe(audio_path, **transcribe_options)
+                emitted = _window_progress_local.emitted
+            finally:
+                _window_progress_local.callback = None
+                _window_progress_local.segment_callback = None
+
+            # 窗口钩子没有回调的片段（取不到 all_segments 时为全部片段）在转录结束后补上
+            if segment_callback is not None:
+                segments = result.get('segments', [])
+                if emitted < len(segments):
+                    for index, segment in enumerate(segments[emitted:], start=emitted):
+                        segment_callback(normalize_segment(segment, index))
             
             transcribe_time = time.time() - start_time
             
-            # 处理结果
-            segments = result.get('segments', [])
-            text = result.get('text', '').strip()
-            language = result.get('language', 'unknown')
-            
-            # 确保每个片段都是独立的（移除可能的上下文依赖）
-            processed_segments = []
-            for segment in segments:
-                processed_segment = {
-                    'id': segment.get('id', 0),
-                    'start': segment.get('start', 0.0),
-                    'end': segment.get('end', 0.0),
-                    'text': segment.get('text', '').strip(),
-                    'avg_logprob': segment.get('avg_logprob', 0.0),
-                    'compression_ratio': segment.get('compression_ratio', 0.0),
-                    'no_speech_prob': segment.get('no_speech_prob', 0.0)
-                }
-                processed_segments.append(processed_segment)
+            # 处理结果（确保每个片段都是独立的，移除可能的上下文依赖）
+            processed = build_result(result.get('segments', []), result.get('text', ''),
+                                     result.get('language', 'unknown'), transcribe_time)
             
             if self.device == "cuda":
                 torch.cuda.empty_cache()
@@ -417,15 +469,7 @@ class WhisperDirectManager:
             else:
                 logger.info(f"转录完成，用时: {transcribe_time:.2f}秒")
             
-            return {
-                'success': True,
-                'text': text,
-                'language': language,
-                'segments': processed_segments,
-                'processing_time': transcribe_time,
-                'context_disabled': True,  # 标记已关闭上下文记忆
-                'segment_count': len(processed_segments)
-            }
+            return processed
             
         except Exception as e:
             logger.error(f"音频转录失败: {e}")
@@ -492,6 +536,8 @@ class WhisperDirectManager:
                 'model_name': self.model_name,
                 'is_loading': self.is_loading,
                 'is_warmed_up': self.is_warmed_up,
+                'is_quantized': self.is_quantized,
+                'cpu_thread_plan': self.cpu_plan,
                 'context_memory_disabled': True
             }
 
@@ -543,6 +589,10 @@ class WhisperDirectManager:
                 logger.error("CUDA不可用，无法移动到GPU")
                 return False
 
+            if self.is_quantized:
+                logger.error("int8量化模型仅支持CPU推理，无法移动到GPU")
+                return False
+
             try:
                 logger.info("将Whisper模型移动到GPU...")
                 start_time = time.time()
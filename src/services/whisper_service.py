@@ -1,13 +1,30 @@
-from flask import Flask, request, jsonify
-import whisper
-import torch
+"""
+ASR工作节点服务
+独立部署在转录机器上，主节点通过 asr_engine: "remote" + asr_endpoints 把转录分发到这里。
+
+音频直接作为请求体上传，不需要与主节点共享文件系统:
+    Content-Type: audio/pcm          16kHz 单声道 s16le 裸PCM
+    其他 Content-Type                 任意ffmpeg可解码的音频文件（主节点发送FLAC）
+    X-ASR-Options: {...}              可选，JSON格式的转录选项
+
+响应为NDJSON，每行一个事件:
+    {"type": "progress", "position": 秒, "duration": 秒}
+    {"type": "segment", "segment": {...}}
+    {"type": "result", "result": {...}}
+    {"type": "error", "error": "..."}
+
+用法:
+    python -m src.services.whisper_service --host 0.0.0.0 --port 5001
+"""
+
+from flask import Flask, request, jsonify, Response
 import gc
-import threading
-import time
+import json
 import os
+import queue
 import tempfile
-import subprocess
-import logging
+import threading
+import time
 
 app = Flask(__name__)
 
@@ -16,217 +33,195 @@ import sys
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 from utils.logger import get_cached_logger
 
+from src.services.asr_engines import get_asr_engine, resolve_engine_name, RemoteASREngine
+from src.services.tran import load_config
+
 logger = get_cached_logger("Whisper服务")
 
-class WhisperModelManager:
+SAMPLE_RATE = 16000
+# 请求体读取块大小
+READ_CHUNK_SIZE = 1024 * 1024
+
+
+class ASRWorker:
+    """工作节点: 持有本机ASR引擎，并按槽位数限制同时进行的转录"""
+
     def __init__(self):
-        self.model = None
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        self.model_path = "./whisper/large-v3.pt"
+        config = load_config()
+        self.engine_name = resolve_engine_name()
+        if self.engine_name == RemoteASREngine.name:
+            raise ValueError("工作节点的 asr_engine 不能是 remote，请配置本机引擎")
+        self.slots = max(1, int(config.get('asr_worker_slots', 1)))
+        self.token = config.get('asr_worker_token', '')
+        self.active = 0
+        self.completed = 0
         self.lock = threading.Lock()
-        
-        # 优化设置
-        if self.device == "cuda":
-            torch.cuda.set_per_process_memory_fraction(0.6)
-            torch.backends.cudnn.benchmark = True
-            os.environ['PYTORCH_CUDA_ALLOC_CONF'] = 'max_split_size_mb:512'
-        
-    def get_model(self):
+
+    @property
+    def engine(self):
+        return get_asr_engine(self.engine_name)
+
+    def try_acquire(self) -> bool:
         with self.lock:
-            if self.model is None:
-                self._load_model()
-            return self.model
-            
-    def _load_model(self):
-        logger.info(f"加载模型到 {self.device}")
-        
-        if self.model:
-            del self.model
-            self.model = None
-            
-        if self.device == "cuda":
-            torch.cuda.empty_cache()
-        gc.collect()
-        
-        # 加载模型
-        if os.path.exists(self.model_path):
-            self.model = whisper.load_model(self.model_path, device=self.device)
-        else:
-            self.model = whisper.load_model("large-v3", device=self.device)
-            
-        # 优化设置
-        self.model.eval()
-        for param in self.model.parameters():
-            param.requires_grad = False
-            
-        if self.device == "cuda":
-            torch.cuda.empty_cache()
-            memory = torch.cuda.memory_allocated() / 1024**3
-            logger.info(f"模型加载完成，显存使用: {memory:.2f}GB")
-        else:
-            logger.info("模型加载完成")
-            
-    def transcribe(self, audio_path):
-        model = self.get_model()
-        
-        options = {
-            "beam_size": 1,
-            "best_of": 1,
-            "temperature": 0.0,
-            "compression_ratio_threshold": 2.4,
-            "logprob_threshold": -1.0,
-            "no_speech_threshold": 0.6,
-            "condition_on_previous_text": False,
-            "verbose": False
-        }
-        
-        if self.device == "cuda":
-            torch.cuda.empty_cache()
-            
-        with torch.no_grad():
-            result = model.transcribe(audio_path, **options)
-            
-        if self.device == "cuda":
-            torch.cuda.empty_cache()
-            
-        return result
+            if self.active >= self.slots:
+                return False
+            self.active += 1
+            return True
+
+    def release(self):
+        with self.lock:
+            self.active -= 1
+            self.completed += 1
+
+    def capacity(self):
+        with self.lock:
+            return {
+                'slots': self.slots,
+                'active': self.active,
+                'available': self.slots - self.active,
+                'completed': self.completed
+            }
 
-model_manager = WhisperModelManager()
 
-def extract_audio_from_video(video_path):
-    with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_audio:
+worker = ASRWorker()
+
+
+def check_token():
+    """校验共享令牌（未配置时不校验）"""
+    if not worker.token:
+        return True
+    return request.headers.get('Authorization', '') == f"Bearer {worker.token}"
+
+
+def read_audio_body():
+    """按块读取请求体，PCM直接解码为数组，其他格式落到临时文件交给引擎用ffmpeg解码"""
+    if request.mimetype == 'audio/pcm':
+        import numpy as np
+        chunks = []
+        while True:
+            chunk = request.stream.read(READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        data = b''.join(chunks)
+        if not data:
+            raise ValueError("请求体为空")
+        return np.frombuffer(data, '<i2').astype(np.float32) / 32768.0, None
+
+    with tempfile.NamedTemporaryFile(suffix=".audio", delete=False) as temp_audio:
         audio_path = temp_audio.name
-        
-    cmd = [
-        "ffmpeg", "-i", video_path, "-vn", "-acodec", "pcm_s16le", 
-        "-ar", "16000", "-ac", "1", "-threads", "2", "-f", "wav", 
-        audio_path, "-y"
-    ]
-    
-    try:
-        result = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8', errors='replace', timeout=300)
-        if result.returncode != 0:
-            raise subprocess.CalledProcessError(result.returncode, cmd)
-        return audio_path
-    except Exception as e:
-        if os.path.exists(audio_path):
-            os.remove(audio_path)
-        raise Exception(f"音频提取失败: {e}")
+        size = 0
+        while True:
+            chunk = request.stream.read(READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            temp_audio.write(chunk)
+            size += len(chunk)
+    if size == 0:
+        os.remove(audio_path)
+        raise ValueError("请求体为空")
+    return audio_path, audio_path
+
 
 @app.route('/health', methods=['GET'])
 def health_check():
     try:
-        with model_manager.lock:
-            model_loaded = model_manager.model is not None
-            
-        memory_info = {}
-        if torch.cuda.is_available():
-            memory_info = {
-                "allocated_gb": torch.cuda.memory_allocated() / 1024**3,
-                "reserved_gb": torch.cuda.memory_reserved() / 1024**3,
-                "device_name": torch.cuda.get_device_name()
-            }
-            
-        return jsonify({
+        engine_status = worker.engine.get_status()
+        status = {
             "status": "healthy",
-            "model_loaded": model_loaded,
-            "device": model_manager.device,
-            "memory_info": memory_info
-        })
+            "engine": worker.engine_name,
+            "model_loaded": engine_status.get('model_loaded', False),
+            "device": engine_status.get('device'),
+        }
+        status.update(worker.capacity())
+        return jsonify(status)
     except Exception as e:
         return jsonify({"status": "error", "error": str(e)}), 500
 
+
 @app.route('/transcribe', methods=['POST'])
 def transcribe_endpoint():
+    if not check_token():
+        return jsonify({"success": False, "error": "未授权"}), 401
+
+    if not worker.try_acquire():
+        response = jsonify({"success": False, "error": "没有空闲槽位"})
+        response.headers['Retry-After'] = '2'
+        return response, 503
+
     try:
-        if not request.json or 'audio_path' not in request.json:
-            return jsonify({"error": "缺少audio_path参数"}), 400
-            
-        audio_path = request.json['audio_path']
-        if not os.path.exists(audio_path):
-            return jsonify({"error": f"音频文件不存在: {audio_path}"}), 400
-            
-        start_time = time.time()
-        result = model_manager.transcribe(audio_path)
-        processing_time = time.time() - start_time
-        
-        return jsonify({
-            "success": True,
-            "segments": result['segments'],
-            "text": result['text'],
-            "language": result['language'],
-            "processing_time": processing_time
-        })
-        
+        options = json.loads(request.headers.get('X-ASR-Options') or '{}')
+        audio, temp_path = read_audio_body()
     except Exception as e:
-        logger.error(f"转录错误: {e}")
-        return jsonify({"success": False, "error": str(e)}), 500
+        worker.release()
+        return jsonify({"success": False, "error": f"请求无效: {e}"}), 400
 
-@app.route('/transcribe_video', methods=['POST'])
-def transcribe_video_endpoint():
-    try:
-        if not request.json or 'video_path' not in request.json:
-            return jsonify({"error": "缺少video_path参数"}), 400
-            
-        video_path = request.json['video_path']
-        if not os.path.exists(video_path):
-            return jsonify({"error": f"视频文件不存在: {video_path}"}), 400
-            
-        start_time = time.time()
-        audio_path = extract_audio_from_video(video_path)
-        
+    events = queue.Queue()
+
+    def run():
         try:
-            result = model_manager.transcribe(audio_path)
-            processing_time = time.time() - start_time
-            
-            return jsonify({
-                "success": True,
-                "segments": result['segments'],
-                "text": result['text'],
-                "language": result['language'],
-                "processing_time": processing_time
-            })
-            
+            start_time = time.time()
+            result = worker.engine.transcribe(
+                audio, options,
+                progress_cb=lambda position, duration: events.put(
+                    {"type": "progress", "position": position, "duration": duration}),
+                segment_cb=lambda segment: events.put({"type": "segment", "segment": segment})
+            )
+            logger.info(f"转录完成，片段数: {result.get('segment_count', 0)}，用时: {time.time() - start_time:.2f}秒")
+            events.put({"type": "result", "result": result})
+        except Exception as e:
+            logger.error(f"转录错误: {e}")
+            events.put({"type": "error", "error": str(e)})
         finally:
-            if os.path.exists(audio_path):
-                os.remove(audio_path)
-                
-    except Exception as e:
-        logger.error(f"视频转录错误: {e}")
-        return jsonify({"success": False, "error": str(e)}), 500
+            worker.release()
+            if temp_path and os.path.exists(temp_path):
+                os.remove(temp_path)
+            events.put(None)
+
+    threading.Thread(target=run, daemon=True).start()
+
+    def generate():
+        while True:
+            event = events.get()
+            if event is None:
+                break
+            yield json.dumps(event, ensure_ascii=False) + "\n"
+
+    return Response(generate(), mimetype='application/x-ndjson')
+
 
 @app.route('/model/reload', methods=['POST'])
 def reload_model():
+    if not check_token():
+        return jsonify({"success": False, "error": "未授权"}), 401
     try:
-        with model_manager.lock:
-            model_manager._load_model()
+        worker.engine.unload()
+        worker.engine.warmup()
         return jsonify({"success": True, "message": "模型重新加载完成"})
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
+
 @app.route('/model/unload', methods=['POST'])
 def unload_model():
+    if not check_token():
+        return jsonify({"success": False, "error": "未授权"}), 401
     try:
-        with model_manager.lock:
-            if model_manager.model:
-                del model_manager.model
-                model_manager.model = None
-                
-            if model_manager.device == "cuda":
-                torch.cuda.empty_cache()
-            gc.collect()
-            
+        worker.engine.unload()
+        gc.collect()
         return jsonify({"success": True, "message": "模型已卸载"})
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
+
 @app.route('/memory/optimize', methods=['POST'])
 def optimize_memory():
     try:
+        import torch
         if torch.cuda.is_available():
             torch.cuda.empty_cache()
             gc.collect()
-            
+
             return jsonify({
                 "success": True,
                 "message": "显存优化完成",
@@ -238,18 +233,30 @@ def optimize_memory():
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
-if __name__ == "__main__":
-    logger.info("启动Whisper服务")
-    
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="ASR工作节点")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址")
+    parser.add_argument("--port", type=int, default=5001, help="监听端口")
+    args = parser.parse_args()
+
+    logger.info(f"启动ASR工作节点，引擎: {worker.engine_name}，槽位: {worker.slots}")
+
     # 环境变量优化
     os.environ['TOKENIZERS_PARALLELISM'] = 'false'
     os.environ['CUDA_LAUNCH_BLOCKING'] = '0'
-    
+
     # 预加载模型
     try:
-        model_manager.get_model()
+        worker.engine.warmup()
         logger.info("模型预加载完成")
     except Exception as e:
         logger.error(f"模型预加载失败: {e}")
-        
-    app.run(host="127.0.0.1", port=5001, debug=False, threaded=True)
\ No newline at end of file
+
+    app.run(host=args.host, port=args.port, debug=False, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,374 @@
+"""
+CPU推理调优模块
+为纯CPU节点提供Whisper int8动态量化和线程分配规划
+
+线程规划在 intra-op / inter-op / ffmpeg 三者之间分配CPU核心，
+基准测试实测各配置的实时率(RTF)后，将最优方案（线程分配与是否int8量化）写入 db/cpu_thread_plan.json，
+后续启动时直接加载该方案。
+
+用法:
+    python -m src.utils.cpu_tuner bench [--seconds 30] [--model large-v3-turbo]
+"""
+
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, Any, List
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+from utils.logger import get_cached_logger
+
+logger = get_cached_logger("CPU调优")
+
+PLAN_PATH = 'db/cpu_thread_plan.json'
+CONFIG_PATH = 'config/tran-py.json'
+SAMPLE_RATE = 16000
+
+# 已应用到torch运行时的线程方案（torch线程数为进程级设置，进程内其他CPU推理沿用该方案）
+_active_plan = None
+
+
+def load_cpu_settings() -> Dict[str, Any]:
+    """从主配置文件读取CPU推理相关设置"""
+    settings = {
+        'whisper_cpu_quantize': 'auto',
+        'whisper_cpu_threads': 'auto'
+    }
+    try:
+        if os.path.exists(CONFIG_PATH):
+            with open(CONFIG_PATH, 'r', encoding='utf-8') as f:
+                content = f.read().strip()
+                if content:
+                    config = json.loads(content)
+                    for key in settings:
+                        if key in config:
+                            settings[key] = config[key]
+    except Exception as e:
+        logger.warning(f"读取CPU推理配置失败，使用默认值: {e}")
+    return settings
+
+
+def get_core_count() -> int:
+    """获取可用CPU核心数（优先物理核心）"""
+    try:
+        import psutil
+        physical = psutil.cpu_count(logical=False)
+        if physical:
+            return physical
+    except Exception:
+        pass
+    return os.cpu_count() or 1
+
+
+class CPUThreadPlanner:
+    """CPU线程规划器，在intra-op、inter-op和ffmpeg之间分配核心"""
+
+    def __init__(self, plan_path: str = PLAN_PATH):
+        self.plan_path = plan_path
+        self.cores = get_core_count()
+
+    def default_plan(self) -> Dict[str, int]:
+        """未测量时的启发式方案: ffmpeg分到约1/4核心(最多4个)，其余给intra-op"""
+        ffmpeg_threads = max(1, min(4, self.cores // 4))
+        interop_threads = 1 if self.cores <= 4 else 2
+        intra_threads = max(1, self.cores - ffmpeg_threads)
+        return {
+            'intra_op': intra_threads,
+            'inter_op': interop_threads,
+            'ffmpeg': ffmpeg_threads,
+            'cores': self.cores,
+            'source': 'default'
+        }
+
+    def candidate_plans(self) -> List[Dict[str, int]]:
+        """生成基准测试的候选方案"""
+        candidates = []
+        seen = set()
+        for ffmpeg_threads in (1, 2, 4):
+            if ffmpeg_threads >= self.cores:
+                continue
+            for interop_threads in (1, 2):
+                remaining = self.cores - ffmpeg_threads
+                for intra_threads in (remaining, max(1, remaining // 2)):
+                    key = (intra_threads, interop_threads, ffmpeg_threads)
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    candidates.append({
+                        'intra_op': intra_threads,
+                        'inter_op': interop_threads,
+                        'ffmpeg': ffmpeg_threads,
+                        'cores': self.cores,
+                        'source': 'candidate'
+                    })
+        if not candidates:
+            candidates.append(self.default_plan())
+        return candidates
+
+    def load_plan(self, override=None) -> Dict[str, int]:
+        """
+        获取当前应使用的线程方案
+
+        Args:
+            override: 配置中的 whisper_cpu_threads，"auto" 或显式的 {intra_op, inter_op, ffmpeg}
+
+        Returns:
+            线程方案字典
+        """
+        if isinstance(override, dict):
+            plan = self.default_plan()
+            for key in ('intra_op', 'inter_op', 'ffmpeg'):
+                if key in override:
+                    plan[key] = max(1, int(override[key]))
+            plan['source'] = 'config'
+            return plan
+
+        try:
+            if os.path.exists(self.plan_path):
+                with open(self.plan_path, 'r', encoding='utf-8') as f:
+                    saved = json.load(f)
+                plan = saved.get('plan', {})
+                # 核心数变化后（换机器/改容器配额）测量结果失效
+                if plan.get('cores') == self.cores:
+                    plan['source'] = 'measured'
+                    return plan
+                logger.info(f"已保存的线程方案基于 {plan.get('cores')} 核心，当前 {self.cores} 核心，改用默认方案")
+        except Exception as e:
+            logger.warning(f"读取线程方案失败: {e}")
+
+        return self.default_plan()
+
+    def save_plan(self, plan: Dict[str, int], results: List[Dict[str, Any]]):
+        """保存测量得到的最优方案及全部测量结果"""
+        os.makedirs(os.path.dirname(self.plan_path), exist_ok=True)
+        with open(self.plan_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'plan': plan,
+                'results': results,
+                'measured_at': time.time()
+            }, f, ensure_ascii=False, indent=2)
+        logger.info(f"线程方案已保存到: {self.plan_path}")
+
+
+def resolve_quantize(setting, plan: Dict[str, Any]) -> bool:
+    """
+    是否对Whisper做int8量化
+
+    Args:
+        setting: 配置中的 whisper_cpu_quantize，true/false 或 "auto"
+        plan: 当前线程方案，"auto" 时使用基准测试测得的最优量化模式，未测量时量化
+    """
+    if setting == 'auto':
+        return bool(plan.get('quantize', True))
+    return bool(setting)
+
+
+def get_active_plan():
+    """返回已应用的线程方案，尚未应用时返回None"""
+    return _active_plan
+
+
+def apply_thread_plan(plan: Dict[str, int]) -> bool:
+    """将线程方案应用到torch运行时"""
+    import torch
+    global _active_plan
+
+    torch.set_num_threads(plan['intra_op'])
+    _active_plan = plan
+    try:
+        # inter-op线程数只能在首次并行计算前设置一次
+        torch.set_num_interop_threads(plan['inter_op'])
+    except RuntimeError as e:
+        logger.debug(f"inter-op线程数已固定，跳过设置: {e}")
+        return False
+    logger.info(f"CPU线程方案已应用 - intra-op: {plan['intra_op']}, inter-op: {plan['inter_op']}, "
+                f"ffmpeg: {plan['ffmpeg']} (来源: {plan.get('source', 'unknown')})")
+    return True
+
+
+def quantize_whisper_for_cpu(model):
+    """
+    对Whisper模型的线性层做int8动态量化
+
+    whisper.model.Linear 是 nn.Linear 的子类，只在前向中把权重转换为输入dtype，
+    CPU上全程fp32时与 nn.Linear 等价。torch的动态量化按精确类型匹配，
+    因此先把这些层还原为 nn.Linear 再量化。
+    """
+    import torch
+
+    linear_count = 0
+    for module in model.modules():
+        if isinstance(module, torch.nn.Linear) and type(module) is not torch.nn.Linear:
+            module.__class__ = torch.nn.Linear
+        if isinstance(module, torch.nn.Linear):
+            linear_count += 1
+
+    quantized = torch.quantization.quantize_dynamic(
+        model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True
+    )
+    logger.info(f"已对 {linear_count} 个线性层应用int8动态量化")
+    return quantized
+
+
+def make_synthetic_clip(seconds: int = 30):
+    """生成合成测试音频: 按音节节奏调幅的谐波 + 底噪，16kHz单声道float32"""
+    import numpy as np
+
+    rng = np.random.default_rng(0)
+    t = np.arange(int(seconds * SAMPLE_RATE), dtype=np.float32) / SAMPLE_RATE
+    pitch = 140 + 30 * np.sin(2 * np.pi * 0.3 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / SAMPLE_RATE
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 6))
+    envelope = 0.5 * (1 + np.sin(2 * np.pi * 4 * t)) * (np.sin(2 * np.pi * 0.2 * t) > -0.6)
+    clip = 0.3 * voiced * envelope + 0.01 * rng.standard_normal(t.shape[0])
+    return clip.astype(np.float32)
+
+
+def _start_ffmpeg_load(threads: int, seconds: int):
+    """启动一个占用指定线程数的ffmpeg编码负载，模拟音频提取/视频合成的并发占用"""
+    cmd = [
+        "ffmpeg", "-hide_banner", "-loglevel", "error",
+        "-f", "lavfi", "-i", f"testsrc2=size=1280x720:rate=30:duration={seconds * 4}",
+        "-threads", str(threads), "-f", "null", "-"
+    ]
+    try:
+        return subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    except FileNotFoundError:
+        return None
+
+
+def _run_single(model_name: str, quantize: bool, intra: int, inter: int, ffmpeg_threads: int,
+                seconds: int) -> Dict[str, Any]:
+    """在当前进程中测量一个配置（由基准测试以子进程方式调用）"""
+    import torch
+    import whisper
+
+    plan = {'intra_op': intra, 'inter_op': inter, 'ffmpeg': ffmpeg_threads, 'source': 'bench'}
+    apply_thread_plan(plan)
+
+    download_root = os.path.abspath("whisper")
+    local_path = os.path.join(download_root, f"{model_name}.pt")
+    model = whisper.load_model(local_path if os.path.exists(local_path) else model_name,
+                               device="cpu", download_root=download_root)
+    model.eval()
+    if quantize:
+        model = quantize_whisper_for_cpu(model)
+
+    clip = make_synthetic_clip(seconds)
+    options = {
+        "language": "en", "task": "transcribe", "beam_size": 5, "best_of": 5,
+        "temperature": 0.0, "condition_on_previous_text": False, "verbose": None, "fp16": False
+    }
+
+    ffmpeg_proc = _start_ffmpeg_load(ffmpeg_threads, seconds) if ffmpeg_threads > 0 else None
+    try:
+        start_time = time.time()
+        with torch.no_grad():
+            model.transcribe(clip, **options)
+        elapsed = time.time() - start_time
+    finally:
+        if ffmpeg_proc is not None:
+            ffmpeg_proc.kill()
+            ffmpeg_proc.wait()
+
+    return {
+        'quantize': quantize,
+        'intra_op': intra,
+        'inter_op': inter,
+        'ffmpeg': ffmpeg_threads,
+        'elapsed': round(elapsed, 3),
+        'rtf': round(elapsed / seconds, 4)
+    }
+
+
+def benchmark_cpu_configs(model_name: str = "large-v3-turbo", seconds: int = 30,
+                          quantize_modes=(False, True), save: bool = True) -> List[Dict[str, Any]]:
+    """
+    对每个 (量化模式 × 线程方案) 在合成音频上测量实时率
+
+    inter-op线程数在进程内只能设置一次，因此每个配置在独立子进程中运行。
+    """
+    planner = CPUThreadPlanner()
+    results = []
+
+    for quantize in quantize_modes:
+        for plan in planner.candidate_plans():
+            cmd = [
+                sys.executable, "-m", "src.utils.cpu_tuner", "run",
+                "--model", model_name,
+                "--seconds", str(seconds),
+                "--intra", str(plan['intra_op']),
+                "--inter", str(plan['inter_op']),
+                "--ffmpeg", str(plan['ffmpeg'])
+            ]
+            if quantize:
+                cmd.append("--quantize")
+
+            logger.info(f"测量配置: int8={quantize}, intra={plan['intra_op']}, "
+                        f"inter={plan['inter_op']}, ffmpeg={plan['ffmpeg']}")
+            proc = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8', errors='replace')
+            if proc.returncode != 0:
+                logger.error(f"配置测量失败: {proc.stderr.strip()[-500:]}")
+                continue
+            results.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+    if not results:
+        logger.error("没有成功的测量结果")
+        return results
+
+    print(f"\n{'int8':<6}{'intra':>7}{'inter':>7}{'ffmpeg':>8}{'耗时(s)':>10}{'RTF':>9}")
+    for r in sorted(results, key=lambda x: x['rtf']):
+        print(f"{str(r['quantize']):<6}{r['intra_op']:>7}{r['inter_op']:>7}{r['ffmpeg']:>8}"
+              f"{r['elapsed']:>10.2f}{r['rtf']:>9.3f}")
+
+    if save:
+        best = min(results, key=lambda x: x['rtf'])
+        planner.save_plan({
+            'intra_op': best['intra_op'],
+            'inter_op': best['inter_op'],
+            'ffmpeg': best['ffmpeg'],
+            'quantize': best['quantize'],
+            'cores': planner.cores
+        }, results)
+        logger.info(f"最优配置: int8={best['quantize']}, RTF={best['rtf']:.3f}")
+
+    return results
+
+
+def main():
+    """命令行入口"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Whisper CPU推理基准测试与线程规划")
+    sub = parser.add_subparsers(dest="command")
+
+    bench = sub.add_parser("bench", help="测量所有候选配置并保存最优线程方案")
+    bench.add_argument("--model", default="large-v3-turbo")
+    bench.add_argument("--seconds", type=int, default=30)
+    bench.add_argument("--int8-only", action="store_true")
+    bench.add_argument("--no-save", action="store_true")
+
+    run = sub.add_parser("run", help="测量单个配置（内部使用）")
+    run.add_argument("--model", default="large-v3-turbo")
+    run.add_argument("--seconds", type=int, default=30)
+    run.add_argument("--intra", type=int, required=True)
+    run.add_argument("--inter", type=int, required=True)
+    run.add_argument("--ffmpeg", type=int, required=True)
+    run.add_argument("--quantize", action="store_true")
+
+    args = parser.parse_args()
+
+    if args.command == "run":
+        result = _run_single(args.model, args.quantize, args.intra, args.inter, args.ffmpeg, args.seconds)
+        print(json.dumps(result))
+    elif args.command == "bench":
+        modes = (True,) if args.int8_only else (False, True)
+        benchmark_cpu_configs(args.model, args.seconds, modes, save=not args.no_save)
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""
+共享HTTP客户端
+按主机复用连接池（keep-alive），连接/读取超时分开配置，
+对429/5xx和连接失败按带抖动的指数退避重试，并记录每个主机的请求延迟统计。
+
+用法:
+    from utils.http_client import get_http_client
+    response = get_http_client().post(url, json=payload)
+"""
+
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+from utils.logger import get_cached_logger
+
+logger = get_cached_logger("HTTP客户端")
+
+DEFAULT_SETTINGS = {
+    'http_connect_timeout': 5,
+    'http_read_timeout': 300,
+    'http_pool_size': 16,
+    'http_max_retries': 3,
+    'http_backoff_base': 1.0,
+    'http_backoff_max': 30.0
+}
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+# 每个主机保留的最近延迟样本数（用于计算分位数）
+LATENCY_WINDOW = 1000
+
+
+def load_http_settings() -> Dict[str, Any]:
+    """从 config/tran-py.json 读取HTTP设置（缺省时使用默认值）"""
+    settings = dict(DEFAULT_SETTINGS)
+    config_path = 'config/tran-py.json'
+    try:
+        if os.path.exists(config_path):
+            with open(config_path, 'r', encoding='utf-8') as f:
+                content = f.read().strip()
+                if content:
+                    config = json.loads(content)
+                    for key in settings:
+                        if key in config:
+                            settings[key] = config[key]
+    except Exception as e:
+        logger.warning(f"读取HTTP配置失败，使用默认值: {e}")
+    return settings
+
+
+def percentile(sorted_values, fraction):
+    """已排序样本的分位数（最近秩法）"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class HostMetrics:
+    """单个主机的请求统计"""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.total_time = 0.0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.status_codes = {}
+
+    def to_dict(self) -> Dict[str, Any]:
+        latencies = sorted(self.latencies)
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'retries': self.retries,
+            'avg_ms': round(self.total_time * 1000 / self.requests, 1) if self.requests else 0,
+            'p50_ms': round(percentile(latencies, 0.5) * 1000, 1),
+            'p90_ms': round(percentile(latencies, 0.9) * 1000, 1),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 1),
+            'status_codes': dict(self.status_codes)
+        }
+
+
+class HTTPClient:
+    """按主机复用连接池的HTTP客户端（线程安全）"""
+
+    def __init__(self, settings: Optional[Dict[str, Any]] = None):
+        self.settings = dict(DEFAULT_SETTINGS)
+        self.settings.update(settings or {})
+        self.sessions = {}
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def _host(self, url: str) -> str:
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}"
+
+    def _session(self, host: str) -> requests.Session:
+        with self.lock:
+            session = self.sessions.get(host)
+            if session is None:
+                session = requests.Session()
+                # 重试由本客户端统一处理，连接池不自行重试
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=int(self.settings['http_pool_size']),
+                                      max_retries=0)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self.sessions[host] = session
+                self.metrics[host] = HostMetrics()
+            return session
+
+    def _record(self, host: str, elapsed: float, status_code: Optional[int], retried: bool):
+        with self.lock:
+            metrics = self.metrics[host]
+            metrics.requests += 1
+            metrics.total_time += elapsed
+            metrics.latencies.append(elapsed)
+            if retried:
+                metrics.retries += 1
+            if status_code is None:
+                metrics.errors += 1
+            else:
+                metrics.status_codes[status_code] = metrics.status_codes.get(status_code, 0) + 1
+                if status_code >= 400:
+                    metrics.errors += 1
+
+    def backoff_delay(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """第attempt次重试前的等待时间: 全抖动指数退避，服务端给出Retry-After时不短于它"""
+        cap = min(float(self.settings['http_backoff_max']),
+                  float(self.settings['http_backoff_base']) * (2 ** attempt))
+        delay = random.uniform(0, cap)
+        if retry_after:
+            try:
+                delay = max(delay, min(float(retry_after), float(self.settings['http_backoff_max'])))
+            except ValueError:
+                pass
+        return delay
+
+    def request(self, method: str, url: str, timeout=None, retries: Optional[int] = None,
+                retry_codes=RETRY_STATUS_CODES, **kwargs) -> requests.Response:
+        """
+        发送请求
+
+        Args:
+            timeout: (连接超时, 读取超时)元组或单个读取超时秒数，默认取配置
+            retries: 最大重试次数，默认取配置；请求体不可重放（如文件流）时应传0
+            retry_codes: 需要重试的状态码；调用方自行处理429（如共享的限流器）时传不含429的集合
+            其余参数同 requests.request
+        """
+        connect_timeout = float(self.settings['http_connect_timeout'])
+        if timeout is None:
+            timeout = (connect_timeout, float(self.settings['http_read_timeout']))
+        elif not isinstance(timeout, tuple):
+            timeout = (min(connect_timeout, float(timeout)), float(timeout))
+        max_retries = int(self.settings['http_max_retries']) if retries is None else retries
+
+        host = self._host(url)
+        session = self._session(host)
+
+        attempt = 0
+        while True:
+            start_time = time.time()
+            try:
+                response = session.request(method, url, timeout=timeout, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.ConnectTimeout) as e:
+                # 连接阶段失败，请求未送达，可以安全重试
+                self._record(host, time.time() - start_time, None, attempt > 0)
+                if attempt >= max_retries:
+                    raise
+                delay = self.backoff_delay(attempt)
+                logger.warning(f"{method} {url} 连接失败，{delay:.1f}秒后重试 ({attempt + 1}/{max_retries}): {e}")
+            except requests.exceptions.RequestException:
+                self._record(host, time.time() - start_time, None, attempt > 0)
+                raise
+            else:
+                elapsed = time.time() - start_time
+                self._record(host, elapsed, response.status_code, attempt > 0)
+                logger.debug(f"{method} {url} -> {response.status_code} ({elapsed * 1000:.0f}ms)")
+                if response.status_code not in retry_codes or attempt >= max_retries:
+                    return response
+                delay = self.backoff_delay(attempt, response.headers.get('Retry-After'))
+                logger.warning(f"{method} {url} 返回 {response.status_code}，"
+                               f"{delay:.1f}秒后重试 ({attempt + 1}/{max_retries})")
+                response.close()
+
+            time.sleep(delay)
+            attempt += 1
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """各主机的请求数、错误数、重试数和延迟分位数"""
+        with self.lock:
+            return {host: metrics.to_dict() for host, metrics in self.metrics.items()}
+
+
+_http_client = None
+_http_client_lock = threading.Lock()
+
+
+def get_http_client() -> HTTPClient:
+    """获取全局HTTP客户端实例"""
+    global _http_client
+    with _http_client_lock:
+        if _http_client is None:
+            _http_client = HTTPClient(load_http_settings())
+        return _http_client
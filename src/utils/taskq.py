@@ -17,7 +17,8 @@ def add_task(task_data, app_state):
         video_duration=video_duration_seconds,
         mode=task_data.get("mode", "srt"),
         invite_code=task_data.get("invite_code", ""),
-        batch_id=task_data.get("batch_id")
+        batch_id=task_data.get("batch_id"),
+        profile=task_data.get("profile")
     )
     
     if not success:
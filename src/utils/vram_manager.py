@@ -5,7 +5,6 @@
 """
 
 import torch
-import gc
 import requests
 import time
 import re
@@ -15,6 +14,7 @@ import os
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
 from utils.logger import get_cached_logger
+from utils.http_client import get_http_client
 
 logger = get_cached_logger("显存管理器")
 
@@ -24,7 +24,7 @@ class VRAMManager:
 
     def __init__(self):
         self.cuda_available = torch.cuda.is_available()
-        self.whisper_manager = None
+        self.asr_engine = None
         self.ollama_base_url = None
         self.ollama_model = None
         self.vram_rotation_enabled = False  # 显存轮询是否启用
@@ -45,10 +45,10 @@ class VRAMManager:
         reserved = torch.cuda.memory_reserved() / (1024**3)
         logger.info(f"[{stage}] 显存状态 - 已分配: {allocated:.2f}GB, 已保留: {reserved:.2f}GB")
 
-    def set_whisper_manager(self, manager):
-        """设置Whisper管理器引用"""
-        self.whisper_manager = manager
-        logger.info("已关联Whisper管理器")
+    def set_asr_engine(self, engine):
+        """设置ASR引擎引用"""
+        self.asr_engine = engine
+        logger.info(f"已关联ASR引擎: {engine.name}")
 
     def set_ollama_config(self, base_url: str, model: str, translator_type: str = "ollama"):
         """设置Ollama配置并判断是否启用显存轮询"""
@@ -87,31 +87,26 @@ class VRAMManager:
             logger.debug("显存轮询未启用，Whisper保持在GPU")
             return True
 
-        if not self.cuda_available or not self.whisper_manager:
-            logger.warning("CUDA不可用或Whisper管理器未设置，跳过操作")
+        if not self.cuda_available or not self.asr_engine:
+            logger.warning("CUDA不可用或ASR引擎未设置，跳过操作")
             return False
 
-        try:
-            with self.whisper_manager.lock:
-                if self.whisper_manager.model is None:
-                    logger.info("Whisper模型未加载，无需移动")
-                    return True
-
-                logger.info("开始将Whisper模型移动到CPU...")
-                start_time = time.time()
+        if not self.asr_engine.is_loaded():
+            logger.info("Whisper模型未加载，无需移动")
+            return True
 
-                # 移动模型到CPU
-                self.whisper_manager.model = self.whisper_manager.model.to('cpu')
+        try:
+            logger.info("开始将Whisper模型移动到CPU...")
+            start_time = time.time()
 
-                # 清理GPU缓存
-                torch.cuda.empty_cache()
-                gc.collect()
+            if not self.asr_engine.move('cpu'):
+                return False
 
-                move_time = time.time() - start_time
-                logger.info(f"Whisper模型已移至CPU，用时: {move_time:.2f}秒")
-                self._log_vram_status("Whisper移至CPU后")
+            move_time = time.time() - start_time
+            logger.info(f"Whisper模型已移至CPU，用时: {move_time:.2f}秒")
+            self._log_vram_status("Whisper移至CPU后")
 
-                return True
+            return True
 
         except Exception as e:
             logger.error(f"Whisper模型移至CPU失败: {e}")
@@ -124,31 +119,26 @@ class VRAMManager:
             logger.debug("显存轮询未启用，Whisper已在GPU")
             return True
 
-        if not self.cuda_available or not self.whisper_manager:
-            logger.warning("CUDA不可用或Whisper管理器未设置，跳过操作")
+        if not self.cuda_available or not self.asr_engine:
+            logger.warning("CUDA不可用或ASR引擎未设置，跳过操作")
             return False
 
-        try:
-            with self.whisper_manager.lock:
-                if self.whisper_manager.model is None:
-                    logger.info("Whisper模型未加载，无需移动")
-                    return True
-
-                logger.info("开始将Whisper模型移动到GPU...")
-                start_time = time.time()
+        if not self.asr_engine.is_loaded():
+            logger.info("Whisper模型未加载，无需移动")
+            return True
 
-                # 清理GPU缓存为模型腾出空间
-                torch.cuda.empty_cache()
-                gc.collect()
+        try:
+            logger.info("开始将Whisper模型移动到GPU...")
+            start_time = time.time()
 
-                # 移动模型到GPU
-                self.whisper_manager.model = self.whisper_manager.model.to('cuda')
+            if not self.asr_engine.move('cuda'):
+                return False
 
-                move_time = time.time() - start_time
-                logger.info(f"Whisper模型已移至GPU，用时: {move_time:.2f}秒")
-                self._log_vram_status("Whisper移至GPU后")
+            move_time = time.time() - start_time
+            logger.info(f"Whisper模型已移至GPU，用时: {move_time:.2f}秒")
+            self._log_vram_status("Whisper移至GPU后")
 
-                return True
+            return True
 
         except Exception as e:
             logger.error(f"Whisper模型移至GPU失败: {e}")
@@ -156,13 +146,13 @@ class VRAMManager:
 
     def unload_whisper_completely(self) -> bool:
         """完全卸载Whisper模型(释放CPU和GPU内存)"""
-        if not self.whisper_manager:
-            logger.warning("Whisper管理器未设置，跳过操作")
+        if not self.asr_engine:
+            logger.warning("ASR引擎未设置，跳过操作")
             return False
 
         try:
             logger.info("开始完全卸载Whisper模型...")
-            self.whisper_manager.unload_model()
+            self.asr_engine.unload()
             logger.info("Whisper模型已完全卸载")
             self._log_vram_status("Whisper完全卸载后")
             return True
@@ -195,7 +185,7 @@ class VRAMManager:
             }
 
             # 发送请求
-            response = requests.post(url, json=payload, timeout=10)
+            response = get_http_client().post(url, json=payload, timeout=10)
 
             if response.status_code == 200:
                 logger.info(f"Ollama模型 {self.ollama_model} 已卸载")
@@ -227,7 +217,7 @@ class VRAMManager:
             logger.warning("Ollama模型卸载失败，继续执行")
 
         # 2. 确保Whisper在GPU
-        if self.whisper_manager:
+        if self.asr_engine:
             if not self.move_whisper_to_gpu():
                 logger.error("Whisper模型移至GPU失败")
                 success = False
@@ -235,6 +225,16 @@ class VRAMManager:
         self._log_vram_status("转录准备完成")
         return success
 
+    def prewarm_ollama_model(self, profile=None):
+        """
+        在后台预热翻译模型（按 ollama_keep_alive 保留在显存中）
+
+        启用显存轮询时必须在Whisper移出显存之后调用，否则两个模型会同时占用显存；
+        未启用时可在转录期间调用，模型加载与转录重叠。
+        """
+        from src.services.tran import start_prewarm
+        return start_prewarm(profile)
+
     def prepare_for_translation(self) -> bool:
         """准备翻译阶段: 将Whisper移至CPU，为Ollama腾出显存"""
         logger.info("=" * 50)
@@ -244,7 +244,7 @@ class VRAMManager:
         success = True
 
         # 将Whisper移至CPU释放显存
-        if self.whisper_manager:
+        if self.asr_engine:
             if not self.move_whisper_to_cpu():
                 logger.error("Whisper模型移至CPU失败")
                 success = False
@@ -268,7 +268,7 @@ class VRAMManager:
 
         # 2. 可选: 将Whisper移至CPU或完全卸载
         # 这里选择移至CPU以加快下次使用
-        if self.whisper_manager:
+        if self.asr_engine:
             if not self.move_whisper_to_cpu():
                 logger.warning("Whisper模型移至CPU失败")
                 success = False
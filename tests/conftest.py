@@ -0,0 +1,28 @@
+"""测试公共配置: 从仓库根目录导入 src 包，桩服务和配置的公共夹具"""
+
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+from src.services.tran_modules.stub_server import StubLLMServer
+
+
+def stub_config(server, **overrides):
+    """指向桩服务的 OpenAI 兼容翻译配置（关闭整句合并和翻译记忆，失败立即重试）"""
+    config = {'translator_type': 'openai', 'openai_base_url': f"{server.url}/v1", 'openai_api_key': 'stub', 'openai_model': 'stub',
+              'translation_batch_size': 5, 'openai_concurrency': 1, 'translation_memory_enabled': False,
+              'translation_sentence_merge': False, 'translation_retry_backoff': 0}
+    config.update(overrides)
+    return config
+
+
+@pytest.fixture
+def stub_server():
+    """默认参数的本地桩服务，测试结束后关闭"""
+    server = StubLLMServer(latency=0.05, per_line=0.005).start()
+    yield server
+    server.stop()
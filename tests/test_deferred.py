@@ -0,0 +1,57 @@
+"""延后批量翻译: 批处理译文写入检查点，同步翻译只补齐缺失的行；记录丢失时改为同步翻译"""
+
+import time
+
+from conftest import stub_config
+from src.services.tran_modules.benchmark import count_aligned, make_lines, translate_task_srt, write_task_srt
+from src.services.tran_modules.deferred import DeferredBatchQueue
+from src.services.tran_modules.stub_server import StubLLMServer
+
+
+def make_queue(tmp_path, config, ready):
+    return DeferredBatchQueue(str(tmp_path / "translation_deferred.json"), collect_seconds=0.1, poll_interval=0.1,
+                              config_loader=lambda profile: config,
+                              on_ready=lambda task_id, stats, message: ready.update({task_id: stats}))
+
+
+def test_batch_results_resume_without_sync_requests(tmp_path):
+    server = StubLLMServer(latency=0.01, per_line=0.001, batch_time=0.2).start()
+    try:
+        config = stub_config(server, translation_mode='deferred')
+        lines = make_lines(30)
+        raw_srt = str(tmp_path / "raw.srt")
+        journal_file = str(tmp_path / "task_translation.journal")
+        write_task_srt(raw_srt, lines)
+
+        ready = {}
+        queue = make_queue(tmp_path, config, ready)
+        assert queue.should_defer("task", config)
+        queue.enqueue("task", raw_srt, journal_file)
+        deadline = time.time() + 30
+        while "task" not in ready and time.time() < deadline:
+            time.sleep(0.05)
+        assert ready["task"]['status'] == 'done'
+        assert not queue.should_defer("task", config)
+
+        translations, stats = translate_task_srt(config, raw_srt, journal_file)
+        assert server.requests == 0
+        assert stats['resumed'] == len(lines)
+        assert count_aligned(lines, translations) == len(lines)
+
+        queue.finish("task")
+        assert queue.should_defer("task", config)
+    finally:
+        server.stop()
+
+
+def test_lost_batch_record_falls_back_to_sync(tmp_path):
+    config = {'translation_mode': 'deferred', 'openai_base_url': 'http://127.0.0.1:1/v1', 'openai_api_key': 'stub',
+              'openai_model': 'stub'}
+    queue = make_queue(tmp_path, config, {})
+    assert not queue.tracking("task")
+    queue.fall_back("task")
+    assert not queue.should_defer("task", config)
+    # 重启后从状态文件读取，仍为同步翻译
+    assert not make_queue(tmp_path, config, {}).should_defer("task", config)
+    queue.finish("task")
+    assert queue.should_defer("task", config)
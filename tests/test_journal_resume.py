@@ -0,0 +1,68 @@
+"""检查点日志: 翻译进程被强制结束后从日志恢复，已完成的行不再请求"""
+
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+
+from conftest import ROOT, stub_config
+from src.services.tran_modules.benchmark import count_aligned, make_lines, translate_task_srt, write_task_srt
+from src.services.tran_modules.context import strip_context
+from src.services.tran_modules.journal import TranslationJournal, read_journal, source_fingerprint
+
+WORKER = ("import json, sys\n"
+          "from src.services.tran_modules.benchmark import translate_task_srt\n"
+          "translate_task_srt(json.loads(sys.argv[1]), sys.argv[2], sys.argv[3])\n")
+
+
+def test_resume_after_kill_requests_no_committed_line(stub_server, tmp_path):
+    lines = make_lines(60)
+    raw_srt = str(tmp_path / "raw.srt")
+    journal_file = str(tmp_path / "task_translation.journal")
+    write_task_srt(raw_srt, lines)
+    config = stub_config(stub_server)
+
+    worker = subprocess.Popen([sys.executable, "-c", WORKER, json.dumps(config), raw_srt, journal_file],
+                              cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 60
+    while stub_server.requests < 4 and worker.poll() is None and time.time() < deadline:
+        time.sleep(0.01)
+    worker.send_signal(signal.SIGKILL)
+    worker.wait()
+    assert worker.returncode == -signal.SIGKILL
+
+    committed = read_journal(journal_file)['items']
+    assert 0 < len(committed) < len(lines)
+    committed_lines = {lines[i] for i in committed}
+
+    resumed_from = len(stub_server.prompts)
+    translations, stats = translate_task_srt(config, raw_srt, journal_file)
+
+    requested = [strip_context(prompt) for prompt in stub_server.prompts[resumed_from:]]
+    rerequested = [line for line in committed_lines if any(line in content for content in requested)]
+    assert rerequested == []
+    assert stats['resumed'] == len(committed)
+    assert count_aligned(lines, translations) == len(lines)
+    assert not os.path.exists(journal_file + ".tmp")
+
+
+def test_rewrite_keeps_recovered_items(tmp_path):
+    path = str(tmp_path / "task_translation.journal")
+    texts = ["a", "b", "c"]
+    journal = TranslationJournal(path, texts)
+    journal.append({0: "A"})
+    journal.close()
+    # 模拟写了一半的最后一行
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('{"items": {"1": "B')
+
+    journal = TranslationJournal(path, texts)
+    assert journal.completed == {0: "A"}
+    journal.append({2: "C"})
+    journal.close()
+
+    recovered = read_journal(path)
+    assert recovered['source'] == source_fingerprint(texts)
+    assert recovered['items'] == {0: "A", 2: "C"}
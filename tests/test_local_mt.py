@@ -0,0 +1,28 @@
+"""本地翻译模型的CPU线程数与 Whisper 的CPU线程方案共用"""
+
+from src.services.tran_modules.local_mt import cpu_threads
+# 与 whisper_direct、local_mt 相同按 utils.cpu_tuner 导入（导入 src 模块时 src 目录已加入导入路径）
+import utils.cpu_tuner as cpu_tuner
+
+PLAN = {'intra_op': 6, 'inter_op': 2, 'ffmpeg': 2, 'cores': 8, 'source': 'measured'}
+
+
+def test_defaults_to_active_plan(monkeypatch):
+    monkeypatch.setattr(cpu_tuner, '_active_plan', PLAN)
+    assert cpu_threads(0) == 6
+
+
+def test_conflicting_setting_keeps_active_plan(monkeypatch):
+    monkeypatch.setattr(cpu_tuner, '_active_plan', PLAN)
+    assert cpu_threads(3) == 6
+
+
+def test_setting_used_before_any_plan(monkeypatch):
+    monkeypatch.setattr(cpu_tuner, '_active_plan', None)
+    assert cpu_threads(3) == 3
+
+
+def test_default_follows_planned_intra_op(monkeypatch):
+    monkeypatch.setattr(cpu_tuner, '_active_plan', None)
+    monkeypatch.setattr(cpu_tuner, 'load_cpu_settings', lambda: {'whisper_cpu_threads': {'intra_op': 5}})
+    assert cpu_threads(0) == 5
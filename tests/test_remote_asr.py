@@ -0,0 +1,104 @@
+"""远程ASR引擎: 未输出片段时节点故障改派其他节点，已输出片段时不重转"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src.services.asr_engines.remote_engine import RemoteASREngine
+
+SEGMENT = {'start': 0.0, 'end': 1.0, 'text': "hello"}
+RESULT = {'text': "hello", 'segments': [SEGMENT], 'language': 'en'}
+
+
+class FakeWorker:
+    """按 behavior 返回转录结果的ASR工作节点: ok / 500 / truncated / error / partial"""
+
+    def __init__(self, behavior):
+        self.behavior = behavior
+        self.requests = 0
+        worker = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status, content_type, body):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                self._send(200, 'application/json',
+                           json.dumps({'status': 'healthy', 'slots': 1, 'available': 1}).encode())
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                worker.requests += 1
+                if worker.behavior == '500':
+                    self._send(500, 'text/plain', "CUDA out of memory".encode())
+                    return
+                events = [{'type': 'progress', 'position': 1.0, 'duration': 1.0}]
+                if worker.behavior in ('ok', 'partial'):
+                    events.append({'type': 'segment', 'segment': SEGMENT})
+                if worker.behavior == 'ok':
+                    events.append({'type': 'result', 'result': dict(RESULT)})
+                elif worker.behavior == 'error':
+                    events.append({'type': 'error', 'error': "decoder crashed"})
+                self._send(200, 'application/x-ndjson', "".join(json.dumps(e) + "\n" for e in events).encode())
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def audio_file(tmp_path):
+    path = tmp_path / "audio.flac"
+    path.write_bytes(b"\0" * 1024)
+    return str(path)
+
+
+def run_engine(behaviors, audio_file):
+    workers = [FakeWorker(behavior) for behavior in behaviors]
+    engine = RemoteASREngine({'asr_endpoints': [w.url for w in workers], 'asr_health_interval': 60})
+    segments = []
+    try:
+        return workers, engine, segments, engine.transcribe(audio_file, segment_cb=segments.append)
+    except Exception as e:
+        return workers, engine, segments, e
+    finally:
+        for worker in workers:
+            worker.stop()
+
+
+@pytest.mark.parametrize("behavior", ['500', 'truncated', 'error'])
+def test_failover_before_any_segment(behavior, audio_file):
+    workers, engine, segments, result = run_engine([behavior, 'ok'], audio_file)
+    assert not isinstance(result, Exception), result
+    assert result['worker'] == workers[1].url
+    assert [w.requests for w in workers] == [1, 1]
+    assert segments == [SEGMENT]
+    assert not engine.pool.endpoints[0]['healthy']
+
+
+def test_no_failover_after_segments_emitted(audio_file):
+    workers, engine, segments, result = run_engine(['partial', 'ok'], audio_file)
+    assert isinstance(result, Exception)
+    assert "中途失败" in str(result)
+    assert workers[1].requests == 0
+    assert segments == [SEGMENT]
+
+
+def test_all_workers_failed_reports_last_error(audio_file):
+    workers, engine, segments, result = run_engine(['500', '500'], audio_file)
+    assert isinstance(result, Exception)
+    assert "500" in str(result)
+    assert [w.requests for w in workers] == [1, 1]
@@ -0,0 +1,65 @@
+"""流式翻译: 跨批次的半句合并翻译，转录异常不被翻译错误掩盖"""
+
+import time
+
+import pytest
+
+from conftest import stub_config
+import src.services.profiles as profiles
+import src.services.stream_translate as stream_translate
+from src.services.stream_translate import StreamingTranslator, transcribe_and_translate
+from src.services.tran_modules.context import strip_context
+
+
+def wait_drained(consumer):
+    """等待翻译线程取走队列中的片段"""
+    while not consumer.queue.empty():
+        time.sleep(0.01)
+    time.sleep(0.3)
+
+
+def test_unfinished_sentence_is_carried_into_next_chunk(stub_server, tmp_path, monkeypatch):
+    config = stub_config(stub_server, translation_sentence_merge=True)
+    monkeypatch.setattr(profiles, 'get_profile_config', lambda profile=None: config)
+    consumer = StreamingTranslator(str(tmp_path / "raw.srt"), str(tmp_path / "translated.srt"))
+    consumer.start()
+
+    consumer.put({'start': 0.0, 'end': 1.0, 'text': "Hello there."})
+    consumer.put({'start': 1.2, 'end': 2.0, 'text': "This is the first"})
+    wait_drained(consumer)
+    # 半句留在翻译线程中等待后续片段
+    assert consumer.translated_count == 1
+    consumer.put({'start': 2.1, 'end': 3.0, 'text': "half of a sentence."})
+    consumer.finish()
+
+    requested = [strip_context(prompt) for prompt in stub_server.prompts]
+    assert any("This is the first half of a sentence." in content for content in requested)
+    assert not any(content.rstrip().endswith("This is the first") for content in requested)
+    assert consumer.translated_count == 3
+    with open(tmp_path / "translated.srt", encoding='utf-8') as f:
+        assert f.read().count(" --> ") == 3
+
+
+def test_trailing_fragment_is_translated_at_end(stub_server, tmp_path, monkeypatch):
+    config = stub_config(stub_server, translation_sentence_merge=True)
+    monkeypatch.setattr(profiles, 'get_profile_config', lambda profile=None: config)
+    consumer = StreamingTranslator(str(tmp_path / "raw.srt"), str(tmp_path / "translated.srt"))
+    consumer.start()
+    consumer.put({'start': 0.0, 'end': 1.0, 'text': "and then it stopped"})
+    consumer.finish()
+    assert consumer.translated_count == 1
+    assert stub_server.requests == 1
+
+
+def test_transcription_error_is_not_masked(tmp_path, monkeypatch):
+    def broken_profile(profile=None):
+        raise ValueError("翻译配置错误")
+
+    def broken_whisper(video_path, progress_callback, task_id, profile, segment_callback=None):
+        raise RuntimeError("whisper crashed")
+
+    monkeypatch.setattr(profiles, 'get_profile_config', broken_profile)
+    monkeypatch.setattr(stream_translate, 'call_whisper_service', broken_whisper)
+    with pytest.raises(RuntimeError, match="whisper crashed"):
+        transcribe_and_translate("task-stream", "video.mp4", str(tmp_path / "raw.srt"),
+                                 str(tmp_path / "translated.srt"))
@@ -0,0 +1,106 @@
+"""通过本地桩服务翻译整个任务: 批量对齐、并发、翻译记忆与去重、失败重试、录制/回放"""
+
+import src.services.tran_modules.memory as memory
+from conftest import stub_config
+from src.services.tran import parse_srt_file, translate_srt_with_callback
+from src.services.tran_modules.benchmark import count_aligned, make_lines, translate_task_srt, write_task_srt
+from src.services.tran_modules.stub_server import StubLLMServer
+
+
+def task_srt(tmp_path, lines):
+    raw_srt = str(tmp_path / "raw.srt")
+    write_task_srt(raw_srt, lines)
+    return raw_srt
+
+
+def test_batch_reply_missing_items_are_realigned(tmp_path):
+    # 批量回复最多只包含3条，缺失的条目需要重新请求，译文不能错位
+    server = StubLLMServer(latency=0.01, per_line=0.001, max_batch=3).start()
+    try:
+        lines = make_lines(40)
+        translations, stats = translate_task_srt(stub_config(server, translation_batch_size=8),
+                                                 task_srt(tmp_path, lines))
+    finally:
+        server.stop()
+    assert count_aligned(lines, translations) == len(lines)
+    assert stats['untranslated'] == 0
+    assert server.requests > len(lines) // 8
+
+
+def test_concurrency_limit_is_reached_and_respected(tmp_path):
+    lines = make_lines(24)
+    raw_srt = task_srt(tmp_path, lines)
+    for concurrency in (1, 4):
+        server = StubLLMServer(latency=0.2, per_line=0.0, slots=16).start()
+        try:
+            config = stub_config(server, translation_batch_size=1, openai_concurrency=concurrency)
+            translations, _ = translate_task_srt(config, raw_srt)
+        finally:
+            server.stop()
+        assert server.peak_active == concurrency
+        assert count_aligned(lines, translations) == len(lines)
+
+
+def test_duplicates_and_memory_hits_skip_requests(tmp_path, monkeypatch):
+    monkeypatch.setattr(memory, '_translation_memory', None)
+    unique = make_lines(10)
+    lines = unique + unique
+    raw_srt = task_srt(tmp_path, lines)
+    server = StubLLMServer(latency=0.01, per_line=0.001).start()
+    try:
+        config = stub_config(server, translation_batch_size=1, translation_memory_enabled=True,
+                             translation_memory_path=str(tmp_path / "memory.sqlite3"))
+        translations, stats = translate_task_srt(config, raw_srt)
+        first_requests = server.requests
+        assert first_requests == len(unique)
+        assert stats['duplicates'] == len(unique)
+        assert count_aligned(lines, translations) == len(lines)
+
+        translations, stats = translate_task_srt(config, raw_srt)
+    finally:
+        server.stop()
+    assert server.requests == first_requests
+    assert stats['memory_hits'] + stats['duplicates'] == len(lines)
+    assert stats['memory_hits'] >= len(unique)
+    assert count_aligned(lines, translations) == len(lines)
+
+
+def test_server_errors_are_retried_until_recovered(tmp_path):
+    server = StubLLMServer(latency=0.01, per_line=0.001, error_rate=0.3, seed=7).start()
+    try:
+        lines = make_lines(40)
+        translations, stats = translate_task_srt(stub_config(server), task_srt(tmp_path, lines))
+    finally:
+        server.stop()
+    assert server.errors > 0
+    assert stats['untranslated'] == 0
+    assert count_aligned(lines, translations) == len(lines)
+
+
+def test_recorded_session_replays_identically(tmp_path):
+    lines = make_lines(30)
+    raw_srt = task_srt(tmp_path, lines)
+    cassette_path = str(tmp_path / "cassette.jsonl")
+
+    def run(server, name):
+        output_srt = str(tmp_path / f"{name}.srt")
+        try:
+            translate_srt_with_callback(raw_srt, output_path=output_srt, config=stub_config(server))
+        finally:
+            server.stop()
+        with open(output_srt, 'rb') as f:
+            return f.read()
+
+    upstream = StubLLMServer(latency=0.01, per_line=0.001).start()
+    try:
+        recorded = run(StubLLMServer(upstream=upstream.url, cassette_path=cassette_path).start(), "recorded")
+    finally:
+        upstream.stop()
+    assert upstream.requests > 0
+
+    # 上游已停止，只能从录音文件回放
+    replay = StubLLMServer(cassette_path=cassette_path, replay_timing=False).start()
+    assert run(replay, "replayed") == recorded
+    assert replay.replay_misses == 0
+    assert replay.replay_hits == upstream.requests
+    assert count_aligned(lines, [text for _, _, text in parse_srt_file(str(tmp_path / "replayed.srt"))]) == len(lines)